@@ -1,23 +1,85 @@
 import os
 import json
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple, Optional
 import numpy as np
 from pydantic import BaseModel
 from pathlib import Path
-import fitz  # PyMuPDF for PDF processing
 from docx import Document as DocxDocument
 import chardet
 from core.logger import logger
 from model.embedding_model import TextEmbeddingModel
+from model.embedding_usage import EmbeddingUsage
 from repository.entity.sql_entity import DocumentEmbedding
-from config.config import settings
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
+from Embedding.vector_index import (
+    ATTRIBUTE_FIELDS, Filters, FlatVectorIndex, IVFVectorIndex, OrgVectorIndexRegistry, QuantizedVectorIndex,
+    attribute_key, normalize_filters, normalize_rows, rank_candidates, row_attributes, select_top_k
+)
+from Embedding.vector_shard import VectorShardStore
+from Embedding.keyword_index import BM25Index, reciprocal_rank_fusion
+from Embedding import text_splitter
+from Embedding.parallel_parser import get_parallel_parser
+from Embedding.search_cache import get_search_result_cache
+from Embedding.vector_codec import CODEC_JSON, SUPPORTED_CODECS, encode_vector, decode_vector, decode_json_vector
+from config.config import settings, config
+from utils.content_hash import compute_content_hash
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import create_engine, func, insert, null, text
 from sqlalchemy.orm import sessionmaker
-import re
 import hashlib
 
 
+# 向量检索配置（config.yml -> vector_search）
+VECTOR_SEARCH_CONFIG = config.get("vector_search", {}) or {}
+
+# 文档入库配置（config.yml -> document_ingest）
+INGEST_CONFIG = config.get("document_ingest", {}) or {}
+
+# 进程内按 检索模式 + org_code 缓存的向量索引（每个 uvicorn worker 各自一份）
+_ORG_VECTOR_INDEXES: Dict[str, OrgVectorIndexRegistry] = {
+    "ivf": OrgVectorIndexRegistry(),
+    "flat": OrgVectorIndexRegistry(),
+    "int8": OrgVectorIndexRegistry(),
+}
+
+# 关键词检索（BM25）与混合检索配置（config.yml -> vector_search.keyword）
+KEYWORD_CONFIG = VECTOR_SEARCH_CONFIG.get("keyword", {}) or {}
+
+# 文档检索方式：vector（向量）/ hybrid（向量 + BM25 关键词，RRF 融合）/ keyword（仅关键词，不调用嵌入接口）
+RETRIEVAL_MODES = ("vector", "hybrid", "keyword")
+
+# 进程内按 org_code 缓存的 BM25 关键词索引，首次关键词/混合检索时构建
+_KEYWORD_INDEXES = OrgVectorIndexRegistry()
+
+# 磁盘内存映射向量分片（mmap 模式），所有 worker 共享同一目录
+_SHARD_STORE = VectorShardStore(
+    base_dir=VECTOR_SEARCH_CONFIG.get("shard_dir", "vector_shards"),
+    compact_threshold=VECTOR_SEARCH_CONFIG.get("shard_compact_threshold", 8)
+)
+
+
+def iter_unique_grouped_chunks(grouped_chunks: Iterable[Dict[str, object]]) -> Iterator[Tuple[Dict[str, object], str, str]]:
+    """
+    过滤空 chunk 并按 content_hash 去重，逐个产出 (原始 item, chunk 文本, content_hash)；只在内存中保留哈希
+    """
+    seen_hashes: set[str] = set()
+    for item in grouped_chunks:
+        chunk = str(item.get("content", "") or "").strip()
+        if not chunk:
+            continue
+        content_hash = compute_content_hash(chunk)
+        if content_hash in seen_hashes:
+            continue
+        seen_hashes.add(content_hash)
+        yield item, chunk, content_hash
+
+
+def unique_grouped_chunks(grouped_chunks: List[Dict[str, object]]) -> List[Tuple[Dict[str, object], str, str]]:
+    """
+    过滤空 chunk 并按 content_hash 去重，返回 [(原始 item, chunk 文本, content_hash), ...]
+    """
+    return list(iter_unique_grouped_chunks(grouped_chunks))
+
+
 def cosine_similarity(a: List[float], b: List[float]) -> float:
     """
     计算两个向量的余弦相似度
@@ -58,6 +120,22 @@ class DocumentProcessor:
         else:
             raise ValueError(f"不支持的文件类型: {file_ext}")
     
+    def iter_document_pages(self, file_path: str) -> Iterator[str]:
+        """
+        流式读取文档内容：PDF 逐页、TXT 按块、DOCX 按段落组输出文本，
+        各片段直接拼接后与 read_document 的结果一致，内存占用与文档大小无关
+        """
+        file_ext = Path(file_path).suffix.lower()
+
+        if file_ext == '.txt':
+            return self._iter_txt(file_path)
+        elif file_ext == '.pdf':
+            return self._iter_pdf(file_path)
+        elif file_ext in ['.doc', '.docx']:
+            return self._iter_docx(file_path)
+        else:
+            raise ValueError(f"不支持的文件类型: {file_ext}")
+
     def _read_txt(self, file_path: str) -> str:
         """
         读取TXT文件
@@ -91,12 +169,8 @@ class DocumentProcessor:
         读取PDF文件
         """
         try:
-            doc = fitz.open(file_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text
+            # 大 PDF 按页区间分到进程池并行解析，按页列表拼接
+            return get_parallel_parser().read_pdf(file_path)
         except Exception as e:
             logger.error(f"读取PDF文件失败: {e}")
             raise
@@ -113,6 +187,59 @@ class DocumentProcessor:
             logger.error(f"读取DOCX文件失败: {e}")
             raise
     
+    def _detect_txt_encoding(self, file_path: str, block_size: int = 1 << 20) -> str:
+        """按与 _read_txt 相同的顺序尝试编码，逐块解码校验整份文件，不把文件整体读入内存"""
+        for encoding in ['utf-8', 'gbk', 'gb2312', 'latin-1']:
+            try:
+                with open(file_path, 'r', encoding=encoding) as f:
+                    while f.read(block_size):
+                        pass
+                return encoding
+            except UnicodeDecodeError:
+                continue
+
+        detector = chardet.UniversalDetector()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                detector.feed(block)
+                if detector.done:
+                    break
+        detector.close()
+        return detector.result['encoding']
+
+    def _iter_txt(self, file_path: str, block_size: int = 1 << 20) -> Iterator[str]:
+        encoding = self._detect_txt_encoding(file_path, block_size)
+        logger.info(f"使用 {encoding} 编码流式读取TXT文件")
+        with open(file_path, 'r', encoding=encoding) as f:
+            for block in iter(lambda: f.read(block_size), ""):
+                yield block
+
+    def _iter_pdf(self, file_path: str) -> Iterator[str]:
+        try:
+            yield from get_parallel_parser().iter_pdf_pages(file_path)
+        except Exception as e:
+            logger.error(f"读取PDF文件失败: {e}")
+            raise
+
+    def _iter_docx(self, file_path: str, paragraphs_per_block: int = 200) -> Iterator[str]:
+        try:
+            doc = DocxDocument(file_path)
+        except Exception as e:
+            logger.error(f"读取DOCX文件失败: {e}")
+            raise
+        block: List[str] = []
+        first = True
+        for p in doc.paragraphs:
+            if not p.text.strip():
+                continue
+            block.append(p.text)
+            if len(block) >= paragraphs_per_block:
+                yield ("" if first else "\n") + "\n".join(block)
+                first = False
+                block = []
+        if block:
+            yield ("" if first else "\n") + "\n".join(block)
+
     def split_document(self, content: str, chunk_size: int = 512, overlap: int = 50) -> List[str]:
         """
         将文档内容切分为多个块（更适合中文：先按章节标题分段，再按句子拼接；overlap 使用字符数）
@@ -131,72 +258,13 @@ class DocumentProcessor:
 
         返回结构：[{"section": str, "chunk_index": int, "content": str}, ...]
         """
-        if not content:
-            return []
-
-        # Step 1: 参数归一化（chunk_size / overlap 以“字符长度”近似控制）
-        chunk_size = max(int(chunk_size), 50)
-        overlap = max(int(overlap), 0)
-
-        # Step 2: 先按标题/编号/分隔符分组为多个 section
-        section_items = self._split_sections_with_titles(content)
-
-        # Step 3: section 内按句子边界切分，并装箱成 chunk
-        results: List[Dict[str, object]] = []
-
-        for section_title, section_text in section_items:
-            current_chunk = ""
-            chunk_idx = 0
-
-            def flush_current():
-                nonlocal current_chunk, chunk_idx
-                if current_chunk.strip():
-                    results.append({
-                        "section": section_title,
-                        "chunk_index": chunk_idx,
-                        "content": current_chunk.strip()
-                    })
-                    chunk_idx += 1
-                current_chunk = ""
-
-            sentences = self._split_cn_sentences(section_text)
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if not sentence:
-                    continue
-
-                # Step 3.1: 避免超长句子：硬切成小段（极少发生，属于兜底）
-                if len(sentence) > chunk_size:
-                    parts = [sentence[i:i + chunk_size] for i in range(0, len(sentence), chunk_size)]
-                else:
-                    parts = [sentence]
-
-                for part in parts:
-                    part = part.strip()
-                    if not part:
-                        continue
+        return text_splitter.split_grouped(content, chunk_size, overlap)
 
-                    # Step 3.2: 装箱（packing）：把句子拼到 chunk_size 上限
-                    separator = "\n" if current_chunk else ""
-                    if len(current_chunk) + len(separator) + len(part) <= chunk_size:
-                        current_chunk = f"{current_chunk}{separator}{part}" if current_chunk else part
-                        continue
-
-                    # Step 3.3: 当前块满了，先落盘
-                    flush_current()
-
-                    # Step 3.4: 新块携带 overlap（字符级），保证上下文连续
-                    if overlap > 0 and results:
-                        prev = results[-1]["content"]
-                        prev_text = prev if isinstance(prev, str) else ""
-                        overlap_text = prev_text[-overlap:] if len(prev_text) > overlap else prev_text
-                        current_chunk = f"{overlap_text}\n{part}" if overlap_text else part
-                    else:
-                        current_chunk = part
-
-            flush_current()
-
-        return results
+    def iter_split_document_grouped(self, pages: Iterable[str], chunk_size: int = 512, overlap: int = 50) -> Iterator[Dict[str, object]]:
+        """
+        流式切分：逐页输入文本，边读边产出 chunk，输出与 split_document_grouped 对整篇文本切分的结果完全一致
+        """
+        return text_splitter.iter_split_grouped(pages, chunk_size, overlap)
 
     def _split_sections(self, content: str) -> List[str]:
         # 兼容旧逻辑：返回纯文本 section 列表
@@ -204,161 +272,10 @@ class DocumentProcessor:
 
     def _split_sections_with_titles(self, content: str) -> List[Tuple[str, str]]:
         """将全文分成多个 section，并尽量提取 section 标题（通用文本/文档做法）。"""
-        lines = [re.sub(r"\s+", " ", ln).strip() for ln in content.splitlines()]
-        lines = [ln for ln in lines if ln]
-
-        heading_keywords = {
-            "摘要", "目录", "前言", "引言", "概述", "背景", "结论", "附录",
-            "简介", "说明", "注意事项", "常见问题", "FAQ",
-            "译文", "赏析", "作者介绍", "作品评价",
-            "写作手法", "艺术特色", "表现手法", "主题", "主旨", "内容介绍"
-        }
-
-        sentence_end_re = re.compile(r"[。！？!?；;：:]$")
-        separator_re = re.compile(r"^[-=_*]{3,}$")
-
-        def looks_like_heading_strict(line: str) -> bool:
-            if not line:
-                return False
-            if separator_re.match(line):
-                return True
-            if len(line) <= 24 and any(k in line for k in heading_keywords):
-                return True
-            if re.match(r"^(第[一二三四五六七八九十0-9]+[章节篇部分])\s*\S+", line):
-                return True
-            if re.match(r"^\d+(?:\.\d+){0,4}[\.、．)）]?\s*\S+", line):
-                return True
-            if re.match(r"^[一二三四五六七八九十]+[、.．)）]\s*\S+", line):
-                return True
-            return False
-
-        def is_heading(line: str) -> bool:
-            if not line:
-                return False
-            if looks_like_heading_strict(line):
-                return True
-            # 通用短行标题启发式：短、无句末标点、相对“像标题”
-            if len(line) <= 20 and not sentence_end_re.search(line):
-                # 太像正文的短句（包含逗号太多）不当作标题
-                if line.count("，") + line.count(",") >= 2:
-                    return False
-                # 有明显结构符号则更像标题
-                if any(sym in line for sym in [":", "：", "-", "—"]):
-                    return True
-                # 纯短语也可视作标题
-                return True
-            return False
-
-        # Step 1: 预处理：合并 PDF/拷贝文本常见的“硬换行断句”
-        merged_lines: List[str] = []
-        for line in lines:
-            if not merged_lines:
-                merged_lines.append(line)
-                continue
-
-            prev = merged_lines[-1]
-            if (
-                not looks_like_heading_strict(line)
-                and not looks_like_heading_strict(prev)
-                and not sentence_end_re.search(prev)
-                and len(prev) < 80
-                and len(line) < 80
-            ):
-                merged_lines[-1] = f"{prev} {line}".strip()
-            else:
-                merged_lines.append(line)
-
-        lines = merged_lines
-
-        # Step 2: 章节分组（section）：遇到标题行则开启新 section
-        section_items: List[Tuple[str, List[str]]] = []
-        current_title = ""
-        buf: List[str] = []
-
-        def flush_section():
-            nonlocal buf, current_title
-            if not buf:
-                return
-            # 默认标题：使用第一行的前 20 字作为兜底（便于后续聚合）
-            title = current_title.strip() or (buf[0][:20] if buf[0] else "")
-            section_items.append((title, buf))
-            buf = []
-
-        for line in lines:
-            if is_heading(line):
-                # 遇到新的标题前，先把上一 section 刷出
-                if buf:
-                    flush_section()
-                current_title = line
-                # 标题只作为 section 元数据，不进入正文内容，避免产生仅标题的 chunk
-                buf = []
-                continue
-
-            buf.append(line)
-
-        flush_section()
-
-        # Step 3: 输出 section 文本：标题 + 内容合并为一个 text 块
-        return [(title, "\n".join(sec_lines).strip()) for title, sec_lines in section_items]
+        return text_splitter.split_sections_with_titles(content)
 
     def _split_cn_sentences(self, text: str) -> List[str]:
-        text = re.sub(r"\s+", " ", text).strip()
-        if not text:
-            return []
-
-        # 以中文/英文句末标点切分，并保留标点
-        parts = re.split(r"([。！？!?；;])", text)
-        sentences: List[str] = []
-        for i in range(0, len(parts), 2):
-            seg = parts[i].strip() if i < len(parts) else ""
-            punct = parts[i + 1] if i + 1 < len(parts) else ""
-            s = f"{seg}{punct}".strip()
-            if s:
-                sentences.append(s)
-        return sentences
-    
-    def _split_long_paragraph(self, text: str, max_length: int) -> List[str]:
-        """
-        将长段落按句子切分
-        """
-        import re
-        # 按句子边界切分
-        sentences = re.split(r'([。！？!?]+)', text)
-        # 将标点符号和句子内容配对
-        sentence_list = []
-        for i in range(0, len(sentences)-1, 2):
-            if i+1 < len(sentences):
-                sentence_list.append(sentences[i] + sentences[i+1])
-            else:
-                sentence_list.append(sentences[i])
-        
-        # 合并较短的句子以达到合适的长度
-        merged_sentences = []
-        current_sentence = ""
-        
-        for sentence in sentence_list:
-            if len(current_sentence + sentence) < max_length:
-                current_sentence += sentence
-            else:
-                if current_sentence.strip():
-                    merged_sentences.append(current_sentence.strip())
-                current_sentence = sentence
-        
-        if current_sentence.strip():
-            merged_sentences.append(current_sentence.strip())
-        
-        return merged_sentences
-    
-    def _get_overlap_text(self, chunk: str, overlap_size: int) -> str:
-        """
-        获取块的末尾部分作为重叠文本
-        """
-        words = chunk.split()
-        if len(words) <= overlap_size:
-            return chunk + " "
-        
-        overlap_words = words[-overlap_size:]
-        return " ".join(overlap_words) + " "
+        return text_splitter.split_cn_sentences(text)
 
 
 class DocumentEmbeddingService:
@@ -366,25 +283,123 @@ class DocumentEmbeddingService:
     文档向量服务类
     """
     
-    def __init__(self, db_session: Session, embedding_model: TextEmbeddingModel):
+    def __init__(self, db_session: Session, embedding_model: TextEmbeddingModel, search_mode: Optional[str] = None,
+                 usage: Optional[EmbeddingUsage] = None):
         # 修复：确保正确使用数据库会话
         self.db = db_session
         self.document_processor = DocumentProcessor(embedding_model)
         self.embedding_model = embedding_model
+        # 当前请求的嵌入用量累加器（由接口层传入，可为空）
+        self.usage = usage
+        # 检索模式：ivf（近似最近邻索引）/ flat（矩阵精确检索）/ int8（量化索引 + 精确重排）/ mmap（磁盘分片）/ loop（逐行计算余弦相似度）
+        self.search_mode = (search_mode or VECTOR_SEARCH_CONFIG.get("mode", "ivf")).lower()
+        if self.search_mode not in _ORG_VECTOR_INDEXES and self.search_mode not in ("mmap", "loop"):
+            raise ValueError(f"不支持的检索模式: {self.search_mode}")
+        # 新写入向量的存储格式：json（embedding 列）/ f32 / i8（embedding_bin 列）
+        self.storage_codec = str(VECTOR_SEARCH_CONFIG.get("storage", CODEC_JSON)).lower()
+        if self.storage_codec not in SUPPORTED_CODECS:
+            raise ValueError(f"不支持的向量存储格式: {self.storage_codec}")
+        # 入库写法：bulk（Core 批量 INSERT）/ 关闭时走 ORM add_all + flush；每条 INSERT 语句的最大行数
+        self.bulk_insert = bool(INGEST_CONFIG.get("bulk_insert", True))
+        self.insert_batch_size = max(int(INGEST_CONFIG.get("insert_batch_size", 1000) or 1000), 1)
 
     def _coerce_embedding_vector(self, embedding_value) -> Optional[List[float]]:
         """兼容数据库中 embedding 可能为 JSON 数组或 JSON 字符串两种格式"""
-        if embedding_value is None:
-            return None
-        if isinstance(embedding_value, list):
-            return embedding_value
-        if isinstance(embedding_value, str):
+        return decode_json_vector(embedding_value)
+
+    def _row_vector(self, embedding_value, embedding_bin: Optional[bytes] = None, embedding_codec: Optional[str] = None):
+        """读取一行的向量：优先解码 embedding_bin（np.frombuffer，无 JSON 解析），否则回退 JSON 列"""
+        if embedding_bin:
             try:
-                parsed = json.loads(embedding_value)
-                return parsed if isinstance(parsed, list) else None
-            except Exception:
-                return None
-        return None
+                return decode_vector(embedding_bin, embedding_codec)
+            except Exception as e:
+                logger.error(f"解码二进制向量失败: {e}")
+        return self._coerce_embedding_vector(embedding_value)
+
+    def _storage_values(self, vector: List[float]) -> Dict[str, object]:
+        """按配置的存储格式返回向量列的值（同一服务写入的行列集合一致，便于 executemany）"""
+        if self.storage_codec == CODEC_JSON:
+            return {"embedding": vector}
+        return {"embedding_bin": encode_vector(vector, self.storage_codec), "embedding_codec": self.storage_codec}
+
+    def _apply_storage(self, obj: DocumentEmbedding, vector: List[float]) -> DocumentEmbedding:
+        """按配置的存储格式写入向量列"""
+        for key, value in self._storage_values(vector).items():
+            setattr(obj, key, value)
+        return obj
+
+    def _insert_rows(self, rows: List[Dict[str, object]]) -> List[int]:
+        """
+        批量写入 document_embedding（不提交），按 rows 顺序返回自增 ID，不逐行 refresh
+
+        - 支持 INSERT ... RETURNING 的数据库（SQLite 3.35+、MariaDB、PostgreSQL）：executemany + RETURNING
+        - MySQL：每 insert_batch_size 行一条多值 INSERT，ID 由 LAST_INSERT_ID() 起按 auto_increment_increment 推算
+          （InnoDB 对行数已知的多值 INSERT 一次分配连续的自增值，各 autoinc_lock_mode 下均成立）
+        - 其他数据库或关闭 bulk_insert 时回退 ORM add_all + flush
+        """
+        if not rows:
+            return []
+        dialect = self.db.get_bind().dialect
+        table = DocumentEmbedding.__table__
+        ids: List[int] = []
+        if self.bulk_insert and getattr(dialect, "insert_executemany_returning_sort_by_parameter_order", False):
+            stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+            for i in range(0, len(rows), self.insert_batch_size):
+                ids.extend(row_id for (row_id,) in self.db.execute(stmt, rows[i:i + self.insert_batch_size]))
+            return ids
+
+        if self.bulk_insert and dialect.name == "mysql":
+            step = int(self.db.execute(text("SELECT @@auto_increment_increment")).scalar() or 1)
+            for i in range(0, len(rows), self.insert_batch_size):
+                part = rows[i:i + self.insert_batch_size]
+                first_id = self.db.execute(insert(table).values(part)).lastrowid
+                ids.extend(range(first_id, first_id + step * len(part), step))
+            return ids
+
+        objs = [DocumentEmbedding(**row) for row in rows]
+        self.db.add_all(objs)
+        self.db.flush()
+        return [obj.id for obj in objs]
+
+    def migrate_embeddings_to_binary(self, codec: str = "f32", batch_size: int = 1000, clear_json: bool = False) -> int:
+        """
+        存量数据迁移：把只有 JSON 向量的行转换为 embedding_bin（按 id 分批，每批提交一次，可中断后重跑）
+
+        前置步骤：二进制列已由 repository.document_embedding_crud.ensure_embedding_binary_columns() 在启动时补齐
+        """
+        if codec == CODEC_JSON or codec not in SUPPORTED_CODECS:
+            raise ValueError(f"不支持的二进制向量格式: {codec}")
+
+        migrated = 0
+        last_id = 0
+        while True:
+            rows = self.db.query(DocumentEmbedding).filter(
+                DocumentEmbedding.id > last_id,
+                DocumentEmbedding.embedding_bin.is_(None),
+                DocumentEmbedding.embedding.isnot(None)
+            ).order_by(DocumentEmbedding.id).limit(batch_size).all()
+            if not rows:
+                break
+            try:
+                for row in rows:
+                    vector = self._coerce_embedding_vector(row.embedding)
+                    if not vector:
+                        logger.error(f"解析数据库向量失败, 文档ID: {row.id}")
+                        continue
+                    row.embedding_bin = encode_vector(vector, codec)
+                    row.embedding_codec = codec
+                    if clear_json:
+                        # 使用 SQL NULL，避免 JSON 列写入 'null' 字面量
+                        row.embedding = null()
+                    migrated += 1
+                self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"向量存储迁移失败, 批次起始ID: {last_id}: {e}")
+                raise
+            last_id = rows[-1].id
+            logger.info(f"向量存储迁移进度: 已迁移 {migrated} 行, 当前ID: {last_id}")
+        return migrated
     
     def process_and_save_document(
         self, 
@@ -393,109 +408,961 @@ class DocumentEmbeddingService:
         doc_subject: str, 
         org_code: str,
         chunk_size: int = 512,
-        overlap: int = 50
-    ) -> List[DocumentEmbedding]:
+        overlap: int = 50,
+        flush_chunks: Optional[int] = None,
+        source_name: Optional[str] = None,
+        skip_chunks: int = 0,
+        resume_counts: Optional[Dict[str, int]] = None,
+        progress_callback: Optional[Callable[[Dict[str, int]], None]] = None,
+        incremental: bool = False
+    ) -> int:
         """
-        处理文档并保存向量到数据库
+        处理文档并保存向量到数据库（流式：逐页读取 -> 增量切分 -> 小批量向量化 -> 每 flush_chunks 个 chunk 入库一次）
+
+        内存只保留一个批次的 chunk；每批单独提交，中途失败时已提交的批次会保留。
+
+        Args:
+            source_name: 来源文件名，默认取 file_path 的文件名
+            skip_chunks: 跳过前 N 个（去重后的）chunk，用于中断任务续跑时不重复入库
+            resume_counts: 续跑时已完成的 embedded/stored 计数，进度在此基础上累加
+            progress_callback: 每批提交后回调 {"parsed", "embedded", "stored", "processed"}，抛出异常可中断处理
+            incremental: 增量更新同一 source_name + org_code 下已入库的文档，只向量化新增的 chunk，
+                删除已不存在的 chunk，详见 _reingest_chunks（此模式下忽略 skip_chunks）
+
+        Returns:
+            int: 本次保存的向量条数
         """
-        # Step 1: 读取文档内容（txt/pdf/docx）
-        content = self.document_processor.read_document(file_path)
+        flush_chunks = max(int(flush_chunks or INGEST_CONFIG.get("flush_chunks", 200)), 1)
+        source_name = source_name or Path(file_path).name
+        progress = {"parsed": 0, "embedded": 0, "stored": 0, "processed": 0}
+        progress.update(resume_counts or {})
 
-        # Step 2: 分组切分（section/chunk_index），生成稳定的 chunk 单元
-        grouped_chunks = self.document_processor.split_document_grouped(content, chunk_size, overlap)
+        # Step 1 + 2: 逐页读取文档（txt/pdf/docx），增量分组切分（section/chunk_index）
+        pages = self.document_processor.iter_document_pages(file_path)
+        grouped_chunks = self.document_processor.iter_split_document_grouped(pages, chunk_size, overlap)
 
-        # Step 3: 去重准备：基于归一化文本计算 SHA256（工业常规做法）
-        def normalize_for_hash(text: str) -> str:
-            text = re.sub(r"\s+", " ", text or "").strip()
-            return text
+        if incremental:
+            return self._reingest_chunks(
+                iter_unique_grouped_chunks(grouped_chunks), doc_type, doc_subject, source_name, org_code,
+                flush_chunks, progress, progress_callback
+            )
 
-        source_name = Path(file_path).name
-        seen_hashes: set[str] = set()
-        to_insert: List[DocumentEmbedding] = []
+        def flush(batch: List[Tuple[Dict[str, object], str, str]]) -> int:
+            count = self._save_chunk_batch(batch, doc_type, doc_subject, source_name, org_code)
+            progress["embedded"] += count
+            progress["stored"] += count
+            progress["processed"] += len(batch)
+            if progress_callback is not None:
+                progress_callback(dict(progress))
+            return count
 
-        # Step 4: 对每个 chunk 生成向量并构建入库对象（先构建列表，最后批量写库）
-        for item in grouped_chunks:
-            chunk = str(item.get("content", "") or "").strip()
-            if not chunk:
+        # Step 3: 去重：基于归一化文本计算 SHA256（工业常规做法），整篇文档范围内只保留哈希
+        batch: List[Tuple[Dict[str, object], str, str]] = []
+        saved = 0
+        for unique_chunk in iter_unique_grouped_chunks(grouped_chunks):
+            progress["parsed"] += 1
+            if progress["parsed"] <= skip_chunks:
+                progress["processed"] = progress["parsed"]
                 continue
+            batch.append(unique_chunk)
+            if len(batch) >= flush_chunks:
+                saved += flush(batch)
+                batch = []
+        if batch:
+            saved += flush(batch)
 
-            normalized = normalize_for_hash(chunk)
-            content_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
-            if content_hash in seen_hashes:
-                continue
-            seen_hashes.add(content_hash)
+        logger.info(f"文档入库完成: {source_name}, 共 {progress['parsed']} 个 chunk, 保存 {saved} 条向量")
+        return saved
+
+    def _reingest_chunks(
+        self,
+        unique_chunks: Iterable[Tuple[Dict[str, object], str, str]],
+        doc_type: str,
+        doc_subject: str,
+        source_name: str,
+        org_code: str,
+        flush_chunks: int,
+        progress: Dict[str, int],
+        progress_callback: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> int:
+        """
+        增量更新文档：按 content_hash 与库中同一 source_name + org_code 的已有 chunk 对比
 
-            # Step 4.1: 生成 embedding（此处使用 embedding 模型，不需要对话大模型）
-            result = self.embedding_model.get_embedding_vector(chunk)
+        - 未变化的 chunk 不重新向量化，chunk_index 变化时原地更新
+        - section/doc_type/doc_subject 变化时复制原向量写入新行、删除旧行（检索索引中的属性键随之更新）
+        - 新增的 chunk 每 flush_chunks 个向量化一次并 flush 拿到 ID（不提交）
+        - 新文档中已不存在的 chunk（以及同一内容的重复行）删除
+
+        全部变更在同一个事务中提交；中途失败或被取消时整体回滚，库中仍是旧版本文档。
+        """
+        existing, deleted_ids = self._load_source_chunks(org_code, source_name)
+        updates: List[Dict[str, object]] = []
+        new_ids: List[int] = []
+        new_vectors: List[np.ndarray] = []
+        new_attrs: List[Tuple[int, ...]] = []
+        new_contents: List[str] = []
+        moved: List[Tuple[int, Dict[str, object], str, str]] = []
+        moved_count = 0
+        unchanged = 0
+
+        def report():
+            if progress_callback is not None:
+                progress_callback(dict(progress))
+
+        def flush(batch: List[Tuple[Dict[str, object], str, str]]):
+            to_insert, vectors = self._build_chunk_rows(batch, doc_type, doc_subject, source_name, org_code)
+            if to_insert:
+                new_ids.extend(self._insert_rows(to_insert))
+                new_vectors.append(np.asarray(vectors, dtype=np.float32))
+                new_attrs.extend(self._row_attributes(row) for row in to_insert)
+                new_contents.extend(row["content"] for row in to_insert)
+            progress["embedded"] += len(to_insert)
+            progress["stored"] += len(to_insert)
+            progress["processed"] += len(batch)
+            report()
+
+        def move(items: List[Tuple[int, Dict[str, object], str, str]]):
+            # 按旧行 ID 读出已存储的向量，带新元数据写入新行；读不出向量的按新增 chunk 重新向量化
+            nonlocal moved_count
+            stored = {
+                row_id: self._row_vector(embedding_value, embedding_bin, embedding_codec)
+                for row_id, embedding_value, embedding_bin, embedding_codec in self.db.query(
+                    DocumentEmbedding.id,
+                    DocumentEmbedding.embedding,
+                    DocumentEmbedding.embedding_bin,
+                    DocumentEmbedding.embedding_codec
+                ).filter(DocumentEmbedding.id.in_([old_id for old_id, _, _, _ in items])).all()
+            }
+            to_insert, vectors, missing = [], [], []
+            for old_id, item, chunk, content_hash in items:
+                vector = stored.get(old_id)
+                if vector is None or len(vector) == 0:
+                    missing.append((item, chunk, content_hash))
+                    continue
+                to_insert.append(self._chunk_row(item, chunk, content_hash, doc_type, doc_subject, source_name, org_code, vector))
+                vectors.append(vector)
+            if to_insert:
+                new_ids.extend(self._insert_rows(to_insert))
+                new_vectors.append(np.asarray(vectors, dtype=np.float32))
+                new_attrs.extend(self._row_attributes(row) for row in to_insert)
+                new_contents.extend(row["content"] for row in to_insert)
+            moved_count += len(items)
+            deleted_ids.extend(old_id for old_id, _, _, _ in items)
+            if missing:
+                progress["processed"] -= len(missing)
+                flush(missing)
+
+        batch: List[Tuple[Dict[str, object], str, str]] = []
+        try:
+            for item, chunk, content_hash in unique_chunks:
+                progress["parsed"] += 1
+                old = existing.pop(content_hash, None)
+                if old is None:
+                    batch.append((item, chunk, content_hash))
+                    if len(batch) >= flush_chunks:
+                        flush(batch)
+                        batch = []
+                    continue
+
+                progress["processed"] += 1
+                section = str(item.get("section", "") or "")
+                if (old[1], old[3], old[4]) != (section, doc_type, doc_subject):
+                    # 检索索引按 id 保存属性键：属性变化时换成新行，索引与分片只需追加新行、删除旧行
+                    moved.append((old[0], item, chunk, content_hash))
+                    if len(moved) >= self.insert_batch_size:
+                        move(moved)
+                        moved = []
+                else:
+                    unchanged += 1
+                    chunk_index = int(item.get("chunk_index", 0) or 0)
+                    if old[2] != chunk_index:
+                        updates.append({"id": old[0], "chunk_index": chunk_index})
+                if progress["processed"] % flush_chunks == 0:
+                    report()
+            if batch:
+                flush(batch)
+            if moved:
+                move(moved)
+
+            deleted_ids.extend(old[0] for old in existing.values())
+            if updates:
+                self.db.bulk_update_mappings(DocumentEmbedding, updates)
+            for i in range(0, len(deleted_ids), 1000):
+                self.db.query(DocumentEmbedding).filter(
+                    DocumentEmbedding.id.in_(deleted_ids[i:i + 1000])
+                ).delete(synchronize_session=False)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"增量更新文档失败，已回滚: {source_name}: {e}")
+            raise
+        self._invalidate_results(org_code)
+
+        # 提交后同步进程内向量索引与磁盘分片：先追加新增行，再移除删除的行
+        if new_vectors:
+            rows = list(zip(new_ids, np.concatenate(new_vectors), new_attrs))
+            self._add_to_org_index(org_code, rows)
+            self._append_to_shard(org_code, rows)
+            self._add_to_keyword_index(org_code, list(zip(new_ids, new_contents, new_attrs)))
+        self._remove_from_org_index(org_code, deleted_ids)
+        self._delete_from_shard(org_code, deleted_ids)
+
+        logger.info(
+            f"文档增量更新完成: {source_name}, 共 {progress['parsed']} 个 chunk, 未变化 {unchanged}, "
+            f"新增 {len(new_ids) - moved_count}, 元数据变化 {moved_count}, 删除 {len(deleted_ids) - moved_count}, "
+            f"更新序号 {len(updates)}"
+        )
+        return len(new_ids) - moved_count
+
+    def _load_source_chunks(self, org_code: str, source_name: str) -> Tuple[Dict[str, Tuple], List[int]]:
+        """
+        读取同一来源已入库 chunk 的 {content_hash: (id, section, chunk_index, doc_type, doc_subject)}（不加载向量列）
+
+        同一哈希有多行时保留 ID 最小的一行，其余 ID 作为待删除的重复行一并返回；
+        旧数据没有 content_hash 时按正文现算。
+        """
+        existing: Dict[str, Tuple] = {}
+        duplicate_ids: List[int] = []
+        legacy_ids: List[int] = []
+        source_filter = (DocumentEmbedding.org_code == org_code, DocumentEmbedding.source_name == source_name)
+
+        def keep(content_hash: str, row: Tuple):
+            if content_hash in existing:
+                duplicate_ids.append(int(row[0]))
+            else:
+                existing[content_hash] = (int(row[0]), row[1] or "", int(row[2] or 0), row[3], row[4])
+
+        rows = self.db.query(
+            DocumentEmbedding.id,
+            DocumentEmbedding.section,
+            DocumentEmbedding.chunk_index,
+            DocumentEmbedding.doc_type,
+            DocumentEmbedding.doc_subject,
+            DocumentEmbedding.content_hash
+        ).filter(*source_filter).order_by(DocumentEmbedding.id).yield_per(5000)
+        for row in rows:
+            if row[5]:
+                keep(row[5], tuple(row[:5]))
+            else:
+                legacy_ids.append(int(row[0]))
+
+        for i in range(0, len(legacy_ids), 1000):
+            legacy_rows = self.db.query(
+                DocumentEmbedding.id,
+                DocumentEmbedding.section,
+                DocumentEmbedding.chunk_index,
+                DocumentEmbedding.doc_type,
+                DocumentEmbedding.doc_subject,
+                DocumentEmbedding.content
+            ).filter(DocumentEmbedding.id.in_(legacy_ids[i:i + 1000])).order_by(DocumentEmbedding.id).all()
+            for row in legacy_rows:
+                keep(compute_content_hash(str(row[5] or "").strip()), tuple(row[:5]))
+        return existing, duplicate_ids
+
+    def _build_chunk_rows(
+        self,
+        batch: List[Tuple[Dict[str, object], str, str]],
+        doc_type: str,
+        doc_subject: str,
+        source_name: str,
+        org_code: str
+    ) -> Tuple[List[Dict[str, object]], List[List[float]]]:
+        """批量向量化一批 chunk 并构建待入库的行（列名 -> 值），向量化失败的 chunk 跳过"""
+        # Step 4: 批量生成 embedding（按服务端单次请求上限打包，而不是每个 chunk 一次请求）
+        embed_result = self.embedding_model.embed_many([chunk for _, chunk, _ in batch], usage=self.usage)
+
+        # Step 4.1: 构建行数据，写入 section/chunk_index/source_name/content_hash
+        to_insert: List[Dict[str, object]] = []
+        vectors: List[List[float]] = []
+        for (item, chunk, content_hash), result in zip(batch, embed_result["embeddings"]):
             if not result:
                 logger.error(f"生成向量失败，内容: {chunk[:100]}...")
                 continue
 
-            # Step 4.2: 构建 ORM 对象，写入 section/chunk_index/source_name/content_hash
-            to_insert.append(
-                DocumentEmbedding(
-                    doc_type=doc_type,
-                    doc_subject=doc_subject,
-                    source_name=source_name,
-                    org_code=org_code,
-                    section=str(item.get("section", "") or ""),
-                    chunk_index=int(item.get("chunk_index", 0) or 0),
-                    embedding=result,
-                    content=chunk,
-                    content_hash=content_hash
-                )
-            )
+            to_insert.append(self._chunk_row(item, chunk, content_hash, doc_type, doc_subject, source_name, org_code, result))
+            vectors.append(result)
+        return to_insert, vectors
 
-        # Step 5: 批量入库（比逐条 commit 快很多，生产常规）
+    def _chunk_row(
+        self,
+        item: Dict[str, object],
+        chunk: str,
+        content_hash: str,
+        doc_type: str,
+        doc_subject: str,
+        source_name: str,
+        org_code: str,
+        vector: List[float]
+    ) -> Dict[str, object]:
+        return {
+            "doc_type": doc_type,
+            "doc_subject": doc_subject,
+            "source_name": source_name,
+            "org_code": org_code,
+            "section": str(item.get("section", "") or ""),
+            "chunk_index": int(item.get("chunk_index", 0) or 0),
+            "content": chunk,
+            "content_hash": content_hash,
+            **self._storage_values(vector)
+        }
+
+    @staticmethod
+    def _row_attributes(row: Dict[str, object]) -> Tuple[int, ...]:
+        """行数据 -> 检索索引中的属性键（章节、doc_type、doc_subject、source_name）"""
+        return row_attributes(*(row.get(field) for field in ATTRIBUTE_FIELDS))
+
+    def _save_chunk_batch(
+        self,
+        batch: List[Tuple[Dict[str, object], str, str]],
+        doc_type: str,
+        doc_subject: str,
+        source_name: str,
+        org_code: str
+    ) -> int:
+        """向量化并提交一批 chunk，同步索引与分片，返回保存条数"""
+        to_insert, vectors = self._build_chunk_rows(batch, doc_type, doc_subject, source_name, org_code)
+        if not to_insert:
+            return 0
+
+        # Step 5: 批量入库：批量 INSERT 直接拿到自增 ID 后提交，不再逐行 refresh
         try:
-            if to_insert:
-                self.db.add_all(to_insert)
-                self.db.commit()
-                for obj in to_insert:
-                    try:
-                        self.db.refresh(obj)
-                    except Exception:
-                        pass
-            return to_insert
+            ids = self._insert_rows(to_insert)
+            self.db.commit()
         except Exception as e:
             self.db.rollback()
             logger.error(f"保存文档向量到数据库失败: {e}")
             raise
+        self._invalidate_results(org_code)
+
+        # Step 6: 同步进程内向量索引、关键词索引与磁盘分片（未加载/未导出时跳过，首次搜索会全量构建）
+        rows, keyword_rows = [], []
+        for row_id, vector, row in zip(ids, vectors, to_insert):
+            if row_id is None:
+                continue
+            row_attrs = self._row_attributes(row)
+            rows.append((row_id, vector, row_attrs))
+            keyword_rows.append((row_id, row["content"], row_attrs))
+        self._add_to_org_index(org_code, rows)
+        self._append_to_shard(org_code, rows)
+        self._add_to_keyword_index(org_code, keyword_rows)
+        return len(to_insert)
+
+    def _new_org_index(self) -> FlatVectorIndex:
+        if self.search_mode == "flat":
+            return FlatVectorIndex()
+        if self.search_mode == "int8":
+            int8_config = VECTOR_SEARCH_CONFIG.get("int8", {}) or {}
+            return QuantizedVectorIndex(
+                scan_dim=int8_config.get("scan_dim"),
+                rerank_factor=int8_config.get("rerank_factor", 4)
+            )
+        ivf_config = VECTOR_SEARCH_CONFIG.get("ivf", {}) or {}
+        return IVFVectorIndex(
+            nprobe=ivf_config.get("nprobe", 16),
+            nlist=ivf_config.get("nlist"),
+            min_train_size=ivf_config.get("min_train_size", 4096)
+        )
+
+    def _org_snapshot(self, org_code: str) -> Tuple[int, int]:
+        """返回数据库中该组织的 (行数, 最大ID)，用于判断索引是否过期"""
+        count, max_id = self.db.query(
+            func.count(DocumentEmbedding.id), func.max(DocumentEmbedding.id)
+        ).filter(DocumentEmbedding.org_code == org_code).one()
+        return int(count or 0), int(max_id or 0)
+
+    def _load_org_vectors(self, org_code: str, min_id: int = 0,
+                          batch_size: int = 5000) -> Tuple[List[int], List[object], List[Tuple[int, ...]]]:
+        """只查询 id + 属性列 + 向量列，分批读取组织下 id > min_id 的向量，返回 (ids, 向量, 属性键)"""
+        ids: List[int] = []
+        vectors: List[object] = []
+        attrs: List[Tuple[int, ...]] = []
+        for batch_ids, batch_vectors, batch_attrs in self._iter_org_vectors(org_code, min_id, batch_size):
+            ids.extend(batch_ids)
+            vectors.extend(batch_vectors)
+            attrs.extend(batch_attrs)
+        return ids, vectors, attrs
+
+    def _iter_org_vectors(self, org_code: str, min_id: int = 0,
+                          batch_size: int = 5000) -> Iterator[Tuple[List[int], List[object], List[Tuple[int, ...]]]]:
+        """按 id 顺序每 batch_size 行产出一批 (ids, 向量, 属性键)"""
+        ids: List[int] = []
+        vectors: List[object] = []
+        attrs: List[Tuple[int, ...]] = []
+        rows = self.db.query(
+            DocumentEmbedding.id,
+            DocumentEmbedding.section,
+            DocumentEmbedding.doc_type,
+            DocumentEmbedding.doc_subject,
+            DocumentEmbedding.source_name,
+            DocumentEmbedding.embedding,
+            DocumentEmbedding.embedding_bin,
+            DocumentEmbedding.embedding_codec
+        ).filter(
+            DocumentEmbedding.org_code == org_code,
+            DocumentEmbedding.id > min_id
+        ).order_by(DocumentEmbedding.id).yield_per(batch_size)
+        dim = None
+        for row_id, section, doc_type, doc_subject, source_name, embedding_value, embedding_bin, embedding_codec in rows:
+            vector = self._row_vector(embedding_value, embedding_bin, embedding_codec)
+            if vector is None or len(vector) == 0:
+                logger.error(f"解析数据库向量失败, 文档ID: {row_id}")
+                continue
+            if dim is None:
+                dim = len(vector)
+            elif len(vector) != dim:
+                logger.error(f"向量维度不一致, 文档ID: {row_id}, 维度: {len(vector)}")
+                continue
+            ids.append(int(row_id))
+            vectors.append(vector)
+            attrs.append(row_attributes(section, doc_type, doc_subject, source_name))
+            if len(ids) >= batch_size:
+                yield ids, vectors, attrs
+                ids, vectors, attrs = [], [], []
+        if ids:
+            yield ids, vectors, attrs
+
+    def _load_vectors_by_id(self, ids: List[int]) -> Dict[int, object]:
+        """按 id 读取原始向量（int8 索引精确重排用），返回 {id: 向量}"""
+        if not ids:
+            return {}
+        rows = self.db.query(
+            DocumentEmbedding.id,
+            DocumentEmbedding.embedding,
+            DocumentEmbedding.embedding_bin,
+            DocumentEmbedding.embedding_codec
+        ).filter(DocumentEmbedding.id.in_(ids)).all()
+        vectors = {}
+        for row_id, embedding_value, embedding_bin, embedding_codec in rows:
+            vector = self._row_vector(embedding_value, embedding_bin, embedding_codec)
+            if vector is not None and len(vector):
+                vectors[int(row_id)] = vector
+        return vectors
+
+    def _get_org_index(self, org_code: str) -> FlatVectorIndex:
+        """获取组织的向量索引：首次全量构建；数据库有新增时增量追加；有删除时重建"""
+        registry = _ORG_VECTOR_INDEXES[self.search_mode]
+        with registry.lock(org_code):
+            index, state = registry.get(org_code)
+            snapshot = self._org_snapshot(org_code)
+            if index is not None and state == snapshot:
+                return index
+
+            if index is not None and state is not None and snapshot[1] > state[1]:
+                ids, vectors, attrs = self._load_org_vectors(org_code, min_id=state[1])
+                if state[0] + len(ids) == snapshot[0]:
+                    index.add(ids, vectors, attrs)
+                    registry.put(org_code, index, snapshot)
+                    logger.info(f"向量索引增量同步完成: org_code={org_code}, 新增 {len(ids)} 条")
+                    return index
+
+            index = self._new_org_index()
+            if isinstance(index, IVFVectorIndex):
+                ids, vectors, attrs = self._load_org_vectors(org_code)
+                index.add(ids, vectors, attrs)
+            else:
+                # 精确 / 量化索引逐批追加，构建时只多占用一批原始向量的内存
+                for ids, vectors, attrs in self._iter_org_vectors(org_code):
+                    index.add(ids, vectors, attrs)
+            registry.put(org_code, index, snapshot)
+            logger.info(f"向量索引构建完成: org_code={org_code}, 共 {len(index)} 条")
+            return index
+
+    def _add_to_org_index(self, org_code: str, rows: List[Tuple[int, List[float], Tuple[int, ...]]]):
+        """rows 为 [(id, 向量, 属性键), ...]"""
+        if not rows:
+            return
+        ids = [row_id for row_id, _, _ in rows]
+        vectors = [vector for _, vector, _ in rows]
+        attrs = [row_attrs for _, _, row_attrs in rows]
+        for registry in _ORG_VECTOR_INDEXES.values():
+            with registry.lock(org_code):
+                index, state = registry.get(org_code)
+                if index is None or state is None:
+                    continue
+                try:
+                    index.add(ids, vectors, attrs)
+                    registry.put(org_code, index, (state[0] + len(ids), max(state[1], max(ids))))
+                except Exception as e:
+                    # 索引同步失败不影响入库，丢弃索引等待下次搜索重建
+                    logger.error(f"同步向量索引失败，将在下次搜索时重建: {e}")
+                    registry.drop(org_code)
+
+    def _remove_from_org_index(self, org_code: str, ids: List[int]):
+        """从进程内向量索引和关键词索引中删除"""
+        if not ids:
+            return
+        for registry in (*_ORG_VECTOR_INDEXES.values(), _KEYWORD_INDEXES):
+            with registry.lock(org_code):
+                index, state = registry.get(org_code)
+                if index is None or state is None:
+                    continue
+                try:
+                    removed = index.remove(ids)
+                    registry.put(org_code, index, (state[0] - removed, state[1]))
+                except Exception as e:
+                    logger.error(f"从向量索引删除失败，将在下次搜索时重建: {e}")
+                    registry.drop(org_code)
+
+    def _load_org_texts(self, org_code: str, min_id: int = 0,
+                        batch_size: int = 5000) -> Tuple[List[int], List[str], List[Tuple[int, ...]]]:
+        """只查询 id + 属性列 + 正文，分批读取组织下 id > min_id 的 chunk，返回 (ids, 正文, 属性键)"""
+        ids: List[int] = []
+        contents: List[str] = []
+        attrs: List[Tuple[int, ...]] = []
+        rows = self.db.query(
+            DocumentEmbedding.id,
+            DocumentEmbedding.section,
+            DocumentEmbedding.doc_type,
+            DocumentEmbedding.doc_subject,
+            DocumentEmbedding.source_name,
+            DocumentEmbedding.content
+        ).filter(
+            DocumentEmbedding.org_code == org_code,
+            DocumentEmbedding.id > min_id
+        ).order_by(DocumentEmbedding.id).yield_per(batch_size)
+        for row_id, section, doc_type, doc_subject, source_name, content in rows:
+            ids.append(int(row_id))
+            contents.append(content or "")
+            attrs.append(row_attributes(section, doc_type, doc_subject, source_name))
+        return ids, contents, attrs
+
+    def _get_keyword_index(self, org_code: str) -> BM25Index:
+        """获取组织的 BM25 关键词索引：首次全量构建；数据库有新增时增量追加；有删除时重建"""
+        with _KEYWORD_INDEXES.lock(org_code):
+            index, state = _KEYWORD_INDEXES.get(org_code)
+            snapshot = self._org_snapshot(org_code)
+            if index is not None and state == snapshot:
+                return index
+
+            if index is not None and state is not None and snapshot[1] > state[1]:
+                ids, contents, attrs = self._load_org_texts(org_code, min_id=state[1])
+                if state[0] + len(ids) == snapshot[0]:
+                    index.add(ids, contents, attrs)
+                    _KEYWORD_INDEXES.put(org_code, index, snapshot)
+                    logger.info(f"关键词索引增量同步完成: org_code={org_code}, 新增 {len(ids)} 条")
+                    return index
+
+            index = BM25Index(k1=KEYWORD_CONFIG.get("k1", 1.2), b=KEYWORD_CONFIG.get("b", 0.75))
+            ids, contents, attrs = self._load_org_texts(org_code)
+            index.add(ids, contents, attrs)
+            _KEYWORD_INDEXES.put(org_code, index, snapshot)
+            logger.info(f"关键词索引构建完成: org_code={org_code}, 共 {len(index)} 条")
+            return index
+
+    def _add_to_keyword_index(self, org_code: str, rows: List[Tuple[int, str, Tuple[int, ...]]]):
+        """rows 为 [(id, 正文, 属性键), ...]；索引尚未构建时跳过"""
+        if not rows:
+            return
+        ids = [row_id for row_id, _, _ in rows]
+        with _KEYWORD_INDEXES.lock(org_code):
+            index, state = _KEYWORD_INDEXES.get(org_code)
+            if index is None or state is None:
+                return
+            try:
+                index.add(ids, [content for _, content, _ in rows], [row_attrs for _, _, row_attrs in rows])
+                _KEYWORD_INDEXES.put(org_code, index, (state[0] + len(ids), max(state[1], max(ids))))
+            except Exception as e:
+                logger.error(f"同步关键词索引失败，将在下次搜索时重建: {e}")
+                _KEYWORD_INDEXES.drop(org_code)
+
+    def _get_shard_index(self, org_code: str):
+        """
+        获取组织的内存映射分片索引：分片记录的 (行数, 最大ID) 与数据库一致时直接使用；数据库只有新增时追加缺失的行；
+        分片不存在、为不带属性键或快照的旧分片、或有未同步的删除时从数据库重新导出
+        """
+        index = _SHARD_STORE.open_index(org_code)
+        snapshot = self._org_snapshot(org_code)
+        if index is not None and index.has_attrs and index.snapshot is not None:
+            state = index.snapshot
+            if state == snapshot:
+                return index
+            if snapshot[1] > state[1]:
+                ids, vectors, attrs = self._load_org_vectors(org_code, min_id=state[1])
+                if state[0] + len(ids) == snapshot[0] and _SHARD_STORE.append(org_code, ids, vectors, attrs, expected=state):
+                    logger.info(f"向量分片补齐缺失的行: org_code={org_code}, 新增 {len(ids)} 条")
+                    return _SHARD_STORE.open_index(org_code)
+        ids, vectors, attrs = self._load_org_vectors(org_code)
+        # 记录数据库快照而不是导出的行数：无法解析的向量行不导出，也不应让每次检索都重新导出
+        _SHARD_STORE.export(org_code, ids, vectors, attrs, snapshot=snapshot)
+        return _SHARD_STORE.open_index(org_code)
+
+    def _append_to_shard(self, org_code: str, rows: List[Tuple[int, List[float], Tuple[int, ...]]]):
+        """写入失败或分片尚未导出时不影响入库，下次检索发现分片快照与数据库不一致时补齐"""
+        if not rows:
+            return
+        try:
+            _SHARD_STORE.append(
+                org_code,
+                [row_id for row_id, _, _ in rows],
+                [vector for _, vector, _ in rows],
+                [row_attrs for _, _, row_attrs in rows]
+            )
+        except Exception as e:
+            logger.error(f"写入向量增量分片失败: org_code={org_code}: {e}")
+
+    def _delete_from_shard(self, org_code: str, ids: List[int]):
+        if not ids:
+            return
+        try:
+            _SHARD_STORE.delete(org_code, ids)
+        except Exception as e:
+            # 删除标记写入失败时分片中会残留旧向量，回表时已删除的行会被过滤；重新导出分片即可修复
+            logger.error(f"写入向量分片删除标记失败: org_code={org_code}: {e}")
+
+    def _invalidate_results(self, org_code: str):
+        cache = get_search_result_cache()
+        if cache is not None:
+            cache.invalidate(org_code)
+
+    def _result_snapshot(self, cache, org_code: str) -> Tuple:
+        """结果缓存使用的组织版本快照，数据库的 (行数, 最大ID) 按 snapshot_seconds 节流查询"""
+        return cache.snapshot(org_code, lambda: self._org_snapshot(org_code))
+
+    def get_cached_results(
+        self,
+        query: str,
+        org_code: str,
+        top_k: int,
+        options: Tuple = ()
+    ) -> Tuple[Optional[List[Tuple[DocumentEmbedding, float]]], Optional[Tuple]]:
+        """
+        查询结果缓存：返回 (命中时按 id 回表后的结果，未命中为 None, 组织当前数据快照)
+
+        快照需原样传给 cache_results 作为缓存条目的版本；结果缓存关闭时快照为 None，不查询数据库
+        options 为影响排序的检索参数（如 (per_section_limit, mmr_lambda)），参与缓存键
+        """
+        cache = get_search_result_cache()
+        if cache is None:
+            return None, None
+        snapshot = self._result_snapshot(cache, org_code)
+        cached = cache.get(org_code, query, top_k, snapshot, options)
+        if cached is None:
+            return None, snapshot
+        return self._fetch_by_ids(cached), snapshot
+
+    def cache_results(
+        self,
+        query: str,
+        org_code: str,
+        top_k: int,
+        snapshot: Optional[Tuple],
+        results: List[Tuple[DocumentEmbedding, float]],
+        options: Tuple = ()
+    ):
+        """写入查询结果缓存（只保存 id 与相似度）"""
+        cache = get_search_result_cache()
+        if cache is not None and snapshot is not None:
+            cache.put(org_code, query, top_k, snapshot, [(row.id, score) for row, score in results], options)
+
+    def get_cached_ids_batch(
+        self,
+        queries: List[str],
+        org_code: str,
+        top_k: int,
+        options: Tuple = ()
+    ) -> Tuple[List[Optional[List[Tuple[int, float]]]], Optional[Tuple]]:
+        """批量查询结果缓存：返回 (与 queries 一一对应的 [(id, 分数), ...]，未命中为 None, 组织当前数据快照)，不回表"""
+        cache = get_search_result_cache()
+        if cache is None:
+            return [None] * len(queries), None
+        snapshot = self._result_snapshot(cache, org_code)
+        return [cache.get(org_code, query, top_k, snapshot, options) for query in queries], snapshot
+
+    def cache_ids_batch(
+        self,
+        queries: List[str],
+        org_code: str,
+        top_k: int,
+        snapshot: Optional[Tuple],
+        results: List[Optional[List[Tuple[int, float]]]],
+        options: Tuple = ()
+    ):
+        """批量写入查询结果缓存，results 中为 None 的查询不写入"""
+        cache = get_search_result_cache()
+        if cache is None or snapshot is None:
+            return
+        for query, scored_ids in zip(queries, results):
+            if scored_ids is not None:
+                cache.put(org_code, query, top_k, snapshot, scored_ids, options)
+
+    def _fetch_rows(self, ids: Iterable[int]) -> Dict[int, DocumentEmbedding]:
+        """按 id 回表（不加载 embedding 列），返回 {id: 行}"""
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        rows = self.db.query(DocumentEmbedding).options(
+            defer(DocumentEmbedding.embedding), defer(DocumentEmbedding.embedding_bin)
+        ).filter(
+            DocumentEmbedding.id.in_(ids)
+        ).all()
+        return {row.id: row for row in rows}
+
+    def _fetch_by_ids(self, scored_ids: List[Tuple[int, float]]) -> List[Tuple[DocumentEmbedding, float]]:
+        """按 id 回表取 top_k 行（不加载 embedding 列），并保持分数顺序"""
+        by_id = self._fetch_rows(row_id for row_id, _ in scored_ids)
+        return [(by_id[row_id], score) for row_id, score in scored_ids if row_id in by_id]
+
+    def fetch_batch(self, results: List[List[Tuple[int, float]]]) -> List[List[Tuple[DocumentEmbedding, float]]]:
+        """批量检索结果回表：全部查询的 id 合并为一次查询，再按各自的分数顺序拆回"""
+        by_id = self._fetch_rows(row_id for scored_ids in results for row_id, _ in scored_ids)
+        return [
+            [(by_id[row_id], score) for row_id, score in scored_ids if row_id in by_id]
+            for scored_ids in results
+        ]
     
+    @staticmethod
+    def search_options(per_section_limit: Optional[int] = None, mmr_lambda: Optional[float] = None,
+                       filters: Optional[Filters] = None, mode: str = "vector") -> Tuple:
+        """影响检索结果的参数 -> 可哈希的元组，作为结果缓存键的一部分"""
+        return (
+            mode,
+            per_section_limit or 0,
+            mmr_lambda,
+            tuple((field, tuple(values)) for field, values in sorted(normalize_filters(filters).items()))
+        )
+
+    def _search_index_ids(
+        self,
+        query_vector: List[float],
+        org_code: str,
+        top_k: int,
+        per_section_limit: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        filters: Optional[Filters] = None
+    ) -> List[Tuple[int, float]]:
+        """在进程内向量索引（或 mmap 分片）中检索，只返回 [(id, 相似度), ...]，不回表"""
+        return self._search_index_ids_batch([query_vector], org_code, top_k, per_section_limit, mmr_lambda, filters)[0]
+
+    def _search_index_ids_batch(
+        self,
+        query_vectors: List[List[float]],
+        org_code: str,
+        top_k: int,
+        per_section_limit: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        filters: Optional[Filters] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """批量向量检索：索引只同步一次，全部查询向量与组织向量矩阵做一次矩阵乘法，返回每个查询的 [(id, 相似度), ...]"""
+        if self.search_mode == "mmap":
+            index = self._get_shard_index(org_code)
+            if index is None:
+                return [[] for _ in query_vectors]
+            return self._search_vector_index(index, query_vectors, top_k, per_section_limit, mmr_lambda, filters)
+        # 入库时 _add_to_org_index / _remove_from_org_index 就地追加、删除并压缩索引数组，
+        # 检索（含属性过滤）需与其持有同一把组织锁，否则可能读到重新分配中的数组、返回错位的 id
+        with _ORG_VECTOR_INDEXES[self.search_mode].lock(org_code):
+            index = self._get_org_index(org_code)
+            return self._search_vector_index(index, query_vectors, top_k, per_section_limit, mmr_lambda, filters)
+
+    def _search_vector_index(
+        self,
+        index,
+        query_vectors: List[List[float]],
+        top_k: int,
+        per_section_limit: Optional[int],
+        mmr_lambda: Optional[float],
+        filters: Optional[Filters]
+    ) -> List[List[Tuple[int, float]]]:
+        mmr_pool = VECTOR_SEARCH_CONFIG.get("mmr_pool")
+        if isinstance(index, QuantizedVectorIndex):
+            return index.search_batch(
+                query_vectors, top_k, per_section_limit, mmr_lambda, mmr_pool, filters=filters,
+                rerank_loader=self._load_vectors_by_id
+            )
+        return index.search_batch(query_vectors, top_k, per_section_limit, mmr_lambda, mmr_pool, filters=filters)
+
+    def search_keyword_documents(
+        self,
+        query: str,
+        org_code: str,
+        top_k: int = 10,
+        per_section_limit: Optional[int] = None,
+        filters: Optional[Filters] = None
+    ) -> List[Tuple[DocumentEmbedding, float]]:
+        """BM25 关键词检索（不调用嵌入接口），返回 [(文档, BM25 分数), ...]，限流/过滤参数同 search_similar_documents"""
+        # 与入库时的增删持有同一把组织锁，见 _search_index_ids_batch
+        with _KEYWORD_INDEXES.lock(org_code):
+            hits = self._get_keyword_index(org_code).search(query, top_k, per_section_limit, normalize_filters(filters))
+        return self._fetch_by_ids(hits)
+
+    def search_hybrid_documents(
+        self,
+        query: str,
+        org_code: str,
+        top_k: int = 10,
+        query_vector: Optional[List[float]] = None,
+        per_section_limit: Optional[int] = None,
+        filters: Optional[Filters] = None
+    ) -> List[Tuple[DocumentEmbedding, float]]:
+        """
+        混合检索：向量检索与 BM25 关键词检索各取候选（vector_search.keyword.candidate_pool，不少于 4 * top_k），
+        按倒数排名融合（RRF，常数 vector_search.keyword.rrf_k）后再按章节限流取 top_k，返回 [(文档, 融合分数), ...]
+
+        向量检索补足语义相近的结果，关键词检索补足编号、型号、人名等精确匹配
+        """
+        filters = normalize_filters(filters)
+        if query_vector is None:
+            query_vector = self.embedding_model.get_embedding_vector(query, usage=self.usage)
+        pool = self._hybrid_pool(top_k)
+        if not query_vector:
+            logger.error("生成查询向量失败，仅使用关键词检索结果")
+            vector_hits = []
+        elif self.search_mode == "loop":
+            vector_hits = [
+                (row.id, score)
+                for row, score in self.search_similar_documents(query, org_code, pool, query_vector, filters=filters)
+            ]
+        else:
+            vector_hits = self._search_index_ids(query_vector, org_code, pool, filters=filters)
+        return self._fetch_by_ids(self._fuse_hybrid(query, org_code, top_k, vector_hits, per_section_limit, filters))
+
+    @staticmethod
+    def _hybrid_pool(top_k: int) -> int:
+        return max(int(KEYWORD_CONFIG.get("candidate_pool", 50)), top_k * 4)
+
+    def _fuse_hybrid(
+        self,
+        query: str,
+        org_code: str,
+        top_k: int,
+        vector_hits: List[Tuple[int, float]],
+        per_section_limit: Optional[int],
+        filters: Dict[str, List[str]]
+    ) -> List[Tuple[int, float]]:
+        """取关键词候选并与向量候选按 RRF 融合，按章节限流后返回 [(id, 融合分数), ...]"""
+        with _KEYWORD_INDEXES.lock(org_code):
+            keyword_index = self._get_keyword_index(org_code)
+            keyword_hits = keyword_index.search(query, self._hybrid_pool(top_k), None, filters)
+            fused = reciprocal_rank_fusion([vector_hits, keyword_hits], k=int(KEYWORD_CONFIG.get("rrf_k", 60)))
+            if not fused:
+                return []
+            group_keys = keyword_index.group_keys([row_id for row_id, _ in fused])
+        scores = np.asarray([score for _, score in fused], dtype=np.float64)
+        best = select_top_k(scores, top_k, group_keys, per_section_limit)
+        return [fused[i] for i in best]
+
+    def search_documents_batch(
+        self,
+        queries: List[str],
+        org_code: str,
+        top_k: int = 10,
+        query_vectors: Optional[List[Optional[List[float]]]] = None,
+        per_section_limit: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        filters: Optional[Filters] = None,
+        mode: str = "vector"
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索，返回与 queries 顺序一致的 [(id, 分数), ...]（不回表，回表见 fetch_batch）
+
+        query_vectors 与 queries 一一对应（keyword 模式不需要），为 None 时批量生成；
+        某个查询向量为空时该查询在 vector 模式下无结果，在 hybrid 模式下只用关键词结果。
+        向量部分在索引中一次矩阵乘法完成（loop 模式仍逐个查询），其余参数同单条检索。
+        """
+        filters = normalize_filters(filters)
+        if not queries:
+            return []
+        if mode == "keyword":
+            with _KEYWORD_INDEXES.lock(org_code):
+                keyword_index = self._get_keyword_index(org_code)
+                return [keyword_index.search(query, top_k, per_section_limit, filters) for query in queries]
+
+        if query_vectors is None:
+            query_vectors = self.embedding_model.embed_many(queries, usage=self.usage)["embeddings"]
+        valid = [i for i, vector in enumerate(query_vectors) if vector]
+        vector_top_k = self._hybrid_pool(top_k) if mode == "hybrid" else top_k
+        cap, mmr = (None, None) if mode == "hybrid" else (per_section_limit, mmr_lambda)
+        vector_hits: List[List[Tuple[int, float]]] = [[] for _ in queries]
+        if self.search_mode == "loop":
+            for i in valid:
+                vector_hits[i] = [
+                    (row.id, score)
+                    for row, score in self.search_similar_documents(
+                        queries[i], org_code, vector_top_k, query_vectors[i], cap, mmr, filters
+                    )
+                ]
+        elif valid:
+            found = self._search_index_ids_batch(
+                [query_vectors[i] for i in valid], org_code, vector_top_k, cap, mmr, filters
+            )
+            for i, hits in zip(valid, found):
+                vector_hits[i] = hits
+
+        if mode != "hybrid":
+            return vector_hits
+        return [
+            self._fuse_hybrid(query, org_code, top_k, hits, per_section_limit, filters)
+            for query, hits in zip(queries, vector_hits)
+        ]
+
     def search_similar_documents(
         self, 
         query: str, 
         org_code: str, 
-        top_k: int = 10
+        top_k: int = 10,
+        query_vector: Optional[List[float]] = None,
+        per_section_limit: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        filters: Optional[Filters] = None
     ) -> List[Tuple[DocumentEmbedding, float]]:
         """
         根据查询内容搜索相似文档
+
+        query_vector 由调用方预先生成时（如异步接口中 await 生成）不再重复调用嵌入模型
+        per_section_limit: 每个 section 最多返回的条数，在索引内选 top_k 时直接限流（数据足够时保证返回 top_k 条）
+        mmr_lambda: 不为空时对限流后的候选池（vector_search.mmr_pool，默认 4 * top_k）做 MMR 重排，
+            取值 0~1，越小结果越多样
+        filters: {"doc_type" / "doc_subject" / "source_name": 值或值列表}，在打分前按索引中的属性键过滤，
+            只对命中的向量计算相似度
         """
+        filters = normalize_filters(filters)
         # 1. 生成查询向量
-        query_vector = self.embedding_model.get_embedding_vector(query)
+        if query_vector is None:
+            query_vector = self.embedding_model.get_embedding_vector(query, usage=self.usage)
         if not query_vector:
             logger.error("生成查询向量失败")
             return []
-        
+
+        if self.search_mode != "loop":
+            return self._fetch_by_ids(
+                self._search_index_ids(query_vector, org_code, top_k, per_section_limit, mmr_lambda, filters)
+            )
+
         # 2. 从数据库获取所有相关文档向量
         # 修复：确保 self.db 是正确的数据库会话
         doc_embeddings = self.db.query(DocumentEmbedding).filter(
-            DocumentEmbedding.org_code == org_code
+            DocumentEmbedding.org_code == org_code,
+            *[getattr(DocumentEmbedding, field).in_(values) for field, values in filters.items()]
         ).all()
         
         # 3. 计算相似度
         similarities = []
+        stored_vectors = []
         for doc_emb in doc_embeddings:
             try:
-                stored_vector = self._coerce_embedding_vector(doc_emb.embedding)
-                if not stored_vector:
+                stored_vector = self._row_vector(doc_emb.embedding, doc_emb.embedding_bin, doc_emb.embedding_codec)
+                if stored_vector is None or len(stored_vector) == 0:
                     logger.error(f"解析数据库向量失败, 文档ID: {doc_emb.id}")
                     continue
                 similarity = cosine_similarity(query_vector, stored_vector)
                 similarities.append((doc_emb, similarity))
+                stored_vectors.append(stored_vector)
             except Exception as e:
                 logger.error(f"计算相似度失败: {e}, 文档ID: {doc_emb.id}")
                 continue
+
+        if per_section_limit or mmr_lambda is not None:
+            # 限流 / MMR 与索引模式共用同一套选择逻辑
+            best = rank_candidates(
+                np.asarray([similarity for _, similarity in similarities], dtype=np.float64),
+                top_k,
+                np.asarray([attribute_key(doc_emb.section) for doc_emb, _ in similarities], dtype=np.int64),
+                per_section_limit,
+                lambda pos: normalize_rows([stored_vectors[i] for i in pos]),
+                mmr_lambda,
+                VECTOR_SEARCH_CONFIG.get("mmr_pool")
+            )
+            return [similarities[i] for i in best]
         
         # 4. 按相似度排序并返回top_k
         similarities.sort(key=lambda x: x[1], reverse=True)
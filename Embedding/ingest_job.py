@@ -0,0 +1,403 @@
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from core.logger import logger
+from config.config import config
+
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = {JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED}
+
+_JOB_COLUMNS = [
+    "job_id", "status", "file_name", "file_path", "doc_type", "doc_subject", "org_code",
+    "chunk_size", "overlap", "incremental", "chunks_parsed", "chunks_embedded", "chunks_stored", "chunks_processed",
+    "total_tokens", "cancel_requested", "error", "created_at", "started_at", "finished_at", "updated_at",
+    "owner_host", "owner_pid", "owner_boot", "heartbeat_at"
+]
+
+# 兼容旧版本创建的任务表：缺少时补上的列
+_ADDED_COLUMNS = {
+    "incremental": "INTEGER DEFAULT 0",
+    "owner_host": "TEXT",
+    "owner_pid": "INTEGER",
+    "owner_boot": "TEXT",
+    "heartbeat_at": "REAL"
+}
+
+
+def _boot_id() -> Optional[str]:
+    """本次开机的标识（Linux），用于判断持有进程是否在重启前就已退出；其他系统返回 None"""
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _pid_alive(pid: int) -> Optional[bool]:
+    """进程是否存在；无法判断（Windows 上 os.kill 会结束进程，不能用来探测）时返回 None"""
+    if os.name != "posix":
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return None
+    return True
+
+
+# 当前进程的身份：主机名 + 进程号 + 开机标识
+OWNER_HOST = socket.gethostname()
+OWNER_BOOT = _boot_id()
+
+
+class IngestCancelled(Exception):
+    """任务被取消，由进度回调抛出以中断入库流程"""
+
+
+class IngestJobStore:
+    """
+    文档入库任务表（SQLite 本地持久化，WAL 模式，多个 worker 共享同一文件）
+
+    进程重启后未完成的任务仍在表中，可由 IngestJobManager.recover() 重新入队。
+    """
+
+    def __init__(self, db_path: str = "ingest_jobs.db"):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingest_job ("
+                " job_id TEXT PRIMARY KEY, status TEXT NOT NULL,"
+                " file_name TEXT, file_path TEXT, doc_type TEXT, doc_subject TEXT, org_code TEXT,"
+                " chunk_size INTEGER, overlap INTEGER, incremental INTEGER DEFAULT 0,"
+                " chunks_parsed INTEGER DEFAULT 0, chunks_embedded INTEGER DEFAULT 0,"
+                " chunks_stored INTEGER DEFAULT 0, chunks_processed INTEGER DEFAULT 0,"
+                " total_tokens INTEGER DEFAULT 0, cancel_requested INTEGER DEFAULT 0, error TEXT,"
+                " created_at REAL, started_at REAL, finished_at REAL, updated_at REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(ingest_job)")}
+            for column, ddl in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    # 兼容旧版本创建的任务表
+                    self._conn.execute(f"ALTER TABLE ingest_job ADD COLUMN {column} {ddl}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ingest_job_status ON ingest_job(status)")
+            self._conn.commit()
+
+    def create(self, job: Dict[str, object]) -> Dict[str, object]:
+        now = time.time()
+        job = {**job, "status": JOB_QUEUED, "created_at": now, "updated_at": now}
+        columns = [c for c in _JOB_COLUMNS if c in job]
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO ingest_job ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [job[c] for c in columns]
+            )
+            self._conn.commit()
+        return self.get(job["job_id"])
+
+    def get(self, job_id: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM ingest_job WHERE job_id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, org_code: Optional[str] = None, limit: int = 50) -> List[Dict[str, object]]:
+        sql = "SELECT * FROM ingest_job"
+        params: list = []
+        if org_code:
+            sql += " WHERE org_code=?"
+            params.append(org_code)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE ingest_job SET {', '.join(f'{k}=?' for k in fields)} WHERE job_id=?",
+                list(fields.values()) + [job_id]
+            )
+            self._conn.commit()
+
+    def claim(self, job_id: str) -> bool:
+        """queued -> running 原子切换并记录持有进程，避免多个 worker 进程重复执行同一任务"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE ingest_job SET status=?, started_at=?, updated_at=?, heartbeat_at=?,"
+                " owner_host=?, owner_pid=?, owner_boot=? WHERE job_id=? AND status=?",
+                (JOB_RUNNING, now, now, now, OWNER_HOST, os.getpid(), OWNER_BOOT, job_id, JOB_QUEUED)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_ids: List[str]):
+        """持有进程定时刷新运行中任务的心跳（与批次提交无关）"""
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE ingest_job SET heartbeat_at=? WHERE status=? AND owner_pid=? AND owner_host=?"
+                f" AND job_id IN ({', '.join('?' for _ in job_ids)})",
+                [time.time(), JOB_RUNNING, os.getpid(), OWNER_HOST] + list(job_ids)
+            )
+            self._conn.commit()
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, object]]:
+        """排队中的任务直接取消；运行中的任务打上取消标记，由执行线程在下一批次前退出"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE ingest_job SET status=?, cancel_requested=1, finished_at=?, updated_at=? WHERE job_id=? AND status=?",
+                (JOB_CANCELLED, now, now, job_id, JOB_QUEUED)
+            )
+            self._conn.execute(
+                "UPDATE ingest_job SET cancel_requested=1, updated_at=? WHERE job_id=? AND status=?",
+                (now, job_id, JOB_RUNNING)
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    @staticmethod
+    def _owner_gone(job: Dict[str, object], stale_before: float, active: set) -> bool:
+        """
+        持有进程是否已不在：同一主机上按开机标识与进程号判断（重启过、进程不存在、或进程号已被当前进程复用）；
+        其他主机或无法判断时，看心跳是否超过 stale_seconds 未刷新（心跳由独立线程定时写入，持有进程存活时不会过期）
+        """
+        if job["job_id"] in active:
+            return False
+        heartbeat = job["heartbeat_at"] or job["updated_at"] or 0
+        if job["owner_pid"] is None or job["owner_host"] != OWNER_HOST:
+            return heartbeat < stale_before
+        if job["owner_boot"] and OWNER_BOOT and job["owner_boot"] != OWNER_BOOT:
+            return True
+        if job["owner_pid"] == os.getpid():
+            return True
+        alive = _pid_alive(int(job["owner_pid"]))
+        if alive is False:
+            return True
+        return heartbeat < stale_before
+
+    def requeue_stale(self, stale_seconds: float, active: Optional[set] = None) -> int:
+        """把持有进程已退出的 running 任务重新置为 queued；active 为当前进程正在执行的任务"""
+        stale_before = time.time() - stale_seconds
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, owner_host, owner_pid, owner_boot, heartbeat_at, updated_at FROM ingest_job WHERE status=?",
+                (JOB_RUNNING,)
+            ).fetchall()
+            gone = [row["job_id"] for row in rows if self._owner_gone(dict(row), stale_before, active or set())]
+            for job_id in gone:
+                self._conn.execute(
+                    "UPDATE ingest_job SET status=?, updated_at=? WHERE job_id=? AND status=?",
+                    (JOB_QUEUED, time.time(), job_id, JOB_RUNNING)
+                )
+            self._conn.commit()
+        if gone:
+            logger.info(f"持有进程已退出的入库任务重新入队: {gone}")
+        return len(gone)
+
+    def queued_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM ingest_job WHERE status=? ORDER BY created_at", (JOB_QUEUED,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class IngestJobManager:
+    """
+    文档入库任务调度：上传接口只保存文件并登记任务，由有界线程池在后台执行
+    解析 -> 切分 -> 向量化 -> 入库，进度按批次写回任务表
+    """
+
+    def __init__(self, store: IngestJobStore, job_dir: str = "ingest_jobs", workers: int = 2, stale_seconds: float = 300,
+                 heartbeat_seconds: float = 30):
+        self.store = store
+        self.job_dir = job_dir
+        self.stale_seconds = stale_seconds
+        # 心跳间隔至少比判定过期的时间短几倍，避免偶发的写入延迟导致误判
+        self.heartbeat_seconds = max(min(float(heartbeat_seconds), stale_seconds / 3), 0.05)
+        self._executor = ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix="ingest-job")
+        self._active: set = set()
+        self._active_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        os.makedirs(job_dir, exist_ok=True)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            with self._active_lock:
+                job_ids = list(self._active)
+            try:
+                self.store.heartbeat(job_ids)
+            except Exception as e:
+                logger.warning(f"文档入库任务心跳写入失败: {e}")
+
+    def _ensure_heartbeat(self):
+        with self._active_lock:
+            if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, name="ingest-job-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+
+    def submit(self, fileobj, file_name: str, doc_type: str, doc_subject: str, org_code: str,
+               chunk_size: int = 512, overlap: int = 50, incremental: bool = False) -> Dict[str, object]:
+        """保存上传文件并登记任务，立即返回任务信息"""
+        job_id = uuid.uuid4().hex
+        file_path = os.path.join(self.job_dir, f"{job_id}{os.path.splitext(file_name)[1].lower()}")
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(fileobj, buffer, 1 << 20)
+        job = self.store.create({
+            "job_id": job_id,
+            "file_name": file_name,
+            "file_path": file_path,
+            "doc_type": doc_type,
+            "doc_subject": doc_subject,
+            "org_code": org_code,
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "incremental": int(bool(incremental))
+        })
+        self._executor.submit(self._run, job_id)
+        logger.info(f"文档入库任务已登记: job_id={job_id}, file={file_name}, org_code={org_code}")
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, object]]:
+        return self.store.request_cancel(job_id)
+
+    def recover(self) -> int:
+        """服务启动时把未完成的任务重新入队（已提交的批次会跳过，不重复入库）"""
+        with self._active_lock:
+            active = set(self._active)
+        self.store.requeue_stale(self.stale_seconds, active)
+        job_ids = self.store.queued_ids()
+        for job_id in job_ids:
+            self._executor.submit(self._run, job_id)
+        if job_ids:
+            logger.info(f"恢复未完成的文档入库任务 {len(job_ids)} 个")
+        return len(job_ids)
+
+    def shutdown(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id: str):
+        if not self.store.claim(job_id):
+            return
+        with self._active_lock:
+            self._active.add(job_id)
+        self._ensure_heartbeat()
+        try:
+            self._execute(job_id)
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+
+    def _execute(self, job_id: str):
+        job = self.store.get(job_id)
+
+        from config.database import SessionLocal
+        from model.embedding_model import TextEmbeddingModel
+        from model.embedding_usage import EmbeddingUsage
+        from Embedding.document_embedding_model import DocumentEmbeddingService
+
+        base_tokens = int(job["total_tokens"] or 0)
+        # 增量更新在一个事务中提交，中断后没有已提交的批次，续跑时从头开始
+        incremental = bool(job["incremental"])
+        resume = not incremental
+        usage = EmbeddingUsage()
+
+        def on_progress(progress: Dict[str, int]):
+            # 每个批次提交后回写进度（心跳由独立线程定时写入）；检测到取消标记时中断
+            self.store.update(
+                job_id,
+                chunks_parsed=progress["parsed"],
+                chunks_embedded=progress["embedded"],
+                chunks_stored=progress["stored"],
+                chunks_processed=progress["processed"],
+                total_tokens=base_tokens + usage.total_tokens
+            )
+            current = self.store.get(job_id)
+            if current and current["cancel_requested"]:
+                raise IngestCancelled()
+
+        # 失败的任务保留上传文件，便于排查或重新提交；成功或取消后才删除
+        remove_file = False
+        db = SessionLocal()
+        try:
+            service = DocumentEmbeddingService(db, TextEmbeddingModel(), usage=usage)
+            service.process_and_save_document(
+                job["file_path"], job["doc_type"], job["doc_subject"], job["org_code"],
+                job["chunk_size"], job["overlap"],
+                source_name=job["file_name"],
+                skip_chunks=int(job["chunks_processed"] or 0) if resume else 0,
+                resume_counts={"embedded": int(job["chunks_embedded"] or 0), "stored": int(job["chunks_stored"] or 0)} if resume else None,
+                progress_callback=on_progress,
+                incremental=incremental
+            )
+            self.store.update(job_id, status=JOB_SUCCEEDED, finished_at=time.time(),
+                              total_tokens=base_tokens + usage.total_tokens)
+            remove_file = True
+            logger.info(f"文档入库任务完成: job_id={job_id}")
+        except IngestCancelled:
+            self.store.update(job_id, status=JOB_CANCELLED, finished_at=time.time(),
+                              total_tokens=base_tokens + usage.total_tokens)
+            remove_file = True
+            logger.info(f"文档入库任务已取消: job_id={job_id}")
+        except Exception as e:
+            self.store.update(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time(),
+                              total_tokens=base_tokens + usage.total_tokens)
+            logger.error(f"文档入库任务失败: job_id={job_id}，已保留文件 {job['file_path']}: {e}")
+        finally:
+            db.close()
+            if remove_file:
+                try:
+                    os.remove(job["file_path"])
+                except OSError:
+                    pass
+
+
+_job_manager: Optional[IngestJobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_ingest_job_manager() -> IngestJobManager:
+    """进程级单例，配置见 config.yml -> document_ingest"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                ingest_config = config.get("document_ingest", {}) or {}
+                _job_manager = IngestJobManager(
+                    IngestJobStore(ingest_config.get("job_db_path", "ingest_jobs.db")),
+                    job_dir=ingest_config.get("job_dir", "ingest_jobs"),
+                    workers=ingest_config.get("job_workers", 2),
+                    stale_seconds=ingest_config.get("job_stale_seconds", 300),
+                    heartbeat_seconds=ingest_config.get("job_heartbeat_seconds", 30)
+                )
+    return _job_manager
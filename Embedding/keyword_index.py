@@ -0,0 +1,305 @@
+import math
+import re
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from Embedding.vector_index import ATTRIBUTE_FIELDS, Filters, compile_filters, default_attributes, filter_mask, select_top_k
+
+
+# 字母数字串（含 - _ . / 连接的型号、编号，如 AB-1234、v2.1）
+_WORD_RE = re.compile(r"[0-9a-z]+(?:[-_./][0-9a-z]+)*")
+_SUBWORD_RE = re.compile(r"[0-9a-z]+")
+# 中日韩统一表意文字（含扩展 A 与兼容汉字）
+_CJK_RANGES = ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF))
+# 全角 ASCII 与全角空格转半角
+_FULLWIDTH = str.maketrans({**{chr(code): chr(code - 0xFEE0) for code in range(0xFF01, 0xFF5F)}, "　": " "})
+# 词键：汉字二元组/一元组按码点直接编码（第 62 位置 1），字母数字词取进程内哈希（第 62 位为 0），两者不会冲突
+_CJK_FLAG = 1 << 62
+_WORD_MASK = _CJK_FLAG - 1
+
+
+def _normalize(text: Optional[str]) -> str:
+    return (text or "").translate(_FULLWIDTH).lower()
+
+
+def _word_key(word: str) -> int:
+    # 索引只在进程内使用，进程内一致的 hash 即可
+    return hash(word) & _WORD_MASK
+
+
+def _word_tokens(word: str) -> List[str]:
+    """带连接符的编号额外拆出各段，如 "ab-1234" -> ab-1234, ab, 1234"""
+    parts = _SUBWORD_RE.findall(word)
+    return [word] + parts if len(parts) > 1 else [word]
+
+
+def _cjk_terms(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """码点数组 -> (词起始下标, 词键)：连续汉字取二元组，前后都不是汉字的单字取一元组"""
+    cjk = np.zeros(codes.size, dtype=bool)
+    for low, high in _CJK_RANGES:
+        cjk |= (codes >= low) & (codes <= high)
+    starts = np.flatnonzero(cjk[:-1] & cjk[1:])
+    singles = np.flatnonzero(cjk & ~np.r_[False, cjk[:-1]] & ~np.r_[cjk[1:], False])
+    positions = np.concatenate([starts, singles])
+    keys = np.concatenate([
+        _CJK_FLAG | (codes[starts] << 21) | codes[starts + 1],
+        _CJK_FLAG | (codes[singles] << 21)
+    ])
+    return positions, keys
+
+
+def _code_points(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+
+
+def text_terms(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量分词为整数词键（中文友好，不依赖词典），返回 (每个词所属的文本序号, 词键)：
+
+    - 全角字母数字转半角并转小写
+    - 字母数字串整体作为一个词，带连接符的编号额外拆出各段，如 "AB-1234" -> ab-1234, ab, 1234
+    - 连续汉字按二元组（bigram）切分，单个汉字保留为一元词，如 "采购合同" -> 采购, 购合, 合同
+
+    汉字部分按码点数组整体向量化计算，不逐词创建字符串
+    """
+    normalized = [_normalize(text) for text in texts]
+    joined = "\n".join(normalized)
+    offsets = np.cumsum([0] + [len(text) + 1 for text in normalized[:-1]])
+    positions, keys = _cjk_terms(_code_points(joined))
+
+    word_positions: List[int] = []
+    word_keys: List[int] = []
+    for match in _WORD_RE.finditer(joined):
+        for token in _word_tokens(match.group()):
+            word_positions.append(match.start())
+            word_keys.append(_word_key(token))
+    positions = np.concatenate([positions, np.asarray(word_positions, dtype=np.int64)])
+    keys = np.concatenate([keys, np.asarray(word_keys, dtype=np.int64)])
+    return np.searchsorted(offsets, positions, side="right") - 1, keys
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Tuple[int, float]]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    倒数排名融合（RRF）：每路结果按名次贡献 1 / (k + 名次)，返回按融合分数降序的 [(id, 融合分数), ...]
+
+    只依赖名次，不需要把余弦相似度与 BM25 分数归一化到同一量纲
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (row_id, _) in enumerate(ranking, start=1):
+            fused[row_id] = fused.get(row_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    进程内 BM25 关键词倒排索引（chunk 正文 -> 词 -> 命中的行号与词频）
+
+    - 词表为有序的词键数组，批量添加时用 np.unique / np.searchsorted 一次完成词键到词 ID 的映射
+    - 倒排表用 array 追加存储，查询时零拷贝转为 NumPy 数组计算分数
+    - 支持增量 add / remove：删除只打标记，df、文档数与平均长度按存活的行计算；删除超过 1/4 时重建倒排表
+    - 每行另存与向量索引相同的属性键（见 ATTRIBUTE_FIELDS），用于检索前过滤和按章节限流
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = float(k1)
+        self.b = float(b)
+        self._vocab_keys = np.empty(0, dtype=np.int64)
+        self._vocab_ids = np.empty(0, dtype=np.int64)
+        self._postings: List[array] = []
+        self._freqs: List[array] = []
+        self._positions: Dict[int, int] = {}
+        self._size = 0
+        self._deleted = 0
+        self._total_length = 0.0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._lengths = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._attrs = np.empty((0, len(ATTRIBUTE_FIELDS)), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._size - self._deleted
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def _ensure_capacity(self, extra: int):
+        need = self._size + extra
+        capacity = self._ids.shape[0]
+        if need <= capacity:
+            return
+        new_capacity = max(need, capacity * 2, 1024)
+        ids = np.empty(new_capacity, dtype=np.int64)
+        lengths = np.empty(new_capacity, dtype=np.float32)
+        alive = np.zeros(new_capacity, dtype=bool)
+        attrs = np.empty((new_capacity, len(ATTRIBUTE_FIELDS)), dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        lengths[:self._size] = self._lengths[:self._size]
+        alive[:self._size] = self._alive[:self._size]
+        attrs[:self._size] = self._attrs[:self._size]
+        self._ids, self._lengths, self._alive, self._attrs = ids, lengths, alive, attrs
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """词键 -> 词 ID，词表中不存在的为 -1"""
+        if self._vocab_keys.size == 0:
+            return np.full(keys.size, -1, dtype=np.int64)
+        index = np.minimum(np.searchsorted(self._vocab_keys, keys), self._vocab_keys.size - 1)
+        return np.where(self._vocab_keys[index] == keys, self._vocab_ids[index], -1)
+
+    def _term_ids(self, keys: np.ndarray) -> np.ndarray:
+        """词键 -> 词 ID，新词追加到词表"""
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        term_ids = self._lookup(unique_keys)
+        missing = term_ids < 0
+        if missing.any():
+            new_ids = np.arange(len(self._postings), len(self._postings) + int(missing.sum()), dtype=np.int64)
+            term_ids[missing] = new_ids
+            for _ in range(new_ids.size):
+                self._postings.append(array("q"))
+                self._freqs.append(array("I"))
+            vocab_keys = np.concatenate([self._vocab_keys, unique_keys[missing]])
+            order = np.argsort(vocab_keys, kind="stable")
+            self._vocab_keys = vocab_keys[order]
+            self._vocab_ids = np.concatenate([self._vocab_ids, new_ids])[order]
+        return term_ids[inverse]
+
+    def add(self, ids, texts: Sequence[str], attrs=None):
+        """增量添加 chunk 正文，attrs 为每行的属性键（见 row_attributes）；已存在的 id 先删除再添加"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if ids.size == 0:
+            return
+        if len(texts) != ids.size:
+            raise ValueError(f"ids 数量({ids.size})与文本数量({len(texts)})不一致")
+        attrs = default_attributes(ids) if attrs is None else np.asarray(attrs, dtype=np.int64).reshape(ids.size, -1)
+        existing = [row_id for row_id in ids.tolist() if row_id in self._positions]
+        if existing:
+            self.remove(existing)
+
+        # 批量建倒排：(词 ID, 行号) 合成一个 int64 键，np.unique 一次得到按词排序的行号与词频，
+        # 每个词每批只追加一次，而不是每次出现追加一次
+        start = self._size
+        docs, keys = text_terms(texts)
+        lengths = np.bincount(docs, minlength=ids.size)
+        pairs, freqs = np.unique((self._term_ids(keys) << 32) | (docs + start), return_counts=True)
+        pair_terms = pairs >> 32
+        pair_positions = pairs & 0xFFFFFFFF
+        freqs = freqs.astype(np.uint32)
+        if pairs.size:
+            bounds = np.flatnonzero(np.diff(pair_terms)) + 1
+            starts, stops = np.r_[0, bounds], np.r_[bounds, pairs.size]
+            for term_id, lo, hi in zip(pair_terms[starts].tolist(), starts.tolist(), stops.tolist()):
+                self._postings[term_id].frombytes(pair_positions[lo:hi].tobytes())
+                self._freqs[term_id].frombytes(freqs[lo:hi].tobytes())
+
+        self._ensure_capacity(ids.size)
+        end = start + ids.size
+        self._ids[start:end] = ids
+        self._lengths[start:end] = lengths
+        self._alive[start:end] = True
+        self._attrs[start:end] = attrs
+        self._positions.update(zip(ids.tolist(), range(start, end)))
+        self._total_length += float(lengths.sum())
+        self._size = end
+
+    def remove(self, ids) -> int:
+        """按 id 删除（打删除标记），返回实际删除条数"""
+        removed = 0
+        for row_id in np.asarray(ids, dtype=np.int64).reshape(-1).tolist():
+            pos = self._positions.pop(row_id, None)
+            if pos is None:
+                continue
+            self._alive[pos] = False
+            self._total_length -= float(self._lengths[pos])
+            removed += 1
+        self._deleted += removed
+        if self._deleted and self._deleted * 4 >= self._size:
+            self._compact()
+        return removed
+
+    def _compact(self):
+        """移除已删除的行并重写倒排表中的行号"""
+        keep = self._alive[:self._size]
+        remap = np.cumsum(keep, dtype=np.int64) - 1
+        for term_id in range(len(self._postings)):
+            positions = np.frombuffer(self._postings[term_id], dtype=np.int64)
+            if positions.size == 0:
+                continue
+            alive = keep[positions]
+            if alive.all():
+                self._postings[term_id] = array("q", remap[positions].tobytes())
+                continue
+            self._postings[term_id] = array("q", remap[positions[alive]].tobytes())
+            self._freqs[term_id] = array("I", np.frombuffer(self._freqs[term_id], dtype=np.uint32)[alive].tobytes())
+        kept = int(keep.sum())
+        self._ids[:kept] = self._ids[:self._size][keep]
+        self._lengths[:kept] = self._lengths[:self._size][keep]
+        self._attrs[:kept] = self._attrs[:self._size][keep]
+        self._alive[:kept] = True
+        self._alive[kept:] = False
+        self._size = kept
+        self._deleted = 0
+        self._positions = {row_id: pos for pos, row_id in enumerate(self._ids[:kept].tolist())}
+
+    def _query_term_ids(self, query: str) -> List[int]:
+        """
+        查询分词（去重，规则同 text_terms）：带连接符的编号在索引中存在整词时只用整词匹配，
+        避免 "Q-42" 拆出的 "q" 命中大量无关的行；整词不存在时退回各段
+        """
+        normalized = _normalize(query)
+        keys = _cjk_terms(_code_points(normalized))[1].tolist()
+        for word in _WORD_RE.findall(normalized):
+            word_keys = [_word_key(token) for token in _word_tokens(word)]
+            if len(word_keys) > 1 and self._lookup(np.asarray(word_keys[:1], dtype=np.int64))[0] >= 0:
+                word_keys = word_keys[:1]
+            keys.extend(word_keys)
+        term_ids = self._lookup(np.asarray(keys, dtype=np.int64))
+        return list(dict.fromkeys(term_ids[term_ids >= 0].tolist()))
+
+    def group_keys(self, ids: Sequence[int]) -> np.ndarray:
+        """id -> 章节分组键（索引中不存在的 id 自成一组）"""
+        return np.asarray([
+            self._attrs[self._positions[row_id], 0] if row_id in self._positions else -1 - row_id
+            for row_id in ids
+        ], dtype=np.int64)
+
+    def search(self, query: str, top_k: int = 10, group_cap: Optional[int] = None,
+               filters: Optional[Filters] = None) -> List[Tuple[int, float]]:
+        """
+        BM25 检索，返回 [(id, BM25 分数), ...]；只对命中查询词的行计分
+
+        group_cap: 每个章节最多返回的条数；filters: 同 FlatVectorIndex.search
+        """
+        alive_count = len(self)
+        if top_k <= 0 or alive_count == 0:
+            return []
+        term_ids = self._query_term_ids(query)
+        if not term_ids:
+            return []
+
+        alive = self._alive[:self._size]
+        compiled = compile_filters(filters)
+        allowed = alive & filter_mask(self._attrs[:self._size], compiled) if compiled else alive
+        avg_length = self._total_length / alive_count or 1.0
+        position_parts, score_parts = [], []
+        for term_id in term_ids:
+            positions = np.frombuffer(self._postings[term_id], dtype=np.int64)
+            df = int(alive[positions].sum())
+            if df == 0:
+                continue
+            matched = allowed[positions]
+            positions = positions[matched]
+            if positions.size == 0:
+                continue
+            tf = np.frombuffer(self._freqs[term_id], dtype=np.uint32)[matched].astype(np.float32)
+            idf = math.log(1.0 + (alive_count - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self._lengths[positions] / avg_length)
+            position_parts.append(positions)
+            score_parts.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        if not position_parts:
+            return []
+
+        candidates, inverse = np.unique(np.concatenate(position_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts), minlength=candidates.size)
+        best = select_top_k(scores, top_k, self._attrs[candidates, 0], group_cap)
+        return [(int(self._ids[candidates[i]]), float(scores[i])) for i in best]
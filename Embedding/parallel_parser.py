@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+import fitz  # PyMuPDF for PDF processing
+
+
+def pdf_page_count(file_path: str) -> int:
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def read_pdf_range(file_path: str, start: int, end: int) -> List[str]:
+    """读取 [start, end) 页的文本，每页一项（在子进程中执行，各进程独立打开文档）"""
+    with fitz.open(file_path) as doc:
+        return [doc[i].get_text() for i in range(start, min(end, doc.page_count))]
+
+
+class ParallelDocumentParser:
+    """
+    基于进程池的 PDF 解析：大 PDF 按页区间拆分到多个进程并行解析，多个入库任务共享同一个进程池
+
+    - 页数少于 min_parallel_pages 时直接在当前进程串行解析，避免进程间传输的开销
+    - 进程池使用 spawn 启动方式（uvicorn worker 中已有线程，fork 不安全），首次使用时才创建
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: int = 32, min_parallel_pages: int = 64):
+        self.max_workers = max(int(max_workers or os.cpu_count() or 1), 1)
+        self.pages_per_task = max(int(pages_per_task), 1)
+        self.min_parallel_pages = max(int(min_parallel_pages), 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        return [(start, min(start + self.pages_per_task, page_count)) for start in range(0, page_count, self.pages_per_task)]
+
+    def iter_pdf_pages(self, file_path: str) -> Iterator[str]:
+        """按页顺序产出 PDF 文本；同时在途的页区间不超过 2 * max_workers 个，内存占用有上限"""
+        page_count = pdf_page_count(file_path)
+        if self.max_workers <= 1 or page_count < self.min_parallel_pages:
+            yield from read_pdf_range(file_path, 0, page_count)
+            return
+
+        executor = self._get_executor()
+        ranges = self._page_ranges(page_count)
+        window = 2 * self.max_workers
+        futures = [executor.submit(read_pdf_range, file_path, start, end) for start, end in ranges[:window]]
+        next_range = len(futures)
+        try:
+            for i in range(len(ranges)):
+                pages = futures[i].result()
+                futures[i] = None
+                if next_range < len(ranges):
+                    start, end = ranges[next_range]
+                    futures.append(executor.submit(read_pdf_range, file_path, start, end))
+                    next_range += 1
+                yield from pages
+        finally:
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+
+    def read_pdf(self, file_path: str) -> str:
+        return "".join(self.iter_pdf_pages(file_path))
+
+
+_parser: Optional[ParallelDocumentParser] = None
+_parser_lock = threading.Lock()
+
+
+def get_parallel_parser() -> ParallelDocumentParser:
+    """进程级单例，配置见 config.yml -> document_ingest"""
+    global _parser
+    if _parser is None:
+        with _parser_lock:
+            if _parser is None:
+                # 延迟导入：spawn 子进程导入本模块时不需要加载配置
+                from config.config import config
+                ingest_config = config.get("document_ingest", {}) or {}
+                _parser = ParallelDocumentParser(
+                    max_workers=ingest_config.get("parse_workers"),
+                    pages_per_task=ingest_config.get("pdf_pages_per_task", 32),
+                    min_parallel_pages=ingest_config.get("pdf_min_parallel_pages", 64)
+                )
+    return _parser
+
+
+def shutdown_parallel_parser():
+    if _parser is not None:
+        _parser.shutdown()
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from config.config import config
+from utils.content_hash import compute_content_hash
+
+
+ResultKey = Tuple[str, str, int, Tuple]
+
+
+class SearchResultCache:
+    """
+    文档检索结果缓存：(org_code, 归一化查询, top_k, 检索选项) -> 最终排序的 [(id, 相似度), ...]
+
+    - 进程内 LRU + TTL，只缓存 id 和分数，命中后按 id 回表取最新的行内容
+    - 每条结果记录写入时组织的版本快照 snapshot()：(本进程写入版本, 行数, 最大ID)，快照变化即视为失效
+    - 本进程入库时调用 invalidate(org_code) 清掉该组织的全部结果并递增版本，不需要查询数据库
+    - 其他 worker 的写入通过数据库的 (行数, 最大ID) 发现；该值按组织缓存 snapshot_seconds 秒，
+      命中时不必每次查询数据库，其他 worker 入库后最多 snapshot_seconds 秒内仍可能返回旧结果
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_items: int = 10000, snapshot_seconds: float = 5):
+        self.ttl_seconds = max(float(ttl_seconds), 0)
+        self.max_items = max(int(max_items), 0)
+        self.snapshot_seconds = max(float(snapshot_seconds), 0)
+        self._items: "OrderedDict[ResultKey, Tuple[float, Tuple, List[Tuple[int, float]]]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._db_snapshots: Dict[str, Tuple[float, Tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "invalidations": 0, "snapshot_queries": 0}
+
+    @staticmethod
+    def make_key(org_code: str, query: str, top_k: int, options: Tuple = ()) -> ResultKey:
+        # 查询按空白归一化（与嵌入向量缓存的键一致）；options 为影响排序的检索参数（章节限流、MMR 等）
+        return org_code or "", compute_content_hash(query), int(top_k), tuple(options)
+
+    def snapshot(self, org_code: str, load: Callable[[], Tuple[int, int]]) -> Tuple:
+        """
+        组织当前的版本快照 (本进程写入版本, 行数, 最大ID)；load 查询数据库的 (行数, 最大ID)，
+        距上次查询不足 snapshot_seconds 秒时复用上次的结果
+        """
+        org_code = org_code or ""
+        now = time.monotonic()
+        with self._lock:
+            version = self._versions.get(org_code, 0)
+            cached = self._db_snapshots.get(org_code)
+            if cached is not None and now - cached[0] < self.snapshot_seconds:
+                return (version, *cached[1])
+        db_snapshot = tuple(load())
+        with self._lock:
+            self._stats["snapshot_queries"] += 1
+            # 查询期间本进程有写入时不记录，下次重新查询
+            if self._versions.get(org_code, 0) == version:
+                self._db_snapshots[org_code] = (now, db_snapshot)
+        return (version, *db_snapshot)
+
+    def get(self, org_code: str, query: str, top_k: int, snapshot: Tuple,
+            options: Tuple = ()) -> Optional[List[Tuple[int, float]]]:
+        key = self.make_key(org_code, query, top_k, options)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, cached_snapshot, results = entry
+            if expires_at < time.monotonic() or cached_snapshot != tuple(snapshot):
+                del self._items[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._items.move_to_end(key)
+            self._stats["hits"] += 1
+            return list(results)
+
+    def put(self, org_code: str, query: str, top_k: int, snapshot: Tuple,
+            results: List[Tuple[int, float]], options: Tuple = ()):
+        if self.max_items <= 0 or self.ttl_seconds <= 0:
+            return
+        key = self.make_key(org_code, query, top_k, options)
+        with self._lock:
+            if snapshot[0] != self._versions.get(org_code or "", 0):
+                # 取快照之后本进程有写入，结果可能已过期
+                return
+            self._items[key] = (time.monotonic() + self.ttl_seconds, tuple(snapshot), list(results))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def invalidate(self, org_code: str) -> int:
+        """
+        本进程写入后调用：清除组织的全部缓存结果并递增版本，返回清除条数
+
+        递增版本后，写入前取得的快照与当前版本不一致，检索中途发生写入时的结果不会再被缓存
+        """
+        org_code = org_code or ""
+        with self._lock:
+            keys = [key for key in self._items if key[0] == org_code]
+            for key in keys:
+                del self._items[key]
+            self._versions[org_code] = self._versions.get(org_code, 0) + 1
+            self._db_snapshots.pop(org_code, None)
+            self._stats["invalidations"] += 1
+        return len(keys)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["items"] = len(self._items)
+        lookups = stats["hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_result_cache: Optional[SearchResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_search_result_cache() -> Optional[SearchResultCache]:
+    """进程级单例；配置 vector_search.result_cache.enabled=false 时返回 None"""
+    global _result_cache
+    cache_config = config.get("vector_search.result_cache", {}) or {}
+    if not cache_config.get("enabled", True):
+        return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = SearchResultCache(
+                    ttl_seconds=cache_config.get("ttl_seconds", 300),
+                    max_items=cache_config.get("max_items", 10000),
+                    snapshot_seconds=cache_config.get("snapshot_seconds", 5)
+                )
+    return _result_cache
@@ -0,0 +1,266 @@
+"""
+文档文本切分（不依赖大模型），单遍流式处理：
+
+    逐页文本 -> 行（空白归一化） -> 合并硬换行 -> 标题识别/章节分组 -> 句子切分 -> 装箱成 chunk
+
+所有正则在模块加载时预编译；每行的“严格标题”判断只计算一次并随行传递。
+"""
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+HEADING_KEYWORDS = {
+    "摘要", "目录", "前言", "引言", "概述", "背景", "结论", "附录",
+    "简介", "说明", "注意事项", "常见问题", "FAQ",
+    "译文", "赏析", "作者介绍", "作品评价",
+    "写作手法", "艺术特色", "表现手法", "主题", "主旨", "内容介绍"
+}
+
+# 行尾出现这些字符时认为句子已结束（不与下一行合并，也不作为短行标题）
+_SENTENCE_END_CHARS = frozenset("。！？!?；;：:")
+_SEPARATOR_RE = re.compile(r"^[-=_*]{3,}$")
+_HEADING_KEYWORD_RE = re.compile("|".join(re.escape(k) for k in sorted(HEADING_KEYWORDS)))
+# 编号标题：第X章/节/篇/部/分、1.2.3 标题、一、标题
+_NUMBERED_HEADING_RE = re.compile(
+    r"^(?:第[一二三四五六七八九十0-9]+[章节篇部分]\s*\S+"
+    r"|\d+(?:\.\d+){0,4}[\.、．)）]?\s*\S+"
+    r"|[一二三四五六七八九十]+[、.．)）]\s*\S+)"
+)
+# 句末标点，切分时保留标点
+_SENTENCE_SPLIT_RE = re.compile(r"([。！？!?；;])")
+
+
+def looks_like_heading_strict(line: str) -> bool:
+    if not line:
+        return False
+    if _SEPARATOR_RE.match(line):
+        return True
+    if len(line) <= 24 and _HEADING_KEYWORD_RE.search(line):
+        return True
+    return _NUMBERED_HEADING_RE.match(line) is not None
+
+
+def is_heading(line: str, strict: Optional[bool] = None) -> bool:
+    """strict 为该行 looks_like_heading_strict 的结果（已计算过时传入，避免重复匹配）"""
+    if not line:
+        return False
+    if strict is None:
+        strict = looks_like_heading_strict(line)
+    if strict:
+        return True
+    # 通用短行标题启发式：短、无句末标点、相对“像标题”
+    if len(line) <= 20 and line[-1] not in _SENTENCE_END_CHARS:
+        # 太像正文的短句（包含逗号太多）不当作标题
+        if line.count("，") + line.count(",") >= 2:
+            return False
+        # 有明显结构符号或纯短语都视作标题
+        return True
+    return False
+
+
+def iter_lines(pages: Iterable[str]) -> Iterator[str]:
+    """逐页拼接文本并按行输出（空白归一化、去掉空行），跨页的半行与下一页开头合并"""
+    carry = ""
+    for page in pages:
+        if not page:
+            continue
+        lines = (carry + page).splitlines(keepends=True)
+        carry = ""
+        last = lines[-1]
+        # 末尾没有换行（或以 \r 结尾，可能与下一页开头的 \n 组成一个换行）的半行留到下一页
+        if last.splitlines()[0] == last or last.endswith("\r"):
+            carry = lines.pop()
+        for ln in lines:
+            ln = " ".join(ln.split())
+            if ln:
+                yield ln
+    carry = " ".join(carry.split())
+    if carry:
+        yield carry
+
+
+def iter_merged_lines(lines: Iterable[str]) -> Iterator[Tuple[str, bool]]:
+    """合并 PDF/拷贝文本常见的“硬换行断句”，输出 (行, 是否严格标题)"""
+    prev: Optional[str] = None
+    prev_strict = False
+    for line in lines:
+        strict = looks_like_heading_strict(line)
+        if prev is None:
+            prev, prev_strict = line, strict
+            continue
+        if (
+            not strict
+            and not prev_strict
+            and prev[-1] not in _SENTENCE_END_CHARS
+            and len(prev) < 80
+            and len(line) < 80
+        ):
+            prev = f"{prev} {line}".strip()
+            prev_strict = looks_like_heading_strict(prev)
+        else:
+            yield prev, prev_strict
+            prev, prev_strict = line, strict
+    if prev is not None:
+        yield prev, prev_strict
+
+
+def iter_split_grouped(pages: Iterable[str], chunk_size: int = 512, overlap: int = 50) -> Iterator[Dict[str, object]]:
+    """
+    流式切分：逐页输入文本，边读边产出 {"section", "chunk_index", "content"}。
+
+    内存中只保留当前行、当前 chunk 和未遇到句末标点的半句文本，与文档大小无关。
+    """
+    # 参数归一化（chunk_size / overlap 以“字符长度”近似控制）
+    chunk_size = max(int(chunk_size), 50)
+    overlap = max(int(overlap), 0)
+
+    section_title: Optional[str] = None  # None 表示当前没有打开的 section
+    current_chunk = ""
+    chunk_idx = 0
+    last_content: Optional[str] = None   # 上一个输出的 chunk，用于 overlap
+    pending = ""                         # 当前句子中尚未遇到句末标点的文本
+    pending_cut = False                  # 当前句子是否已按 chunk_size 硬切出过片段
+    emitted: List[Dict[str, object]] = []
+
+    def flush_current():
+        nonlocal current_chunk, chunk_idx, last_content
+        if current_chunk.strip():
+            last_content = current_chunk.strip()
+            emitted.append({"section": section_title, "chunk_index": chunk_idx, "content": last_content})
+            chunk_idx += 1
+        current_chunk = ""
+
+    def pack(part: str):
+        # 装箱（packing）：把句子拼到 chunk_size 上限
+        nonlocal current_chunk
+        part = part.strip()
+        if not part:
+            return
+        if not current_chunk:
+            if len(part) <= chunk_size:
+                current_chunk = part
+                return
+        elif len(current_chunk) + 1 + len(part) <= chunk_size:
+            current_chunk = f"{current_chunk}\n{part}"
+            return
+
+        # 当前块满了，先落盘；新块携带 overlap（字符级），保证上下文连续
+        flush_current()
+        if overlap > 0 and last_content is not None:
+            overlap_text = last_content[-overlap:] if len(last_content) > overlap else last_content
+            current_chunk = f"{overlap_text}\n{part}" if overlap_text else part
+        else:
+            current_chunk = part
+
+    def finish_sentence(punct: str):
+        nonlocal pending, pending_cut
+        if pending_cut:
+            # 超长句子已硬切出前面的片段，剩余部分按相同边界继续切
+            sentence = pending.rstrip() + punct
+        else:
+            sentence = f"{pending.strip()}{punct}".strip()
+        # 避免超长句子：硬切成小段（极少发生，属于兜底）
+        if pending_cut or len(sentence) > chunk_size:
+            for i in range(0, len(sentence), chunk_size):
+                pack(sentence[i:i + chunk_size])
+        else:
+            pack(sentence)
+        pending = ""
+        pending_cut = False
+
+    def feed_line(line: str):
+        # 以中文/英文句末标点切分，并保留标点；行与行之间等价于一个空格
+        nonlocal pending, pending_cut
+        parts = _SENTENCE_SPLIT_RE.split(line)
+        for i in range(0, len(parts), 2):
+            seg = parts[i]
+            if pending or pending_cut:
+                pending = f"{pending} {seg}" if i == 0 else f"{pending}{seg}"
+            else:
+                pending = seg.lstrip()
+            if i + 1 < len(parts):
+                finish_sentence(parts[i + 1])
+        # 没有句末标点的超长文本：确定会被硬切的片段提前输出，避免整段缓存在内存里
+        while len(pending) > chunk_size and len(pending.rstrip()) > chunk_size:
+            pack(pending[:chunk_size])
+            pending = pending[chunk_size:]
+            pending_cut = True
+
+    def close_section():
+        if pending or pending_cut:
+            finish_sentence("")
+        flush_current()
+
+    # 按标题/编号/分隔符分组为多个 section；section 内按句子边界切分并装箱
+    current_title = ""
+    for line, strict in iter_merged_lines(iter_lines(pages)):
+        if is_heading(line, strict):
+            # 遇到新的标题前，先把上一 section 刷出；标题只作为 section 元数据，不进入正文内容
+            if section_title is not None:
+                close_section()
+                section_title = None
+            current_title = line
+        else:
+            if section_title is None:
+                # 默认标题：使用第一行的前 20 字作为兜底（便于后续聚合）
+                section_title = current_title.strip() or line[:20]
+                chunk_idx = 0
+            feed_line(line)
+        if emitted:
+            yield from emitted
+            emitted.clear()
+
+    if section_title is not None:
+        close_section()
+        yield from emitted
+
+
+def split_grouped(content: str, chunk_size: int = 512, overlap: int = 50) -> List[Dict[str, object]]:
+    """对整篇文本切分，返回 [{"section": str, "chunk_index": int, "content": str}, ...]"""
+    if not content:
+        return []
+    return list(iter_split_grouped([content], chunk_size, overlap))
+
+
+def split_sections_with_titles(content: str) -> List[Tuple[str, str]]:
+    """将全文分成多个 section，并尽量提取 section 标题，返回 [(标题, 正文), ...]"""
+    section_items: List[Tuple[str, List[str]]] = []
+    current_title = ""
+    buf: List[str] = []
+
+    def flush_section():
+        nonlocal buf
+        if not buf:
+            return
+        # 默认标题：使用第一行的前 20 字作为兜底（便于后续聚合）
+        title = current_title.strip() or (buf[0][:20] if buf[0] else "")
+        section_items.append((title, buf))
+        buf = []
+
+    for line, strict in iter_merged_lines(iter_lines([content])):
+        if is_heading(line, strict):
+            # 遇到新的标题前，先把上一 section 刷出；标题只作为 section 元数据，不进入正文内容
+            flush_section()
+            current_title = line
+            continue
+        buf.append(line)
+
+    flush_section()
+    return [(title, "\n".join(sec_lines).strip()) for title, sec_lines in section_items]
+
+
+def split_cn_sentences(text: str) -> List[str]:
+    """以中文/英文句末标点切分，并保留标点"""
+    text = " ".join(text.split())
+    if not text:
+        return []
+
+    parts = _SENTENCE_SPLIT_RE.split(text)
+    sentences: List[str] = []
+    for i in range(0, len(parts), 2):
+        seg = parts[i].strip()
+        punct = parts[i + 1] if i + 1 < len(parts) else ""
+        s = f"{seg}{punct}".strip()
+        if s:
+            sentences.append(s)
+    return sentences
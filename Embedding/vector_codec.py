@@ -0,0 +1,69 @@
+import json
+from typing import Optional, Tuple
+import numpy as np
+
+
+# 向量存储格式
+CODEC_JSON = "json"    # embedding 列的 JSON 数组（旧格式）
+CODEC_F32 = "f32"      # 小端 float32 原始字节，每维 4 字节
+CODEC_I8 = "i8"        # int8 标量量化：4 字节小端 float32 scale + 每维 1 字节
+
+SUPPORTED_CODECS = {CODEC_JSON, CODEC_F32, CODEC_I8}
+
+_F32 = np.dtype("<f4")
+
+
+def encode_vector(vector, codec: str) -> bytes:
+    """
+    将向量编码为二进制
+    """
+    array = np.asarray(vector, dtype=_F32).reshape(-1)
+    if codec == CODEC_F32:
+        return array.tobytes()
+    if codec == CODEC_I8:
+        max_abs = float(np.max(np.abs(array))) if array.size else 0.0
+        scale = max_abs / 127.0 if max_abs > 0 else 1.0
+        codes = np.clip(np.rint(array / scale), -127, 127).astype(np.int8)
+        return np.array([scale], dtype=_F32).tobytes() + codes.tobytes()
+    raise ValueError(f"不支持的二进制向量格式: {codec}")
+
+
+def quantize_int8(matrix) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按行 int8 标量量化（与 CODEC_I8 相同的方案）：返回 (int8 码矩阵, 每行 float32 scale)，原向量 ≈ 码 * scale
+    """
+    matrix = np.asarray(matrix, dtype=_F32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    max_abs = np.max(np.abs(matrix), axis=1) if matrix.shape[1] else np.zeros(matrix.shape[0], dtype=_F32)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def decode_vector(blob: bytes, codec: str) -> np.ndarray:
+    """
+    将二进制解码为 float32 向量；f32 格式直接 np.frombuffer 零拷贝（返回只读视图）
+    """
+    if codec == CODEC_F32:
+        return np.frombuffer(blob, dtype=_F32)
+    if codec == CODEC_I8:
+        scale = np.frombuffer(blob, dtype=_F32, count=1)[0]
+        codes = np.frombuffer(blob, dtype=np.int8, offset=4)
+        return codes.astype(np.float32) * scale
+    raise ValueError(f"不支持的二进制向量格式: {codec}")
+
+
+def decode_json_vector(embedding_value) -> Optional[list]:
+    """兼容 embedding 列可能为 JSON 数组或 JSON 字符串两种格式"""
+    if embedding_value is None:
+        return None
+    if isinstance(embedding_value, list):
+        return embedding_value
+    if isinstance(embedding_value, str):
+        try:
+            parsed = json.loads(embedding_value)
+            return parsed if isinstance(parsed, list) else None
+        except Exception:
+            return None
+    return None
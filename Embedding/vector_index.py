@@ -0,0 +1,699 @@
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+from core.logger import logger
+from Embedding.vector_codec import quantize_int8
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    将向量（或向量矩阵）转换为 float32 并按行做 L2 归一化，零向量保持为 0
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _nearest_centroids(data: np.ndarray, centroids: np.ndarray, block: int = 16384) -> np.ndarray:
+    """分块计算每行向量最近的聚类中心，避免一次性生成 N x nlist 的大矩阵"""
+    labels = np.empty(data.shape[0], dtype=np.int32)
+    for start in range(0, data.shape[0], block):
+        labels[start:start + block] = np.argmax(data[start:start + block] @ centroids.T, axis=1)
+    return labels
+
+
+def top_k_positions(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """在一维分数数组中选出 top_k 的下标（按分数降序）"""
+    if top_k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < scores.size:
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        part = np.arange(scores.size)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+# 每行向量附带的属性键（列顺序固定，写入分片文件）：第 0 列章节用于按章节限流，其余列用于检索前过滤
+ATTRIBUTE_FIELDS = ("section", "doc_type", "doc_subject", "source_name")
+FILTER_FIELDS = ATTRIBUTE_FIELDS[1:]
+
+Filters = Dict[str, Union[str, Iterable[str], None]]
+
+# 过滤后子集占比不低于该值时，整块矩阵打分再屏蔽未命中的行，比按行号取出子集（复制向量）更快
+DENSE_FILTER_RATIO = 0.25
+
+
+def attribute_key(value: Optional[str]) -> int:
+    """属性值 -> 稳定的非负 63 位键（跨进程一致，可写入分片文件）；空值归为同一个键"""
+    key = (value or "").strip() or "(none)"
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & 0x7FFFFFFFFFFFFFFF
+
+
+def row_attributes(section: Optional[str], doc_type: Optional[str], doc_subject: Optional[str],
+                   source_name: Optional[str]) -> Tuple[int, ...]:
+    """按 ATTRIBUTE_FIELDS 的顺序计算一行的属性键"""
+    return tuple(attribute_key(value) for value in (section, doc_type, doc_subject, source_name))
+
+
+def default_attributes(ids) -> np.ndarray:
+    """未提供属性时每行自成一个章节组（负数，不会与 attribute_key 冲突），其余属性按空值处理"""
+    ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+    attrs = np.full((ids.size, len(ATTRIBUTE_FIELDS)), attribute_key(None), dtype=np.int64)
+    attrs[:, 0] = -1 - ids
+    return attrs
+
+
+def normalize_filters(filters: Optional[Filters]) -> Dict[str, List[str]]:
+    """
+    校验并规整过滤条件：{字段: 值或值列表} -> {字段: 去重排序后的值列表}，空值/空列表的字段不参与过滤
+
+    同一字段的多个值之间为“或”，不同字段之间为“且”
+    """
+    normalized: Dict[str, List[str]] = {}
+    for field, values in (filters or {}).items():
+        if values is None:
+            continue
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"不支持的过滤字段: {field}，可选 {', '.join(FILTER_FIELDS)}")
+        values = [values] if isinstance(values, str) else list(values)
+        if values:
+            normalized[field] = sorted({str(value) for value in values})
+    return normalized
+
+
+def compile_filters(filters: Optional[Filters]) -> List[Tuple[int, np.ndarray]]:
+    """过滤条件 -> [(属性列号, 允许的键数组), ...]"""
+    return [
+        (ATTRIBUTE_FIELDS.index(field), np.unique(np.asarray([attribute_key(v) for v in values], dtype=np.int64)))
+        for field, values in normalize_filters(filters).items()
+    ]
+
+
+def filter_mask(attrs: np.ndarray, compiled: List[Tuple[int, np.ndarray]]) -> np.ndarray:
+    """按属性键矩阵计算满足全部过滤条件的行（布尔位图），只读属性列，不读向量"""
+    mask = np.ones(attrs.shape[0], dtype=bool)
+    for column, keys in compiled:
+        values = attrs[:, column]
+        mask &= values == keys[0] if keys.size == 1 else np.isin(values, keys)
+    return mask
+
+
+def _group_ranks(groups: np.ndarray) -> np.ndarray:
+    """每个元素在同组元素中的出现序号（按数组顺序，从 0 开始）"""
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    counts = np.diff(np.r_[starts, groups.size])
+    ranks = np.empty(groups.size, dtype=np.int64)
+    ranks[order] = np.arange(groups.size) - np.repeat(starts, counts)
+    return ranks
+
+
+def select_top_k(scores: np.ndarray, top_k: int, groups: Optional[np.ndarray] = None,
+                 group_cap: Optional[int] = None) -> np.ndarray:
+    """
+    按分数降序选出 top_k 个下标，分数为 -inf 的下标（已删除）不会被选中
+
+    指定 group_cap 时每组最多 group_cap 个，结果与“完整排序后逐个跳过超额的组”一致；
+    只对前 window 个候选排序，限流后不足 top_k 时窗口扩大 4 倍，直到覆盖全部候选。
+    """
+    if top_k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if not group_cap or groups is None:
+        best = top_k_positions(scores, top_k)
+        return best[np.isfinite(scores[best])]
+
+    window = min(scores.size, max(top_k * 4, 64))
+    while True:
+        order = top_k_positions(scores, window)
+        order = order[np.isfinite(scores[order])]
+        picked = order[_group_ranks(groups[order]) < group_cap]
+        if picked.size >= top_k or window >= scores.size:
+            return picked[:top_k]
+        window = min(scores.size, window * 4)
+
+
+def mmr_select(scores: np.ndarray, candidates: np.ndarray, vectors: np.ndarray, top_k: int,
+               mmr_lambda: float) -> np.ndarray:
+    """
+    MMR（最大边际相关）重排：每轮选出 λ·相关度 - (1-λ)·与已选结果的最大相似度 最高的候选
+
+    candidates 为候选下标，vectors 为对应的归一化向量矩阵；返回按选中顺序排列的 candidates 子集
+    """
+    relevance = scores[candidates].astype(np.float32)
+    max_sim = np.full(candidates.size, -np.inf, dtype=np.float32)
+    chosen = np.zeros(candidates.size, dtype=bool)
+    order: List[int] = []
+    for _ in range(min(top_k, candidates.size)):
+        mmr = relevance if not order else mmr_lambda * relevance - (1 - mmr_lambda) * max_sim
+        mmr = np.where(chosen, -np.inf, mmr)
+        best = int(np.argmax(mmr))
+        order.append(best)
+        chosen[best] = True
+        np.maximum(max_sim, vectors @ vectors[best], out=max_sim)
+    return candidates[np.asarray(order, dtype=np.int64)]
+
+
+def rank_candidates(scores: np.ndarray, top_k: int, groups: Optional[np.ndarray] = None,
+                    group_cap: Optional[int] = None, vectors_at: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                    mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None) -> np.ndarray:
+    """
+    从分数数组中选出最终 top_k 的下标：按组限流，可选对限流后的前 mmr_pool 个候选做 MMR 重排
+
+    vectors_at(下标数组) 返回对应的归一化向量，只在 MMR 时调用（只取候选池的向量）
+    """
+    if mmr_lambda is None or vectors_at is None:
+        return select_top_k(scores, top_k, groups, group_cap)
+    pool = select_top_k(scores, max(int(mmr_pool or top_k * 4), top_k), groups, group_cap)
+    return mmr_select(scores, pool, vectors_at(pool), top_k, float(mmr_lambda))
+
+
+class FlatVectorIndex:
+    """
+    精确检索索引：每个组织的向量保存为一个预归一化的 float32 矩阵
+
+    查询时一次矩阵乘法得到全部余弦相似度，再用 np.argpartition 选出 top_k，
+    避免逐行构建 np.array 和重复计算范数。
+    每行另存一组属性键（见 ATTRIBUTE_FIELDS）：章节用于检索时按章节限流，
+    doc_type / doc_subject / source_name 用于检索前过滤，只对命中的行计算相似度。
+    """
+
+    def __init__(self):
+        self.dim: Optional[int] = None
+        self._size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._attrs = np.empty((0, len(ATTRIBUTE_FIELDS)), dtype=np.int64)
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    @property
+    def attrs(self) -> np.ndarray:
+        return self._attrs[:self._size]
+
+    @property
+    def groups(self) -> np.ndarray:
+        return self._attrs[:self._size, 0]
+
+    def _ensure_capacity(self, extra: int):
+        need = self._size + extra
+        capacity = self._ids.shape[0]
+        if need <= capacity:
+            return
+        new_capacity = max(need, capacity * 2, 1024)
+        ids = np.empty(new_capacity, dtype=np.int64)
+        attrs = np.empty((new_capacity, len(ATTRIBUTE_FIELDS)), dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        attrs[:self._size] = self._attrs[:self._size]
+        self._ids, self._attrs = ids, attrs
+        self._resize_vectors(new_capacity)
+
+    def _resize_vectors(self, capacity: int):
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        if self._size:
+            vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+
+    def _write_vectors(self, start: int, matrix: np.ndarray):
+        """写入已归一化的向量"""
+        self._vectors[start:start + matrix.shape[0]] = matrix
+
+    def _compact_vectors(self, keep: np.ndarray, kept: int):
+        self._vectors[:kept] = self.vectors[keep]
+
+    def _row_vectors(self, positions: np.ndarray) -> np.ndarray:
+        """行号 -> 归一化向量（MMR 重排时使用）"""
+        return self._vectors[positions]
+
+    def _score_rows(self, queries: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """全部查询与给定行号（为空时为全部行）的向量内积，返回 (查询数, 行数) 的分数矩阵"""
+        matrix = self.vectors if positions is None else self._vectors[positions]
+        return queries @ matrix.T
+
+    def _append(self, ids, vectors, attrs=None) -> int:
+        """追加向量到矩阵末尾，返回本次写入的起始行号"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        matrix = normalize_rows(vectors)
+        if matrix.shape[0] != ids.size:
+            raise ValueError(f"ids 数量({ids.size})与向量数量({matrix.shape[0]})不一致")
+        attrs = default_attributes(ids) if attrs is None else np.asarray(attrs, dtype=np.int64).reshape(ids.size, -1)
+        if attrs.shape[1] != len(ATTRIBUTE_FIELDS):
+            raise ValueError(f"属性列数({attrs.shape[1]})与 ATTRIBUTE_FIELDS({len(ATTRIBUTE_FIELDS)})不一致")
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"向量维度不一致: 索引为 {self.dim}, 新增为 {matrix.shape[1]}")
+
+        start = self._size
+        self._ensure_capacity(ids.size)
+        self._write_vectors(start, matrix)
+        self._ids[start:start + ids.size] = ids
+        self._attrs[start:start + ids.size] = attrs
+        self._size += ids.size
+        return start
+
+    def add(self, ids, vectors, attrs=None):
+        """增量添加向量（vectors 不要求预先归一化），attrs 为每行的属性键（见 row_attributes，不传则不可过滤）"""
+        if np.asarray(ids).size == 0:
+            return
+        self._append(ids, vectors, attrs)
+
+    def remove(self, ids) -> int:
+        """按 id 删除向量（其余行保持原有顺序），返回实际删除条数"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if ids.size == 0 or self._size == 0:
+            return 0
+        keep = ~np.isin(self.ids, ids)
+        removed = self._size - int(keep.sum())
+        if removed:
+            self._compact(keep)
+        return removed
+
+    def _compact(self, keep: np.ndarray):
+        kept = int(keep.sum())
+        self._compact_vectors(keep, kept)
+        self._ids[:kept] = self.ids[keep]
+        self._attrs[:kept] = self.attrs[keep]
+        self._size = kept
+
+    def _prepare_query(self, query_vector) -> np.ndarray:
+        return self._prepare_queries(query_vector)[0]
+
+    def _prepare_queries(self, query_vectors) -> np.ndarray:
+        queries = normalize_rows(query_vectors)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"查询向量维度({queries.shape[1]})与索引维度({self.dim})不一致")
+        return queries
+
+    def _select(self, scores: np.ndarray, positions: Optional[np.ndarray], top_k: int, group_cap: Optional[int],
+                mmr_lambda: Optional[float], mmr_pool: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """在一个查询的分数数组中选出 top_k，返回 (行号, 分数)；positions 为分数对应的行号，为空时表示全部行"""
+        if positions is None:
+            best = rank_candidates(scores, top_k, self.groups, group_cap, self._row_vectors, mmr_lambda, mmr_pool)
+            return best, scores[best]
+        best = rank_candidates(
+            scores, top_k, self._attrs[positions, 0], group_cap,
+            lambda pos: self._row_vectors(positions[pos]), mmr_lambda, mmr_pool
+        )
+        return positions[best], scores[best]
+
+    def _results(self, rows: np.ndarray, scores: np.ndarray) -> List[Tuple[int, float]]:
+        return [(int(row_id), float(score)) for row_id, score in zip(self._ids[rows], scores)]
+
+    def _rank_positions(self, query: np.ndarray, positions: np.ndarray, top_k: int, group_cap: Optional[int],
+                        mmr_lambda: Optional[float], mmr_pool: Optional[int]) -> List[Tuple[int, float]]:
+        """只对给定行号的向量打分并选出 top_k"""
+        scores = self._score_rows(query.reshape(1, -1), positions)[0]
+        return self._results(*self._select(scores, positions, top_k, group_cap, mmr_lambda, mmr_pool))
+
+    def _select_batch(self, queries: np.ndarray, top_k: int, group_cap: Optional[int], mmr_lambda: Optional[float],
+                      mmr_pool: Optional[int], filters: Optional[Filters]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """精确检索：全部查询与（过滤后的）矩阵做一次矩阵乘法，再逐个查询选出 top_k 的 (行号, 分数)"""
+        compiled = compile_filters(filters)
+        mask, positions = None, None
+        if compiled:
+            mask = filter_mask(self.attrs, compiled)
+            allowed = int(mask.sum())
+            if allowed == 0:
+                empty = np.empty(0, dtype=np.int64)
+                return [(empty, np.empty(0, dtype=np.float32)) for _ in range(queries.shape[0])]
+            if allowed < self._size * DENSE_FILTER_RATIO:
+                positions = np.flatnonzero(mask)
+        scores = self._score_rows(queries, positions)
+        if positions is None and mask is not None:
+            scores[:, ~mask] = -np.inf
+        return [self._select(row, positions, top_k, group_cap, mmr_lambda, mmr_pool) for row in scores]
+
+    def _search_batch(self, queries: np.ndarray, top_k: int, group_cap: Optional[int], mmr_lambda: Optional[float],
+                      mmr_pool: Optional[int], filters: Optional[Filters]) -> List[List[Tuple[int, float]]]:
+        return [
+            self._results(rows, scores)
+            for rows, scores in self._select_batch(queries, top_k, group_cap, mmr_lambda, mmr_pool, filters)
+        ]
+
+    def search(self, query_vector, top_k: int = 10, group_cap: Optional[int] = None,
+               mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None,
+               filters: Optional[Filters] = None) -> List[Tuple[int, float]]:
+        """
+        查询 top_k 个最相似的向量，返回 [(id, 余弦相似度), ...]
+
+        group_cap: 每个分组（章节）最多返回的条数；mmr_lambda: 不为空时对候选池做 MMR 重排（越小越多样）
+        filters: {字段: 值或值列表}（字段见 FILTER_FIELDS），先按属性位图筛出子集，只对子集打分
+        """
+        if self._size == 0 or top_k <= 0:
+            return []
+        return self._search_batch(self._prepare_queries(query_vector)[:1], top_k, group_cap, mmr_lambda, mmr_pool, filters)[0]
+
+    def search_batch(self, query_vectors, top_k: int = 10, group_cap: Optional[int] = None,
+                     mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None,
+                     filters: Optional[Filters] = None) -> List[List[Tuple[int, float]]]:
+        """
+        批量查询：query_vectors 为 (n, dim) 矩阵或向量列表，返回与查询顺序一致的 n 组 [(id, 余弦相似度), ...]
+
+        n 个查询与索引矩阵只做一次矩阵乘法（而不是 n 次矩阵-向量乘法），其余参数同 search
+        """
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.size == 0:
+            return []
+        if self._size == 0 or top_k <= 0:
+            return [[] for _ in range(normalize_rows(queries).shape[0])]
+        return self._search_batch(self._prepare_queries(queries), top_k, group_cap, mmr_lambda, mmr_pool, filters)
+
+
+class IVFVectorIndex(FlatVectorIndex):
+    """
+    倒排文件（IVF）近似最近邻索引，纯 NumPy 实现
+
+    - 向量存储与 FlatVectorIndex 相同，内积即余弦相似度
+    - 数据量达到 min_train_size 后用球面 k-means 训练聚类中心，查询时只扫描最近的 nprobe 个桶
+    - 数据量不足时退化为全量精确扫描
+    - 支持增量 add，新增数据量翻倍后自动重新训练
+    """
+
+    def __init__(self, nprobe: int = 16, nlist: Optional[int] = None, min_train_size: int = 4096,
+                 kmeans_iters: int = 10, max_train_samples: int = 100000, seed: int = 42):
+        super().__init__()
+        self.nprobe = max(int(nprobe), 1)
+        self.nlist = nlist
+        self.min_train_size = max(int(min_train_size), 1)
+        self.kmeans_iters = kmeans_iters
+        self.max_train_samples = max_train_samples
+        self.seed = seed
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._lists: List[np.ndarray] = []
+        self._trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def _ensure_capacity(self, extra: int):
+        capacity = self._ids.shape[0]
+        super()._ensure_capacity(extra)
+        if self._ids.shape[0] != capacity:
+            assign = np.full(self._ids.shape[0], -1, dtype=np.int32)
+            assign[:self._size] = self._assign[:self._size]
+            self._assign = assign
+
+    def add(self, ids, vectors, attrs=None):
+        """增量添加向量（vectors 不要求预先归一化），必要时重新训练聚类"""
+        if np.asarray(ids).size == 0:
+            return
+        start = self._append(ids, vectors, attrs)
+        if self._size >= self.min_train_size and (not self.is_trained or self._size >= self._trained_size * 2):
+            self.train()
+        elif self.is_trained:
+            self._assign_range(start, self._size)
+
+    def _compact(self, keep: np.ndarray):
+        # 删除后行号变化：保留原聚类中心，按原桶归属重建倒排桶
+        assign = self._assign[:self._size][keep]
+        super()._compact(keep)
+        self._assign[:self._size] = assign
+        if self.is_trained:
+            order = np.argsort(assign, kind="stable").astype(np.int64)
+            counts = np.bincount(assign, minlength=len(self._lists))
+            self._lists = np.split(order, np.cumsum(counts)[:-1])
+
+    def _default_nlist(self) -> int:
+        if self.nlist:
+            return max(1, min(int(self.nlist), self._size))
+        return max(1, min(int(np.sqrt(self._size)), 4096, self._size))
+
+    def train(self):
+        """用球面 k-means 训练聚类中心，并重建全部倒排桶"""
+        if self._size == 0:
+            return
+        nlist = self._default_nlist()
+        rng = np.random.default_rng(self.seed)
+        data = self.vectors
+        sample_size = min(self._size, max(nlist * 32, min(nlist * 256, self.max_train_samples)))
+        sample = data[rng.choice(self._size, sample_size, replace=False)] if sample_size < self._size else data
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            labels = _nearest_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # 空桶重新随机取样，避免中心塌缩
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()), replace=False)]
+            centroids = normalize_rows(sums)
+
+        self._centroids = centroids
+        self._trained_size = self._size
+        self._assign[:self._size] = -1
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._assign_range(0, self._size)
+        logger.info(f"IVF 索引训练完成: size={self._size}, nlist={nlist}")
+
+    def _assign_range(self, start: int, end: int):
+        if end <= start:
+            return
+        labels = _nearest_centroids(self._vectors[start:end], self._centroids)
+        self._assign[start:end] = labels
+        positions = np.arange(start, end, dtype=np.int64)
+        order = np.argsort(labels, kind="stable")
+        sorted_labels = labels[order]
+        uniques, first = np.unique(sorted_labels, return_index=True)
+        bounds = list(first[1:]) + [len(order)]
+        for label, begin, stop in zip(uniques, first, bounds):
+            self._lists[label] = np.concatenate([self._lists[label], positions[order[begin:stop]]])
+
+    def search(self, query_vector, top_k: int = 10, group_cap: Optional[int] = None,
+               mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None,
+               filters: Optional[Filters] = None, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """查询 top_k 个近似最相似的向量，返回 [(id, 余弦相似度), ...]，限流/MMR/过滤参数同 FlatVectorIndex.search"""
+        if self._size == 0 or top_k <= 0:
+            return []
+        if not self.is_trained:
+            return super().search(query_vector, top_k, group_cap, mmr_lambda, mmr_pool, filters)
+
+        query = self._prepare_query(query_vector)
+        probe = min(nprobe or self.nprobe, len(self._lists))
+        compiled = compile_filters(filters)
+        mask, allowed = None, self._size
+        if compiled:
+            mask = filter_mask(self.attrs, compiled)
+            allowed = int(mask.sum())
+            if allowed == 0:
+                return []
+            if allowed * len(self._lists) <= self._size * probe:
+                # 过滤后的子集不比探测的桶大：直接对子集精确扫描，比探测更快且结果精确
+                return self._rank_positions(query, np.flatnonzero(mask), top_k, group_cap, mmr_lambda, mmr_pool)
+
+        probe_lists = top_k_positions(self._centroids @ query, probe)
+        candidates = np.concatenate([self._lists[i] for i in probe_lists])
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        if candidates.size < top_k:
+            # 桶内候选不足 top_k 时退化为全量（过滤后子集）扫描，保证返回数量
+            return super().search(query_vector, top_k, group_cap, mmr_lambda, mmr_pool, filters)
+
+        results = self._rank_positions(query, candidates, top_k, group_cap, mmr_lambda, mmr_pool)
+        if len(results) < top_k and candidates.size < allowed:
+            # 按章节限流后桶内候选不足 top_k，同样退化为全量扫描
+            return super().search(query_vector, top_k, group_cap, mmr_lambda, mmr_pool, filters)
+        return results
+
+    def search_batch(self, query_vectors, top_k: int = 10, group_cap: Optional[int] = None,
+                     mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None,
+                     filters: Optional[Filters] = None, nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """
+        批量查询，参数同 FlatVectorIndex.search_batch
+
+        未训练时与精确索引相同，一次矩阵乘法完成；训练后各查询探测的桶不同，逐个查询只扫描各自的桶
+        （比对全部向量做矩阵乘法的计算量小）
+        """
+        if not self.is_trained:
+            return super().search_batch(query_vectors, top_k, group_cap, mmr_lambda, mmr_pool, filters)
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.size == 0:
+            return []
+        return [
+            self.search(query, top_k, group_cap, mmr_lambda, mmr_pool, filters, nprobe)
+            for query in self._prepare_queries(queries)
+        ]
+
+
+# 重排时按 id 读取原始向量的回调：ids -> {id: 向量}，读取不到的 id 保留量化分数
+RerankLoader = Callable[[List[int]], Dict[int, object]]
+
+
+class QuantizedVectorIndex(FlatVectorIndex):
+    """
+    int8 标量量化索引：每行向量归一化后量化为 int8 码 + 一个 float32 scale（见 quantize_int8），
+    内存约为 float32 矩阵的 1/4，适合单个 worker 常驻百万级 chunk
+
+    - 非对称扫描：查询向量保持 float32，与 int8 码分块做内积后乘以每行 scale，得到近似余弦相似度；
+      每块转换为约 1MB 的 float32（留在 CPU 缓存中），不生成整个 float32 矩阵
+    - scan_dim 不为空时只保存前 scan_dim 维并重新归一化（适用于 text-embedding-v4 等支持截断维度的模型），
+      内存再按比例下降，召回损失由重排弥补
+    - 检索时传入 rerank_loader 则先按量化分数取 rerank_factor * top_k 个候选，
+      读取原始向量计算精确余弦相似度后重新排序；不传时直接返回量化分数
+    """
+
+    # 扫描时每块转换为 float32 的字节数
+    SCAN_BLOCK_BYTES = 1 << 20
+
+    def __init__(self, scan_dim: Optional[int] = None, rerank_factor: int = 4):
+        super().__init__()
+        self.scan_dim = int(scan_dim) if scan_dim else None
+        self.rerank_factor = max(int(rerank_factor or 0), 0)
+        self._codes = np.empty((0, 0), dtype=np.int8)
+        self._scales = np.empty(0, dtype=np.float32)
+
+    @property
+    def code_dim(self) -> int:
+        return min(self.scan_dim or self.dim, self.dim)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """解码后的近似向量（截断维度时为前 code_dim 维）"""
+        return self._row_vectors(np.arange(self._size))
+
+    @property
+    def nbytes(self) -> int:
+        """向量部分占用的内存字节数"""
+        return self._codes[:self._size].nbytes + self._scales[:self._size].nbytes
+
+    def _resize_vectors(self, capacity: int):
+        codes = np.empty((capacity, self.code_dim), dtype=np.int8)
+        scales = np.empty(capacity, dtype=np.float32)
+        if self._size:
+            codes[:self._size] = self._codes[:self._size]
+            scales[:self._size] = self._scales[:self._size]
+        self._codes, self._scales = codes, scales
+
+    def _write_vectors(self, start: int, matrix: np.ndarray):
+        if self.code_dim < matrix.shape[1]:
+            matrix = normalize_rows(matrix[:, :self.code_dim])
+        codes, scales = quantize_int8(matrix)
+        self._codes[start:start + codes.shape[0]] = codes
+        self._scales[start:start + codes.shape[0]] = scales
+
+    def _compact_vectors(self, keep: np.ndarray, kept: int):
+        self._codes[:kept] = self._codes[:self._size][keep]
+        self._scales[:kept] = self._scales[:self._size][keep]
+
+    def _row_vectors(self, positions: np.ndarray) -> np.ndarray:
+        return self._codes[positions].astype(np.float32) * self._scales[positions, None]
+
+    def _score_rows(self, queries: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.code_dim < queries.shape[1]:
+            queries = normalize_rows(queries[:, :self.code_dim])
+        if positions is None:
+            codes, scales = self._codes[:self._size], self._scales[:self._size]
+        else:
+            codes, scales = self._codes[positions], self._scales[positions]
+        scores = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        block_rows = max(self.SCAN_BLOCK_BYTES // (4 * max(codes.shape[1], 1)), 64)
+        for start in range(0, codes.shape[0], block_rows):
+            block = codes[start:start + block_rows]
+            scores[:, start:start + block.shape[0]] = queries @ block.astype(np.float32).T
+        scores *= scales
+        return scores
+
+    def _rerank(self, query: np.ndarray, rows: np.ndarray, scores: np.ndarray, loaded: Dict[int, object]) -> np.ndarray:
+        """用原始向量的精确余弦相似度替换候选的量化分数"""
+        scores = scores.astype(np.float32)
+        found, vectors = [], []
+        for i, row_id in enumerate(self._ids[rows].tolist()):
+            vector = loaded.get(row_id)
+            if vector is not None and len(vector) == self.dim:
+                found.append(i)
+                vectors.append(vector)
+        if found:
+            scores[found] = normalize_rows(vectors) @ query
+        return scores
+
+    def _search_batch(self, queries: np.ndarray, top_k: int, group_cap: Optional[int], mmr_lambda: Optional[float],
+                      mmr_pool: Optional[int], filters: Optional[Filters],
+                      rerank_loader: Optional[RerankLoader] = None) -> List[List[Tuple[int, float]]]:
+        if rerank_loader is None or self.rerank_factor <= 0:
+            return super()._search_batch(queries, top_k, group_cap, mmr_lambda, mmr_pool, filters)
+        # 量化分数粗排（已按章节限流），候选的原始向量一次读取
+        pool = max(top_k * self.rerank_factor, int(mmr_pool or 0) if mmr_lambda is not None else 0)
+        coarse = self._select_batch(queries, pool, group_cap, None, None, filters)
+        candidates = np.unique(np.concatenate([rows for rows, _ in coarse]))
+        loaded = rerank_loader(self._ids[candidates].tolist()) if candidates.size else {}
+        results = []
+        for query, (rows, scores) in zip(queries, coarse):
+            scores = self._rerank(query, rows, scores, loaded)
+            results.append(self._results(*self._select(scores, rows, top_k, group_cap, mmr_lambda, mmr_pool)))
+        return results
+
+    def search(self, query_vector, top_k: int = 10, group_cap: Optional[int] = None,
+               mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None,
+               filters: Optional[Filters] = None, rerank_loader: Optional[RerankLoader] = None) -> List[Tuple[int, float]]:
+        """参数同 FlatVectorIndex.search；rerank_loader 不为空时对量化粗排的候选按原始向量精确重排"""
+        if self._size == 0 or top_k <= 0:
+            return []
+        return self._search_batch(
+            self._prepare_queries(query_vector)[:1], top_k, group_cap, mmr_lambda, mmr_pool, filters, rerank_loader
+        )[0]
+
+    def search_batch(self, query_vectors, top_k: int = 10, group_cap: Optional[int] = None,
+                     mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None,
+                     filters: Optional[Filters] = None,
+                     rerank_loader: Optional[RerankLoader] = None) -> List[List[Tuple[int, float]]]:
+        """参数同 FlatVectorIndex.search_batch；重排时全部查询的候选合并为一次 rerank_loader 调用"""
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.size == 0:
+            return []
+        if self._size == 0 or top_k <= 0:
+            return [[] for _ in range(normalize_rows(queries).shape[0])]
+        return self._search_batch(
+            self._prepare_queries(queries), top_k, group_cap, mmr_lambda, mmr_pool, filters, rerank_loader
+        )
+
+
+class OrgVectorIndexRegistry:
+    """
+    按 org_code 维护进程内向量索引，并记录索引对应的数据库快照（行数、最大ID）用于增量同步
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, object] = {}
+        self._states: Dict[str, Tuple[int, int]] = {}
+        self._locks: Dict[str, threading.RLock] = {}
+        self._guard = threading.Lock()
+
+    def lock(self, org_code: str) -> threading.RLock:
+        with self._guard:
+            if org_code not in self._locks:
+                self._locks[org_code] = threading.RLock()
+            return self._locks[org_code]
+
+    def get(self, org_code: str):
+        return self._indexes.get(org_code), self._states.get(org_code)
+
+    def put(self, org_code: str, index, state: Tuple[int, int]):
+        self._indexes[org_code] = index
+        self._states[org_code] = state
+
+    def update_state(self, org_code: str, state: Tuple[int, int]):
+        if org_code in self._indexes:
+            self._states[org_code] = state
+
+    def drop(self, org_code: str):
+        self._indexes.pop(org_code, None)
+        self._states.pop(org_code, None)
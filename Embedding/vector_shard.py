@@ -0,0 +1,390 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from core.logger import logger
+from Embedding.vector_index import (
+    ATTRIBUTE_FIELDS, DENSE_FILTER_RATIO, Filters, compile_filters, filter_mask, normalize_rows, rank_candidates
+)
+
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+
+@contextmanager
+def _file_lock(path: str, timeout: float = 30.0, stale_seconds: float = 300.0):
+    """
+    跨进程文件锁（O_EXCL 创建锁文件，Windows/Linux 通用），用于多个 uvicorn worker 同时写同一组织的分片
+    """
+    start = time.time()
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale_seconds:
+                    # 持锁进程异常退出留下的锁文件
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() - start > timeout:
+                raise TimeoutError(f"获取分片文件锁超时: {path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _save_npy(path: str, array: np.ndarray):
+    """先写临时文件再 os.replace，保证读者看不到写了一半的分片"""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class MmapShardIndex:
+    """
+    基于内存映射分片的只读索引：一个 base 分片 + 若干增量 delta 分片 + 删除标记（tombstone）
+
+    向量通过 np.load(mmap_mode="r") 打开，数据驻留在操作系统页缓存中，由所有 worker 进程共享。
+    已删除的 id 在打开时换算成每个分片的屏蔽掩码，查询时跳过，压缩时才真正移除。
+    每个分片可带一个属性键矩阵（见 ATTRIBUTE_FIELDS），用于按章节限流和检索前过滤。
+    snapshot 为 manifest 中记录的分片对应的数据库 (行数, 最大ID)，旧版本导出的分片没有该记录。
+    """
+
+    def __init__(self, segments: List[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]], version: int, deleted_ids=None,
+                 snapshot: Optional[Tuple[int, int]] = None):
+        self.segments = segments
+        self.version = version
+        self.snapshot = snapshot
+        self.dim = segments[0][1].shape[1] if segments and segments[0][1].ndim == 2 else None
+        self.has_attrs = all(
+            attrs is not None and attrs.ndim == 2 and attrs.shape[1] == len(ATTRIBUTE_FIELDS)
+            for _, _, attrs in segments
+        )
+        self._offsets = np.cumsum([0] + [ids.shape[0] for ids, _, _ in segments])
+        self._masks: List[Optional[np.ndarray]] = [None] * len(segments)
+        self._deleted = 0
+        if deleted_ids is not None and len(deleted_ids):
+            for i, (ids, _, _) in enumerate(segments):
+                mask = np.isin(ids, deleted_ids)
+                if mask.any():
+                    self._masks[i] = mask
+                    self._deleted += int(mask.sum())
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1]) - self._deleted
+
+    def _locate(self, positions: np.ndarray):
+        """全局行号 -> (分片序号, 分片内行号)"""
+        segment = np.searchsorted(self._offsets, positions, side="right") - 1
+        return segment, positions - self._offsets[segment]
+
+    def _gather_vectors(self, positions: np.ndarray) -> np.ndarray:
+        return np.stack([self.segments[s][1][row] for s, row in zip(*self._locate(positions))])
+
+    def search(self, query_vector, top_k: int = 10, group_cap: Optional[int] = None,
+               mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None,
+               filters: Optional[Filters] = None) -> List[Tuple[int, float]]:
+        """查询 top_k 个最相似的向量，返回 [(id, 余弦相似度), ...]，限流/MMR/过滤参数同 FlatVectorIndex.search"""
+        if top_k <= 0 or len(self) == 0:
+            return []
+        return self.search_batch(normalize_rows(query_vector)[:1], top_k, group_cap, mmr_lambda, mmr_pool, filters)[0]
+
+    def search_batch(self, query_vectors, top_k: int = 10, group_cap: Optional[int] = None,
+                     mmr_lambda: Optional[float] = None, mmr_pool: Optional[int] = None,
+                     filters: Optional[Filters] = None) -> List[List[Tuple[int, float]]]:
+        """批量查询：每个分片只读取一遍，与全部查询做一次矩阵乘法，参数同 FlatVectorIndex.search_batch"""
+        queries = normalize_rows(query_vectors) if np.asarray(query_vectors).size else np.empty((0, 0), dtype=np.float32)
+        if top_k <= 0 or len(self) == 0 or queries.shape[0] == 0:
+            return [[] for _ in range(queries.shape[0])]
+        compiled = compile_filters(filters)
+        if compiled and not self.has_attrs:
+            raise ValueError("分片缺少属性键，无法按条件过滤，请重新导出分片")
+        use_groups = bool(group_cap) and self.has_attrs
+        parts, group_parts, position_parts = [], [], []
+        for (ids, vectors, attrs), mask, offset in zip(self.segments, self._masks, self._offsets):
+            size = ids.shape[0]
+            if size == 0:
+                continue
+            keep = None if mask is None else ~mask
+            if compiled:
+                keep = filter_mask(attrs, compiled) if keep is None else keep & filter_mask(attrs, compiled)
+            if keep is not None and keep.sum() < size * DENSE_FILTER_RATIO:
+                # 命中的行较少：只从映射文件中读取并计算命中的行
+                rows = np.flatnonzero(keep)
+                if rows.size == 0:
+                    continue
+                parts.append(queries @ vectors[rows].T)
+                position_parts.append(rows + offset)
+                if use_groups:
+                    group_parts.append(attrs[rows, 0])
+                continue
+            scores = queries @ np.asarray(vectors).T
+            if keep is not None:
+                scores[:, ~keep] = -np.inf
+            parts.append(scores)
+            position_parts.append(np.arange(offset, offset + size))
+            if use_groups:
+                group_parts.append(attrs[:, 0])
+        if not parts:
+            return [[] for _ in range(queries.shape[0])]
+        all_scores = np.concatenate(parts, axis=1)
+        positions = np.concatenate(position_parts)
+        groups = np.concatenate(group_parts) if use_groups else None
+        results = []
+        for scores in all_scores:
+            best = rank_candidates(
+                scores, top_k, groups, group_cap, lambda pos: self._gather_vectors(positions[pos]), mmr_lambda, mmr_pool
+            )
+            results.append([
+                (int(self.segments[s][0][row]), float(scores[pos]))
+                for pos, s, row in zip(best, *self._locate(positions[best]))
+            ])
+        return results
+
+
+class VectorShardStore:
+    """
+    按 org_code 管理磁盘向量分片（.npy），目录结构：
+
+        <base_dir>/<org>/manifest.json
+        <base_dir>/<org>/base-<uuid>.ids.npy / base-<uuid>.vectors.npy
+        <base_dir>/<org>/delta-<uuid>.ids.npy / delta-<uuid>.vectors.npy / delta-<uuid>.attrs.npy
+        <base_dir>/<org>/tomb-<uuid>.ids.npy
+
+    - export：从数据库导出全量向量为 base 分片
+    - append：文档上传后写入增量 delta 分片
+    - delete：文档增量更新删除旧 chunk 后写入删除标记（只含 id）
+    - compact：后台线程把 base + delta 合并为新的 base 分片，并移除已删除的 id
+
+    manifest 的 snapshot 记录分片内容对应的数据库 (行数, 最大ID)，随 export / append / delete 更新；
+    检索端发现与数据库不一致（如 append 时分片尚未导出、写入失败）时补齐缺失的行或重新导出。
+    """
+
+    def __init__(self, base_dir: str, compact_threshold: int = 8):
+        self.base_dir = base_dir
+        self.compact_threshold = max(int(compact_threshold), 1)
+        self._readers: Dict[str, MmapShardIndex] = {}
+        self._compacting: set = set()
+        self._guard = threading.Lock()
+
+    def _org_dir(self, org_code: str) -> str:
+        safe = re.sub(r"[^0-9A-Za-z_.-]", "_", org_code or "") or "_"
+        digest = hashlib.sha1((org_code or "").encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.base_dir, f"{safe}-{digest}")
+
+    def read_manifest(self, org_code: str) -> Optional[dict]:
+        path = os.path.join(self._org_dir(org_code), MANIFEST_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _manifest_snapshot(manifest: Optional[dict]) -> Optional[Tuple[int, int]]:
+        snapshot = (manifest or {}).get("snapshot")
+        return (int(snapshot[0]), int(snapshot[1])) if snapshot else None
+
+    def snapshot(self, org_code: str) -> Optional[Tuple[int, int]]:
+        """分片对应的数据库 (行数, 最大ID)；未导出或旧版本分片返回 None"""
+        return self._manifest_snapshot(self.read_manifest(org_code))
+
+    def _write_manifest(self, org_dir: str, manifest: dict):
+        path = os.path.join(org_dir, MANIFEST_FILE)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _write_segment(self, org_dir: str, prefix: str, ids, vectors, attrs=None) -> str:
+        name = f"{prefix}-{uuid.uuid4().hex}"
+        ids_array = np.asarray(ids, dtype=np.int64).reshape(-1)
+        matrix = normalize_rows(vectors) if ids_array.size else np.empty((0, 0), dtype=np.float32)
+        _save_npy(os.path.join(org_dir, f"{name}.vectors.npy"), matrix)
+        if attrs is not None:
+            _save_npy(
+                os.path.join(org_dir, f"{name}.attrs.npy"),
+                np.asarray(attrs, dtype=np.int64).reshape(ids_array.size, len(ATTRIBUTE_FIELDS))
+            )
+        _save_npy(os.path.join(org_dir, f"{name}.ids.npy"), ids_array)
+        return name
+
+    def _remove_segments(self, org_dir: str, names: List[str]):
+        for name in names:
+            # .groups.npy 为旧版本只含章节分组键的文件
+            for suffix in (".ids.npy", ".vectors.npy", ".attrs.npy", ".groups.npy"):
+                try:
+                    os.remove(os.path.join(org_dir, f"{name}{suffix}"))
+                except OSError:
+                    # Windows 下仍被其他进程映射的文件无法删除，留待下次压缩清理
+                    pass
+
+    def export(self, org_code: str, ids, vectors, attrs=None, snapshot: Optional[Tuple[int, int]] = None):
+        """全量导出组织向量为新的 base 分片，替换原有全部分片；snapshot 默认为导出行的 (行数, 最大ID)"""
+        org_dir = self._org_dir(org_code)
+        os.makedirs(org_dir, exist_ok=True)
+        if snapshot is None:
+            snapshot = (len(ids), int(max(ids)) if len(ids) else 0)
+        with _file_lock(os.path.join(org_dir, LOCK_FILE)):
+            old = self.read_manifest(org_code)
+            base = self._write_segment(org_dir, "base", ids, vectors, attrs)
+            version = (old or {}).get("version", 0) + 1
+            self._write_manifest(org_dir, {"version": version, "base": base, "deltas": [], "snapshot": list(snapshot)})
+            if old:
+                self._remove_segments(org_dir, [old["base"]] + old.get("deltas", []) + old.get("tombstones", []))
+        logger.info(f"向量分片导出完成: org_code={org_code}, 共 {len(ids)} 条")
+
+    def append(self, org_code: str, ids, vectors, attrs=None, expected: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        写入增量分片；组织尚未导出过分片时返回 False（首次搜索时再全量导出）。
+        expected 不为空时只在分片 snapshot 仍等于 expected 时写入（检索端补齐缺失行，避免与其他进程重复追加）
+        """
+        if len(ids) == 0 or self.read_manifest(org_code) is None:
+            return False
+        org_dir = self._org_dir(org_code)
+        with _file_lock(os.path.join(org_dir, LOCK_FILE)):
+            manifest = self.read_manifest(org_code)
+            if manifest is None:
+                return False
+            snapshot = self._manifest_snapshot(manifest)
+            if expected is not None and snapshot != tuple(expected):
+                return False
+            manifest["deltas"].append(self._write_segment(org_dir, "delta", ids, vectors, attrs))
+            if snapshot is not None:
+                manifest["snapshot"] = [snapshot[0] + len(ids), max(snapshot[1], int(max(ids)))]
+            manifest["version"] += 1
+            self._write_manifest(org_dir, manifest)
+            delta_count = len(manifest["deltas"]) + len(manifest.get("tombstones", []))
+        if delta_count >= self.compact_threshold:
+            self.compact_async(org_code)
+        return True
+
+    def delete(self, org_code: str, ids) -> bool:
+        """写入删除标记；组织尚未导出过分片时返回 False"""
+        if len(ids) == 0 or self.read_manifest(org_code) is None:
+            return False
+        org_dir = self._org_dir(org_code)
+        with _file_lock(os.path.join(org_dir, LOCK_FILE)):
+            manifest = self.read_manifest(org_code)
+            if manifest is None:
+                return False
+            name = f"tomb-{uuid.uuid4().hex}"
+            _save_npy(os.path.join(org_dir, f"{name}.ids.npy"), np.asarray(ids, dtype=np.int64).reshape(-1))
+            manifest.setdefault("tombstones", []).append(name)
+            snapshot = self._manifest_snapshot(manifest)
+            if snapshot is not None:
+                manifest["snapshot"] = [snapshot[0] - len(set(int(i) for i in ids)), snapshot[1]]
+            manifest["version"] += 1
+            self._write_manifest(org_dir, manifest)
+            delta_count = len(manifest["deltas"]) + len(manifest["tombstones"])
+        if delta_count >= self.compact_threshold:
+            self.compact_async(org_code)
+        return True
+
+    def _load_deleted_ids(self, org_dir: str, manifest: dict) -> Optional[np.ndarray]:
+        names = manifest.get("tombstones", [])
+        if not names:
+            return None
+        return np.concatenate([np.load(os.path.join(org_dir, f"{name}.ids.npy")) for name in names])
+
+    def compact(self, org_code: str):
+        """合并 base + delta 为新的 base 分片，并移除删除标记中的 id"""
+        org_dir = self._org_dir(org_code)
+        with _file_lock(os.path.join(org_dir, LOCK_FILE)):
+            manifest = self.read_manifest(org_code)
+            if manifest is None or not (manifest.get("deltas") or manifest.get("tombstones")):
+                return
+            names = [manifest["base"]] + manifest["deltas"]
+            deleted_ids = self._load_deleted_ids(org_dir, manifest)
+            segments = [self._load_segment(org_dir, name, mmap=True) for name in names]
+            # 任一分片缺少属性键（旧版本写入）时合并结果也不带属性键，由检索端重新导出
+            has_attrs = all(attrs is not None for _, _, attrs in segments)
+            if deleted_ids is not None:
+                kept = []
+                for ids, vectors, attrs in segments:
+                    keep = ~np.isin(ids, deleted_ids)
+                    if keep.all():
+                        kept.append((ids, vectors, attrs))
+                    else:
+                        kept.append((ids[keep], vectors[keep], attrs[keep] if attrs is not None else None))
+                segments = kept
+            segments = [segment for segment in segments if segment[0].shape[0] > 0]
+            if segments:
+                ids = np.concatenate([ids for ids, _, _ in segments])
+                vectors = np.concatenate([vectors for _, vectors, _ in segments])
+                attrs = np.concatenate([attrs for _, _, attrs in segments]) if has_attrs else None
+            else:
+                ids, vectors = np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+                attrs = np.empty((0, len(ATTRIBUTE_FIELDS)), dtype=np.int64)
+            del segments
+            base = self._write_segment(org_dir, "base", ids, vectors, attrs)
+            compacted = {"version": manifest["version"] + 1, "base": base, "deltas": []}
+            if "snapshot" in manifest:
+                compacted["snapshot"] = manifest["snapshot"]
+            self._write_manifest(org_dir, compacted)
+            self._remove_segments(org_dir, names + manifest.get("tombstones", []))
+        logger.info(f"向量分片压缩完成: org_code={org_code}, 合并 {len(names)} 个分片, 共 {len(ids)} 条")
+
+    def compact_async(self, org_code: str):
+        """后台线程压缩，同一组织同时只跑一个压缩任务"""
+        with self._guard:
+            if org_code in self._compacting:
+                return
+            self._compacting.add(org_code)
+
+        def run():
+            try:
+                self.compact(org_code)
+            except Exception as e:
+                logger.error(f"向量分片压缩失败: org_code={org_code}: {e}")
+            finally:
+                with self._guard:
+                    self._compacting.discard(org_code)
+
+        threading.Thread(target=run, name=f"shard-compact-{org_code}", daemon=True).start()
+
+    def _load_segment(self, org_dir: str, name: str, mmap: bool = True) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        mode = "r" if mmap else None
+        ids = np.load(os.path.join(org_dir, f"{name}.ids.npy"), mmap_mode=mode)
+        vectors = np.load(os.path.join(org_dir, f"{name}.vectors.npy"), mmap_mode=mode)
+        attrs_path = os.path.join(org_dir, f"{name}.attrs.npy")
+        attrs = np.load(attrs_path, mmap_mode=mode) if os.path.exists(attrs_path) else None
+        return ids, vectors, attrs
+
+    def open_index(self, org_code: str) -> Optional[MmapShardIndex]:
+        """打开组织的分片索引；manifest 版本变化时重新映射"""
+        manifest = self.read_manifest(org_code)
+        if manifest is None:
+            return None
+        reader = self._readers.get(org_code)
+        if reader is not None and reader.version == manifest["version"]:
+            return reader
+
+        org_dir = self._org_dir(org_code)
+        names = [manifest["base"]] + manifest.get("deltas", [])
+        try:
+            segments = [self._load_segment(org_dir, name) for name in names]
+            deleted_ids = self._load_deleted_ids(org_dir, manifest)
+        except FileNotFoundError:
+            # 读取期间分片被压缩替换，重新读取 manifest
+            return self.open_index(org_code) if self.read_manifest(org_code) != manifest else None
+        reader = MmapShardIndex(segments, manifest["version"], deleted_ids, self._manifest_snapshot(manifest))
+        self._readers[org_code] = reader
+        return reader
@@ -1,12 +1,13 @@
 import logging
+import time
 from typing import List, Dict, Any
 import json
-import aiohttp
 from model.openAI import chat_completion
+from active.intent_classifier import get_intent_classifier
+from active.endpoint_prompts import EndpointPrompts, render_endpoints
+from core.http_client import get_http_client
 from config.config import config
 import re
-import sys  # 添加sys导入
-import os   # 添加os导入
 
 
 # 从配置文件读取AI提示词配置
@@ -25,7 +26,19 @@ async def analyze_user_intent(user_query: str) -> Dict[str, Any]:
     """
     分析用户需求，提取意图和参数
     返回：{intent, entities, operations}
+    本地意图识别（规则 / 历史意图）置信度足够时直接返回，不调用大模型
     """
+    classifier = get_intent_classifier()
+    start = time.perf_counter()
+    candidate = None
+    if classifier.enabled:
+        candidate = classifier.classify(user_query)
+        if classifier.accept(candidate):
+            classifier.record(candidate["source"], time.perf_counter() - start)
+            logging.info(f"[第一步]本地意图识别命中（{candidate['source']}，置信度 {candidate['confidence']}）：{candidate}")
+            return candidate
+        start = time.perf_counter()
+
     # 从配置文件获取提示词模板
     prompt_template = AI_INTENT_CONFIG.get("user_prompt_template", "")
     # 从配置文件获取常见意图和参数示例
@@ -59,11 +72,18 @@ async def analyze_user_intent(user_query: str) -> Dict[str, Any]:
             cleaned_reply = cleaned_reply[3:-3].strip()
 
         result = json.loads(cleaned_reply)
+        if isinstance(result, dict):
+            result["source"] = "llm"
+            classifier.learn(user_query, result)
+        classifier.record("llm", time.perf_counter() - start)
         logging.info(f"[第一步]用户需求分析结果：{result}")
         return result
     except Exception as e:
         logging.error(f"[第一步]用户需求分析失败：{e}")
-        # 返回默认结果
+        classifier.record("llm_failed", time.perf_counter() - start)
+        # 大模型失败时，有本地候选则用低置信度的候选，否则返回默认结果
+        if candidate is not None:
+            return candidate
         return {
             "intent": "未知",
             "entities": {},
@@ -75,37 +95,17 @@ async def analyze_user_intent(user_query: str) -> Dict[str, Any]:
 '''
 AI匹配接口
 '''
-async def match_endpoints_with_ai(user_intent: Dict[str, Any], endpoints: List[Dict[str, Any]]) -> Dict[str, Any]:
+async def match_endpoints_with_ai(user_intent: Dict[str, Any], endpoints: List[Dict[str, Any]],
+                                  candidates: List[int] = None, prompts: EndpointPrompts = None) -> Dict[str, Any]:
+    """
+    candidates: 接口预检索得到的候选下标（0 起），为空时使用全部接口；
+    提示词中的序号始终是接口在 endpoints 中的位置 + 1，返回的 endpoint_index 无需换算
+    prompts: endpoints 预编译的接口描述（见 get_endpoint_prompt_cache），为空时现场生成
+    """
     logging.info("[第三步]AI匹配开始")
     
-    # 准备接口描述
-    endpoints_desc = []
-    for i, ep in enumerate(endpoints):
-        desc = f"{i + 1}. {ep['method']} {ep['path']} - {ep['summary']}"
-        if ep.get('parameters'):
-            if 'parameter_details' in ep and ep['parameter_details']:
-                params_info = []
-                for param_detail in ep['parameter_details']:
-                    param_name = param_detail.get('name', '')
-                    param_location = param_detail.get('in', '')
-                    param_type = param_detail.get('schema', {}).get('type', 'unknown')
-                    if 'anyOf' in param_detail.get('schema', {}):
-                        types = [item.get("type", "unknown") for item in param_detail["schema"]["anyOf"]]
-                        param_type = "|".join(types)
-                    required_mark = "必需" if param_detail.get('required', False) else "可选"
-                    # 特殊处理additionalProperties标记
-                    if param_name == "_additionalPropertiesBody":
-                        params_info.append(f"任意JSON对象(body:object,必需)")
-                    else:
-                        params_info.append(f"{param_name}({param_location}:{param_type},{required_mark})")
-                desc += f" (参数: {', '.join(params_info)})"
-            else:
-                params = ', '.join(ep.get('parameters', []))
-                if params:
-                    desc += f" (参数: {params})"
-        endpoints_desc.append(desc)
-    
-    endpoints_text = "\n".join(endpoints_desc)
+    # 准备接口描述（优先使用 Swagger 加载时预编译的结果）
+    endpoints_text = render_endpoints(endpoints, candidates, prompts)
     
     # 构建提示词
     prompt = f"""
@@ -312,25 +312,32 @@ async def execute_api_call(
         if auth_headers:
             logging.info(f"  授权头部: {auth_headers}")
         
-        # 执行HTTP请求 - 使用更安全的连接方式
-        # 创建connector时避免使用可能导致问题的参数
-        # 为Python 3.13兼容性，避免使用可能引起问题的参数
-        # 使用更简单的连接器配置来避免Python 3.13兼容性问题
-        # 移除可能在Python 3.13中引起问题的eager_start参数
-        if sys.version_info >= (3, 13):
-            # 在Python 3.13中避免使用eager_start参数
-            os.environ["PYTHONASYNCIOTASKS"] = "0"
-            
-        connector = aiohttp.TCPConnector(limit=100, limit_per_host=30, ttl_dns_cache=300, use_dns_cache=True)
-        timeout = aiohttp.ClientTimeout(total=300)
+        # 执行HTTP请求：使用应用级共享连接池（按 host 保持长连接、缓存 DNS），不再每次调用新建连接器和会话
+        session = get_http_client().session
+        status_code = 500
+        data = {}
         
-        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-            status_code = 500
-            data = {}
-            
-            try:
-                if method == "get":
-                    async with session.get(url, params=query_params, headers=headers) as response:
+        try:
+            if method == "get":
+                async with session.get(url, params=query_params, headers=headers) as response:
+                    status_code = response.status
+                    # 尝试解析响应内容
+                    try:
+                        # 始终尝试读取响应内容
+                        raw_text = await response.text()
+                        if raw_text and raw_text.strip():
+                            try:
+                                data = json.loads(raw_text)
+                            except json.JSONDecodeError:
+                                data = {"text": raw_text, "parse_error": "JSON decode failed"}
+                        else:
+                            data = {}
+                    except:
+                        data = {"error": "Failed to read response"}
+            elif method == "post":
+                # 根据Swagger定义正确处理POST请求参数
+                if body_params:
+                    async with session.post(url, params=query_params, json=body_params, headers=headers) as response:
                         status_code = response.status
                         # 尝试解析响应内容
                         try:
@@ -345,78 +352,27 @@ async def execute_api_call(
                                 data = {}
                         except:
                             data = {"error": "Failed to read response"}
-                elif method == "post":
-                    # 根据Swagger定义正确处理POST请求参数
-                    if body_params:
-                        async with session.post(url, params=query_params, json=body_params, headers=headers) as response:
-                            status_code = response.status
-                            # 尝试解析响应内容
-                            try:
-                                # 始终尝试读取响应内容
-                                raw_text = await response.text()
-                                if raw_text and raw_text.strip():
-                                    try:
-                                        data = json.loads(raw_text)
-                                    except json.JSONDecodeError:
-                                        data = {"text": raw_text, "parse_error": "JSON decode failed"}
-                                else:
-                                    data = {}
-                            except:
-                                data = {"error": "Failed to read response"}
-                    else:
-                        # 如果没有明确的body参数，将所有非路径参数放入body
-                        async with session.post(url, params=query_params, json=params, headers=headers) as response:
-                            status_code = response.status
-                            # 尝试解析响应内容
-                            try:
-                                # 始终尝试读取响应内容
-                                raw_text = await response.text()
-                                if raw_text and raw_text.strip():
-                                    try:
-                                        data = json.loads(raw_text)
-                                    except json.JSONDecodeError:
-                                        data = {"text": raw_text, "parse_error": "JSON decode failed"}
-                                else:
-                                    data = {}
-                            except:
-                                data = {"error": "Failed to read response"}
-                elif method == "put":
-                    # 根据Swagger定义正确处理PUT请求参数
-                    if body_params:
-                        async with session.put(url, params=query_params, json=body_params, headers=headers) as response:
-                            status_code = response.status
-                            # 尝试解析响应内容
-                            try:
-                                # 始终尝试读取响应内容
-                                raw_text = await response.text()
-                                if raw_text and raw_text.strip():
-                                    try:
-                                        data = json.loads(raw_text)
-                                    except json.JSONDecodeError:
-                                        data = {"text": raw_text, "parse_error": "JSON decode failed"}
-                                else:
-                                    data = {}
-                            except:
-                                data = {"error": "Failed to read response"}
-                    else:
-                        # 如果没有明确的body参数，将所有非路径参数放入body
-                        async with session.put(url, params=query_params, json=params, headers=headers) as response:
-                            status_code = response.status
-                            # 尝试解析响应内容
-                            try:
-                                # 始终尝试读取响应内容
-                                raw_text = await response.text()
-                                if raw_text and raw_text.strip():
-                                    try:
-                                        data = json.loads(raw_text)
-                                    except json.JSONDecodeError:
-                                        data = {"text": raw_text, "parse_error": "JSON decode failed"}
-                                else:
-                                    data = {}
-                            except:
-                                data = {"error": "Failed to read response"}
-                elif method == "delete":
-                    async with session.delete(url, params=query_params, headers=headers) as response:
+                else:
+                    # 如果没有明确的body参数，将所有非路径参数放入body
+                    async with session.post(url, params=query_params, json=params, headers=headers) as response:
+                        status_code = response.status
+                        # 尝试解析响应内容
+                        try:
+                            # 始终尝试读取响应内容
+                            raw_text = await response.text()
+                            if raw_text and raw_text.strip():
+                                try:
+                                    data = json.loads(raw_text)
+                                except json.JSONDecodeError:
+                                    data = {"text": raw_text, "parse_error": "JSON decode failed"}
+                            else:
+                                data = {}
+                        except:
+                            data = {"error": "Failed to read response"}
+            elif method == "put":
+                # 根据Swagger定义正确处理PUT请求参数
+                if body_params:
+                    async with session.put(url, params=query_params, json=body_params, headers=headers) as response:
                         status_code = response.status
                         # 尝试解析响应内容
                         try:
@@ -432,50 +388,83 @@ async def execute_api_call(
                         except:
                             data = {"error": "Failed to read response"}
                 else:
-                    return {"success": False, "error": f"不支持的HTTP方法: {method}"}
-                
-            except Exception as e:
-                logging.error(f"  HTTP请求执行失败: {e}")
-                return {"success": False, "error": str(e), "endpoint": endpoint["path"]}
-                
-            logging.info(f"[API调用完成] API调用结果")
-            logging.info(f"  状态码: {status_code}")
-            logging.info(f"  响应数据类型: {type(data).__name__}")
-            if isinstance(data, dict):
-                if 'content' in data:
-                    logging.info(f"  响应数据条数: {len(data.get('content', []))}")
-                if 'totalElements' in data:
-                    logging.info(f"  总元素数: {data.get('totalElements')}")
-                if 'totalPages' in data:
-                    logging.info(f"  总页数: {data.get('totalPages')}")
-                if 'number' in data:
-                    logging.info(f"  当前页码: {data.get('number')}")
+                    # 如果没有明确的body参数，将所有非路径参数放入body
+                    async with session.put(url, params=query_params, json=params, headers=headers) as response:
+                        status_code = response.status
+                        # 尝试解析响应内容
+                        try:
+                            # 始终尝试读取响应内容
+                            raw_text = await response.text()
+                            if raw_text and raw_text.strip():
+                                try:
+                                    data = json.loads(raw_text)
+                                except json.JSONDecodeError:
+                                    data = {"text": raw_text, "parse_error": "JSON decode failed"}
+                            else:
+                                data = {}
+                        except:
+                            data = {"error": "Failed to read response"}
+            elif method == "delete":
+                async with session.delete(url, params=query_params, headers=headers) as response:
+                    status_code = response.status
+                    # 尝试解析响应内容
+                    try:
+                        # 始终尝试读取响应内容
+                        raw_text = await response.text()
+                        if raw_text and raw_text.strip():
+                            try:
+                                data = json.loads(raw_text)
+                            except json.JSONDecodeError:
+                                data = {"text": raw_text, "parse_error": "JSON decode failed"}
+                        else:
+                            data = {}
+                    except:
+                        data = {"error": "Failed to read response"}
+            else:
+                return {"success": False, "error": f"不支持的HTTP方法: {method}"}
             
-            # 构建返回结果
-            result = {
-                "success": status_code < 400,  # 状态码小于400才认为成功
-                "status_code": status_code,
-                "data": data,
-                "endpoint": endpoint["path"]
-            }
+        except Exception as e:
+            logging.error(f"  HTTP请求执行失败: {e}")
+            return {"success": False, "error": str(e), "endpoint": endpoint["path"]}
             
-            # 如果调用失败，返回详细的错误信息供AI分析
-            if status_code >= 400:
-                result["error_details"] = {
-                    "request": {
-                        "url": url,
-                        "method": method,
-                        "query_params": query_params,
-                        "body_params": body_params,
-                        "headers": dict(headers) if headers else {}
-                    },
-                    "response": {
-                        "status_code": status_code,
-                        "data": data
-                    }
+        logging.info(f"[API调用完成] API调用结果")
+        logging.info(f"  状态码: {status_code}")
+        logging.info(f"  响应数据类型: {type(data).__name__}")
+        if isinstance(data, dict):
+            if 'content' in data:
+                logging.info(f"  响应数据条数: {len(data.get('content', []))}")
+            if 'totalElements' in data:
+                logging.info(f"  总元素数: {data.get('totalElements')}")
+            if 'totalPages' in data:
+                logging.info(f"  总页数: {data.get('totalPages')}")
+            if 'number' in data:
+                logging.info(f"  当前页码: {data.get('number')}")
+        
+        # 构建返回结果
+        result = {
+            "success": status_code < 400,  # 状态码小于400才认为成功
+            "status_code": status_code,
+            "data": data,
+            "endpoint": endpoint["path"]
+        }
+        
+        # 如果调用失败，返回详细的错误信息供AI分析
+        if status_code >= 400:
+            result["error_details"] = {
+                "request": {
+                    "url": url,
+                    "method": method,
+                    "query_params": query_params,
+                    "body_params": body_params,
+                    "headers": dict(headers) if headers else {}
+                },
+                "response": {
+                    "status_code": status_code,
+                    "data": data
                 }
-                
-            return result
+            }
+            
+        return result
     except Exception as e:
         logging.error(f"[API调用异常] API调用失败: {e}")
         return {"success": False, "error": str(e), "endpoint": endpoint["path"]}
@@ -487,7 +476,9 @@ async def analyze_api_error_and_retry(
     error_result: Dict[str, Any],
     endpoints_list: List[Dict[str, Any]],
     api_url: str = None,
-    auth_headers: Dict[str, Any] = None
+    auth_headers: Dict[str, Any] = None,
+    candidates: List[int] = None,
+    prompts: EndpointPrompts = None
 ) -> Dict[str, Any]:
     """
     分析API调用错误并尝试重新规划调用
@@ -499,6 +490,8 @@ async def analyze_api_error_and_retry(
         endpoints_list: 所有可用接口列表
         api_url: API基础URL
         auth_headers: 授权头部信息
+        candidates: 接口预检索得到的候选下标（0 起），为空时使用全部接口
+        prompts: endpoints_list 预编译的接口描述，为空时现场生成
         
     Returns:
         重新规划后的调用结果或最终错误结果
@@ -517,34 +510,8 @@ async def analyze_api_error_and_retry(
         "error_message": error_result.get("data", {}).get("message", "Unknown error")
     }
     
-    # 准备接口描述（用于重新规划）
-    endpoints_desc = []
-    for i, ep in enumerate(endpoints_list):
-        desc = f"{i + 1}. {ep['method']} {ep['path']} - {ep['summary']}"
-        if ep.get('parameters'):
-            if 'parameter_details' in ep and ep['parameter_details']:
-                params_info = []
-                for param_detail in ep['parameter_details']:
-                    param_name = param_detail.get('name', '')
-                    param_location = param_detail.get('in', '')
-                    param_type = param_detail.get('schema', {}).get('type', 'unknown')
-                    if 'anyOf' in param_detail.get('schema', {}):
-                        types = [item.get("type", "unknown") for item in param_detail["schema"]["anyOf"]]
-                        param_type = "|".join(types)
-                    required_mark = "必需" if param_detail.get('required', False) else "可选"
-                    # 特殊处理additionalProperties标记
-                    if param_name == "_additionalPropertiesBody":
-                        params_info.append(f"任意JSON对象(body:object,必需)")
-                    else:
-                        params_info.append(f"{param_name}({param_location}:{param_type},{required_mark})")
-                desc += f" (参数: {', '.join(params_info)})"
-            else:
-                params = ', '.join(ep.get('parameters', []))
-                if params:
-                    desc += f" (参数: {params})"
-        endpoints_desc.append(desc)
-    
-    endpoints_text = "\n".join(endpoints_desc)
+    # 准备接口描述（用于重新规划，重试时复用预编译结果）
+    endpoints_text = render_endpoints(endpoints_list, candidates, prompts)
     
     # 构建详细的错误信息用于AI分析
     detailed_error_info = {
@@ -0,0 +1,150 @@
+import logging
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional
+from config.config import config
+from active.endpoint_retriever import endpoints_fingerprint
+
+# 接口描述格式变化时递增，旧的预编译结果随之失效
+PROMPT_RENDER_VERSION = 1
+
+_CJK = re.compile(r"[一-鿿　-〿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    提示词 token 数估算（不依赖分词器）：中文字符约 0.6 token / 字，其余字符约 0.3 token / 字符，
+    与 DeepSeek 官方给出的换算比例一致，用于预算而非计费
+    """
+    cjk = len(_CJK.findall(text))
+    return math.ceil(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+def describe_endpoint(number: int, ep: Dict[str, Any]) -> str:
+    """单个接口在提示词中的描述：序号. 方法 路径 - 摘要 (参数: 参数名(位置:类型,必需|可选), ...)"""
+    desc = f"{number}. {ep['method']} {ep['path']} - {ep['summary']}"
+    if ep.get('parameters'):
+        if 'parameter_details' in ep and ep['parameter_details']:
+            params_info = []
+            for param_detail in ep['parameter_details']:
+                param_name = param_detail.get('name', '')
+                param_location = param_detail.get('in', '')
+                param_type = param_detail.get('schema', {}).get('type', 'unknown')
+                if 'anyOf' in param_detail.get('schema', {}):
+                    types = [item.get("type", "unknown") for item in param_detail["schema"]["anyOf"]]
+                    param_type = "|".join(types)
+                required_mark = "必需" if param_detail.get('required', False) else "可选"
+                # 特殊处理additionalProperties标记
+                if param_name == "_additionalPropertiesBody":
+                    params_info.append(f"任意JSON对象(body:object,必需)")
+                else:
+                    params_info.append(f"{param_name}({param_location}:{param_type},{required_mark})")
+            desc += f" (参数: {', '.join(params_info)})"
+        else:
+            params = ', '.join(ep.get('parameters', []))
+            if params:
+                desc += f" (参数: {params})"
+    return desc
+
+
+class EndpointPrompts:
+    """
+    一份接口列表预编译好的提示词描述（每个接口一行，序号为列表位置 + 1）及各行 token 估算
+
+    version 由描述格式版本与接口列表指纹组成，写入调用日志便于追溯当时发送给大模型的接口列表
+    """
+
+    def __init__(self, endpoints: List[Dict[str, Any]]):
+        self.source = endpoints
+        self.version = f"v{PROMPT_RENDER_VERSION}-{endpoints_fingerprint(endpoints)[:12]}"
+        self.lines = [describe_endpoint(i + 1, ep) for i, ep in enumerate(endpoints)]
+        # 每行另加 1 个换行符的 token
+        self.tokens = [estimate_tokens(line) + 1 for line in self.lines]
+        self.total_tokens = sum(self.tokens)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def select(self, candidates: Optional[List[int]] = None, max_tokens: int = 0, log: bool = True) -> List[int]:
+        """
+        选出发送给大模型的接口下标：candidates 为预检索的候选（必选 / 嵌入失败的接口在前，其余按相似度降序，
+        见 EndpointIndex.search），超出 max_tokens 预算（0 表示不限）时从末尾截掉相似度最低的部分；
+        candidates 为空（未启用或未触发预检索）时发送全部接口，不按 Swagger 顺序截断
+        """
+        if candidates is None:
+            if log and max_tokens and 0 < max_tokens < self.total_tokens:
+                logging.warning(f"[接口描述] {len(self.lines)} 个接口约 {self.total_tokens} tokens，超出提示词预算 "
+                                f"{max_tokens} tokens，未经预检索排序，全部发送（可检查 endpoint_retrieval 配置）")
+            return list(range(len(self.lines)))
+        rows = list(candidates)
+        if max_tokens and max_tokens > 0:
+            used = 0
+            for pos, row in enumerate(rows):
+                used += self.tokens[row]
+                if used > max_tokens:
+                    if log:
+                        logging.warning(f"[接口描述] 超出提示词预算 {max_tokens} tokens，"
+                                        f"{len(rows)} 个候选接口只发送前 {pos} 个（截掉相似度最低的部分）")
+                    return rows[:pos]
+        return rows
+
+    def render(self, candidates: Optional[List[int]] = None, max_tokens: int = 0) -> str:
+        return "\n".join(self.lines[row] for row in self.select(candidates, max_tokens))
+
+    def count_tokens(self, candidates: Optional[List[int]] = None, max_tokens: int = 0) -> int:
+        return sum(self.tokens[row] for row in self.select(candidates, max_tokens))
+
+
+class EndpointPromptCache:
+    """按 Swagger 地址缓存预编译的接口描述；接口列表对象不变（同一份解析结果）时直接复用，否则重新编译"""
+
+    def __init__(self, max_tokens: int = 0):
+        self.max_tokens = int(max_tokens or 0)
+        self._entries: Dict[str, EndpointPrompts] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, endpoints: List[Dict[str, Any]]) -> EndpointPrompts:
+        with self._lock:
+            prompts = self._entries.get(key)
+        if prompts is not None and prompts.source is endpoints:
+            return prompts
+        compiled = EndpointPrompts(endpoints)
+        with self._lock:
+            self._entries[key] = compiled
+        logging.info(f"[接口描述] 已预编译 {key}: {len(compiled)} 个接口, 约 {compiled.total_tokens} tokens, "
+                     f"版本 {compiled.version}")
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = dict(self._entries)
+        return {
+            "max_tokens": self.max_tokens,
+            "entries": {
+                key: {"endpoints": len(prompts), "total_tokens": prompts.total_tokens, "version": prompts.version}
+                for key, prompts in entries.items()
+            }
+        }
+
+
+_endpoint_prompt_cache: Optional[EndpointPromptCache] = None
+
+
+def get_endpoint_prompt_cache() -> EndpointPromptCache:
+    """进程级单例，提示词预算见 config.yml -> ai_endpoint_matching.max_endpoint_tokens"""
+    global _endpoint_prompt_cache
+    if _endpoint_prompt_cache is None:
+        _endpoint_prompt_cache = EndpointPromptCache(config.get("ai_endpoint_matching.max_endpoint_tokens", 0))
+    return _endpoint_prompt_cache
+
+
+def render_endpoints(endpoints: List[Dict[str, Any]], candidates: Optional[List[int]] = None,
+                     prompts: Optional[EndpointPrompts] = None) -> str:
+    """
+    提示词中的接口列表（按 ai_endpoint_matching.max_endpoint_tokens 预算截断）；
+    prompts 为该列表的预编译结果，未提供时现场编译（与预编译前的开销相同）
+    """
+    if prompts is None or prompts.source is not endpoints:
+        prompts = EndpointPrompts(endpoints)
+    return prompts.render(candidates, get_endpoint_prompt_cache().max_tokens)
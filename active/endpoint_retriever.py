@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from config.config import config
+from model import get_embedding_model
+
+
+def endpoint_text(endpoint: Dict[str, Any], max_length: int = 512) -> str:
+    """接口的检索文本：方法、路径、摘要、描述及参数名 / 参数描述"""
+    params = []
+    for detail in endpoint.get("parameter_details") or []:
+        name = detail.get("name", "")
+        if name == "_additionalPropertiesBody":
+            continue
+        params.append(f"{name} {detail.get('description', '')}".strip())
+    if not params:
+        params = list(endpoint.get("parameters") or [])
+    parts = [
+        f"{endpoint.get('method', '')} {endpoint.get('path', '')}",
+        endpoint.get("summary") or "",
+        endpoint.get("description") or "",
+        "参数: " + ", ".join(params) if params else ""
+    ]
+    return " ".join(part for part in parts if part)[:max_length]
+
+
+def endpoints_fingerprint(endpoints: List[Dict[str, Any]]) -> str:
+    """接口列表的指纹（方法 + 路径 + 摘要），Swagger 文档变化后旧索引失效"""
+    digest = hashlib.sha1()
+    for endpoint in endpoints:
+        digest.update(f"{endpoint.get('method')} {endpoint.get('path')} {endpoint.get('summary')}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EndpointIndex:
+    """一份 Swagger 文档的接口向量（已归一化，按接口顺序）；嵌入失败的接口记在 missing 中"""
+
+    def __init__(self, fingerprint: str, vectors: np.ndarray, rows: np.ndarray, missing: List[int], always: List[int]):
+        self.fingerprint = fingerprint
+        self.vectors = vectors
+        self.rows = rows
+        self.missing = missing
+        self.always = always
+
+    def search(self, query_vector: np.ndarray, top_n: int) -> List[int]:
+        """
+        返回候选接口下标（0 起）：必选接口与嵌入失败的接口在前，其后为相似度最高的 top_n 个（降序）；
+        提示词超出预算时 EndpointPrompts.select 从末尾截断，只会截掉相似度最低的接口
+        """
+        selected: List[int] = []
+        seen = set()
+        for row in self.always + self.missing:
+            if row not in seen:
+                seen.add(row)
+                selected.append(row)
+        if len(self.rows):
+            scores = self.vectors @ query_vector
+            top_n = min(top_n, len(scores))
+            best = np.argpartition(-scores, top_n - 1)[:top_n]
+            for row in self.rows[best[np.argsort(-scores[best])]].tolist():
+                if row not in seen:
+                    seen.add(row)
+                    selected.append(row)
+        return selected
+
+
+class EndpointRetriever:
+    """
+    接口预检索：加载 Swagger 时把每个接口的检索文本嵌入一次，保存在进程内；
+    匹配接口时只把与用户需求最相似的 top_n 个接口交给大模型，避免大型 API 的提示词过长
+
+    - 接口数不超过 min_endpoints 时不检索，仍发送全部接口
+    - always_include 中的路径片段（如大模型问答接口）对应的接口始终在候选中
+    - 嵌入失败时返回 None，由调用方回退为全部接口；失败在 failure_retry 秒内不再重试，避免每个请求都重新嵌入全部接口
+    """
+
+    def __init__(self, top_n: int = 30, min_endpoints: int = 60, max_text_length: int = 512,
+                 always_include: List[str] = None, dimensions: Optional[int] = None, enabled: bool = True,
+                 failure_retry: float = 60):
+        self.enabled = enabled
+        self.top_n = max(int(top_n), 1)
+        self.min_endpoints = int(min_endpoints)
+        self.max_text_length = int(max_text_length)
+        self.always_include = [part for part in (always_include or []) if part]
+        self.dimensions = dimensions
+        self.failure_retry = float(failure_retry)
+        self._indexes: Dict[str, EndpointIndex] = {}
+        # key -> (接口列表指纹, 可重试时间)
+        self._failures: Dict[str, Tuple[str, float]] = {}
+        self._build_locks: Dict[str, asyncio.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+
+    def _needs_retrieval(self, endpoints: List[Dict[str, Any]]) -> bool:
+        return self.enabled and len(endpoints) > self.min_endpoints
+
+    async def _embed(self, texts: List[str]) -> Dict[str, object]:
+        return await get_embedding_model().embed_many_async(texts, dimensions=self.dimensions)
+
+    async def build(self, key: str, endpoints: List[Dict[str, Any]]) -> Optional[EndpointIndex]:
+        """为一份接口列表建立向量索引（同一指纹已建立时直接复用），key 一般为 Swagger 地址"""
+        if not self._needs_retrieval(endpoints):
+            return None
+        fingerprint = endpoints_fingerprint(endpoints)
+        index = self._indexes.get(key)
+        if index is not None and index.fingerprint == fingerprint:
+            return index
+        if self._recently_failed(key, fingerprint):
+            return None
+        # 按 key 加锁：不同 Swagger 文档的索引可以同时建立
+        lock = self._build_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(key)
+            if index is not None and index.fingerprint == fingerprint:
+                return index
+            if self._recently_failed(key, fingerprint):
+                return None
+            start = time.perf_counter()
+            texts = [endpoint_text(endpoint, self.max_text_length) for endpoint in endpoints]
+            try:
+                result = await self._embed(texts)
+            except Exception as e:
+                result = {"embeddings": [None] * len(texts), "error": str(e)}
+            rows = [i for i, vector in enumerate(result["embeddings"]) if vector is not None]
+            if not rows:
+                logging.error(f"[接口预检索] 接口嵌入全部失败，不建立索引，{self.failure_retry:.0f} 秒后再试: "
+                              f"{key} {result.get('error') or result.get('errors')}")
+                self._failures[key] = (fingerprint, time.monotonic() + self.failure_retry)
+                with self._lock:
+                    self._stats["build_failures"] += 1
+                return None
+            vectors = np.asarray([result["embeddings"][i] for i in rows], dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            missing = [i for i, vector in enumerate(result["embeddings"]) if vector is None]
+            always = [
+                i for i, endpoint in enumerate(endpoints)
+                if any(part in endpoint.get("path", "") for part in self.always_include)
+            ]
+            index = EndpointIndex(fingerprint, vectors, np.asarray(rows, dtype=np.int64), missing, always)
+            self._indexes[key] = index
+            self._failures.pop(key, None)
+            with self._lock:
+                self._stats["builds"] += 1
+            logging.info(f"[接口预检索] 索引已建立: {key}, 接口 {len(endpoints)} 个, 嵌入失败 {len(missing)} 个, "
+                         f"缓存命中 {result.get('cached', 0)} 条, 耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+            return index
+
+    def _recently_failed(self, key: str, fingerprint: str) -> bool:
+        """同一份接口列表刚建立失败、还在重试等待期内（接口列表变化后立即重试）"""
+        failure = self._failures.get(key)
+        if failure is None or failure[0] != fingerprint or time.monotonic() >= failure[1]:
+            return False
+        with self._lock:
+            self._stats["build_skipped"] += 1
+        return True
+
+    async def retrieve(self, key: str, endpoints: List[Dict[str, Any]], query_text: str) -> Optional[List[int]]:
+        """
+        返回交给大模型的候选接口下标（0 起，必选 / 嵌入失败的接口在前，其余按相似度降序）；返回 None 表示使用全部接口
+        """
+        if not self._needs_retrieval(endpoints) or not (query_text or "").strip():
+            return None
+        with self._lock:
+            self._stats["queries"] += 1
+        try:
+            index = await self.build(key, endpoints)
+            if index is None:
+                raise ValueError("接口索引不可用")
+            query_vector = (await self._embed([query_text]))["embeddings"][0]
+            if query_vector is None:
+                raise ValueError("查询向量生成失败")
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+            candidates = index.search(query_vector, self.top_n)
+        except Exception as e:
+            logging.warning(f"[接口预检索] 检索失败，使用全部接口: {e}")
+            with self._lock:
+                self._stats["fallbacks"] += 1
+            return None
+        with self._lock:
+            self._stats["endpoints_total"] += len(endpoints)
+            self._stats["endpoints_sent"] += len(candidates)
+        return candidates
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {name: self._stats[name] for name in
+                     ("queries", "fallbacks", "builds", "build_failures", "build_skipped", "endpoints_total", "endpoints_sent")}
+        stats["sent_ratio"] = round(stats["endpoints_sent"] / stats["endpoints_total"], 4) if stats["endpoints_total"] else 0.0
+        stats["indexes"] = {key: len(index.rows) for key, index in self._indexes.items()}
+        stats["top_n"] = self.top_n
+        stats["min_endpoints"] = self.min_endpoints
+        return stats
+
+
+def build_query_text(user_query: str, user_intent: Dict[str, Any]) -> str:
+    """检索用的查询文本：用户原始输入 + 意图、操作与参数名"""
+    parts = [user_query or "", str(user_intent.get("intent") or "")]
+    parts.extend(str(op) for op in user_intent.get("required_operations") or [])
+    parts.extend(str(name) for name in (user_intent.get("entities") or {}))
+    return " ".join(part for part in parts if part)
+
+
+_endpoint_retriever: Optional[EndpointRetriever] = None
+
+
+def get_endpoint_retriever() -> EndpointRetriever:
+    """进程级单例，参数见 config.yml -> endpoint_retrieval"""
+    global _endpoint_retriever
+    if _endpoint_retriever is None:
+        retrieval_config = config.get("endpoint_retrieval", {}) or {}
+        _endpoint_retriever = EndpointRetriever(
+            top_n=retrieval_config.get("top_n", 30),
+            min_endpoints=retrieval_config.get("min_endpoints", 60),
+            max_text_length=retrieval_config.get("max_text_length", 512),
+            always_include=retrieval_config.get("always_include", []),
+            dimensions=retrieval_config.get("dimensions"),
+            enabled=retrieval_config.get("enabled", True),
+            failure_retry=retrieval_config.get("failure_retry", 60)
+        )
+    return _endpoint_retriever
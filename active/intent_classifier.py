@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from config.config import config
+
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_DATE = re.compile(r"\d{4}\s*[-/.年]\s*\d{1,2}\s*[-/.月]\s*\d{1,2}\s*[日号]?")
+# 术语后紧跟的参数值：有“为/是/=/:”时取到下一个标点为止，否则只取字母数字（如 用户123、编号 A-01）
+_EXPLICIT_VALUE = re.compile(r"\s*(?:为|是|=|:|：)\s*([^\s,，。;；!！?？、的]+)")
+_PLAIN_VALUE = re.compile(r"\s*([A-Za-z0-9][A-Za-z0-9_\-]*)")
+_WORD = re.compile(r"[a-z0-9]+|[一-鿿]")
+
+ACTION, OBJECT, PARAM = "action", "object", "param"
+
+
+def _normalize(query: str) -> str:
+    """历史匹配用的归一化：小写，数字统一为 0（同一句式不同编号视为同一查询）"""
+    return _NUMBER.sub("0", query.strip().lower())
+
+
+def _terms(text: str) -> Counter:
+    """字 / 英文词 一元组 + 相邻二元组，用于 TF-IDF"""
+    words = _WORD.findall(text)
+    terms = Counter(words)
+    terms.update(a + b for a, b in zip(words, words[1:]))
+    return terms
+
+
+class IntentHistory:
+    """
+    历史意图库：t_call_log 中大模型给出的意图分析结果
+
+    查询按字 / 二元组做 TF-IDF，新查询与历史查询的余弦相似度足够高、且数字个数一致时复用历史意图，
+    实体中与历史查询数字相同的值按位置替换为新查询中的数字（如 查询用户123的订单 → 查询用户456的订单）。
+    """
+
+    def __init__(self, limit: int = 2000, min_similarity: float = 0.9):
+        self.limit = max(int(limit), 0)
+        self.min_similarity = float(min_similarity)
+        self._examples: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._index: Optional[Tuple[Dict[str, List[Tuple[int, float]]], Dict[str, float], List[str]]] = None
+
+    def __len__(self):
+        return len(self._examples)
+
+    def __contains__(self, query: str) -> bool:
+        return _normalize(query) in self._examples
+
+    def add(self, query: str, intent: Dict[str, Any]):
+        if not self.limit or not query or intent.get("intent") in (None, "", "未知"):
+            return
+        key = _normalize(query)
+        self._examples.pop(key, None)
+        self._examples[key] = (query, intent)
+        while len(self._examples) > self.limit:
+            self._examples.popitem(last=False)
+        self._index = None
+
+    def _build(self):
+        keys = list(self._examples)
+        doc_terms = [_terms(key) for key in keys]
+        df = Counter(term for terms in doc_terms for term in terms)
+        idf = {term: math.log((1 + len(keys)) / (1 + count)) + 1 for term, count in df.items()}
+        postings: Dict[str, List[Tuple[int, float]]] = {}
+        for doc, terms in enumerate(doc_terms):
+            weights = {term: tf * idf[term] for term, tf in terms.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                postings.setdefault(term, []).append((doc, weight / norm))
+        self._index = (postings, idf, keys)
+
+    def match(self, query: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        if not self._examples:
+            return None
+        if self._index is None:
+            self._build()
+        postings, idf, keys = self._index
+        # 历史中未出现的词按最大 idf 计入查询范数，避免只有少数词命中时相似度虚高
+        max_idf = max(idf.values())
+        weights = {term: tf * idf.get(term, max_idf) for term, tf in _terms(_normalize(query)).items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        scores: Counter = Counter()
+        for term, weight in weights.items():
+            for doc, doc_weight in postings.get(term, ()):
+                scores[doc] += weight * doc_weight
+        if not scores:
+            return None
+        doc, score = scores.most_common(1)[0]
+        score /= norm
+        if score < self.min_similarity:
+            return None
+        past_query, past_intent = self._examples[keys[doc]]
+        past_numbers = _NUMBER.findall(past_query)
+        numbers = _NUMBER.findall(query)
+        if len(past_numbers) != len(numbers):
+            return None
+        mapping = dict(zip(past_numbers, numbers))
+        entities = {
+            name: mapping.get(value, value) if isinstance(value, str) else value
+            for name, value in (past_intent.get("entities") or {}).items()
+        }
+        result = {
+            "intent": past_intent.get("intent"),
+            "entities": entities,
+            "required_operations": list(past_intent.get("required_operations") or []),
+            "missing_info": list(past_intent.get("missing_info") or [])
+        }
+        return result, score
+
+
+class IntentClassifier:
+    """
+    本地意图识别（快速通道），置信度足够时跳过大模型意图分析
+
+    - 规则：按 ai_intent_analysis.common_intents（动作）、keyword_mappings / key_parameters（对象）、
+      parameter_patterns（参数标记）做最长匹配，抽取动作、对象与紧跟其后的参数值；出现多步骤连接词、
+      多个动作或查询过长时降低置信度
+    - 历史：规则置信度不足时，用 t_call_log 中大模型的历史意图做 TF-IDF 最近邻匹配
+    - 两者都不够置信时返回 None，由调用方走大模型；大模型成功的结果通过 learn() 加入历史库
+    """
+
+    def __init__(self, actions: List[str], keyword_mappings: Dict[str, List[str]],
+                 parameter_patterns: Dict[str, List[str]], key_parameters: List[str] = None,
+                 object_terms: List[str] = None, multi_step_markers: List[str] = None,
+                 min_confidence: float = 0.75, max_query_length: int = 40, enabled: bool = True,
+                 history: Optional[IntentHistory] = None):
+        self.enabled = enabled
+        self.min_confidence = float(min_confidence)
+        self.max_query_length = int(max_query_length)
+        self.multi_step_markers = [m for m in (multi_step_markers or []) if m]
+        self.object_terms = {term.strip() for term in object_terms or [] if term.strip()}
+        self.history = history or IntentHistory()
+        self.history_loaded = False
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._elapsed: Counter = Counter()
+
+        # 同一个词属于多类时：参数标记 > 对象 > 动作（如“日志”“通知”既在动作又在参数示例中，按对象处理）
+        action_set = set(actions)
+        vocabulary: Dict[str, Tuple[str, str]] = {}
+        for term in actions:
+            vocabulary[term] = (ACTION, term)
+        for canonical, synonyms in (keyword_mappings or {}).items():
+            kind = ACTION if canonical in action_set else OBJECT
+            for term in [canonical] + list(synonyms or []):
+                vocabulary[term] = (kind, canonical)
+        for term in list(key_parameters or []) + list(object_terms or []):
+            if term.strip():
+                vocabulary[term.strip()] = (OBJECT, term.strip())
+        for name, markers in (parameter_patterns or {}).items():
+            for term in markers or []:
+                vocabulary[term] = (PARAM, name)
+        self._vocabulary = {term.lower(): value for term, value in vocabulary.items()}
+        # 按长度降序组成交替式，re 在同一位置取第一个命中的分支，即最长匹配
+        alternatives = sorted(self._vocabulary, key=len, reverse=True)
+        self._pattern = re.compile("|".join(map(re.escape, alternatives)), re.IGNORECASE) if alternatives else None
+
+    def _match_rules(self, query: str) -> Tuple[Dict[str, Any], float]:
+        actions: List[str] = []
+        objects: List[str] = []
+        entities: Dict[str, Any] = {}
+        dangling = False
+        for match in self._pattern.finditer(query) if self._pattern else []:
+            kind, canonical = self._vocabulary[match.group(0).lower()]
+            if kind == ACTION:
+                if canonical not in actions:
+                    actions.append(canonical)
+                continue
+            if kind == OBJECT and canonical not in objects:
+                objects.append(canonical)
+            value = _EXPLICIT_VALUE.match(query, match.end()) or _PLAIN_VALUE.match(query, match.end())
+            if value:
+                entities.setdefault(canonical, value.group(1))
+            elif kind == PARAM:
+                dangling = True
+        date = _DATE.search(query)
+        if date:
+            entities["date"] = re.sub(r"\s+", "", date.group(0))
+
+        if not actions:
+            return {}, 0.0
+        action = actions[0]
+        confidence = 0.5
+        if objects:
+            confidence += 0.25
+        if entities:
+            confidence += 0.15
+        elif not dangling:
+            confidence += 0.05
+        if len(query) <= self.max_query_length:
+            confidence += 0.1
+        confidence -= 0.3 * (len(actions) - 1)
+        # 中文名词短语中心语在后（用户123的订单 → 订单），信息 / 详情等补充对象词只作修饰
+        heads = [obj for obj in objects if obj not in self.object_terms] or objects
+        result = {
+            "intent": action + "".join(heads[-1:]),
+            "entities": entities,
+            "required_operations": [action + obj for obj in objects] or [action],
+            "missing_info": []
+        }
+        return result, round(max(confidence, 0.0), 4)
+
+    def classify(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        返回置信度最高的候选意图（附 source / confidence 字段），无候选时返回 None；
+        是否采用由 accept() 判断
+        """
+        query = (query or "").strip()
+        if not query:
+            return None
+        if any(marker in query for marker in self.multi_step_markers):
+            return None
+        result, confidence = self._match_rules(query)
+        candidate = dict(result, source="rule", confidence=confidence) if result else None
+        if candidate is None or confidence < self.min_confidence:
+            matched = self.history.match(query)
+            if matched and (candidate is None or matched[1] > confidence):
+                candidate = dict(matched[0], source="history", confidence=round(matched[1], 4))
+        return candidate
+
+    def accept(self, candidate: Optional[Dict[str, Any]]) -> bool:
+        return self.enabled and candidate is not None and candidate["confidence"] >= self.min_confidence
+
+    def learn(self, query: str, intent: Dict[str, Any]):
+        """加入大模型给出的意图分析结果"""
+        if intent.get("source", "llm") == "llm":
+            self.history.add(query, intent)
+
+    def load_history(self, records: List[Dict[str, Any]]):
+        """
+        records 为新的在前的 {query, intent}（见 get_recent_intent_logs），快速通道自身的结果不回灌；
+        加载前已在进程内学习到的查询保留较新的结果
+        """
+        for record in reversed(records):
+            if record["query"] not in self.history:
+                self.learn(record["query"], record["intent"])
+        self.history_loaded = True
+
+    def record(self, source: str, elapsed: float):
+        with self._lock:
+            self._counts[source] += 1
+            self._elapsed[source] += elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            elapsed = dict(self._elapsed)
+        total = sum(counts.values())
+        local = counts.get("rule", 0) + counts.get("history", 0)
+        return {
+            "enabled": self.enabled,
+            "min_confidence": self.min_confidence,
+            "requests": total,
+            "counts": counts,
+            "without_llm_rate": round(local / total, 4) if total else 0.0,
+            "avg_ms": {source: round(elapsed[source] * 1000 / count, 3) for source, count in counts.items()},
+            "history_size": len(self.history)
+        }
+
+
+_intent_classifier: Optional[IntentClassifier] = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """进程级单例，参数见 config.yml -> intent_fast_path"""
+    global _intent_classifier
+    if _intent_classifier is None:
+        fast_config = config.get("intent_fast_path", {}) or {}
+        intent_config = config.get("ai_intent_analysis", {}) or {}
+        _intent_classifier = IntentClassifier(
+            actions=intent_config.get("common_intents", []),
+            keyword_mappings=config.get("keyword_mappings", {}) or {},
+            parameter_patterns=config.get("parameter_patterns", {}) or {},
+            key_parameters=intent_config.get("key_parameters", []),
+            object_terms=fast_config.get("object_terms", []),
+            multi_step_markers=fast_config.get("multi_step_markers", []),
+            min_confidence=fast_config.get("min_confidence", 0.75),
+            max_query_length=fast_config.get("max_query_length", 40),
+            enabled=fast_config.get("enabled", True),
+            history=IntentHistory(
+                limit=fast_config.get("history_limit", 2000),
+                min_similarity=fast_config.get("history_min_similarity", 0.9)
+            )
+        )
+    return _intent_classifier
+
+
+async def load_intent_history(classifier: Optional[IntentClassifier] = None):
+    """
+    启动时从 t_call_log 加载历史意图（数据库查询在线程池中执行，不阻塞事件循环）；
+    数据库不可用时只用规则和进程内学习到的结果
+    """
+    classifier = classifier or get_intent_classifier()
+    if not classifier.enabled or classifier.history_loaded or not classifier.history.limit:
+        return
+    classifier.history_loaded = True
+    try:
+        # 延迟导入：基准测试等离线场景不需要数据库
+        from repository.call_log_crud import get_recent_intent_logs
+        records = await asyncio.get_running_loop().run_in_executor(
+            None, get_recent_intent_logs, classifier.history.limit
+        )
+        classifier.load_history(records)
+        logging.info(f"[意图快速通道] 已加载历史意图 {len(classifier.history)} 条")
+    except Exception as e:
+        logging.warning(f"[意图快速通道] 加载历史意图失败：{e}")
@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from config.config import config
+from core.http_client import get_http_client
+from active.SwaggerParser import SwaggerParser
+
+
+class SwaggerCatalog:
+    """
+    Swagger 文档目录：按 URL 保存解析后的接口列表
+
+    - 持久化：SQLite（WAL 模式，多个 worker 共享同一文件），重启后无需重新拉取
+    - 进程内：保存接口列表对象，文档未变化时始终返回同一个列表（下游按对象复用预编译的提示词）
+    - 过期：距上次校验超过 ttl 秒时用 ETag / Last-Modified 发条件请求，304 只刷新校验时间；
+      其他 worker 刚校验过（数据库中的校验时间未过期）时直接采用，不再请求
+    - 拉取失败时继续使用旧数据，error_retry 秒后再尝试
+    """
+
+    def __init__(self, db_path: Optional[str] = "swagger_catalog.db", ttl: float = 300, error_retry: float = 30):
+        self.ttl = float(ttl)
+        self.error_retry = float(error_retry)
+        # url -> {"endpoints", "fingerprint", "etag", "last_modified", "fetched_at", "checked_at", "next_check"}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._url_locks: Dict[str, asyncio.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "shared_hits": 0, "not_modified": 0, "fetches": 0, "failures": 0, "stale_served": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path:
+            try:
+                db_dir = os.path.dirname(db_path)
+                if db_dir:
+                    os.makedirs(db_dir, exist_ok=True)
+                self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS swagger_catalog ("
+                    " url TEXT PRIMARY KEY, endpoints TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+                    " etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, checked_at REAL NOT NULL)"
+                )
+                self._conn.commit()
+            except Exception as e:
+                logging.error(f"[Swagger目录] 初始化持久化存储失败，仅使用进程内缓存: {e}")
+                self._conn = None
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _load_row(self, url: str) -> Optional[Dict[str, Any]]:
+        if self._conn is None:
+            return None
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT fingerprint, etag, last_modified, fetched_at, checked_at, endpoints FROM swagger_catalog WHERE url=?",
+                    (url,)
+                ).fetchone()
+        except Exception as e:
+            logging.error(f"[Swagger目录] 读取持久化记录失败: {e}")
+            return None
+        if row is None:
+            return None
+        fingerprint, etag, last_modified, fetched_at, checked_at, endpoints = row
+        return {"fingerprint": fingerprint, "etag": etag, "last_modified": last_modified,
+                "fetched_at": fetched_at, "checked_at": checked_at, "endpoints_json": endpoints}
+
+    def _save(self, url: str, entry: Dict[str, Any], endpoints_json: Optional[str] = None):
+        """endpoints_json 为空时只更新校验时间（304）"""
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                if endpoints_json is None:
+                    self._conn.execute("UPDATE swagger_catalog SET checked_at=? WHERE url=?", (entry["checked_at"], url))
+                else:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO swagger_catalog"
+                        " (url, endpoints, fingerprint, etag, last_modified, fetched_at, checked_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (url, endpoints_json, entry["fingerprint"], entry["etag"], entry["last_modified"],
+                         entry["fetched_at"], entry["checked_at"])
+                    )
+                self._conn.commit()
+        except Exception as e:
+            logging.error(f"[Swagger目录] 写入持久化记录失败: {e}")
+
+    def _adopt(self, url: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """采用数据库中的记录；接口列表指纹未变时保留进程内的列表对象"""
+        entry = self._entries.get(url)
+        if entry is None or entry["fingerprint"] != row["fingerprint"]:
+            endpoints = json.loads(row["endpoints_json"])
+        else:
+            endpoints = entry["endpoints"]
+        entry = {key: value for key, value in row.items() if key != "endpoints_json"}
+        entry["endpoints"] = endpoints
+        entry["next_check"] = row["checked_at"] + self.ttl
+        self._entries[url] = entry
+        return entry
+
+    async def _fetch(self, url: str, entry: Optional[Dict[str, Any]]) -> Tuple[int, Optional[Dict[str, Any]], Any]:
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        # 使用应用级共享连接池（与接口调用共用长连接和 DNS 缓存）
+        async with get_http_client().session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return 304, None, response.headers.copy()
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+            # 响应头保持大小写不敏感（ETag / Etag）
+            return response.status, data, response.headers.copy()
+
+    async def lookup(self, url: str, force: bool = False) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        返回 (接口列表, 来源)；来源为 memory / shared（其他 worker 刚校验过）/ not_modified / fetched /
+        stale（拉取失败，使用旧数据）/ failed（无可用数据，返回空列表）
+        """
+        now = time.time()
+        entry = self._entries.get(url)
+        if not force and entry is not None and now < entry["next_check"]:
+            self._count("memory_hits")
+            return entry["endpoints"], "memory"
+
+        lock = self._url_locks.setdefault(url, asyncio.Lock())
+        async with lock:
+            now = time.time()
+            entry = self._entries.get(url)
+            if not force and entry is not None and now < entry["next_check"]:
+                self._count("memory_hits")
+                return entry["endpoints"], "memory"
+
+            row = self._load_row(url)
+            if row is not None and (entry is None or row["checked_at"] > entry["checked_at"]):
+                entry = self._adopt(url, row)
+                if not force and now < entry["next_check"]:
+                    self._count("shared_hits")
+                    return entry["endpoints"], "shared"
+
+            try:
+                status, data, headers = await self._fetch(url, entry)
+            except Exception as e:
+                self._count("failures")
+                logging.error(f"[Swagger目录] 拉取 {url} 失败: {e}")
+                if entry is None:
+                    return [], "failed"
+                entry["next_check"] = now + self.error_retry
+                self._count("stale_served")
+                return entry["endpoints"], "stale"
+
+            if status == 304 and entry is not None:
+                entry["checked_at"] = now
+                entry["next_check"] = now + self.ttl
+                self._save(url, entry)
+                self._count("not_modified")
+                return entry["endpoints"], "not_modified"
+
+            endpoints = SwaggerParser.extract_endpoints(data) if isinstance(data, dict) else []
+            if not endpoints and entry is not None:
+                # 文档异常（非 JSON 对象或没有接口）时不覆盖已有数据
+                entry["next_check"] = now + self.error_retry
+                self._count("stale_served")
+                return entry["endpoints"], "stale"
+            endpoints_json = json.dumps(endpoints, ensure_ascii=False)
+            fingerprint = hashlib.sha256(endpoints_json.encode("utf-8")).hexdigest()
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                endpoints = entry["endpoints"]
+            entry = {
+                "endpoints": endpoints,
+                "fingerprint": fingerprint,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "fetched_at": now,
+                "checked_at": now,
+                "next_check": now + (self.ttl if endpoints else self.error_retry)
+            }
+            self._entries[url] = entry
+            if endpoints:
+                self._save(url, entry, endpoints_json)
+            self._count("fetches")
+            logging.info(f"[Swagger目录] 已拉取 {url}，共 {len(endpoints)} 个接口")
+            return endpoints, "fetched"
+
+    async def get(self, url: str, force: bool = False) -> List[Dict[str, Any]]:
+        return (await self.lookup(url, force))[0]
+
+    async def warm_up(self, urls: List[str]):
+        """启动时预加载（数据库中未过期的记录直接采用，不发请求）"""
+        results = await asyncio.gather(*(self.lookup(url) for url in urls), return_exceptions=True)
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                logging.error(f"[Swagger目录] 预加载 {url} 失败: {result}")
+            else:
+                logging.info(f"[Swagger目录] 预加载 {url}: {len(result[0])} 个接口（{result[1]}）")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["ttl"] = self.ttl
+        stats["persistent"] = self._conn is not None
+        stats["entries"] = {
+            url: {
+                "endpoints": len(entry["endpoints"]),
+                "etag": entry.get("etag"),
+                "last_modified": entry.get("last_modified"),
+                "fetched_at": entry.get("fetched_at"),
+                "checked_at": entry.get("checked_at")
+            }
+            for url, entry in list(self._entries.items())
+        }
+        return stats
+
+
+def configured_swagger_urls() -> List[str]:
+    """config.yml -> swagger_urls 中启用的文档地址"""
+    urls = []
+    for item in (config.get("swagger_urls", {}) or {}).values():
+        if isinstance(item, dict) and item.get("url") and item.get("enabled", True):
+            urls.append(item["url"])
+    return urls
+
+
+_swagger_catalog: Optional[SwaggerCatalog] = None
+
+
+def get_swagger_catalog() -> SwaggerCatalog:
+    """进程级单例，参数见 config.yml -> swagger_catalog"""
+    global _swagger_catalog
+    if _swagger_catalog is None:
+        catalog_config = config.get("swagger_catalog", {}) or {}
+        _swagger_catalog = SwaggerCatalog(
+            db_path=catalog_config.get("db_path", "swagger_catalog.db"),
+            ttl=catalog_config.get("ttl", 300),
+            error_retry=catalog_config.get("error_retry", 30)
+        )
+    return _swagger_catalog
@@ -0,0 +1,139 @@
+# core/http_client.py
+import asyncio
+import threading
+from collections import Counter
+from typing import Dict, Optional
+import aiohttp
+from core.logger import logger
+from config.config import config
+
+
+class HttpClientManager:
+    """
+    应用级共享的 aiohttp 客户端（下游业务接口调用、Swagger 文档拉取）
+
+    - 整个进程共用一个 ClientSession + TCPConnector：按 host 保持长连接（keep-alive），
+      DNS 结果按 ttl_dns_cache 缓存，避免每次调用重新握手、解析域名和协商 TLS
+    - 由 FastAPI lifespan 在启动时 start()、关闭时 close()；未启动时（脚本、测试）首次使用懒创建
+    - 通过 aiohttp TraceConfig 统计请求数、失败数、新建/复用连接数、DNS 缓存命中及各 host 的请求数
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 30, keepalive_timeout: float = 60,
+                 ttl_dns_cache: int = 300, timeout: float = 300, connect_timeout: Optional[float] = None):
+        self.limit = max(int(limit), 0)
+        self.limit_per_host = max(int(limit_per_host), 0)
+        self.keepalive_timeout = float(keepalive_timeout)
+        self.ttl_dns_cache = int(ttl_dns_cache)
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+        self._hosts: Counter = Counter()
+        self._in_flight = 0
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            with self._lock:
+                self._stats["requests"] += 1
+                self._hosts[params.url.host or ""] += 1
+                self._in_flight += 1
+
+        async def on_request_end(session, context, params):
+            with self._lock:
+                self._in_flight -= 1
+                if params.response.status >= 400:
+                    self._stats["http_errors"] += 1
+
+        async def on_request_exception(session, context, params):
+            with self._lock:
+                self._in_flight -= 1
+                self._stats["failures"] += 1
+                if isinstance(params.exception, asyncio.TimeoutError):
+                    self._stats["timeouts"] += 1
+
+        def counter(name: str):
+            async def on_event(session, context, params):
+                with self._lock:
+                    self._stats[name] += 1
+            return on_event
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_create_end.append(counter("connections_created"))
+        trace.on_connection_reuseconn.append(counter("connections_reused"))
+        trace.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        return trace
+
+    async def start(self) -> aiohttp.ClientSession:
+        """创建共享会话（lifespan 启动时调用，需在事件循环中执行）"""
+        return self.session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """共享会话；调用方直接 session.get / post，不要关闭它"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+                use_dns_cache=True
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout, trace_configs=[self._trace_config()]
+            )
+            logger.info(f"共享 HTTP 连接池已创建: limit={self.limit}, limit_per_host={self.limit_per_host}")
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats = {
+                name: self._stats[name]
+                for name in ("requests", "failures", "timeouts", "http_errors", "connections_created",
+                             "connections_reused", "dns_cache_hits", "dns_cache_misses")
+            }
+            stats["in_flight"] = self._in_flight
+            stats["hosts"] = dict(self._hosts)
+        connections = stats["connections_created"] + stats["connections_reused"]
+        stats["reuse_rate"] = round(stats["connections_reused"] / connections, 4) if connections else 0.0
+        stats["open"] = self._session is not None and not self._session.closed
+        stats["limits"] = {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "ttl_dns_cache": self.ttl_dns_cache
+        }
+        return stats
+
+
+_http_client: Optional[HttpClientManager] = None
+
+
+def get_http_client() -> HttpClientManager:
+    """进程级单例，连接池参数见 config.yml -> http_client"""
+    global _http_client
+    if _http_client is None:
+        client_config = config.get("http_client", {}) or {}
+        _http_client = HttpClientManager(
+            limit=client_config.get("limit", 100),
+            limit_per_host=client_config.get("limit_per_host", 30),
+            keepalive_timeout=client_config.get("keepalive_timeout", 60),
+            ttl_dns_cache=client_config.get("ttl_dns_cache", 300),
+            timeout=client_config.get("timeout", 300),
+            connect_timeout=client_config.get("connect_timeout")
+        )
+    return _http_client
+
+
+async def close_http_client():
+    if _http_client is not None:
+        await _http_client.close()
@@ -7,9 +7,13 @@ import uuid
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from active.SwaggerParser import SwaggerParser
 from active.endpoint_matcher import analyze_user_intent, match_endpoints_with_ai, execute_api_call, analyze_api_error_and_retry
+from active.intent_classifier import get_intent_classifier
+from active.endpoint_retriever import get_endpoint_retriever, build_query_text
+from active.endpoint_prompts import get_endpoint_prompt_cache
+from active.swagger_catalog import get_swagger_catalog
 from model.com_model import AskRequest, StandardResponse, ResponseCode
+from core.http_client import get_http_client
 from model.openAI import chat_completion
 from repository.call_log_crud import insert_call_log, delete_call_logs_by_request_id
 from repository.entity.sql_entity import t_call_log
@@ -90,9 +94,6 @@ async def ask_gpt_base(request: AskRequest):
 '''
 
 
-# 全局缓存Swagger文档
-SWAGGER_CACHE = {}
-
 
 @router.post("/active/chat")
 async def chat_with_ai(request: ChatRequest):
@@ -152,16 +153,16 @@ async def chat_with_ai(request: ChatRequest):
         
         stage_start = time.time()
         swagger_url = request.swagger_url or "http://localhost:9876/v3/api-docs"
-        if swagger_url in SWAGGER_CACHE:
-            endpoints = SWAGGER_CACHE[swagger_url]
-            logging.info(f"  使用缓存的Swagger文档，共{len(endpoints)}个接口")
-            cache_used = True
-        else:
-            endpoints = await SwaggerParser.parse_swagger(swagger_url)
-            SWAGGER_CACHE[swagger_url] = endpoints
-            logging.info(f"  解析完成，共找到{len(endpoints)}个接口")
-            cache_used = False
+        # Swagger 目录：按 URL 持久化解析结果，过期后按 ETag / Last-Modified 校验，多个 worker 共享
+        endpoints, catalog_source = await get_swagger_catalog().lookup(swagger_url)
+        cache_used = catalog_source != "fetched"
+        if catalog_source == "fetched":
+            # 新文档加载时即建立接口向量索引（接口较少时不建立）
+            await get_endpoint_retriever().build(swagger_url, endpoints)
+        logging.info(f"  Swagger文档来源: {catalog_source}，共{len(endpoints)}个接口")
             
+        # 预编译提示词中的接口描述（接口列表不变时复用），匹配与重试都不再逐个格式化
+        prompts = get_endpoint_prompt_cache().get(swagger_url, endpoints)
         stage_time = int((time.time() - stage_start) * 1000)
         
         # 记录Swagger解析日志
@@ -170,8 +171,12 @@ async def chat_with_ai(request: ChatRequest):
             stage="swagger_parsing",
             step_order=2,
             operation="解析Swagger文档",
-            input_data=json.dumps({"swagger_url": swagger_url, "cache_used": cache_used}, ensure_ascii=False),
-            output_data=json.dumps({"endpoint_count": len(endpoints)}, ensure_ascii=False),
+            input_data=json.dumps({"swagger_url": swagger_url, "cache_used": cache_used, "catalog_source": catalog_source}, ensure_ascii=False),
+            output_data=json.dumps({
+                "endpoint_count": len(endpoints),
+                "prompt_version": prompts.version,
+                "prompt_tokens": prompts.total_tokens
+            }, ensure_ascii=False),
             status="success",
             execution_time=stage_time
         )
@@ -192,8 +197,17 @@ async def chat_with_ai(request: ChatRequest):
         logging.info("=" * 60)
         
         stage_start = time.time()
-        match_result = await match_endpoints_with_ai(user_intent, endpoints)
+        # 接口较多时先按向量相似度预检索，只把候选接口交给大模型
+        candidates = await get_endpoint_retriever().retrieve(
+            swagger_url, endpoints, build_query_text(request.query, user_intent)
+        )
+        if candidates is not None:
+            logging.info(f"  接口预检索: {len(endpoints)} 个接口中选出 {len(candidates)} 个候选")
+        match_result = await match_endpoints_with_ai(user_intent, endpoints, candidates, prompts)
         stage_time = int((time.time() - stage_start) * 1000)
+        # 与提示词一致：按 max_endpoint_tokens 预算计算实际发送的接口
+        sent_rows = prompts.select(candidates, get_endpoint_prompt_cache().max_tokens, log=False)
+        candidates_count = len(candidates) if candidates is not None else len(endpoints)
         
         # 记录接口匹配日志
         matching_log = t_call_log(
@@ -201,7 +215,15 @@ async def chat_with_ai(request: ChatRequest):
             stage="endpoint_matching",
             step_order=3,
             operation="AI匹配接口",
-            input_data=json.dumps({"user_intent": user_intent, "endpoints_count": len(endpoints)}, ensure_ascii=False),
+            input_data=json.dumps({
+                "user_intent": user_intent,
+                "endpoints_count": len(endpoints),
+                "candidates_count": candidates_count,
+                "endpoints_sent": len(sent_rows),
+                "endpoints_dropped": candidates_count - len(sent_rows),
+                "prompt_version": prompts.version,
+                "endpoint_tokens": prompts.count_tokens(sent_rows)
+            }, ensure_ascii=False),
             output_data=json.dumps(match_result, ensure_ascii=False),
             status="success",
             execution_time=stage_time
@@ -309,7 +331,7 @@ async def chat_with_ai(request: ChatRequest):
                     
                     # 进行错误分析和重试 (4.n.5)
                     retry_start = time.time()
-                    retry_result = await analyze_api_error_and_retry(endpoint, params, result, endpoints, request.api_url, auth_headers)
+                    retry_result = await analyze_api_error_and_retry(endpoint, params, result, endpoints, request.api_url, auth_headers, candidates, prompts)
                     retry_time = int((time.time() - retry_start) * 1000)
                     
                     # 更新重试计数
@@ -468,13 +490,44 @@ async def chat_with_ai(request: ChatRequest):
 
 @router.post("/active/load-swagger")
 async def load_swagger(swagger_url: str):
-    """专门加载Swagger文档"""
+    """专门加载Swagger文档（强制重新校验，结果写入 Swagger 目录，聊天接口按同一 URL 直接使用）"""
 
-    endpoints = await SwaggerParser.parse_swagger(swagger_url)
-    SWAGGER_CACHE["latest"] = endpoints
+    endpoints = await get_swagger_catalog().get(swagger_url, force=True)
+    await get_endpoint_retriever().build(swagger_url, endpoints)
+    get_endpoint_prompt_cache().get(swagger_url, endpoints)
     return {"count": len(endpoints), "endpoints": endpoints[:5]}  # 只返回前5个示例
 
 
+@router.get("/active/http-client/stats")
+async def http_client_stats():
+    """下游接口调用共享连接池的统计（请求数、失败数、连接复用率、各 host 请求数）及连接池上限，用于监控"""
+    return get_http_client().stats()
+
+
+@router.get("/active/intent/stats")
+async def intent_fast_path_stats():
+    """意图识别快速通道统计：各来源（rule / history / llm / llm_failed）次数、平均耗时及未调用大模型的占比"""
+    return get_intent_classifier().stats()
+
+
+@router.get("/active/endpoint-retrieval/stats")
+async def endpoint_retrieval_stats():
+    """接口预检索统计：检索次数、回退为全部接口的次数、发送给大模型的接口占比及各文档的索引规模"""
+    return get_endpoint_retriever().stats()
+
+
+@router.get("/active/endpoint-prompts/stats")
+async def endpoint_prompts_stats():
+    """各 Swagger 文档预编译接口描述的接口数、估算 token 数与版本，以及提示词中接口列表的 token 预算"""
+    return get_endpoint_prompt_cache().stats()
+
+
+@router.get("/active/swagger-catalog/stats")
+async def swagger_catalog_stats():
+    """Swagger 目录统计：命中 / 条件请求 / 拉取 / 失败次数，以及各文档的接口数、ETag 与最近校验时间"""
+    return get_swagger_catalog().stats()
+
+
 '''
 ====================自定义工作流=======================================
 '''
\ No newline at end of file
@@ -1,14 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-import asyncio
 import os
-import re
-import hashlib
 from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
-from dto.embedding_model import EmbeddingRequest, EmbeddingResponse, EmbeddingItem, DocumentSearchRequest, DocumentSearchResponse, DocumentSearchResult
-from model import get_embedding_model, TextEmbeddingModel
+from starlette.concurrency import run_in_threadpool
+from dto.embedding_model import EmbeddingRequest, EmbeddingResponse, EmbeddingItem, EmbeddingUsageInfo, DocumentSearchRequest, DocumentSearchResponse, DocumentSearchResult, DocumentBatchSearchRequest, DocumentBatchSearchResponse, DocumentBatchSearchItem
+from model import get_embedding_model, get_embedding_usage, TextEmbeddingModel, EmbeddingUsage
+from model.embedding_cache import get_embedding_cache
 from core.logger import logger
-from Embedding.document_embedding_model import DocumentEmbeddingService
+from config.config import config
+from Embedding.document_embedding_model import DocumentEmbeddingService, RETRIEVAL_MODES, unique_grouped_chunks
+from Embedding.ingest_job import get_ingest_job_manager
+from Embedding.search_cache import get_search_result_cache
 from sqlalchemy.orm import Session
 from core.dependencies import get_db
 
@@ -44,13 +46,15 @@ class JavaDocumentChunkEmbeddingResponse(BaseModel):
     chunk_size: Optional[int] = None
     overlap: Optional[int] = None
     chunks: List[JavaDocumentChunkEmbeddingItem] = []
+    usage: Optional[EmbeddingUsageInfo] = None
     error: Optional[str] = None
 
 
 @router.post("/generate", response_model=EmbeddingResponse)
 async def generate_embedding(
     request: EmbeddingRequest, 
-    embedding_model: TextEmbeddingModel = Depends(get_embedding_model)
+    embedding_model: TextEmbeddingModel = Depends(get_embedding_model),
+    usage: EmbeddingUsage = Depends(get_embedding_usage)
 ):
     """
     生成文本嵌入向量
@@ -65,48 +69,33 @@ async def generate_embedding(
         
         # 用于存储结果的列表
         results = []
-        total_tokens = 0
         overall_success = True
         overall_error = None
-        
-        # 逐个处理文本
-        for text in texts:
-            try:
-                # 生成单个文本的嵌入向量
-                result = embedding_model.embed_text(
-                    input_text=text,
-                    model=request.model,
-                    dimensions=request.dimensions
-                )
-                
-                if result and result["success"]:
-                    # 添加到结果中
-                    embedding_item = EmbeddingItem(
-                        text=text,
-                        embedding=result["embedding"]
-                    )
-                    results.append(embedding_item)
-                    # 累计token数
-                    if "total_tokens" in result:
-                        total_tokens += result["total_tokens"]
-                else:
-                    # 如果有任何一个失败，整体标记为失败
-                    overall_success = False
-                    overall_error = result.get("error", "未知错误") if result else "API调用失败"
-                    # 即使失败也继续处理其他文本
-                    
-            except Exception as e:
-                logger.error(f"处理文本 '{text}' 时发生错误: {str(e)}")
+
+        # 批量生成嵌入向量（按服务端单次请求上限打包，结果与输入顺序一致）
+        embed_result = await embedding_model.embed_many_async(
+            texts,
+            model=request.model,
+            dimensions=request.dimensions,
+            usage=usage
+        )
+
+        for i, (text, embedding) in enumerate(zip(texts, embed_result["embeddings"])):
+            if embedding:
+                results.append(EmbeddingItem(text=text, embedding=embedding))
+            else:
+                # 如果有任何一个失败，整体标记为失败，但仍返回其他成功的文本
                 overall_success = False
-                overall_error = str(e)
-                # 即使失败也继续处理其他文本
-        
+                overall_error = embed_result["errors"].get(i, "未知错误")
+                logger.error(f"处理文本 '{text}' 时发生错误: {overall_error}")
+
         # 构建响应
         response = EmbeddingResponse(
             success=overall_success,
             embeddings=results,
             model=request.model,
-            total_tokens=total_tokens,
+            total_tokens=usage.total_tokens,
+            usage=EmbeddingUsageInfo(**usage.to_dict()),
             error=overall_error
         )
         
@@ -118,6 +107,18 @@ async def generate_embedding(
         raise HTTPException(status_code=500, detail=f"生成嵌入向量失败: {str(e)}")
 
 
+@router.get("/cache/stats")
+async def embedding_cache_stats():
+    """
+    向量缓存命中统计（内存 LRU + SQLite 持久化）及检索结果缓存统计（result_cache），用于监控
+    """
+    cache = get_embedding_cache()
+    result_cache = get_search_result_cache()
+    stats = {"enabled": False} if cache is None else {"enabled": True, **cache.stats()}
+    stats["result_cache"] = {"enabled": False} if result_cache is None else {"enabled": True, **result_cache.stats()}
+    return stats
+
+
 @router.post("/java/document/chunk-embed", response_model=JavaDocumentChunkEmbeddingResponse)
 async def java_document_chunk_embed(
     file: UploadFile = File(...),
@@ -126,7 +127,8 @@ async def java_document_chunk_embed(
     model: Optional[str] = None,
     dimensions: Optional[int] = None,
     db: Session = Depends(get_db),
-    embedding_model: TextEmbeddingModel = Depends(get_embedding_model)
+    embedding_model: TextEmbeddingModel = Depends(get_embedding_model),
+    usage: EmbeddingUsage = Depends(get_embedding_usage)
 ):
     """Java 调用专用：上传文件 -> 文档切分 -> 每个 chunk 生成向量 -> 返回向量。
 
@@ -161,25 +163,14 @@ async def java_document_chunk_embed(
             )
 
             # Step 5: 对齐入库逻辑的去重：归一化文本 + SHA256
-            def normalize_for_hash(text: str) -> str:
-                return re.sub(r"\s+", " ", text or "").strip()
+            unique_chunks = unique_grouped_chunks(grouped_chunks)
 
-            seen_hashes: set[str] = set()
+            # Step 6: 批量生成向量（按服务端单次请求上限打包），并返回（不写库）
+            embed_result = await embedding_model.embed_many_async(
+                [chunk for _, chunk, _ in unique_chunks], model=model, dimensions=dimensions, usage=usage
+            )
             items: List[JavaDocumentChunkEmbeddingItem] = []
-
-            # Step 6: 逐 chunk 生成向量，并返回（不写库）
-            for item in grouped_chunks:
-                chunk = str(item.get("content", "") or "").strip()
-                if not chunk:
-                    continue
-
-                normalized = normalize_for_hash(chunk)
-                content_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
-                if content_hash in seen_hashes:
-                    continue
-                seen_hashes.add(content_hash)
-
-                embedding = embedding_model.get_embedding_vector(chunk, model=model, dimensions=dimensions)
+            for (item, chunk, content_hash), embedding in zip(unique_chunks, embed_result["embeddings"]):
                 if not embedding:
                     continue
 
@@ -199,6 +190,7 @@ async def java_document_chunk_embed(
                 chunk_size=chunk_size,
                 overlap=overlap,
                 chunks=items,
+                usage=EmbeddingUsageInfo(**usage.to_dict()),
                 error=None
             )
         finally:
@@ -225,7 +217,7 @@ async def java_text_embed(
         if not text:
             raise HTTPException(status_code=400, detail="text 不能为空")
 
-        embedding = embedding_model.get_embedding_vector(text, model=model, dimensions=dimensions)
+        embedding = await embedding_model.get_embedding_vector_async(text, model=model, dimensions=dimensions)
         if not embedding:
             return JavaTextEmbeddingResponse(success=False, error="生成向量失败")
 
@@ -240,7 +232,8 @@ async def java_text_embed(
 @router.post("/batch-generate", response_model=EmbeddingResponse)
 async def batch_generate_embedding(
     request: EmbeddingRequest, 
-    embedding_model: TextEmbeddingModel = Depends(get_embedding_model)
+    embedding_model: TextEmbeddingModel = Depends(get_embedding_model),
+    usage: EmbeddingUsage = Depends(get_embedding_usage)
 ):
     """
     批量生成文本嵌入向量（异步版本）
@@ -253,56 +246,33 @@ async def batch_generate_embedding(
         # 如果输入是单个文本，转换为列表
         texts = request.texts if isinstance(request.texts, list) else [request.texts]
         
-        # 并发处理多个文本（注意：根据API限制调整并发数）
-        semaphore = asyncio.Semaphore(5)  # 限制并发数为5
-        
-        async def process_text(text: str):
-            async with semaphore:
-                try:
-                    result = embedding_model.embed_text(
-                        input_text=text,
-                        model=request.model,
-                        dimensions=request.dimensions
-                    )
-                    
-                    if result and result["success"]:
-                        return EmbeddingItem(
-                            text=text,
-                            embedding=result["embedding"]
-                        )
-                    else:
-                        return None  # 对于批量处理，我们只返回成功的项目
-                except Exception as e:
-                    logger.error(f"异步处理文本 '{text}' 时发生错误: {str(e)}")
-                    return None
-        
-        # 并发处理所有文本
-        tasks = [process_text(text) for text in texts]
-        results = await asyncio.gather(*tasks)
+        # 按服务端单次请求上限打包，各批次并发请求（并发上限见 embedding.async_client.concurrency），
+        # token 数直接取自这次调用的返回值，不再为统计用量重复请求
+        embed_result = await embedding_model.embed_many_async(
+            texts,
+            model=request.model,
+            dimensions=request.dimensions,
+            usage=usage
+        )
         
-        # 过滤掉None值（失败的项目）
-        successful_results = [item for item in results if item is not None]
+        # 对于批量处理，我们只返回成功的项目
+        successful_results = [
+            EmbeddingItem(text=text, embedding=embedding)
+            for text, embedding in zip(texts, embed_result["embeddings"])
+            if embedding
+        ]
+        for i, error in embed_result["errors"].items():
+            logger.error(f"异步处理文本 '{texts[i]}' 时发生错误: {error}")
         
         # 检查是否有成功的项目
         overall_success = len(successful_results) > 0
         
-        # 计算总token数
-        total_tokens = 0
-        for item in successful_results:
-            # 重新获取token数，因为并发处理时无法直接获取
-            temp_result = embedding_model.embed_text(
-                input_text=item.text, 
-                model=request.model,
-                dimensions=request.dimensions
-            )
-            if temp_result and "total_tokens" in temp_result:
-                total_tokens += temp_result["total_tokens"]
-        
         response = EmbeddingResponse(
             success=overall_success,
             embeddings=successful_results,
             model=request.model,
-            total_tokens=total_tokens,
+            total_tokens=usage.total_tokens,
+            usage=EmbeddingUsageInfo(**usage.to_dict()),
             error=None if overall_success else "所有文本处理都失败了"
         )
         
@@ -322,17 +292,37 @@ async def upload_document(
     org_code: str = "",
     chunk_size: int = 512,
     overlap: int = 50,
+    background: bool = True,
+    incremental: bool = False,
     db: Session = Depends(get_db),
-    embedding_model: TextEmbeddingModel = Depends(get_embedding_model)
+    embedding_model: TextEmbeddingModel = Depends(get_embedding_model),
+    usage: EmbeddingUsage = Depends(get_embedding_usage)
 ):
     """
     上传文档并生成向量
+
+    默认（background=true）只保存文件并登记入库任务，立即返回 job_id，
+    通过 /document/jobs/{job_id} 查询进度；background=false 时在请求内同步处理完再返回。
+
+    incremental=true 时按文件名 + org_code 增量更新已入库的同名文档：只向量化新增内容，删除已不存在的 chunk。
     """
     try:
         # 验证文件类型
         file_ext = os.path.splitext(file.filename)[1].lower()
         if file_ext not in ['.txt', '.pdf', '.doc', '.docx']:
             raise HTTPException(status_code=400, detail="不支持的文件类型，仅支持txt、pdf、doc、docx")
+
+        if background:
+            job = await run_in_threadpool(
+                get_ingest_job_manager().submit,
+                file.file, file.filename, doc_type, doc_subject, org_code, chunk_size, overlap, incremental
+            )
+            return {
+                "success": True,
+                "message": "文档已进入后台入库队列",
+                "job_id": job["job_id"],
+                "job": _job_view(job)
+            }
         
         # 保存上传的文件到临时位置
         temp_file_path = f"temp_{file.filename}"
@@ -341,19 +331,23 @@ async def upload_document(
         
         try:
             # 创建文档向量服务
-            doc_service = DocumentEmbeddingService(db, embedding_model)
+            doc_service = DocumentEmbeddingService(db, embedding_model, usage=usage)
             
-            # 处理文档并保存向量
-            saved_embeddings = doc_service.process_and_save_document(
-                temp_file_path, doc_type, doc_subject, org_code, chunk_size, overlap
+            # 处理文档并保存向量（解析/切分/入库均为同步操作，放到线程池执行，避免阻塞事件循环）
+            saved_count = await run_in_threadpool(
+                doc_service.process_and_save_document,
+                temp_file_path, doc_type, doc_subject, org_code, chunk_size, overlap,
+                source_name=file.filename,
+                incremental=incremental
             )
             
-            logger.info(f"成功处理文档，生成 {len(saved_embeddings)} 个向量片段")
+            logger.info(f"成功处理文档，生成 {saved_count} 个向量片段")
             
             return {
                 "success": True,
-                "message": f"成功处理文档，生成 {len(saved_embeddings)} 个向量片段",
-                "count": len(saved_embeddings)
+                "message": f"成功处理文档，生成 {saved_count} 个向量片段",
+                "count": saved_count,
+                "usage": usage.to_dict()
             }
         finally:
             # 删除临时文件
@@ -365,65 +359,246 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=f"上传文档失败: {str(e)}")
 
 
+@router.post("/document/upload/batch")
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    doc_type: str = "",
+    doc_subject: str = "",
+    org_code: str = "",
+    chunk_size: int = 512,
+    overlap: int = 50,
+    incremental: bool = False
+):
+    """
+    批量上传文档：每个文件登记为一个后台入库任务，多个文件由任务线程池并行解析与入库
+    """
+    for file in files:
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        if file_ext not in ['.txt', '.pdf', '.doc', '.docx']:
+            raise HTTPException(status_code=400, detail=f"不支持的文件类型: {file.filename}，仅支持txt、pdf、doc、docx")
+
+    try:
+        manager = get_ingest_job_manager()
+        jobs = []
+        for file in files:
+            job = await run_in_threadpool(
+                manager.submit, file.file, file.filename, doc_type, doc_subject, org_code, chunk_size, overlap, incremental
+            )
+            jobs.append(_job_view(job))
+        return {
+            "success": True,
+            "message": f"{len(jobs)} 个文档已进入后台入库队列",
+            "job_ids": [job["job_id"] for job in jobs],
+            "jobs": jobs
+        }
+    except Exception as e:
+        logger.error(f"批量上传文档时发生错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"批量上传文档失败: {str(e)}")
+
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """任务信息对外视图（不暴露服务器文件路径）"""
+    return {k: v for k, v in job.items() if k != "file_path"}
+
+
+@router.get("/document/jobs")
+async def list_ingest_jobs(org_code: Optional[str] = None, limit: int = 50):
+    """
+    查询最近的文档入库任务
+    """
+    jobs = get_ingest_job_manager().store.list(org_code=org_code, limit=limit)
+    return {"success": True, "jobs": [_job_view(job) for job in jobs]}
+
+
+@router.get("/document/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """
+    查询文档入库任务进度（chunks_parsed / chunks_embedded / chunks_stored）
+    """
+    job = get_ingest_job_manager().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"success": True, "job": _job_view(job)}
+
+
+@router.post("/document/jobs/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str):
+    """
+    取消文档入库任务：排队中的任务立即取消，运行中的任务在当前批次提交后停止（已提交的批次保留）
+    """
+    job = get_ingest_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"success": True, "job": _job_view(job)}
+
+
+def _search_result(doc_emb, similarity: float) -> DocumentSearchResult:
+    return DocumentSearchResult(
+        id=doc_emb.id,
+        doc_type=doc_emb.doc_type,
+        doc_subject=doc_emb.doc_subject,
+        source_name=getattr(doc_emb, "source_name", None),
+        section=getattr(doc_emb, "section", None),
+        chunk_index=getattr(doc_emb, "chunk_index", None),
+        similarity=similarity,
+        embedding_content=doc_emb.content[:100] + "..." if doc_emb.content and len(doc_emb.content) > 100 else (doc_emb.content or doc_emb.doc_subject)
+    )
+
+
 @router.post("/document/search", response_model=DocumentSearchResponse)
 async def search_documents(
     request: DocumentSearchRequest,
     db: Session = Depends(get_db),
-    embedding_model: TextEmbeddingModel = Depends(get_embedding_model)
+    embedding_model: TextEmbeddingModel = Depends(get_embedding_model),
+    usage: EmbeddingUsage = Depends(get_embedding_usage)
 ):
     """
     搜索相似文档
     """
     try:
         # 创建文档向量服务
-        doc_service = DocumentEmbeddingService(db, embedding_model)
+        doc_service = DocumentEmbeddingService(db, embedding_model, usage=usage)
         
-        # 搜索相似文档
-        # 先扩大候选集，再做“按 section 限流”，避免单一章节霸榜导致结果重复
-        candidate_k = max(int(request.top_k or 10) * 5, int(request.top_k or 10))
-        similarities = doc_service.search_similar_documents(
-            request.query, request.org_code, candidate_k
+        mode = (request.mode or "vector").lower()
+        if mode not in RETRIEVAL_MODES:
+            raise HTTPException(status_code=400, detail=f"不支持的检索方式: {request.mode}，可选 {', '.join(RETRIEVAL_MODES)}")
+
+        # 结果缓存命中时直接按 id 回表，不再生成查询向量和检索（组织有新入库时自动失效）
+        top_k = int(request.top_k or 10)
+        filters = {"doc_type": request.doc_type, "doc_subject": request.doc_subject, "source_name": request.source_name}
+        options = doc_service.search_options(request.per_section_limit, request.mmr_lambda, filters, mode)
+        # 检索、索引构建（IVF 训练 / BM25 / 分片导出）与回表都是同步阻塞操作，放到线程池执行，避免阻塞事件循环
+        filtered_similarities, snapshot = await run_in_threadpool(
+            doc_service.get_cached_results, request.query, request.org_code, top_k, options
         )
-        
-        # 按 section 限流：每个 section 最多返回 N 条（工业常规做法，用于提升结果多样性）
-        per_section_limit = 2
-        section_counts = {}
-        filtered_similarities = []
-        for doc_emb, similarity in similarities:
-            sec = (doc_emb.section or "").strip() or "(no_section)"
-            count = section_counts.get(sec, 0)
-            if count >= per_section_limit:
-                continue
-            section_counts[sec] = count + 1
-            filtered_similarities.append((doc_emb, similarity))
-            if len(filtered_similarities) >= int(request.top_k or 10):
-                break
+        if filtered_similarities is None:
+            if mode == "keyword":
+                # 仅关键词检索：BM25 倒排索引，不调用嵌入接口
+                filtered_similarities = await run_in_threadpool(
+                    doc_service.search_keyword_documents,
+                    request.query, request.org_code, top_k, per_section_limit=request.per_section_limit, filters=filters
+                )
+                doc_service.cache_results(request.query, request.org_code, top_k, snapshot, filtered_similarities, options)
+            else:
+                # 搜索相似文档：元数据过滤、按 section 限流（默认每个 section 最多 2 条）和 MMR 重排都在索引内完成，
+                # 数据足够时保证返回 top_k 条，只按最终结果的 id 回表
+                query_vector = await embedding_model.get_embedding_vector_async(request.query, usage=usage)
+                if mode == "hybrid":
+                    # 混合检索：向量与 BM25 关键词结果按倒数排名融合，查询向量生成失败时只用关键词结果
+                    filtered_similarities = await run_in_threadpool(
+                        doc_service.search_hybrid_documents,
+                        request.query, request.org_code, top_k, query_vector=query_vector or [],
+                        per_section_limit=request.per_section_limit, filters=filters
+                    )
+                    if query_vector:
+                        doc_service.cache_results(request.query, request.org_code, top_k, snapshot, filtered_similarities, options)
+                elif not query_vector:
+                    logger.error("生成查询向量失败")
+                    filtered_similarities = []
+                else:
+                    filtered_similarities = await run_in_threadpool(
+                        doc_service.search_similar_documents,
+                        request.query, request.org_code, top_k, query_vector=query_vector,
+                        per_section_limit=request.per_section_limit, mmr_lambda=request.mmr_lambda, filters=filters
+                    )
+                    doc_service.cache_results(request.query, request.org_code, top_k, snapshot, filtered_similarities, options)
         
         # 构建响应
-        results = []
-        for doc_emb, similarity in filtered_similarities:
-            result = DocumentSearchResult(
-                id=doc_emb.id,
-                doc_type=doc_emb.doc_type,
-                doc_subject=doc_emb.doc_subject,
-                source_name=getattr(doc_emb, "source_name", None),
-                section=getattr(doc_emb, "section", None),
-                chunk_index=getattr(doc_emb, "chunk_index", None),
-                similarity=similarity,
-                embedding_content=doc_emb.content[:100] + "..." if doc_emb.content and len(doc_emb.content) > 100 else (doc_emb.content or doc_emb.doc_subject)
-            )
-            results.append(result)
+        results = [_search_result(doc_emb, similarity) for doc_emb, similarity in filtered_similarities]
         
         response = DocumentSearchResponse(
             success=True,
             results=results,
             query=request.query,
-            org_code=request.org_code
+            org_code=request.org_code,
+            usage=EmbeddingUsageInfo(**usage.to_dict())
         )
         
         logger.info(f"文档搜索完成，返回 {len(results)} 个结果")
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"搜索文档时发生错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"搜索文档失败: {str(e)}")
+
+
+@router.post("/document/search/batch", response_model=DocumentBatchSearchResponse)
+async def search_documents_batch(
+    request: DocumentBatchSearchRequest,
+    db: Session = Depends(get_db),
+    embedding_model: TextEmbeddingModel = Depends(get_embedding_model),
+    usage: EmbeddingUsage = Depends(get_embedding_usage)
+):
+    """
+    批量搜索相似文档：一次请求多个查询，检索参数同 /document/search
+
+    未命中结果缓存的查询一次批量生成查询向量，组织索引只同步一次，
+    全部查询向量与组织向量矩阵做一次矩阵乘法，最后合并为一次回表
+    """
+    try:
+        mode = (request.mode or "vector").lower()
+        if mode not in RETRIEVAL_MODES:
+            raise HTTPException(status_code=400, detail=f"不支持的检索方式: {request.mode}，可选 {', '.join(RETRIEVAL_MODES)}")
+        queries = list(request.queries or [])
+        if not queries:
+            raise HTTPException(status_code=400, detail="queries 不能为空")
+        max_queries = int(config.get("vector_search.batch_max_queries", 64) or 64)
+        if len(queries) > max_queries:
+            raise HTTPException(status_code=400, detail=f"单次最多 {max_queries} 个查询，当前 {len(queries)} 个")
+
+        doc_service = DocumentEmbeddingService(db, embedding_model, usage=usage)
+        top_k = int(request.top_k or 10)
+        filters = {"doc_type": request.doc_type, "doc_subject": request.doc_subject, "source_name": request.source_name}
+        options = doc_service.search_options(request.per_section_limit, request.mmr_lambda, filters, mode)
+        # 缓存快照查询、检索（含索引构建）与回表放到线程池执行，避免阻塞事件循环
+        scored, snapshot = await run_in_threadpool(doc_service.get_cached_ids_batch, queries, request.org_code, top_k, options)
+
+        errors: Dict[int, str] = {}
+        missing = [i for i, hits in enumerate(scored) if hits is None]
+        if missing:
+            missing_queries = [queries[i] for i in missing]
+            query_vectors = None
+            if mode != "keyword":
+                # 未命中缓存的查询一次批量生成向量（按服务端单次请求上限打包）
+                embed_result = await embedding_model.embed_many_async(missing_queries, usage=usage)
+                query_vectors = embed_result["embeddings"]
+                for j, error in embed_result["errors"].items():
+                    errors[missing[j]] = f"生成查询向量失败: {error}"
+                    logger.error(f"批量搜索生成查询向量失败: query='{missing_queries[j]}', error={error}")
+            found = await run_in_threadpool(
+                doc_service.search_documents_batch,
+                missing_queries, request.org_code, top_k, query_vectors=query_vectors,
+                per_section_limit=request.per_section_limit, mmr_lambda=request.mmr_lambda, filters=filters, mode=mode
+            )
+            for i, hits in zip(missing, found):
+                scored[i] = hits
+            # 查询向量生成失败的结果不完整，不写入缓存
+            doc_service.cache_ids_batch(
+                missing_queries, request.org_code, top_k, snapshot,
+                [None if i in errors else scored[i] for i in missing], options
+            )
+
+        fetched = await run_in_threadpool(doc_service.fetch_batch, scored)
+        items = [
+            DocumentBatchSearchItem(
+                query=query,
+                results=[_search_result(doc_emb, similarity) for doc_emb, similarity in rows],
+                error=errors.get(i)
+            )
+            for i, (query, rows) in enumerate(zip(queries, fetched))
+        ]
+        logger.info(f"批量文档搜索完成，查询 {len(queries)} 个，缓存命中 {len(queries) - len(missing)} 个")
+        return DocumentBatchSearchResponse(
+            success=True,
+            results=items,
+            org_code=request.org_code,
+            usage=EmbeddingUsageInfo(**usage.to_dict())
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量搜索文档时发生错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"批量搜索文档失败: {str(e)}")
@@ -19,6 +19,16 @@ class EmbeddingItem(BaseModel):
     embedding: List[float]  # 嵌入向量
 
 
+class EmbeddingUsageInfo(BaseModel):
+    """
+    单次请求的嵌入用量
+    """
+    texts: int = 0  # 请求嵌入的文本条数（含缓存命中）
+    cached: int = 0  # 缓存命中条数
+    calls: int = 0  # 实际调用模型服务的次数
+    total_tokens: int = 0  # 消耗的token总数
+
+
 class EmbeddingResponse(BaseModel):
     """
     文本嵌入响应DTO
@@ -27,6 +37,7 @@ class EmbeddingResponse(BaseModel):
     embeddings: List[EmbeddingItem]  # 嵌入结果列表
     model: Optional[str] = None  # 使用的模型
     total_tokens: Optional[int] = 0  # 总token数
+    usage: Optional[EmbeddingUsageInfo] = None  # 本次请求的嵌入用量
     error: Optional[str] = None  # 整体错误信息（如果失败）
 
 
@@ -48,6 +59,27 @@ class DocumentSearchRequest(BaseModel):
     query: str  # 查询文本
     org_code: str  # 组织编码
     top_k: Optional[int] = 10  # 返回结果数量，默认10
+    per_section_limit: Optional[int] = 2  # 每个章节最多返回的条数，为空或 0 时不限
+    mmr_lambda: Optional[float] = None  # MMR 多样性重排系数（0~1，越小越多样），为空时不重排
+    doc_type: Optional[List[str]] = None  # 按文档类型过滤（多个值为“或”），为空时不过滤
+    doc_subject: Optional[List[str]] = None  # 按文档主题过滤
+    source_name: Optional[List[str]] = None  # 按来源文件名过滤
+    mode: Optional[str] = "vector"  # 检索方式：vector（向量）/ hybrid（向量 + BM25 关键词融合）/ keyword（仅关键词，不调用嵌入接口）
+
+
+class DocumentBatchSearchRequest(BaseModel):
+    """
+    批量文档搜索请求DTO（检索参数对全部查询生效）
+    """
+    queries: List[str]  # 查询文本列表
+    org_code: str  # 组织编码
+    top_k: Optional[int] = 10  # 每个查询返回结果数量，默认10
+    per_section_limit: Optional[int] = 2  # 每个章节最多返回的条数，为空或 0 时不限
+    mmr_lambda: Optional[float] = None  # MMR 多样性重排系数（0~1，越小越多样），为空时不重排
+    doc_type: Optional[List[str]] = None  # 按文档类型过滤（多个值为“或”），为空时不过滤
+    doc_subject: Optional[List[str]] = None  # 按文档主题过滤
+    source_name: Optional[List[str]] = None  # 按来源文件名过滤
+    mode: Optional[str] = "vector"  # 检索方式：vector / hybrid / keyword，同 DocumentSearchRequest
 
 
 class DocumentSearchResult(BaseModel):
@@ -72,4 +104,25 @@ class DocumentSearchResponse(BaseModel):
     results: List[DocumentSearchResult]  # 搜索结果列表
     query: str  # 原始查询
     org_code: str  # 组织编码
-    error: Optional[str] = None  # 错误信息
\ No newline at end of file
+    usage: Optional[EmbeddingUsageInfo] = None  # 本次请求的嵌入用量
+    error: Optional[str] = None  # 错误信息
+
+
+class DocumentBatchSearchItem(BaseModel):
+    """
+    批量搜索中单个查询的结果
+    """
+    query: str  # 原始查询
+    results: List[DocumentSearchResult]  # 搜索结果列表
+    error: Optional[str] = None  # 该查询的错误信息（如查询向量生成失败）
+
+
+class DocumentBatchSearchResponse(BaseModel):
+    """
+    批量文档搜索响应DTO
+    """
+    success: bool  # 是否成功
+    results: List[DocumentBatchSearchItem]  # 与请求 queries 顺序一致的结果
+    org_code: str  # 组织编码
+    usage: Optional[EmbeddingUsageInfo] = None  # 本次请求的嵌入用量
+    error: Optional[str] = None  # 错误信息
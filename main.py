@@ -1,16 +1,55 @@
 # main.py
 import os
+import asyncio
 
 # 为Python 3.13兼容性，尽早设置环境变量
 os.environ["PYTHONASYNCIOTASKS"] = "0"
 
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from config import config
 from ctl.routers import api_router
+from model.embedding_client import close_async_embedding_client
+from model.embedding_cache import flush_embedding_cache
+from core.http_client import get_http_client, close_http_client
+from active.swagger_catalog import get_swagger_catalog, configured_swagger_urls
+from active.intent_classifier import load_intent_history
+from Embedding.ingest_job import get_ingest_job_manager
+from repository.document_embedding_crud import ensure_embedding_binary_columns
+from Embedding.parallel_parser import shutdown_parallel_parser
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 升级步骤：补齐 document_embedding 的二进制向量列（读取路径依赖这两列）
+    ensure_embedding_binary_columns()
+    # 恢复重启前未完成的文档入库任务
+    get_ingest_job_manager().recover()
+    # 创建下游接口调用共享的 HTTP 连接池
+    await get_http_client().start()
+    # 后台预加载 config.yml 中配置的 Swagger 文档，不阻塞启动
+    warm_up = None
+    if config.get("swagger_catalog.warm_up", True):
+        warm_up = asyncio.create_task(get_swagger_catalog().warm_up(configured_swagger_urls()))
+    # 后台加载意图快速通道的历史意图（加载完成前只用规则匹配）
+    intent_history = asyncio.create_task(load_intent_history())
+    yield
+    for task in (warm_up, intent_history):
+        if task is not None and not task.done():
+            task.cancel()
+    get_ingest_job_manager().shutdown()
+    shutdown_parallel_parser()
+    # 关闭共享的异步嵌入客户端连接池
+    await close_async_embedding_client()
+    # 写回嵌入向量缓存积累的访问时间
+    flush_embedding_cache()
+    await close_http_client()
+
 
 app = FastAPI(
+    lifespan=lifespan,
     title="ChimichangApp",                    # 标题
     description="学习代码",                  # 描述（支持 Markdown）
     summary="Deadpool 的最爱应用",             # 简介
@@ -2,9 +2,14 @@
 from fastapi import Depends
 from .dashscope_model import DashScopeModel
 from .embedding_model import TextEmbeddingModel
+from .embedding_usage import EmbeddingUsage
 
 def get_dashscope_model() -> DashScopeModel:
     return DashScopeModel()
 
 def get_embedding_model() -> TextEmbeddingModel:
-    return TextEmbeddingModel()
\ No newline at end of file
+    return TextEmbeddingModel()
+
+def get_embedding_usage() -> EmbeddingUsage:
+    # 每个请求一个新的用量累加器
+    return EmbeddingUsage()
@@ -0,0 +1,228 @@
+# model/embedding_cache.py
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from core.logger import logger
+from config.config import config
+from utils.content_hash import compute_content_hash
+
+
+CacheKey = Tuple[str, str, str]
+
+
+class EmbeddingCache:
+    """
+    文本嵌入向量缓存，键为 (content_hash, model, dimensions)
+
+    - 前端：进程内 LRU（OrderedDict），命中无需任何 IO
+    - 后端：SQLite 持久化（WAL 模式，多个 worker 共享同一文件），向量以 float32 二进制保存
+    - 淘汰：内存按条数 LRU 淘汰；SQLite 超过 max_db_items 时按最近访问时间批量删除最旧的 10%
+    - SQLite 命中只在内存中记录访问时间，每 access_flush_seconds 秒或积累 access_flush_items 条后批量写回，
+      读路径不写盘；进程退出时未写回的访问时间丢失，只影响淘汰顺序
+    """
+
+    def __init__(self, db_path: Optional[str] = "embedding_cache.db", memory_items: int = 10000, max_db_items: int = 500000,
+                 access_flush_seconds: float = 60, access_flush_items: int = 1000):
+        self.memory_items = max(int(memory_items), 0)
+        self.max_db_items = max(int(max_db_items), 0)
+        self.access_flush_seconds = max(float(access_flush_seconds), 0.0)
+        self.access_flush_items = max(int(access_flush_items), 1)
+        self._memory: "OrderedDict[CacheKey, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_check = 0
+        # 尚未写回 SQLite 的访问时间 {键: 时间戳}
+        self._pending_access: Dict[CacheKey, int] = {}
+        self._last_access_flush = time.time()
+        if db_path:
+            try:
+                db_dir = os.path.dirname(db_path)
+                if db_dir:
+                    os.makedirs(db_dir, exist_ok=True)
+                self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                    " content_hash TEXT NOT NULL, model TEXT NOT NULL, dimensions TEXT NOT NULL,"
+                    " vector BLOB NOT NULL, last_access INTEGER NOT NULL,"
+                    " PRIMARY KEY (content_hash, model, dimensions))"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_access ON embedding_cache(last_access)")
+                self._conn.commit()
+            except Exception as e:
+                logger.error(f"初始化嵌入向量持久化缓存失败，仅使用内存缓存: {e}")
+                self._conn = None
+
+    @staticmethod
+    def make_key(text: str, model: str, dimensions: Optional[int]) -> CacheKey:
+        return compute_content_hash(text), model or "", str(dimensions or "")
+
+    def _remember(self, key: CacheKey, vector: List[float]):
+        if self.memory_items <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[CacheKey]) -> Dict[int, List[float]]:
+        """批量查询，返回 {keys 下标: 向量}"""
+        found: Dict[int, List[float]] = {}
+        missing: List[int] = []
+        now = int(time.time())
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self._stats["memory_hits"] += 1
+                    # 内存命中同样刷新 SQLite 中的访问时间，热点向量不会被持久层淘汰
+                    if self._conn is not None:
+                        self._pending_access[key] = now
+                else:
+                    missing.append(i)
+
+            if missing and self._conn is not None:
+                try:
+                    # 同一批文本的 model/dimensions 通常相同：按 (model, dimensions) 分组，每组 IN 查询一次
+                    groups: Dict[Tuple[str, str], Dict[str, List[int]]] = {}
+                    for i in missing:
+                        content_hash, model, dimensions = keys[i]
+                        groups.setdefault((model, dimensions), {}).setdefault(content_hash, []).append(i)
+                    for (model, dimensions), by_hash in groups.items():
+                        hashes = list(by_hash)
+                        for start in range(0, len(hashes), 500):
+                            part = hashes[start:start + 500]
+                            rows = self._conn.execute(
+                                "SELECT content_hash, vector FROM embedding_cache WHERE model=? AND dimensions=?"
+                                f" AND content_hash IN ({','.join('?' * len(part))})",
+                                (model, dimensions, *part)
+                            ).fetchall()
+                            for content_hash, blob in rows:
+                                vector = np.frombuffer(blob, dtype="<f4").tolist()
+                                key = (content_hash, model, dimensions)
+                                for i in by_hash[content_hash]:
+                                    found[i] = vector
+                                    self._stats["db_hits"] += 1
+                                self._remember(key, vector)
+                                self._pending_access[key] = now
+                except Exception as e:
+                    logger.error(f"读取嵌入向量持久化缓存失败: {e}")
+            try:
+                self._maybe_flush_access()
+            except Exception as e:
+                logger.error(f"写回嵌入向量缓存访问时间失败: {e}")
+
+            self._stats["misses"] += len(keys) - len(found)
+        return found
+
+    def _maybe_flush_access(self, force: bool = False):
+        """批量写回访问时间（调用方持有 _lock）"""
+        if not self._pending_access or self._conn is None:
+            return
+        if not force and len(self._pending_access) < self.access_flush_items \
+                and time.time() - self._last_access_flush < self.access_flush_seconds:
+            return
+        pending, self._pending_access = self._pending_access, {}
+        self._last_access_flush = time.time()
+        self._conn.executemany(
+            "UPDATE embedding_cache SET last_access=MAX(last_access, ?) WHERE content_hash=? AND model=? AND dimensions=?",
+            [(access, *key) for key, access in pending.items()]
+        )
+        self._conn.commit()
+
+    def flush(self):
+        """立即写回积累的访问时间"""
+        with self._lock:
+            try:
+                self._maybe_flush_access(force=True)
+            except Exception as e:
+                logger.error(f"写回嵌入向量缓存访问时间失败: {e}")
+
+    def put_many(self, items: List[Tuple[CacheKey, List[float]]]):
+        """批量写入缓存"""
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            self._stats["writes"] += len(items)
+            if self._conn is None:
+                return
+            now = int(time.time())
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (content_hash, model, dimensions, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                    [(key[0], key[1], key[2], np.asarray(vector, dtype="<f4").tobytes(), now) for key, vector in items]
+                )
+                for key, _ in items:
+                    self._pending_access.pop(key, None)
+                self._conn.commit()
+                self._writes_since_check += len(items)
+                if self.max_db_items and self._writes_since_check >= 1000:
+                    self._writes_since_check = 0
+                    self._evict()
+            except Exception as e:
+                logger.error(f"写入嵌入向量持久化缓存失败: {e}")
+
+    def _evict(self):
+        # 先写回访问时间，避免刚命中的行按旧时间被淘汰
+        self._maybe_flush_access(force=True)
+        total = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        if total <= self.max_db_items:
+            return
+        remove = total - self.max_db_items + self.max_db_items // 10
+        self._conn.execute(
+            "DELETE FROM embedding_cache WHERE rowid IN "
+            "(SELECT rowid FROM embedding_cache ORDER BY last_access LIMIT ?)",
+            (remove,)
+        )
+        self._conn.commit()
+        self._stats["evictions"] += remove
+        logger.info(f"嵌入向量持久化缓存淘汰 {remove} 条（总量 {total}，上限 {self.max_db_items}）")
+
+    def stats(self) -> Dict[str, object]:
+        """缓存命中统计（用于监控）"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+            stats["pending_access"] = len(self._pending_access)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+        stats["persistent"] = self._conn is not None
+        return stats
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """进程级单例；配置 embedding.cache.enabled=false 时返回 None"""
+    global _embedding_cache
+    cache_config = config.get("embedding.cache", {}) or {}
+    if not cache_config.get("enabled", True):
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    db_path=cache_config.get("db_path", "embedding_cache.db"),
+                    memory_items=cache_config.get("memory_items", 10000),
+                    max_db_items=cache_config.get("max_db_items", 500000),
+                    access_flush_seconds=cache_config.get("access_flush_seconds", 60)
+                )
+    return _embedding_cache
+
+
+def flush_embedding_cache():
+    """进程退出前写回积累的访问时间（缓存未创建时不处理）"""
+    if _embedding_cache is not None:
+        _embedding_cache.flush()
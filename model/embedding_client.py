@@ -0,0 +1,107 @@
+# model/embedding_client.py
+import asyncio
+import os
+from typing import Optional
+import aiohttp
+import dashscope
+from core.logger import logger
+from config.config import config
+
+
+# DashScope 文本向量 HTTP 接口路径（基础地址沿用 dashscope SDK 的 base_http_api_url 配置）
+TEXT_EMBEDDING_PATH = "/services/embeddings/text-embedding/text-embedding"
+
+
+class AsyncEmbeddingClient:
+    """
+    DashScope 文本嵌入异步客户端
+
+    - 进程内共享一个 aiohttp.ClientSession（连接池复用 TCP/TLS 连接）
+    - Semaphore 限制同时在途的请求数，超时按单次请求计算
+    - 返回结构与 TextEmbeddingModel.embed_text 一致
+    """
+
+    def __init__(self, api_key: str = None, concurrency: int = 8, timeout: float = 30, connect_timeout: float = 5):
+        self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
+        self.concurrency = max(int(concurrency), 1)
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def embed(self, input_text, model: str, dimensions: int = None) -> dict:
+        """调用 DashScope 文本嵌入接口，input_text 可以是单个字符串或字符串列表"""
+        texts = input_text if isinstance(input_text, list) else [input_text]
+        payload = {"model": model, "input": {"texts": texts}}
+        if dimensions is not None:
+            payload["parameters"] = {"dimension": dimensions}
+        url = dashscope.base_http_api_url.rstrip("/") + TEXT_EMBEDDING_PATH
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+        session = self._get_session()
+        try:
+            async with self._semaphore:
+                async with session.post(url, json=payload, headers=headers) as response:
+                    data = await response.json(content_type=None)
+                    status = response.status
+        except asyncio.TimeoutError:
+            logger.error(f"异步文本嵌入请求超时: {len(texts)} 条")
+            return {"success": False, "error": "调用失败：请求超时", "data": None}
+        except Exception as e:
+            logger.exception(f"调用异步文本嵌入接口异常: {e}")
+            return {"success": False, "error": f"调用失败：{str(e)}", "data": None}
+
+        if status != 200 or not isinstance(data, dict):
+            # 网关错误等情况下响应体可能不是 JSON 对象
+            error = data if isinstance(data, dict) else {"code": status, "message": str(data)[:200]}
+            logger.error(f"异步文本嵌入失败 - status: {status}, code: {error.get('code')}, message: {error.get('message')}")
+            return {
+                "success": False,
+                "error": f"API调用失败，错误码: {error.get('code')}, 消息: {error.get('message')}",
+                "data": data
+            }
+
+        output = data.get("output") or {}
+        usage = data.get("usage") or {}
+        items = sorted(output.get("embeddings") or [], key=lambda item: item.get("text_index", 0))
+        return {
+            "success": True,
+            "data": data,
+            "embedding": items[0]["embedding"] if items else None,
+            "embeddings": [item["embedding"] for item in items],
+            "usage": usage,
+            "model": model,
+            "total_tokens": usage.get("total_tokens", 0)
+        }
+
+
+_async_client: Optional[AsyncEmbeddingClient] = None
+
+
+def get_async_embedding_client() -> AsyncEmbeddingClient:
+    """进程级单例，连接池在所有请求间共享"""
+    global _async_client
+    if _async_client is None:
+        client_config = config.get("embedding.async_client", {}) or {}
+        _async_client = AsyncEmbeddingClient(
+            concurrency=client_config.get("concurrency", 8),
+            timeout=client_config.get("timeout", 30),
+            connect_timeout=client_config.get("connect_timeout", 5)
+        )
+    return _async_client
+
+
+async def close_async_embedding_client():
+    if _async_client is not None:
+        await _async_client.close()
@@ -1,14 +1,29 @@
 # model/embedding_model.py
+import asyncio
 from http import HTTPStatus
 import dashscope
-from typing import List, Union, Optional
+from typing import List, Union, Optional, Dict
 import os
 from dotenv import load_dotenv
 from core.logger import logger
+from config.config import config
+from model.embedding_cache import EmbeddingCache, get_embedding_cache
+from model.embedding_client import get_async_embedding_client
+from model.embedding_usage import EmbeddingUsage
 
 # 加载环境变量
 load_dotenv()
 
+# DashScope 单次请求最多可携带的文本条数（text-embedding-v3/v4 为 10）
+DEFAULT_EMBEDDING_BATCH_SIZE = 10
+
+
+def _input_summary(input_text: Union[str, List[str]]) -> str:
+    """日志中只记录文本条数与总长度，不输出文档原文"""
+    texts = input_text if isinstance(input_text, list) else [input_text]
+    return f"{len(texts)} 条, 共 {sum(len(str(text or '')) for text in texts)} 字符"
+
+
 class TextEmbeddingModel:
     """
     DashScope文本嵌入模型接口封装类
@@ -27,6 +42,9 @@ class TextEmbeddingModel:
         """
         self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
         self.model = model
+        self.batch_size = int(config.get("embedding.batch_size", DEFAULT_EMBEDDING_BATCH_SIZE) or DEFAULT_EMBEDDING_BATCH_SIZE)
+        # 按 (content_hash, model, dimensions) 缓存向量，重复上传的文档不再重复调用 DashScope
+        self.cache = get_embedding_cache()
         
         if not self.api_key:
             raise ValueError("API密钥未提供。请设置环境变量DASHSCOPE_API_KEY或在代码中传入api_key参数")
@@ -47,7 +65,7 @@ class TextEmbeddingModel:
         Returns:
             Optional[dict]: 成功时返回包含嵌入向量的响应字典，失败时返回错误信息
         """
-        logger.info(f"开始文本嵌入 request>>>input_text={input_text}, model={model or self.model}, dimensions={dimensions}")
+        logger.info(f"开始文本嵌入 request>>>input={_input_summary(input_text)}, model={model or self.model}, dimensions={dimensions}")
         
         # 构建参数
         params = {
@@ -64,10 +82,13 @@ class TextEmbeddingModel:
             
             if resp.status_code == HTTPStatus.OK:
                 logger.info("文本嵌入成功")
+                # 按 text_index 还原输入顺序，批量输入时 embeddings 与 input_text 一一对应
+                items = sorted(resp.output.get('embeddings') or [], key=lambda item: item.get('text_index', 0))
                 return {
                     "success": True,
                     "data": resp,
-                    "embedding": resp.output['embeddings'][0]['embedding'] if resp.output.get('embeddings') and len(resp.output['embeddings']) > 0 else None,
+                    "embedding": items[0]['embedding'] if items else None,
+                    "embeddings": [item['embedding'] for item in items],
                     "usage": resp.usage,
                     "model": resp.output.get('model', model or self.model),
                     "total_tokens": resp.usage.get('total_tokens', 0) if resp.usage else 0
@@ -88,7 +109,144 @@ class TextEmbeddingModel:
                 "data": None
             }
     
-    def get_embedding_vector(self, input_text: Union[str, List[str]], model: str = None, dimensions: int = None) -> Union[List[float], List[List[float]], None]:
+    def embed_many(self, texts: List[str], model: str = None, dimensions: int = None, batch_size: int = None,
+                   usage: Optional[EmbeddingUsage] = None) -> Dict[str, object]:
+        """
+        批量将文本转换为嵌入向量，按服务端单次请求上限打包，减少 HTTP 往返次数
+
+        Args:
+            texts: 输入文本列表
+            model: 使用的嵌入模型，如果提供则覆盖初始化时设置的模型
+            dimensions: 指定向量维度
+            batch_size: 每次请求携带的文本条数，默认取配置 embedding.batch_size（10）
+            usage: 当前请求的用量累加器，本次调用的 token/请求次数会累加进去
+
+        Returns:
+            dict: {
+                "success": 是否全部成功,
+                "embeddings": 与 texts 顺序一致的向量列表，失败项为 None,
+                "errors": {失败项下标: 错误信息},
+                "total_tokens": 总 token 数,
+                "calls": 实际请求次数,
+                "cached": 缓存命中条数
+            }
+        """
+        state = self._begin_many(texts, model, dimensions)
+        batch_size = max(1, min(int(batch_size or self.batch_size), self.batch_size))
+        pending = state["pending"]
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            result = self.embed_text([texts[i] for i in batch], model, dimensions)
+            if self._collect_batch(state, batch, result):
+                continue
+
+            # 整批失败时逐条重试，定位具体失败的文本
+            logger.error(f"批量嵌入失败，逐条重试 {len(batch)} 条: {result.get('error') if result else '未知错误'}")
+            for i in batch:
+                self._collect_single(state, i, self.embed_text(texts[i], model, dimensions))
+
+        return self._finish_many(state, texts, usage)
+
+    async def embed_text_async(self, input_text: Union[str, List[str]], model: str = None, dimensions: int = None) -> Optional[dict]:
+        """
+        embed_text 的异步版本，通过共享连接池的 aiohttp 客户端调用，不阻塞事件循环
+        """
+        logger.info(f"开始异步文本嵌入 request>>>input={_input_summary(input_text)}, model={model or self.model}, dimensions={dimensions}")
+        return await get_async_embedding_client().embed(input_text, model or self.model, dimensions)
+
+    async def embed_many_async(self, texts: List[str], model: str = None, dimensions: int = None, batch_size: int = None,
+                               usage: Optional[EmbeddingUsage] = None) -> Dict[str, object]:
+        """
+        embed_many 的异步版本：各批次并发请求（并发上限见 embedding.async_client.concurrency），返回结构与 embed_many 一致
+        """
+        state = self._begin_many(texts, model, dimensions)
+        batch_size = max(1, min(int(batch_size or self.batch_size), self.batch_size))
+        pending = state["pending"]
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+        async def run_batch(batch: List[int]):
+            result = await self.embed_text_async([texts[i] for i in batch], model, dimensions)
+            if self._collect_batch(state, batch, result):
+                return
+            logger.error(f"批量嵌入失败，逐条重试 {len(batch)} 条: {result.get('error') if result else '未知错误'}")
+            singles = await asyncio.gather(*(self.embed_text_async(texts[i], model, dimensions) for i in batch))
+            for i, single in zip(batch, singles):
+                self._collect_single(state, i, single)
+
+        await asyncio.gather(*(run_batch(batch) for batch in batches))
+        return self._finish_many(state, texts, usage)
+
+    def _begin_many(self, texts: List[str], model: Optional[str], dimensions: Optional[int]) -> Dict[str, object]:
+        """批量嵌入的公共准备：校验空文本并查询缓存，返回记录中间状态的字典"""
+        state = {
+            "embeddings": [None] * len(texts),
+            "errors": {},
+            "total_tokens": 0,
+            "calls": 0,
+            "cached": 0,
+            "keys": {},
+            "pending": []
+        }
+        pending = []
+        for i, text in enumerate(texts):
+            if not text or not str(text).strip():
+                state["errors"][i] = "文本为空"
+            else:
+                pending.append(i)
+
+        # 先查缓存，只有未命中的文本才调用 DashScope
+        if self.cache is not None and pending:
+            keys = {i: EmbeddingCache.make_key(texts[i], model or self.model, dimensions) for i in pending}
+            hits = self.cache.get_many([keys[i] for i in pending])
+            for pos, vector in hits.items():
+                state["embeddings"][pending[pos]] = vector
+            state["keys"] = keys
+            state["cached"] = len(hits)
+            pending = [i for pos, i in enumerate(pending) if pos not in hits]
+        state["pending"] = pending
+        return state
+
+    @staticmethod
+    def _collect_batch(state: Dict[str, object], batch: List[int], result: Optional[dict]) -> bool:
+        """记录一次批量请求的结果，返回该批是否全部成功"""
+        state["calls"] += 1
+        if result and result["success"] and len(result.get("embeddings") or []) == len(batch):
+            state["total_tokens"] += result.get("total_tokens", 0)
+            for i, vector in zip(batch, result["embeddings"]):
+                state["embeddings"][i] = vector
+            return True
+        return False
+
+    @staticmethod
+    def _collect_single(state: Dict[str, object], i: int, single: Optional[dict]):
+        """记录单条重试的结果"""
+        state["calls"] += 1
+        if single and single["success"] and single.get("embedding"):
+            state["embeddings"][i] = single["embedding"]
+            state["total_tokens"] += single.get("total_tokens", 0)
+        else:
+            state["errors"][i] = single.get("error", "未知错误") if single else "API调用失败"
+
+    def _finish_many(self, state: Dict[str, object], texts: List[str], usage: Optional[EmbeddingUsage] = None) -> Dict[str, object]:
+        embeddings = state["embeddings"]
+        if usage is not None:
+            usage.add(texts=len(texts), cached=state["cached"], calls=state["calls"], total_tokens=state["total_tokens"])
+        if self.cache is not None:
+            self.cache.put_many([(state["keys"][i], embeddings[i]) for i in state["pending"] if embeddings[i] is not None])
+
+        logger.info(f"批量文本嵌入完成: 共 {len(texts)} 条, 缓存命中 {state['cached']} 条, "
+                    f"失败 {len(state['errors'])} 条, 请求 {state['calls']} 次")
+        return {
+            "success": not state["errors"],
+            "embeddings": embeddings,
+            "errors": state["errors"],
+            "total_tokens": state["total_tokens"],
+            "calls": state["calls"],
+            "cached": state["cached"]
+        }
+
+    def get_embedding_vector(self, input_text: Union[str, List[str]], model: str = None, dimensions: int = None,
+                             usage: Optional[EmbeddingUsage] = None) -> Union[List[float], List[List[float]], None]:
         """
         获取文本的嵌入向量
         
@@ -100,7 +258,17 @@ class TextEmbeddingModel:
         Returns:
             Union[List[float], List[List[float]], None]: 嵌入向量或向量列表，如果失败则返回None
         """
+        if isinstance(input_text, str):
+            # 单条文本走 embed_many，共享缓存
+            result = self.embed_many([input_text], model, dimensions, usage=usage)
+            if result["embeddings"][0] is not None:
+                return result["embeddings"][0]
+            logger.error(f"获取嵌入向量失败: {result['errors'].get(0, '未知错误')}")
+            return None
+
         result = self.embed_text(input_text, model, dimensions)
+        if usage is not None and result:
+            usage.add(texts=len(input_text), calls=1, total_tokens=result.get("total_tokens", 0))
         
         if result and result["success"]:
             return result["embedding"]
@@ -110,6 +278,27 @@ class TextEmbeddingModel:
             return None
 
 
+    async def get_embedding_vector_async(self, input_text: Union[str, List[str]], model: str = None, dimensions: int = None,
+                                         usage: Optional[EmbeddingUsage] = None) -> Union[List[float], List[List[float]], None]:
+        """
+        get_embedding_vector 的异步版本
+        """
+        if isinstance(input_text, str):
+            result = await self.embed_many_async([input_text], model, dimensions, usage=usage)
+            if result["embeddings"][0] is not None:
+                return result["embeddings"][0]
+            logger.error(f"获取嵌入向量失败: {result['errors'].get(0, '未知错误')}")
+            return None
+
+        result = await self.embed_text_async(input_text, model, dimensions)
+        if usage is not None and result:
+            usage.add(texts=len(input_text), calls=1, total_tokens=result.get("total_tokens", 0))
+        if result and result["success"]:
+            return result["embedding"]
+        error_msg = result["error"] if result else "未知错误"
+        logger.error(f"获取嵌入向量失败: {error_msg}")
+        return None
+
 # 使用示例
 if __name__ == "__main__":
     try:
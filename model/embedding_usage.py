@@ -0,0 +1,26 @@
+# model/embedding_usage.py
+from dataclasses import dataclass, asdict
+from typing import Dict
+
+
+@dataclass
+class EmbeddingUsage:
+    """
+    单次接口请求内的嵌入用量累加器
+
+    由接口通过依赖注入创建，传给 TextEmbeddingModel 的批量方法和 DocumentEmbeddingService，
+    token 数直接取自首次调用 DashScope 的返回值，不需要为统计用量再次请求。
+    """
+    texts: int = 0          # 请求嵌入的文本条数（含缓存命中）
+    cached: int = 0         # 缓存命中条数
+    calls: int = 0          # 实际调用 DashScope 的次数
+    total_tokens: int = 0   # 消耗的 token 总数
+
+    def add(self, texts: int = 0, cached: int = 0, calls: int = 0, total_tokens: int = 0):
+        self.texts += texts
+        self.cached += cached
+        self.calls += calls
+        self.total_tokens += total_tokens
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
@@ -119,4 +119,31 @@ def get_all_call_logs(limit: int = 100, offset: int = 0) -> List[t_call_log]:
 def delete_call_logs_by_request_id(request_id: str):
     """根据请求ID删除调用日志"""
     sql = load_sql("delete_call_logs_by_request_id")
-    execute_sql(sql, {"request_id": request_id})
\ No newline at end of file
+    execute_sql(sql, {"request_id": request_id})
+
+def get_recent_intent_logs(limit: int = 2000) -> List[dict]:
+    """获取最近成功的意图分析记录（用户查询 + 意图结果），新的在前"""
+    sql = load_sql("get_recent_intent_logs")
+    rows = execute_sql(sql, {"limit": limit}, fetch="all")
+
+    records = []
+    for row in rows:
+        # input_data 为用户原始查询（不是 JSON 对象），只有经 insert_call_log 序列化成 JSON 字符串时才需要还原
+        query = row["input_data"]
+        if isinstance(query, str) and query.startswith('"'):
+            try:
+                decoded = json.loads(query)
+            except ValueError:
+                decoded = None
+            if isinstance(decoded, str):
+                query = decoded
+        try:
+            intent = json.loads(row["output_data"]) if row["output_data"] else None
+            # 意图结果写入前已序列化为字符串，这里需要再解析一次
+            if isinstance(intent, str):
+                intent = json.loads(intent)
+        except (TypeError, ValueError):
+            continue
+        if isinstance(query, str) and query.strip() and isinstance(intent, dict):
+            records.append({"query": query, "intent": intent})
+    return records
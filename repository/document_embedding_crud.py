@@ -0,0 +1,71 @@
+# repository/document_embedding_crud.py
+from config.database import execute_sql, engine
+from sqlalchemy import inspect
+from core.logger import logger
+import os
+
+
+def load_sql(name: str):
+    """加载SQL语句"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    sql_file = os.path.join(current_dir, "sql", "document_embedding.sql")
+
+    if not os.path.exists(sql_file):
+        raise FileNotFoundError(f"SQL 文件未找到: {sql_file}")
+
+    with open(sql_file, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    blocks = content.split("-- name: ")
+    for block in blocks:
+        if block.strip().startswith(name):
+            return "\n".join(block.split("\n")[1:]).strip()
+    raise ValueError(f"SQL '{name}' 未找到")
+
+
+def add_embedding_binary_columns():
+    """迁移第一步：为 document_embedding 增加 embedding_bin / embedding_codec 列"""
+    sql = load_sql("add_embedding_binary_columns")
+    execute_sql(sql)
+
+
+def ensure_embedding_binary_columns(bind=None) -> bool:
+    """
+    升级步骤（应用启动时执行，可重复执行）：document_embedding 缺少 embedding_bin / embedding_codec 列时补上。
+    所有读取路径都会选取这两列，与 vector_search.storage 是否为 json 无关。
+    返回是否执行了 ALTER；表不存在时不处理。
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    if not inspector.has_table("document_embedding"):
+        return False
+    columns = {column["name"] for column in inspector.get_columns("document_embedding")}
+    if {"embedding_bin", "embedding_codec"} <= columns:
+        return False
+    if bind.dialect.name == "mysql" and not columns & {"embedding_bin", "embedding_codec"}:
+        statements = [load_sql("add_embedding_binary_columns")]
+    else:
+        # 其他数据库（或只缺其中一列）逐列添加，不带 MySQL 专有的 COMMENT / AFTER
+        statements = [
+            f"ALTER TABLE document_embedding ADD COLUMN {name} {ddl}"
+            for name, ddl in (("embedding_bin", "BLOB NULL"), ("embedding_codec", "VARCHAR(8) NULL"))
+            if name not in columns
+        ]
+    with bind.begin() as conn:
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    logger.info("document_embedding 已补充 embedding_bin / embedding_codec 列")
+    return True
+
+
+def count_json_only_embeddings() -> int:
+    """统计尚未迁移为二进制格式的行数"""
+    sql = load_sql("count_json_only_embeddings")
+    row = execute_sql(sql, fetch="one")
+    return int(row["total"]) if row else 0
+
+
+def clear_migrated_json_embeddings():
+    """迁移最后一步（可选）：清空已迁移行的 JSON 向量，释放存储空间"""
+    sql = load_sql("clear_migrated_json_embeddings")
+    execute_sql(sql)
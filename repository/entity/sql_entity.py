@@ -249,7 +249,7 @@ class t_call_log(BaseModel):
 '''
 Document Embedding Table
 '''
-from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, BigInteger
+from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, BigInteger, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -266,6 +266,8 @@ class DocumentEmbedding(Base):
     section = Column(String(255), nullable=True, comment='分组/章节标题（如：简介、背景、1.2小节等）')
     chunk_index = Column(Integer, nullable=True, comment='章节内chunk序号（用于排序/定位）')
     embedding = Column(JSON, nullable=True, comment='文档向量（例如：[-0.1, 0.5, ..., 0.3]）')
+    embedding_bin = Column(LargeBinary, nullable=True, comment='文档向量二进制（小端float32或int8量化，优先于embedding列）')
+    embedding_codec = Column(String(8), nullable=True, comment='embedding_bin编码格式：f32 / i8')
     content = Column(Text, comment='文档内容')
     content_hash = Column(String(64), nullable=True, comment='chunk归一化文本的SHA256(HEX)，用于去重')
     
@@ -38,4 +38,10 @@ LIMIT :limit OFFSET :offset;
 
 -- name: delete_call_logs_by_request_id
 DELETE FROM t_call_log 
-WHERE request_id = :request_id;
\ No newline at end of file
+WHERE request_id = :request_id;
+
+-- name: get_recent_intent_logs
+SELECT input_data, output_data FROM t_call_log
+WHERE stage = 'intent_analysis' AND status = 'success'
+ORDER BY id DESC
+LIMIT :limit;
@@ -0,0 +1,14 @@
+-- sql/document_embedding.sql
+
+-- name: add_embedding_binary_columns
+ALTER TABLE document_embedding
+  ADD COLUMN embedding_bin BLOB NULL COMMENT '文档向量二进制（小端float32或int8量化，优先于embedding列）' AFTER embedding,
+  ADD COLUMN embedding_codec VARCHAR(8) NULL COMMENT 'embedding_bin编码格式：f32 / i8' AFTER embedding_bin;
+
+-- name: count_json_only_embeddings
+SELECT COUNT(*) AS total FROM document_embedding
+WHERE embedding_bin IS NULL AND embedding IS NOT NULL;
+
+-- name: clear_migrated_json_embeddings
+UPDATE document_embedding SET embedding = NULL
+WHERE embedding_bin IS NOT NULL AND embedding IS NOT NULL;
@@ -0,0 +1,107 @@
+"""
+接口预检索基准测试：大型 Swagger 文档下，只发送 top_n 候选接口与发送全部接口的提示词规模对比，以及检索召回率 / 延迟
+
+运行方式（在项目根目录，需要 DASHSCOPE_API_KEY）：
+    PYTHONPATH=. python test/bench_endpoint_retrieval.py
+    PYTHONPATH=. python test/bench_endpoint_retrieval.py --swagger-url http://localhost:9876/v3/api-docs --top-n 20
+
+说明：
+- 默认合成 --size 个接口（资源 × 操作 × 版本），查询取某个接口的摘要改写，召回率为目标接口（任一版本）出现在候选中的比例。
+- 使用 --swagger-url 时接口来自真实文档，查询为各接口摘要本身（只衡量规模与延迟，召回率仅作参考）。
+- 提示词规模为接口匹配提示词中接口列表的估算 token 数（见 active/endpoint_prompts.estimate_tokens）。
+- 接口向量写入嵌入缓存，重复运行时索引建立不再调用嵌入接口。
+"""
+import argparse
+import asyncio
+import random
+import time
+from active.SwaggerParser import SwaggerParser
+from active.endpoint_retriever import EndpointRetriever
+from active.endpoint_prompts import EndpointPrompts
+
+RESOURCES = ["用户", "订单", "商品", "库存", "仓库", "供应商", "发票", "合同", "员工", "部门", "角色", "权限", "日志",
+             "消息", "优惠券", "支付", "退款", "物流", "评论", "报表", "客户", "门店", "会员卡", "积分", "活动"]
+ACTIONS = [("GET", "查询{}详情", "/{}/{{id}}"), ("GET", "分页查询{}列表", "/{}/page"), ("POST", "新增{}", "/{}"),
+           ("PUT", "修改{}", "/{}/{{id}}"), ("DELETE", "删除{}", "/{}/{{id}}"), ("POST", "导出{}", "/{}/export"),
+           ("POST", "导入{}", "/{}/import"), ("GET", "统计{}数量", "/{}/count")]
+QUERY_TEMPLATES = {"查询{}详情": "帮我看一下编号12的{}", "分页查询{}列表": "列出所有{}", "新增{}": "创建一个新的{}",
+                   "修改{}": "把{}7的信息改一下", "删除{}": "把{}5删掉", "导出{}": "把{}导出成表格",
+                   "导入{}": "批量导入{}数据", "统计{}数量": "现在一共有多少{}"}
+
+
+def synthetic_endpoints(size: int):
+    endpoints = []
+    for n in range(size):
+        resource = RESOURCES[n % len(RESOURCES)]
+        method, summary, path = ACTIONS[(n // len(RESOURCES)) % len(ACTIONS)]
+        version = n // (len(RESOURCES) * len(ACTIONS))
+        endpoints.append({
+            "path": f"/api/v{version + 1}" + path.format(f"r{n % len(RESOURCES)}"),
+            "method": method,
+            "summary": summary.format(resource) + (f"（v{version + 1}）" if version else ""),
+            "parameters": ["id"] if "{id}" in path else [],
+            "parameter_details": [{"name": "id", "in": "path", "required": True, "schema": {"type": "integer"},
+                                   "description": f"{resource}ID"}] if "{id}" in path else []
+        })
+    return endpoints
+
+
+def make_queries(endpoints, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    queries = []
+    for target in rng.sample(range(len(endpoints)), min(count, len(endpoints))):
+        summary = endpoints[target]["summary"].split("（")[0]
+        for template, query in QUERY_TEMPLATES.items():
+            prefix, suffix = template.split("{}")
+            if summary.startswith(prefix) and summary.endswith(suffix):
+                summary = query.format(summary[len(prefix):len(summary) - len(suffix)])
+                break
+        queries.append((target, summary))
+    return queries
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="接口预检索基准测试")
+    parser.add_argument("--size", type=int, default=1200)
+    parser.add_argument("--swagger-url", default=None)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--top-n", type=int, default=30)
+    args = parser.parse_args()
+
+    endpoints = await SwaggerParser.parse_swagger(args.swagger_url) if args.swagger_url else synthetic_endpoints(args.size)
+    if args.swagger_url:
+        queries = [(i, endpoints[i]["summary"] or endpoints[i]["path"])
+                   for i in random.Random(0).sample(range(len(endpoints)), min(args.queries, len(endpoints)))]
+    else:
+        queries = make_queries(endpoints, args.queries)
+    retriever = EndpointRetriever(top_n=args.top_n, min_endpoints=0)
+
+    start = time.perf_counter()
+    index = await retriever.build("bench", endpoints)
+    build_ms = (time.perf_counter() - start) * 1000
+    if index is None:
+        print("接口索引建立失败（检查 DASHSCOPE_API_KEY）")
+        return
+
+    prompts = EndpointPrompts(endpoints)
+    sent_tokens, hits, elapsed = 0, 0, []
+    for target, query in queries:
+        start = time.perf_counter()
+        candidates = await retriever.retrieve("bench", endpoints, query)
+        elapsed.append(time.perf_counter() - start)
+        sent_tokens += prompts.count_tokens(candidates)
+        # 合成接口按版本重复，同名不同版本的接口视为命中
+        hits += any(endpoints[i]["summary"].split("（")[0] == endpoints[target]["summary"].split("（")[0]
+                    for i in candidates)
+    avg_sent = sent_tokens / len(queries)
+
+    print(f"接口数: {len(endpoints)}, 查询数: {len(queries)}, top_n: {args.top_n}")
+    print(f"索引建立耗时: {build_ms:.0f} ms")
+    print(f"提示词接口列表: 全部约 {prompts.total_tokens} tokens -> 候选约 {avg_sent:.0f} tokens，"
+          f"缩减 {prompts.total_tokens / max(avg_sent, 1):.1f} 倍")
+    print(f"检索耗时（含查询向量生成）: 平均 {sum(elapsed) * 1000 / len(elapsed):.1f} ms")
+    print(f"目标接口召回率: {hits / len(queries):.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
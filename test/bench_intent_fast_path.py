@@ -0,0 +1,82 @@
+"""
+意图识别快速通道基准测试：统计不调用大模型即可完成意图分析的请求占比，以及本地识别耗时
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python test/bench_intent_fast_path.py
+    PYTHONPATH=. python test/bench_intent_fast_path.py --from-log 2000 --llm-ms 1800
+
+说明：
+- 默认使用内置的示例查询；--from-log N 改为读取 t_call_log 最近 N 条意图分析记录（需要数据库），
+  按时间顺序回放：前面的大模型结果会进入历史库，用于后续查询的历史匹配。
+- 回放日志时，未命中快速通道的查询用日志中大模型的结果代替实际调用；内置示例则不学习。
+- 平均耗时估算 = 本地识别耗时 + 未命中比例 × --llm-ms（一次大模型意图分析的耗时，按实际观测填写）。
+"""
+import argparse
+import time
+from active.intent_classifier import get_intent_classifier
+
+SAMPLE_QUERIES = [
+    "查询用户123",
+    "查找订单 20240101001",
+    "获取商品编号A-17的详情",
+    "删除用户ID为88的会员",
+    "查询2024-05-01的订单列表",
+    "搜索名称为蓝牙耳机的商品",
+    "导出本月订单报告",
+    "统计昨天新注册的用户数量",
+    "查询用户456的订单",
+    "创建一个新用户，姓名为张三",
+    "今天北京天气怎么样",
+    "帮我查询订单然后取消它",
+    "给我讲个笑话",
+    "审批报销单 10086",
+    "重置用户42的密码",
+    "查看系统访问日志",
+]
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="意图识别快速通道基准测试")
+    parser.add_argument("--from-log", type=int, default=0, help="从 t_call_log 读取最近 N 条意图分析记录回放")
+    parser.add_argument("--llm-ms", type=float, default=1500.0, help="一次大模型意图分析的耗时（毫秒）")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    classifier = get_intent_classifier()
+    classifier.history_loaded = True
+    if args.from_log:
+        from repository.call_log_crud import get_recent_intent_logs
+        records = list(reversed(get_recent_intent_logs(args.from_log)))
+    else:
+        records = [{"query": query, "intent": None} for query in SAMPLE_QUERIES]
+
+    sources = {"rule": 0, "history": 0, "llm": 0}
+    elapsed = []
+    for record in records:
+        start = time.perf_counter()
+        candidate = classifier.classify(record["query"])
+        elapsed.append(time.perf_counter() - start)
+        source = candidate["source"] if classifier.accept(candidate) else "llm"
+        sources[source] += 1
+        if source == "llm" and record["intent"]:
+            classifier.learn(record["query"], record["intent"])
+        if args.verbose:
+            print(f"[{source:>7}] {record['query']} -> {candidate}")
+
+    total = len(records)
+    local = sources["rule"] + sources["history"]
+    local_ms = sum(elapsed) * 1000 / max(total, 1)
+    print(f"查询数: {total}, 规则命中: {sources['rule']}, 历史命中: {sources['history']}, 调用大模型: {sources['llm']}")
+    print(f"不调用大模型占比: {local / max(total, 1):.1%}")
+    print(f"本地识别耗时: 平均 {local_ms:.3f} ms, p99 {percentile(elapsed, 0.99) * 1000:.3f} ms")
+    print(f"意图分析平均耗时估算: 全部走大模型 {args.llm_ms:.0f} ms -> "
+          f"快速通道 {local_ms + sources['llm'] / max(total, 1) * args.llm_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
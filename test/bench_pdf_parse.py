@@ -0,0 +1,78 @@
+"""
+PDF 解析基准测试：单线程逐页 text += 拼接（旧实现） vs 单进程列表拼接 vs 进程池按页区间并行解析
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python test/bench_pdf_parse.py
+    PYTHONPATH=. python test/bench_pdf_parse.py --pages 1000 --workers 8
+
+说明：
+- 未指定 --pdf 时生成一个 --pages 页的中文文本 PDF（缓存在临时目录，重复运行不再生成）
+- 并行解析的加速比取决于 CPU 核数，--workers 默认取 os.cpu_count()
+"""
+import argparse
+import os
+import tempfile
+import time
+import fitz
+from Embedding.parallel_parser import ParallelDocumentParser
+
+
+def make_pdf(path: str, pages: int):
+    line = "文档解析基准测试文本，包含中文与 English words 混排的段落内容。"
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        text = "\n".join(f"第{i + 1}页 第{j + 1}行：{line}" for j in range(45))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontname="china-s", fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def read_pdf_concat(path: str) -> str:
+    doc = fitz.open(path)
+    text = ""
+    for page in doc:
+        text += page.get_text()
+    doc.close()
+    return text
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 解析基准测试")
+    parser.add_argument("--pdf", default=None)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pages-per-task", type=int, default=32)
+    args = parser.parse_args()
+
+    path = args.pdf or os.path.join(tempfile.gettempdir(), f"bench_parse_{args.pages}.pdf")
+    if not os.path.exists(path):
+        print(f"生成 {args.pages} 页测试 PDF: {path}")
+        make_pdf(path, args.pages)
+
+    serial = ParallelDocumentParser(max_workers=1)
+    pool = ParallelDocumentParser(max_workers=args.workers, pages_per_task=args.pages_per_task, min_parallel_pages=1)
+    # 预热进程池，排除进程启动耗时
+    pool.read_pdf(path)
+
+    concat_time, expected = timed(read_pdf_concat, path)
+    serial_time, serial_text = timed(serial.read_pdf, path)
+    pool_time, pool_text = timed(pool.read_pdf, path)
+    pool.shutdown()
+    assert serial_text == expected and pool_text == expected, "并行解析结果与逐页拼接不一致"
+
+    print(f"文件: {path}, 字符数: {len(expected)}, CPU 核数: {os.cpu_count()}, 进程数: {args.workers}")
+    print(f"{'mode':<14} | {'time(s)':>8} | {'speedup':>7}")
+    print(f"{'concat(+=)':<14} | {concat_time:>8.2f} | {1:>6.1f}x")
+    print(f"{'list-join':<14} | {serial_time:>8.2f} | {concat_time / serial_time:>6.1f}x")
+    print(f"{'process-pool':<14} | {pool_time:>8.2f} | {concat_time / pool_time:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
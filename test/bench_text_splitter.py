@@ -0,0 +1,71 @@
+"""
+文本切分基准测试：Embedding.text_splitter.split_grouped 在中文/英文文本上的吞吐（MB/s）
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python test/bench_text_splitter.py
+    PYTHONPATH=. python test/bench_text_splitter.py --mb 20 --repeat 5
+"""
+import argparse
+import random
+import time
+from Embedding import text_splitter
+
+
+CN_SENTENCES = [
+    "向量检索服务负责把文档切分后的文本转换为向量并保存到数据库中",
+    "系统会根据组织编码隔离不同租户的数据",
+    "当文档中出现标题、编号或分隔线时会自动划分章节",
+    "对于超长的句子会按照块大小进行硬切分",
+    "检索时先计算查询向量，再按余弦相似度返回最相关的片段",
+]
+EN_WORDS = (
+    "the of and to in is that for it as with was on be by this are from or have an they which one you "
+    "were all there would their we been has when who will more no if out so said what up its about into"
+).split()
+
+
+def make_cn(rng: random.Random, size: int) -> str:
+    parts, total, section = [], 0, 0
+    while total < size:
+        if rng.random() < 0.02:
+            section += 1
+            line = f"第{section}章 章节标题"
+        else:
+            line = "，".join(rng.choice(CN_SENTENCES) for _ in range(rng.randint(1, 4))) + rng.choice("。！？；")
+        parts.append(line)
+        total += len(line.encode("utf-8")) + 1
+    return "\n".join(parts)
+
+
+def make_en(rng: random.Random, size: int) -> str:
+    parts, total = [], 0
+    while total < size:
+        line = " ".join(rng.choice(EN_WORDS) for _ in range(rng.randint(3, 30))) + rng.choice([".", "?", "!", ";", ""])
+        parts.append(line)
+        total += len(line) + 1
+    return "\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本切分基准测试")
+    parser.add_argument("--mb", type=float, default=5.0, help="每种语言的测试文本大小（MB）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--overlap", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    size = int(args.mb * 1_000_000)
+    print(f"{'lang':<6} | {'size(MB)':>8} | {'chunks':>8} | {'best(s)':>8} | {'MB/s':>8}")
+    for lang, text in (("cn", make_cn(rng, size)), ("en", make_en(rng, size))):
+        mb = len(text.encode("utf-8")) / 1_000_000
+        best, chunks = float("inf"), []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            chunks = text_splitter.split_grouped(text, args.chunk_size, args.overlap)
+            best = min(best, time.perf_counter() - start)
+        print(f"{lang:<6} | {mb:>8.2f} | {len(chunks):>8} | {best:>8.2f} | {mb / best:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+文档向量检索基准测试：逐行 cosine_similarity 循环 vs 矩阵精确检索（flat）vs IVF 近似检索
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python test/bench_vector_search.py
+    PYTHONPATH=. python test/bench_vector_search.py --sizes 10000 100000 1000000 --dim 1024
+
+说明：
+- 逐行循环的数据以 Python list 形式保存（与数据库 JSON 列解析后的形态一致），
+  数据量超过 --loop-limit 时只测前 loop-limit 行并按线性比例外推耗时，避免占用过多内存。
+"""
+import argparse
+import time
+import numpy as np
+from Embedding.document_embedding_model import cosine_similarity
+from Embedding.vector_index import FlatVectorIndex, IVFVectorIndex
+
+
+def make_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 500, 1), dim)).astype(np.float32)
+    labels = rng.integers(0, centers.shape[0], n)
+    return centers[labels] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def bench_loop(vectors: np.ndarray, queries: np.ndarray, top_k: int, loop_limit: int) -> float:
+    n = vectors.shape[0]
+    measured = min(n, loop_limit)
+    stored = vectors[:measured].tolist()
+    start = time.perf_counter()
+    for query in queries:
+        query_vector = query.tolist()
+        similarities = [(i, cosine_similarity(query_vector, vec)) for i, vec in enumerate(stored)]
+        similarities.sort(key=lambda x: x[1], reverse=True)
+        similarities[:top_k]
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return elapsed * n / measured
+
+
+def bench_index(index, queries: np.ndarray, top_k: int) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, top_k)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def recall_at_k(exact: FlatVectorIndex, approx, queries: np.ndarray, top_k: int) -> float:
+    hits = 0
+    for query in queries:
+        truth = {i for i, _ in exact.search(query, top_k)}
+        hits += len(truth & {i for i, _ in approx.search(query, top_k)})
+    return hits / (len(queries) * top_k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文档向量检索基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--loop-limit", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"维度: {args.dim}, 查询数: {args.queries}, top_k: {args.top_k}")
+    print(f"{'向量数':>10} | {'loop(ms)':>10} | {'flat(ms)':>9} | {'加速比':>8} | {'ivf(ms)':>8} | {'ivf召回':>7}")
+    for n in args.sizes:
+        vectors = make_vectors(n, args.dim)
+        queries = make_vectors(args.queries, args.dim, seed=1)
+
+        flat = FlatVectorIndex()
+        flat.add(np.arange(n), vectors)
+        ivf = IVFVectorIndex()
+        ivf.add(np.arange(n), vectors)
+
+        loop_time = bench_loop(vectors, queries, args.top_k, args.loop_limit)
+        flat_time = bench_index(flat, queries, args.top_k)
+        ivf_time = bench_index(ivf, queries, args.top_k)
+        recall = recall_at_k(flat, ivf, queries, args.top_k)
+        extrapolated = "*" if n > args.loop_limit else " "
+        print(f"{n:>10} | {loop_time * 1000:>9.1f}{extrapolated} | {flat_time * 1000:>9.2f} | "
+              f"{loop_time / flat_time:>7.0f}x | {ivf_time * 1000:>8.2f} | {recall:>7.3f}")
+    print("* 按 --loop-limit 行的实测耗时线性外推")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+测试公共夹具
+
+sqlite_database：内存 SQLite 代替 config.database（engine / SessionLocal / execute_sql 与原模块同名同义），
+用于在没有 MySQL 的环境下测试 repository 与 Embedding 中的数据库读写。
+"""
+import sys
+import types
+import pytest
+from sqlalchemy import BigInteger, create_engine, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 才会自增
+    return "INTEGER"
+
+
+@pytest.fixture
+def sqlite_database(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def execute_sql(sql: str, params: dict = None, fetch: str = None):
+        db = session_local()
+        try:
+            result = db.execute(text(sql), params or {})
+            data = None
+            if fetch == "one":
+                row = result.fetchone()
+                data = row._asdict() if row else None
+            elif fetch == "all":
+                data = [row._asdict() for row in result.fetchall()]
+            db.commit()
+            return data
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    database = types.ModuleType("config.database")
+    database.engine = engine
+    database.SessionLocal = session_local
+    database.execute_sql = execute_sql
+    monkeypatch.setitem(sys.modules, "config.database", database)
+    yield database
+    engine.dispose()
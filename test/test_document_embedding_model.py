@@ -0,0 +1,460 @@
+"""
+文档向量服务（Embedding/document_embedding_model.py）数据库读写测试：在内存 SQLite 上用确定的假嵌入模型，
+验证增量更新文档（_reingest_chunks）对未变化 / 元数据变化 / 新增 / 已删除 / 重复 chunk 的处理、
+元数据变化行的向量复制与失败时的整体回滚，批量写入（_insert_rows）各分支返回的 ID 与写入的行一一对应，
+流式入库（process_and_save_document）与整篇读取切分的结果一致、中断后按 skip_chunks / resume_counts 续跑，
+入库 / 删除后检索结果缓存失效，以及检索与入库时的索引增删互斥
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_document_embedding_model.py
+"""
+import hashlib
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.sql.elements import TextClause
+from Embedding import document_embedding_model
+from Embedding.document_embedding_model import (
+    DocumentEmbeddingService, DocumentProcessor, iter_unique_grouped_chunks, unique_grouped_chunks
+)
+from Embedding.search_cache import SearchResultCache
+from Embedding.vector_index import OrgVectorIndexRegistry
+from Embedding.vector_shard import VectorShardStore
+from repository.entity.sql_entity import DocumentEmbedding
+
+ORG = "org1"
+SOURCE = "a.txt"
+DIM = 4
+
+
+class StubEmbeddingModel:
+    """按文本哈希生成固定向量，记录每次向量化的文本；fail_on 中的文本向量化时抛出异常"""
+
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+
+    def embed_many(self, texts, usage=None, **kwargs):
+        self.calls.append(list(texts))
+        if self.fail_on & set(texts):
+            raise RuntimeError("embedding service unavailable")
+        return {"embeddings": [self.vector(text) for text in texts]}
+
+    @staticmethod
+    def vector(text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [float(b) / 255 + 0.01 for b in digest[:DIM]]
+
+
+@pytest.fixture
+def session(sqlite_database):
+    DocumentEmbedding.__table__.create(sqlite_database.engine)
+    db = sqlite_database.SessionLocal()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def shard_store(tmp_path, monkeypatch):
+    store = VectorShardStore(str(tmp_path), compact_threshold=100)
+    monkeypatch.setattr(document_embedding_model, "_SHARD_STORE", store)
+    return store
+
+
+def make_service(session, embedder, **attrs):
+    service = DocumentEmbeddingService(session, embedder, search_mode="flat")
+    service.storage_codec = "f32"
+    for key, value in attrs.items():
+        setattr(service, key, value)
+    return service
+
+
+def chunks(*rows):
+    """rows 为 (section, chunk_index, 正文)"""
+    return [{"section": section, "chunk_index": index, "content": content} for section, index, content in rows]
+
+
+def reingest(service, rows, doc_type="合同", doc_subject="采购", flush_chunks=10):
+    progress = {"parsed": 0, "embedded": 0, "stored": 0, "processed": 0}
+    saved = service._reingest_chunks(
+        iter_unique_grouped_chunks(rows), doc_type, doc_subject, SOURCE, ORG, flush_chunks, progress
+    )
+    return saved, progress
+
+
+def stored_rows(session):
+    """{正文: 行}；行为提交时的列值快照，不随会话过期"""
+    session.expire_all()
+    return {
+        row.content: SimpleNamespace(**{column.name: getattr(row, column.name) for column in DocumentEmbedding.__table__.columns})
+        for row in session.query(DocumentEmbedding).filter(DocumentEmbedding.org_code == ORG).order_by(DocumentEmbedding.id)
+    }
+
+
+def table_state(session):
+    session.expire_all()
+    return [
+        (row.id, row.section, row.chunk_index, row.content, row.embedding_bin)
+        for row in session.query(DocumentEmbedding).order_by(DocumentEmbedding.id)
+    ]
+
+
+ORIGINAL = chunks(("第1节", 0, "甲"), ("第1节", 1, "乙"), ("第2节", 0, "丙"), ("第2节", 1, "丁"))
+
+
+def test_reingest_unchanged_moved_new_vanished_and_duplicate_chunks(session, shard_store):
+    embedder = StubEmbeddingModel()
+    service = make_service(session, embedder)
+    saved, progress = reingest(service, ORIGINAL)
+    assert saved == 4
+    assert progress == {"parsed": 4, "embedded": 4, "stored": 4, "processed": 4}
+    before = stored_rows(session)
+    # 旧版本遗留的同内容重复行
+    session.add(DocumentEmbedding(org_code=ORG, source_name=SOURCE, section="第1节", chunk_index=1, doc_type="合同",
+                                  doc_subject="采购", content="乙", content_hash=before["乙"].content_hash))
+    session.commit()
+    duplicate_id = max(row.id for row in stored_rows(session).values())
+    # 分片已导出时，增量更新后追加新行并标记删除旧行
+    service._get_shard_index(ORG)
+
+    embedder.calls.clear()
+    saved, progress = reingest(service, chunks(
+        ("第1节", 0, "甲"),  # 未变化
+        ("第1节", 5, "乙"),  # 只有序号变化：原地更新
+        ("第3节", 0, "丙"),  # 章节变化：复制向量写入新行
+        ("第3节", 1, "戊"),  # 新增
+        ("第3节", 2, "甲"),  # 本次文档内的重复内容
+    ))
+    assert saved == 1
+    assert progress == {"parsed": 4, "embedded": 1, "stored": 1, "processed": 4}
+    # 只有新增的 chunk 调用嵌入模型
+    assert embedder.calls == [["戊"]]
+
+    after = stored_rows(session)
+    assert sorted(after) == ["丙", "乙", "戊", "甲"]
+    assert (after["甲"].id, after["甲"].chunk_index) == (before["甲"].id, 0)
+    assert (after["乙"].id, after["乙"].chunk_index) == (before["乙"].id, 5)
+    assert after["丙"].id > duplicate_id and after["丙"].section == "第3节"
+    # 元数据变化的行复制原向量，不重新向量化
+    assert after["丙"].embedding_bin == before["丙"].embedding_bin
+    assert np.allclose(service._row_vector(None, after["戊"].embedding_bin, after["戊"].embedding_codec),
+                       StubEmbeddingModel.vector("戊"))
+    assert session.query(DocumentEmbedding).filter(
+        DocumentEmbedding.id.in_([before["丙"].id, before["丁"].id, duplicate_id])
+    ).count() == 0
+
+    # 分片与数据库一致：快照相同，检索范围为库中现存的行
+    index = shard_store.open_index(ORG)
+    assert index.snapshot == service._org_snapshot(ORG)
+    shard_ids = {row_id for row_id, _ in index.search(np.ones(DIM), 10)}
+    assert shard_ids == {row.id for row in after.values()}
+
+
+def test_reingest_doc_type_change_moves_every_row(session, shard_store):
+    embedder = StubEmbeddingModel()
+    service = make_service(session, embedder)
+    reingest(service, ORIGINAL)
+    before = stored_rows(session)
+    embedder.calls.clear()
+
+    saved, _ = reingest(service, ORIGINAL, doc_type="协议")
+    assert saved == 0
+    assert embedder.calls == []
+    after = stored_rows(session)
+    assert {row.doc_type for row in after.values()} == {"协议"}
+    for content, row in after.items():
+        assert row.id != before[content].id
+        assert row.embedding_bin == before[content].embedding_bin
+
+
+def test_reingest_failure_rolls_back_everything(session, shard_store):
+    service = make_service(session, StubEmbeddingModel())
+    reingest(service, ORIGINAL)
+    state = table_state(session)
+
+    # 元数据变化的行与第一批新增 chunk 已写入（未提交），第二批向量化失败：新行、原地更新与删除全部回滚
+    failing = make_service(session, StubEmbeddingModel(fail_on=["己"]), insert_batch_size=1)
+    with pytest.raises(RuntimeError):
+        reingest(failing, chunks(
+            ("第1节", 9, "甲"),
+            ("第3节", 0, "丙"),
+            ("第3节", 1, "戊"),
+            ("第3节", 2, "己"),
+        ), flush_chunks=1)
+    assert failing.embedding_model.calls == [["戊"], ["己"]]
+    assert table_state(session) == state
+    # 回滚后会话仍可用，重跑成功
+    saved, _ = reingest(service, chunks(("第1节", 9, "甲"), ("第3节", 0, "丙"), ("第3节", 1, "戊"), ("第3节", 2, "己")))
+    assert saved == 2
+    assert sorted(stored_rows(session)) == ["丙", "己", "戊", "甲"]
+
+
+class MySQLInsertSession:
+    """
+    在 SQLite 上走 _insert_rows 的 MySQL 分支：方言名为 mysql，@@auto_increment_increment 返回 step，
+    多值 INSERT 按 InnoDB 的方式分配自增值（从 lastrowid 起每行间隔 step），lastrowid 为第一行的 ID
+    """
+
+    def __init__(self, db, step):
+        self.db = db
+        self.step = step
+        self.statements = []
+
+    def get_bind(self):
+        return SimpleNamespace(dialect=SimpleNamespace(name="mysql"))
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        if isinstance(statement, TextClause):
+            assert statement.text == "SELECT @@auto_increment_increment"
+            return self.db.execute(text(f"SELECT {self.step}"))
+        assert params is None, "MySQL 分支应使用多值 INSERT 而不是 executemany"
+        table = DocumentEmbedding.__table__
+        before = self.db.execute(select(func.max(table.c.id))).scalar() or 0
+        self.db.execute(statement)
+        inserted = self.db.execute(select(table.c.id).where(table.c.id > before).order_by(table.c.id)).scalars().all()
+        first_id = before + self.step
+        # 从大到小改号，避免与尚未改号的行冲突
+        for i, row_id in reversed(list(enumerate(inserted))):
+            self.db.execute(table.update().where(table.c.id == row_id).values(id=first_id + self.step * i))
+        return SimpleNamespace(lastrowid=first_id)
+
+
+def embedding_rows(service, count, start=0):
+    return [
+        service._chunk_row({"section": f"第{i % 3}节", "chunk_index": i}, f"正文{i}", f"hash{i}", "合同", "采购",
+                           SOURCE, ORG, StubEmbeddingModel.vector(f"正文{i}"))
+        for i in range(start, start + count)
+    ]
+
+
+def assert_ids_match_rows(session, ids, rows):
+    contents = dict(session.query(DocumentEmbedding.id, DocumentEmbedding.content).all())
+    assert len(set(ids)) == len(ids) == len(rows)
+    assert [contents[row_id] for row_id in ids] == [row["content"] for row in rows]
+
+
+def seed_gap(session):
+    # 先写入再删除若干行，使新 ID 不从 1 开始
+    session.add_all([DocumentEmbedding(org_code=ORG, content=f"旧{i}") for i in range(3)])
+    session.flush()
+    session.query(DocumentEmbedding).filter(DocumentEmbedding.content == "旧1").delete()
+    session.flush()
+
+
+@pytest.mark.parametrize("storage_codec", ["json", "f32"])
+def test_insert_rows_executemany_returning(session, storage_codec):
+    assert session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order
+    service = make_service(session, StubEmbeddingModel(), storage_codec=storage_codec, insert_batch_size=3)
+    seed_gap(session)
+    rows = embedding_rows(service, 7)
+    ids = service._insert_rows(rows)
+    assert_ids_match_rows(session, ids, rows)
+    assert ids == sorted(ids) and ids[0] > 3
+    session.commit()
+    assert_ids_match_rows(session, ids, rows)
+
+
+@pytest.mark.parametrize("step", [1, 2])
+def test_insert_rows_mysql_multi_values_lastrowid(session, step):
+    service = make_service(session, StubEmbeddingModel(), insert_batch_size=3)
+    seed_gap(session)
+    mysql_session = MySQLInsertSession(session, step)
+    service.db = mysql_session
+    rows = embedding_rows(service, 7)
+    ids = service._insert_rows(rows)
+    # 1 条 @@auto_increment_increment 查询 + 7 行按每条 3 行分 3 条 INSERT
+    assert len(mysql_session.statements) == 4
+    # 同一条 INSERT 内的 ID 间隔 step
+    for i in range(0, len(ids), 3):
+        assert all(b - a == step for a, b in zip(ids[i:i + 3], ids[i + 1:i + 3]))
+    assert_ids_match_rows(session, ids, rows)
+
+    more = embedding_rows(service, 2, start=7)
+    more_ids = service._insert_rows(more)
+    assert min(more_ids) > max(ids)
+    assert_ids_match_rows(session, ids + more_ids, rows + more)
+
+
+def test_insert_rows_orm_fallback_and_empty(session):
+    service = make_service(session, StubEmbeddingModel(), bulk_insert=False)
+    assert service._insert_rows([]) == []
+    seed_gap(session)
+    rows = embedding_rows(service, 4)
+    ids = service._insert_rows(rows)
+    assert_ids_match_rows(session, ids, rows)
+
+
+def write_document(tmp_path):
+    """三章、每章若干段的 txt 文档，其中一段在两章中重复出现"""
+    repeated = "所有审批记录需保存五年以上，以备审计查阅。"
+    chapters = []
+    for c, title in enumerate(["第一章 总则", "第二章 采购流程", "第三章 付款与报销"]):
+        paragraphs = [f"本章第{i}项要求：申请人应在{i + 3}个工作日内提交第{c}类材料，由负责人审核并签字确认。"
+                      for i in range(6)]
+        paragraphs.insert(3, repeated)
+        chapters.append(title + "\n" + "\n".join(paragraphs))
+    path = tmp_path / "制度.txt"
+    path.write_text("\n\n".join(chapters), encoding="utf-8")
+    return str(path)
+
+
+def expected_chunks(path, chunk_size, overlap):
+    """整篇读取后切分去重（流式入库之前的处理方式）"""
+    processor = DocumentProcessor(None)
+    grouped = processor.split_document_grouped(processor.read_document(path), chunk_size, overlap)
+    return [(str(item.get("section", "") or ""), int(item.get("chunk_index", 0) or 0), chunk, content_hash)
+            for item, chunk, content_hash in unique_grouped_chunks(grouped)]
+
+
+def stored_chunks(session):
+    session.expire_all()
+    return [(row.section, row.chunk_index, row.content, row.content_hash)
+            for row in session.query(DocumentEmbedding).order_by(DocumentEmbedding.id)]
+
+
+def streaming_service(session, embedder, monkeypatch):
+    service = make_service(session, embedder)
+    processor = service.document_processor
+    # 小块读取，chunk 跨越读取块的边界
+    monkeypatch.setattr(processor, "iter_document_pages", lambda path: DocumentProcessor._iter_txt(processor, path, block_size=37))
+    return service
+
+
+def test_streaming_ingest_stores_same_chunks_as_whole_document(session, shard_store, tmp_path, monkeypatch):
+    path = write_document(tmp_path)
+    expected = expected_chunks(path, 60, 10)
+    assert len(expected) > 10
+    embedder = StubEmbeddingModel()
+    service = streaming_service(session, embedder, monkeypatch)
+    reports = []
+    saved = service.process_and_save_document(path, "制度", "采购", ORG, chunk_size=60, overlap=10, flush_chunks=4,
+                                              progress_callback=reports.append)
+    assert saved == len(expected)
+    assert stored_chunks(session) == expected
+    # 每批最多 4 条向量化一次，每批提交后回调一次
+    assert [len(batch) for batch in embedder.calls] == [4] * (len(expected) // 4) + ([len(expected) % 4] if len(expected) % 4 else [])
+    assert len(reports) == len(embedder.calls)
+    assert reports[-1] == {"parsed": len(expected), "embedded": len(expected), "stored": len(expected), "processed": len(expected)}
+
+
+def test_streaming_ingest_resumes_after_interruption(session, shard_store, tmp_path, monkeypatch):
+    path = write_document(tmp_path)
+    expected = expected_chunks(path, 60, 10)
+    reports = []
+
+    def stop_after_two_batches(progress):
+        reports.append(progress)
+        if len(reports) == 2:
+            raise RuntimeError("cancelled")
+
+    first = StubEmbeddingModel()
+    with pytest.raises(RuntimeError):
+        streaming_service(session, first, monkeypatch).process_and_save_document(
+            path, "制度", "采购", ORG, chunk_size=60, overlap=10, flush_chunks=4, progress_callback=stop_after_two_batches
+        )
+    # 已提交的两批保留
+    assert stored_chunks(session) == expected[:8]
+
+    # 按最后一次回调的进度续跑：跳过已入库的 chunk，计数在此基础上累加
+    resumed = StubEmbeddingModel()
+    done = reports[-1]
+    reports.clear()
+    saved = streaming_service(session, resumed, monkeypatch).process_and_save_document(
+        path, "制度", "采购", ORG, chunk_size=60, overlap=10, flush_chunks=4,
+        skip_chunks=done["processed"], resume_counts={"embedded": done["embedded"], "stored": done["stored"]},
+        progress_callback=reports.append
+    )
+    assert saved == len(expected) - 8
+    assert stored_chunks(session) == expected
+    assert [text for batch in resumed.calls for text in batch] == [chunk for _, _, chunk, _ in expected[8:]]
+    assert reports[-1] == {"parsed": len(expected), "embedded": len(expected), "stored": len(expected), "processed": len(expected)}
+
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    cache = SearchResultCache(snapshot_seconds=60)
+    monkeypatch.setattr(document_embedding_model, "get_search_result_cache", lambda: cache)
+    return cache
+
+
+def cache_top_rows(service, session, query="采购"):
+    """未命中时把当前所有行作为检索结果写入缓存，返回命中的正文列表或 None"""
+    cached, snapshot = service.get_cached_results(query, ORG, 5)
+    if cached is not None:
+        return [row.content for row, _ in cached]
+    rows = session.query(DocumentEmbedding).filter(DocumentEmbedding.org_code == ORG).order_by(DocumentEmbedding.id).all()
+    service.cache_results(query, ORG, 5, snapshot, [(row, 1.0) for row in rows])
+    return None
+
+
+def test_result_cache_invalidated_by_insert_and_delete(session, shard_store, result_cache):
+    service = make_service(session, StubEmbeddingModel())
+    reingest(service, ORIGINAL)
+    assert cache_top_rows(service, session) is None
+    # 命中时不再查询数据库的行数 / 最大ID
+    for _ in range(3):
+        assert cache_top_rows(service, session) == ["甲", "乙", "丙", "丁"]
+    assert result_cache.stats()["snapshot_queries"] == 1
+
+    # 新增 chunk 后失效
+    reingest(service, ORIGINAL + chunks(("第3节", 0, "戊")))
+    assert cache_top_rows(service, session) is None
+    assert cache_top_rows(service, session) == ["甲", "乙", "丙", "丁", "戊"]
+
+    # 删除 chunk 后失效
+    reingest(service, ORIGINAL[:2])
+    assert cache_top_rows(service, session) is None
+    assert cache_top_rows(service, session) == ["甲", "乙"]
+
+
+@pytest.fixture
+def index_registries(monkeypatch):
+    vector = {mode: OrgVectorIndexRegistry() for mode in ("ivf", "flat", "int8")}
+    keyword = OrgVectorIndexRegistry()
+    monkeypatch.setattr(document_embedding_model, "_ORG_VECTOR_INDEXES", vector)
+    monkeypatch.setattr(document_embedding_model, "_KEYWORD_INDEXES", keyword)
+    return vector, keyword
+
+
+@pytest.mark.parametrize("kind", ["vector", "keyword"])
+def test_index_search_blocks_concurrent_remove(session, shard_store, index_registries, kind):
+    service = make_service(session, StubEmbeddingModel())
+    reingest(service, ORIGINAL)
+    ids = {content: row.id for content, row in stored_rows(session).items()}
+    query_vector = StubEmbeddingModel.vector("甲")
+
+    def search():
+        if kind == "vector":
+            return service._search_index_ids(query_vector, ORG, 10)
+        return [(row.id, score) for row, score in service.search_keyword_documents("甲 乙 丙 丁", ORG, 10)]
+
+    assert len(search()) == 4
+    index, _ = (index_registries[0]["flat"] if kind == "vector" else index_registries[1]).get(ORG)
+    method = "search_batch" if kind == "vector" else "search"
+    original = getattr(index, method)
+    entered, release = threading.Event(), threading.Event()
+
+    def blocking_search(*args, **kwargs):
+        entered.set()
+        assert release.wait(5)
+        return original(*args, **kwargs)
+
+    setattr(index, method, blocking_search)
+    found = []
+    searcher = threading.Thread(target=lambda: found.extend(search()))
+    searcher.start()
+    assert entered.wait(5)
+    removed = threading.Event()
+    writer = threading.Thread(target=lambda: (service._remove_from_org_index(ORG, [ids["甲"]]), removed.set()))
+    writer.start()
+    # 检索进行中，入库线程的删除（就地压缩索引数组）需等待检索结束
+    assert not removed.wait(0.2)
+    release.set()
+    searcher.join(5)
+    writer.join(5)
+    assert removed.is_set()
+    assert {row_id for row_id, _ in found} == set(ids.values())
+    assert len(index) == 3
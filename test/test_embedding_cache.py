@@ -0,0 +1,126 @@
+"""
+嵌入向量缓存（model/embedding_cache.py）单元测试：内存 / SQLite 命中与未命中、按 model 与 dimensions 区分键、
+内存 LRU 淘汰、SQLite 按访问时间淘汰，以及读路径不写盘、访问时间批量写回
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_embedding_cache.py
+"""
+import pytest
+from model import embedding_cache
+from model.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可控的 time.time()"""
+    now = {"value": 1000.0}
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now["value"])
+    return now
+
+
+def make_cache(tmp_path, **kwargs):
+    return EmbeddingCache(db_path=str(tmp_path / "cache.db"), **kwargs)
+
+
+def key(text, model="text-embedding-v4", dimensions=None):
+    return EmbeddingCache.make_key(text, model, dimensions)
+
+
+def db_access(cache, text):
+    content_hash, model, dimensions = key(text)
+    row = cache._conn.execute(
+        "SELECT last_access FROM embedding_cache WHERE content_hash=? AND model=? AND dimensions=?",
+        (content_hash, model, dimensions)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def test_hit_and_miss_across_memory_and_disk(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many([(key("甲"), [1.0, 2.0]), (key("乙"), [3.0, 4.0])])
+    assert cache.get_many([key("甲"), key("丙"), key("乙")]) == {0: [1.0, 2.0], 2: [3.0, 4.0]}
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["db_hits"], stats["misses"]) == (2, 0, 1)
+
+    # 新实例（另一个 worker）从 SQLite 读取，之后进入内存
+    other = make_cache(tmp_path)
+    assert other.get_many([key("乙"), key("乙")]) == {0: [3.0, 4.0], 1: [3.0, 4.0]}
+    assert other.stats()["db_hits"] == 2
+    assert other.get_many([key("乙")]) == {0: [3.0, 4.0]}
+    assert other.stats()["memory_hits"] == 1
+
+
+def test_key_includes_model_and_dimensions(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many([(key("甲", dimensions=512), [1.0])])
+    assert cache.get_many([key("甲", dimensions=1024), key("甲", model="text-embedding-v3", dimensions=512)]) == {}
+    assert cache.get_many([key("甲", dimensions=512)]) == {0: [1.0]}
+    # 空白差异归一化后为同一条文本
+    assert key(" 甲 ", dimensions=512) == key("甲", dimensions=512)
+    assert make_cache(tmp_path).get_many([key("甲", dimensions=1024)]) == {}
+
+
+def test_memory_lru_eviction(tmp_path):
+    cache = make_cache(tmp_path, memory_items=2)
+    cache.put_many([(key("甲"), [1.0]), (key("乙"), [2.0])])
+    cache.get_many([key("甲")])
+    cache.put_many([(key("丙"), [3.0])])
+    assert list(cache._memory) == [key("甲"), key("丙")]
+    # 被内存淘汰的仍可从 SQLite 读取
+    assert cache.get_many([key("乙")]) == {0: [2.0]}
+    assert cache.stats()["db_hits"] == 1
+
+
+def test_memory_only_cache(tmp_path):
+    cache = EmbeddingCache(db_path=None, memory_items=1)
+    cache.put_many([(key("甲"), [1.0]), (key("乙"), [2.0])])
+    assert cache.get_many([key("甲"), key("乙")]) == {1: [2.0]}
+    assert cache.stats()["persistent"] is False
+
+
+def test_reads_do_not_write_until_flush(tmp_path, clock):
+    cache = make_cache(tmp_path, memory_items=0, access_flush_seconds=60)
+    cache.put_many([(key("甲"), [1.0])])
+    changes = cache._conn.total_changes
+    clock["value"] = 1010
+    for _ in range(5):
+        assert cache.get_many([key("甲")]) == {0: [1.0]}
+    # 命中不执行 UPDATE / 提交
+    assert cache._conn.total_changes == changes
+    assert db_access(cache, "甲") == 1000
+    assert cache.stats()["pending_access"] == 1
+
+    # 超过写回间隔后下一次读取批量写回
+    clock["value"] = 1070
+    cache.get_many([key("甲")])
+    assert db_access(cache, "甲") == 1070
+    assert cache.stats()["pending_access"] == 0
+
+
+def test_flush_after_item_threshold(tmp_path, clock):
+    cache = make_cache(tmp_path, memory_items=0, access_flush_seconds=3600, access_flush_items=3)
+    cache.put_many([(key(text), [1.0]) for text in "甲乙丙"])
+    clock["value"] = 2000
+    cache.get_many([key("甲"), key("乙")])
+    assert db_access(cache, "甲") == 1000
+    cache.get_many([key("丙")])
+    assert [db_access(cache, text) for text in "甲乙丙"] == [2000, 2000, 2000]
+
+
+def test_db_eviction_keeps_recently_read_rows(tmp_path, clock):
+    cache = make_cache(tmp_path, memory_items=0, max_db_items=10, access_flush_seconds=3600)
+    texts = [f"文本{i}" for i in range(20)]
+    cache.put_many([(key(text), [float(i)]) for i, text in enumerate(texts)])
+    clock["value"] = 2000
+    # 读到的行访问时间只在内存中；淘汰前先写回，不会按旧时间被删除
+    assert len(cache.get_many([key(text) for text in texts[:5]])) == 5
+    cache._evict()
+    remaining = cache._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+    assert remaining == 9
+    assert all(db_access(cache, text) == 2000 for text in texts[:5])
+    assert cache.stats()["evictions"] == 11
+
+
+def test_flush_embedding_cache_without_instance(monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", None)
+    embedding_cache.flush_embedding_cache()
@@ -0,0 +1,137 @@
+"""
+向量接口（ctl/embedding_ctl.py）测试：用 TestClient 调用路由，假嵌入模型代替 DashScope，
+验证 /batch-generate 返回的单次请求用量，以及 /document/search/batch 按请求顺序返回各查询的结果、
+空查询列表与超过 vector_search.batch_max_queries 时返回 400
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_embedding_ctl.py
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from model import embedding_model, get_embedding_model
+from model.embedding_cache import EmbeddingCache
+from model.embedding_model import TextEmbeddingModel
+
+
+def fake_vector(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """真实的 TextEmbeddingModel（缓存、分批、用量累加），只把 DashScope 请求换成按文本长度报告 token 数的假响应"""
+    monkeypatch.setattr(embedding_model, "get_embedding_cache", lambda: None)
+    fake = TextEmbeddingModel(api_key="test-key")
+    fake.cache = EmbeddingCache(db_path=None)
+    fake.requests = []
+
+    async def embed_text_async(input_text, model=None, dimensions=None):
+        texts = input_text if isinstance(input_text, list) else [input_text]
+        fake.requests.append(texts)
+        embeddings = [fake_vector(text) for text in texts]
+        return {"success": True, "embedding": embeddings[0], "embeddings": embeddings,
+                "total_tokens": sum(len(text) for text in texts)}
+
+    fake.embed_text_async = embed_text_async
+    return fake
+
+
+@pytest.fixture
+def client(sqlite_database, fake_model):
+    from ctl import embedding_ctl
+    app = FastAPI()
+    app.include_router(embedding_ctl.router, prefix="/embedding")
+    app.dependency_overrides[get_embedding_model] = lambda: fake_model
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_batch_generate_usage_matches_provider_tokens(client, fake_model):
+    texts = ["采购合同", "销售合同的付款方式", "报销"]
+    body = client.post("/embedding/batch-generate", json={"texts": texts}).json()
+    assert body["success"]
+    assert [item["text"] for item in body["embeddings"]] == texts
+    assert body["total_tokens"] == sum(len(text) for text in texts)
+    assert body["usage"] == {"texts": 3, "cached": 0, "calls": 1, "total_tokens": body["total_tokens"]}
+
+    # 每个请求单独累计；命中缓存的文本不计 token
+    body = client.post("/embedding/batch-generate", json={"texts": texts[:2] + ["新增"]}).json()
+    assert body["usage"] == {"texts": 3, "cached": 2, "calls": 1, "total_tokens": 2}
+    assert body["total_tokens"] == 2
+    assert fake_model.requests == [texts, ["新增"]]
+
+
+CONTENTS = ["采购", "付款审批流程", "合同归档", "差旅报销标准说明", "供应商准入"]
+
+
+@pytest.fixture
+def search_client(client, sqlite_database, monkeypatch):
+    """组织 org1 下每条正文一行，向量与查询同一文本时的假向量相同；索引与结果缓存使用新实例"""
+    from core.dependencies import get_db
+    from Embedding import document_embedding_model
+    from Embedding.search_cache import SearchResultCache
+    from Embedding.vector_index import OrgVectorIndexRegistry
+    from repository.entity.sql_entity import DocumentEmbedding
+
+    monkeypatch.setattr(document_embedding_model, "_ORG_VECTOR_INDEXES",
+                        {mode: OrgVectorIndexRegistry() for mode in ("ivf", "flat", "int8")})
+    monkeypatch.setattr(document_embedding_model, "_KEYWORD_INDEXES", OrgVectorIndexRegistry())
+    result_cache = SearchResultCache()
+    monkeypatch.setattr(document_embedding_model, "get_search_result_cache", lambda: result_cache)
+
+    DocumentEmbedding.__table__.create(sqlite_database.engine)
+    db = sqlite_database.SessionLocal()
+    db.add_all([
+        DocumentEmbedding(org_code="org1", doc_type="制度", doc_subject="采购", section=f"第{i}节", chunk_index=0,
+                          content=content, embedding=fake_vector(content))
+        for i, content in enumerate(CONTENTS)
+    ])
+    db.commit()
+    db.close()
+
+    def get_test_db():
+        session = sqlite_database.SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    client.app.dependency_overrides[get_db] = get_test_db
+    return client
+
+
+def test_batch_search_returns_results_in_query_order(search_client, fake_model):
+    queries = ["合同归档", "采购", "差旅报销标准说明"]
+    body = search_client.post("/embedding/document/search/batch", json={"queries": queries, "org_code": "org1", "top_k": 2}).json()
+    assert body["success"]
+    assert [item["query"] for item in body["results"]] == queries
+    for query, item in zip(queries, body["results"]):
+        # 与查询同一文本的行相似度为 1，排在第一位
+        assert item["error"] is None and len(item["results"]) == 2
+        assert item["results"][0]["embedding_content"] == query
+        assert item["results"][0]["similarity"] == pytest.approx(1.0)
+    # 全部查询一次批量生成向量
+    assert fake_model.requests == [queries]
+
+    # 再次请求：已缓存的查询不再生成向量，顺序仍与请求一致
+    queries = ["供应商准入", "合同归档"]
+    body = search_client.post("/embedding/document/search/batch", json={"queries": queries, "org_code": "org1", "top_k": 2}).json()
+    assert [item["results"][0]["embedding_content"] for item in body["results"]] == queries
+    assert fake_model.requests[-1] == ["供应商准入"]
+    assert body["usage"]["cached"] == 0 and body["usage"]["texts"] == 1
+
+
+def test_batch_search_rejects_empty_and_oversized_query_lists(search_client, fake_model):
+    from config.config import config
+    max_queries = int(config.get("vector_search.batch_max_queries", 64) or 64)
+    response = search_client.post("/embedding/document/search/batch", json={"queries": [], "org_code": "org1"})
+    assert response.status_code == 400
+    response = search_client.post("/embedding/document/search/batch",
+                                  json={"queries": [f"查询{i}" for i in range(max_queries + 1)], "org_code": "org1"})
+    assert response.status_code == 400
+    assert str(max_queries) in response.json()["detail"]
+    response = search_client.post("/embedding/document/search/batch",
+                                  json={"queries": ["采购"], "org_code": "org1", "mode": "fuzzy"})
+    assert response.status_code == 400
+    assert fake_model.requests == []
@@ -0,0 +1,198 @@
+"""
+文本嵌入（model/embedding_model.py、model/embedding_client.py）单元测试：批量嵌入跨批次保持输入顺序、
+整批失败后逐条重试且失败项为 None、单次请求的用量统计（token 数取自服务端返回，缓存命中不计 token），
+以及异步客户端对非 JSON 对象错误响应的处理
+
+用假的 embed_text / HTTP 响应代替 DashScope，不发起网络请求。
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_embedding_model.py
+"""
+import asyncio
+import pytest
+from model import embedding_model
+from model.embedding_cache import EmbeddingCache
+from model.embedding_client import AsyncEmbeddingClient
+from model.embedding_model import TextEmbeddingModel
+from model.embedding_usage import EmbeddingUsage
+
+
+def fake_vector(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+
+def fake_response(texts, fail_texts=()):
+    """与 embed_text 返回结构一致；包含 fail_texts 中的文本时整批失败"""
+    texts = texts if isinstance(texts, list) else [texts]
+    if set(texts) & set(fail_texts):
+        return {"success": False, "error": "API调用失败，错误码: InvalidParameter", "data": None}
+    embeddings = [fake_vector(text) for text in texts]
+    return {"success": True, "embedding": embeddings[0], "embeddings": embeddings,
+            "total_tokens": sum(len(text) for text in texts)}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(embedding_model, "get_embedding_cache", lambda: None)
+    embedder = TextEmbeddingModel(api_key="test-key")
+    embedder.batch_size = 4
+    embedder.requests = []
+    embedder.fail_texts = set()
+
+    def embed_text(input_text, model=None, dimensions=None):
+        embedder.requests.append(input_text)
+        return fake_response(input_text, embedder.fail_texts)
+
+    async def embed_text_async(input_text, model=None, dimensions=None):
+        embedder.requests.append(input_text)
+        # 先发出的批次后返回，验证结果不依赖完成顺序
+        await asyncio.sleep(0.02 / len(embedder.requests))
+        return fake_response(input_text, embedder.fail_texts)
+
+    embedder.embed_text = embed_text
+    embedder.embed_text_async = embed_text_async
+    return embedder
+
+
+TEXTS = [f"文本{i}" * (i % 3 + 1) for i in range(11)]
+
+
+def test_embed_many_keeps_input_order_across_batches(model):
+    result = model.embed_many(TEXTS)
+    assert result["success"]
+    assert result["embeddings"] == [fake_vector(text) for text in TEXTS]
+    # 11 条按每批 4 条请求 3 次
+    assert [len(batch) for batch in model.requests] == [4, 4, 3]
+    assert result["calls"] == 3
+    assert result["total_tokens"] == sum(len(text) for text in TEXTS)
+
+
+def test_failed_batch_retries_singly_and_leaves_none(model):
+    model.fail_texts = {TEXTS[5]}
+    texts = TEXTS[:4] + ["", TEXTS[5]] + TEXTS[6:]
+    result = model.embed_many(texts)
+    assert not result["success"]
+    # 空文本不请求；失败的那一批逐条重试，只有无法嵌入的文本为 None
+    assert set(result["errors"]) == {4, 5}
+    for i, text in enumerate(texts):
+        assert result["embeddings"][i] == (None if i in (4, 5) else fake_vector(text))
+    assert result["calls"] == 3 + 4
+
+
+def test_embed_many_async_keeps_order_and_positions(model):
+    model.fail_texts = {TEXTS[9]}
+    result = asyncio.run(model.embed_many_async(TEXTS))
+    assert set(result["errors"]) == {9}
+    for i, text in enumerate(TEXTS):
+        assert result["embeddings"][i] == (None if i == 9 else fake_vector(text))
+
+
+def provider_tokens(texts):
+    """假服务端对这些文本报告的 token 数"""
+    return sum(len(text) for text in texts)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_usage_matches_provider_tokens_and_cache_hits_are_free(model, use_async):
+    model.cache = EmbeddingCache(db_path=None)
+
+    def embed(texts, usage):
+        if use_async:
+            return asyncio.run(model.embed_many_async(texts, usage=usage))
+        return model.embed_many(texts, usage=usage)
+
+    first = EmbeddingUsage()
+    result = embed(TEXTS, first)
+    assert first.to_dict() == {"texts": 11, "cached": 0, "calls": 3, "total_tokens": provider_tokens(TEXTS)}
+    assert result["total_tokens"] == first.total_tokens
+
+    # 第二个请求：前 6 条命中缓存，不计 token，也不调用服务端
+    second = EmbeddingUsage()
+    extra = ["新文本甲", "新文本乙"]
+    model.requests.clear()
+    embed(TEXTS[:6] + extra, second)
+    assert second.to_dict() == {"texts": 8, "cached": 6, "calls": 1, "total_tokens": provider_tokens(extra)}
+    assert model.requests == [extra]
+
+    # 全部命中缓存
+    third = EmbeddingUsage()
+    embed(TEXTS, third)
+    assert third.to_dict() == {"texts": 11, "cached": 11, "calls": 0, "total_tokens": 0}
+
+
+def test_usage_counts_only_successful_retries(model):
+    model.fail_texts = {TEXTS[1]}
+    usage = EmbeddingUsage()
+    model.embed_many(TEXTS[:4], usage=usage)
+    # 整批失败不计 token；逐条重试成功的 3 条按各自返回的 token 数累加
+    assert usage.calls == 1 + 4
+    assert usage.total_tokens == provider_tokens([TEXTS[0], TEXTS[2], TEXTS[3]])
+
+
+def test_get_embedding_vector_list_input_usage(model):
+    usage = EmbeddingUsage()
+    model.get_embedding_vector(["甲乙", "丙"], usage=usage)
+    assert usage.to_dict() == {"texts": 2, "cached": 0, "calls": 1, "total_tokens": 3}
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    async def json(self, content_type=None):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    closed = False
+
+    def __init__(self, response):
+        self.response = response
+        self.payloads = []
+
+    def post(self, url, json=None, headers=None):
+        self.payloads.append(json)
+        return self.response
+
+
+def run_client(status, body, texts=("甲", "乙")):
+    client = AsyncEmbeddingClient(api_key="test-key")
+    session = FakeSession(FakeResponse(status, body))
+
+    async def call():
+        client._session = session
+        client._semaphore = asyncio.Semaphore(1)
+        return await client.embed(list(texts), "text-embedding-v4", 256)
+
+    return asyncio.run(call()), session
+
+
+@pytest.mark.parametrize("status, body", [
+    (502, ["bad gateway"]),
+    (502, "upstream error"),
+    (200, None),
+    (400, {"code": "InvalidParameter", "message": "too long"}),
+])
+def test_async_client_error_response_does_not_raise(status, body):
+    result, _ = run_client(status, body)
+    assert result["success"] is False
+    assert "API调用失败" in result["error"]
+
+
+def test_async_client_orders_by_text_index():
+    body = {
+        "output": {"embeddings": [{"text_index": 1, "embedding": [2.0]}, {"text_index": 0, "embedding": [1.0]}]},
+        "usage": {"total_tokens": 7}
+    }
+    result, session = run_client(200, body)
+    assert result["success"]
+    assert result["embeddings"] == [[1.0], [2.0]]
+    assert result["total_tokens"] == 7
+    assert session.payloads[0]["parameters"] == {"dimension": 256}
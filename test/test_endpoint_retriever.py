@@ -0,0 +1,119 @@
+"""
+接口预检索（active/endpoint_retriever.py）单元测试：EndpointIndex.search 的排序 / 必选接口 / 嵌入失败接口、
+提示词预算（EndpointPrompts.select）只截掉相似度最低的候选，以及索引建立失败的重试等待与按 key 加锁
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_endpoint_retriever.py
+"""
+import asyncio
+import numpy as np
+from active.endpoint_prompts import EndpointPrompts
+from active.endpoint_retriever import EndpointIndex, EndpointRetriever
+
+
+def make_index(missing=(), always=()):
+    # 接口 0..5，其中 missing 中的接口没有向量；向量为单位向量，与查询 e0 的相似度按下标递增
+    rows = [i for i in range(6) if i not in missing]
+    vectors = np.asarray([[i / 10, np.sqrt(1 - (i / 10) ** 2)] for i in rows], dtype=np.float32)
+    return EndpointIndex("fp", vectors, np.asarray(rows, dtype=np.int64), list(missing), list(always))
+
+
+QUERY = np.asarray([1.0, 0.0], dtype=np.float32)
+
+
+def test_search_returns_top_n_by_similarity():
+    assert make_index().search(QUERY, 3) == [5, 4, 3]
+    # top_n 超过接口数时返回全部
+    assert make_index().search(QUERY, 100) == [5, 4, 3, 2, 1, 0]
+
+
+def test_search_puts_always_include_first_without_duplicates():
+    assert make_index(always=[0, 4]).search(QUERY, 2) == [0, 4, 5]
+
+
+def test_search_puts_missing_rows_first():
+    assert make_index(missing=[5, 2]).search(QUERY, 2) == [5, 2, 4, 3]
+    assert make_index(missing=[1], always=[1, 0]).search(QUERY, 1) == [1, 0, 5]
+
+
+def test_search_without_vectors_returns_only_fallback_rows():
+    index = EndpointIndex("fp", np.empty((0, 2), dtype=np.float32), np.empty(0, dtype=np.int64), [0, 1], [1])
+    assert index.search(QUERY, 3) == [1, 0]
+
+
+def test_select_budget_keeps_always_and_missing_rows():
+    prompts = EndpointPrompts(make_endpoints(6))
+    candidates = make_index(missing=[2], always=[0]).search(QUERY, 3)
+    assert candidates == [0, 2, 5, 4, 3]
+    # 预算只够必选、嵌入失败的接口和相似度最高的一个
+    budget = sum(prompts.tokens[row] for row in (0, 2, 5))
+    assert prompts.select(candidates, budget, log=False) == [0, 2, 5]
+    assert prompts.select(candidates, budget + prompts.tokens[4] - 1, log=False) == [0, 2, 5]
+    assert prompts.count_tokens(candidates, budget) == budget
+    rendered = prompts.render(candidates, budget).splitlines()
+    assert [line.split(".")[0] for line in rendered] == ["1", "3", "6"]
+    # 不限预算时全部发送
+    assert prompts.select(candidates, 0, log=False) == candidates
+
+
+class FakeRetriever(EndpointRetriever):
+    """用确定的假向量代替嵌入接口，记录每次嵌入的文本"""
+
+    def __init__(self, fail: bool = False, delay: float = 0.0, **kwargs):
+        super().__init__(top_n=2, min_endpoints=0, **kwargs)
+        self.fail = fail
+        self.delay = delay
+        self.calls = []
+
+    async def _embed(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("embedding service unavailable")
+        return {"embeddings": [[float(len(text)), 1.0] for text in texts]}
+
+
+def make_endpoints(count: int, prefix: str = "/api"):
+    return [{"method": "GET", "path": f"{prefix}/r{i}", "summary": "x" * i} for i in range(count)]
+
+
+def test_build_failure_is_cached_until_retry_window_passes():
+    retriever = FakeRetriever(fail=True, failure_retry=60)
+    endpoints = make_endpoints(3)
+
+    async def run():
+        assert await retriever.build("doc", endpoints) is None
+        assert await retriever.build("doc", endpoints) is None
+        assert await retriever.retrieve("doc", endpoints, "查询") is None
+        assert len(retriever.calls) == 1
+        # 接口列表变化后立即重试
+        assert await retriever.build("doc", make_endpoints(4)) is None
+        assert len(retriever.calls) == 2
+        # 等待期结束后重试成功
+        retriever.fail = False
+        retriever._failures["doc"] = (retriever._failures["doc"][0], 0.0)
+        assert await retriever.build("doc", make_endpoints(4)) is not None
+
+    asyncio.run(run())
+    stats = retriever.stats()
+    assert stats["build_failures"] == 2
+    assert stats["build_skipped"] >= 2
+
+
+def test_builds_for_different_keys_run_concurrently():
+    retriever = FakeRetriever(delay=0.2)
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        first, second, again = await asyncio.gather(
+            retriever.build("a", make_endpoints(3, "/a")),
+            retriever.build("b", make_endpoints(3, "/b")),
+            retriever.build("a", make_endpoints(3, "/a"))
+        )
+        return first, second, again, asyncio.get_running_loop().time() - start
+
+    first, second, again, elapsed = asyncio.run(run())
+    assert first is again and second is not None
+    # 同一 key 只嵌入一次；不同 key 不互相等待
+    assert len(retriever.calls) == 2
+    assert elapsed < 0.35
@@ -0,0 +1,113 @@
+"""
+共享 HTTP 客户端（core/http_client.py）测试：会话首次使用时懒创建、多次调用复用同一会话与长连接、
+lifespan 关闭时释放，关闭后再次使用重新创建
+
+用 aiohttp 本地测试服务器代替下游接口，不访问外部网络。
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_http_client.py
+"""
+import ast
+import asyncio
+import os
+from contextlib import asynccontextmanager
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from core import http_client
+from core.http_client import HttpClientManager, close_http_client, get_http_client
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """新的进程级单例，不影响其他测试"""
+    monkeypatch.setattr(http_client, "_http_client", None)
+    return get_http_client()
+
+
+async def start_server():
+    async def ok(request):
+        return web.json_response({"path": request.path})
+
+    app = web.Application()
+    app.router.add_get("/{name}", ok)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def test_session_is_lazy_and_reused(manager):
+    async def run():
+        server = await start_server()
+        try:
+            # 未使用前不创建会话
+            assert manager._session is None and manager.stats()["open"] is False
+            session = manager.session
+            for name in ("a", "b", "c"):
+                assert get_http_client().session is session
+                async with get_http_client().session.get(server.make_url(f"/{name}")) as response:
+                    assert (await response.json()) == {"path": f"/{name}"}
+            stats = manager.stats()
+            # 三次调用共用一条长连接
+            assert stats["requests"] == 3
+            assert (stats["connections_created"], stats["connections_reused"]) == (1, 2)
+            assert stats["hosts"] == {server.host: 3}
+        finally:
+            await close_http_client()
+            await server.close()
+        assert session.closed and manager.stats()["open"] is False
+
+    asyncio.run(run())
+
+
+def test_session_recreated_after_close():
+    manager = HttpClientManager()
+
+    async def run():
+        first = await manager.start()
+        await manager.close()
+        assert first.closed
+        second = manager.session
+        assert second is not first and not second.closed
+        await manager.close()
+        # 重复关闭无副作用
+        await manager.close()
+
+    asyncio.run(run())
+
+
+def test_lifespan_starts_and_closes_shared_session(manager):
+    opened = []
+
+    # 与 main.lifespan 相同的启动 / 关闭调用（main 导入全部路由，测试中单独组装）
+    @asynccontextmanager
+    async def lifespan(app):
+        opened.append(await get_http_client().start())
+        yield
+        await close_http_client()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/session")
+    async def session_id():
+        return {"same": get_http_client().session is opened[0]}
+
+    with TestClient(app) as client:
+        assert manager.stats()["open"] is True
+        assert client.get("/session").json() == {"same": True}
+        assert client.get("/session").json() == {"same": True}
+    assert opened[0].closed and manager.stats()["open"] is False
+
+
+def test_main_lifespan_closes_http_client():
+    """main.lifespan 启动时创建共享会话，yield 之后关闭"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    lifespan = next(node for node in tree.body if isinstance(node, ast.AsyncFunctionDef) and node.name == "lifespan")
+    statements = [ast.unparse(node) for node in lifespan.body]
+    yield_at = statements.index("yield")
+    assert any("get_http_client().start()" in line for line in statements[:yield_at])
+    assert "await close_http_client()" in statements[yield_at + 1:]
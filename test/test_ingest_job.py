@@ -0,0 +1,229 @@
+"""
+文档入库任务（Embedding/ingest_job.py）测试：任务表读写与 claim、取消、心跳只刷新本进程的运行中任务、
+持有进程退出后重新入队，以及任务结束后上传文件的清理（失败时保留）
+
+入库流程用假的 DocumentEmbeddingService 代替，不调用 DashScope。
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_ingest_job.py
+"""
+import io
+import os
+import pytest
+from Embedding import ingest_job
+from Embedding.ingest_job import (
+    IngestJobManager, IngestJobStore, JOB_CANCELLED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IngestJobStore(str(tmp_path / "jobs" / "ingest_jobs.db"))
+
+
+def create_job(store, job_id, **fields):
+    return store.create({"job_id": job_id, "file_name": f"{job_id}.txt", "org_code": "org1", **fields})
+
+
+def test_store_create_get_list_and_claim(store):
+    job = create_job(store, "a", chunk_size=256)
+    assert job["status"] == JOB_QUEUED and job["chunk_size"] == 256 and job["cancel_requested"] == 0
+    create_job(store, "b", org_code="org2")
+    assert store.get("missing") is None
+    assert [row["job_id"] for row in store.list(org_code="org2")] == ["b"]
+    assert len(store.list(limit=1)) == 1
+    assert store.queued_ids() == ["a", "b"]
+
+    # 只有 queued 的任务能被 claim 一次
+    assert store.claim("a") is True
+    assert store.claim("a") is False
+    job = store.get("a")
+    assert job["status"] == JOB_RUNNING
+    assert (job["owner_host"], job["owner_pid"]) == (ingest_job.OWNER_HOST, os.getpid())
+    assert store.queued_ids() == ["b"]
+
+    store.update("a", chunks_processed=3, total_tokens=42)
+    assert (store.get("a")["chunks_processed"], store.get("a")["total_tokens"]) == (3, 42)
+
+
+def test_store_adds_missing_columns_to_old_table(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE ingest_job (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, file_name TEXT,"
+                 " file_path TEXT, doc_type TEXT, doc_subject TEXT, org_code TEXT, chunk_size INTEGER, overlap INTEGER,"
+                 " chunks_parsed INTEGER DEFAULT 0, chunks_embedded INTEGER DEFAULT 0, chunks_stored INTEGER DEFAULT 0,"
+                 " chunks_processed INTEGER DEFAULT 0, total_tokens INTEGER DEFAULT 0,"
+                 " cancel_requested INTEGER DEFAULT 0, error TEXT, created_at REAL, started_at REAL,"
+                 " finished_at REAL, updated_at REAL)")
+    conn.commit()
+    conn.close()
+    store = IngestJobStore(db_path)
+    create_job(store, "a", incremental=1)
+    assert store.claim("a")
+    assert store.get("a")["incremental"] == 1 and store.get("a")["heartbeat_at"] is not None
+
+
+def test_request_cancel(store):
+    create_job(store, "queued")
+    create_job(store, "running")
+    create_job(store, "done")
+    store.claim("running")
+    store.update("done", status=JOB_SUCCEEDED)
+
+    # 排队中的直接取消，运行中的只打标记，已结束的不变
+    assert store.request_cancel("queued")["status"] == JOB_CANCELLED
+    running = store.request_cancel("running")
+    assert (running["status"], running["cancel_requested"]) == (JOB_RUNNING, 1)
+    done = store.request_cancel("done")
+    assert (done["status"], done["cancel_requested"]) == (JOB_SUCCEEDED, 0)
+    assert store.request_cancel("missing") is None
+
+
+def test_heartbeat_only_touches_own_running_jobs(store, monkeypatch):
+    for job_id in ("mine", "other", "queued"):
+        create_job(store, job_id)
+    store.claim("mine")
+    store.claim("other")
+    store.update("other", owner_host="other-host", heartbeat_at=1.0)
+    store.update("mine", heartbeat_at=1.0)
+
+    monkeypatch.setattr(ingest_job.time, "time", lambda: 500.0)
+    store.heartbeat(["mine", "other", "queued"])
+    store.heartbeat([])
+    assert store.get("mine")["heartbeat_at"] == 500.0
+    assert store.get("other")["heartbeat_at"] == 1.0
+    assert store.get("queued")["heartbeat_at"] is None
+
+
+def test_requeue_stale(store, monkeypatch):
+    now = {"value": 100.0}
+    monkeypatch.setattr(ingest_job.time, "time", lambda: now["value"])
+    monkeypatch.setattr(ingest_job, "OWNER_BOOT", "current-boot")
+    monkeypatch.setattr(ingest_job, "_pid_alive", lambda pid: pid != 999999)
+    jobs = {
+        "other_host_stale": {"owner_host": "other-host", "heartbeat_at": 100.0},
+        "other_host_fresh": {"owner_host": "other-host"},
+        "dead_pid": {"owner_pid": 999999},
+        "rebooted": {"owner_boot": "previous-boot"},
+        "own_pid_inactive": {},
+        "own_pid_active": {},
+        # 旧版本的任务没有持有进程与心跳，按 updated_at 判断
+        "legacy_no_owner": {"owner_pid": None, "heartbeat_at": None},
+    }
+    for job_id, fields in jobs.items():
+        create_job(store, job_id)
+        store.claim(job_id)
+        store.update(job_id, **{"heartbeat_at": 950.0, **fields})
+    now["value"] = 1000.0
+
+    assert store.requeue_stale(stale_seconds=300, active={"own_pid_active"}) == 5
+    requeued = {job_id for job_id in jobs if store.get(job_id)["status"] == JOB_QUEUED}
+    # 其他主机按心跳判断；同一主机按开机标识、进程号判断；本进程正在执行的不动
+    assert requeued == {"other_host_stale", "dead_pid", "rebooted", "own_pid_inactive", "legacy_no_owner"}
+    assert store.requeue_stale(stale_seconds=300, active={"own_pid_active"}) == 0
+
+
+class FakeService:
+    """代替 DocumentEmbeddingService：回写一批进度后按 behavior 成功或抛出异常"""
+    behavior = "succeed"
+    calls = []
+
+    def __init__(self, db, embedding_model, usage=None):
+        self.usage = usage
+
+    def process_and_save_document(self, file_path, doc_type, doc_subject, org_code, chunk_size, overlap,
+                                  source_name=None, skip_chunks=0, resume_counts=None, progress_callback=None,
+                                  incremental=False):
+        FakeService.calls.append({"file_path": file_path, "skip_chunks": skip_chunks, "resume_counts": resume_counts})
+        assert os.path.exists(file_path)
+        self.usage.total_tokens += 5
+        progress_callback({"parsed": 4, "embedded": 4, "stored": 4, "processed": 4})
+        if FakeService.behavior == "fail":
+            raise RuntimeError("嵌入服务不可用")
+        return 4
+
+
+@pytest.fixture
+def manager(sqlite_database, store, tmp_path, monkeypatch):
+    from Embedding import document_embedding_model
+    from model import embedding_model
+    monkeypatch.setattr(document_embedding_model, "DocumentEmbeddingService", FakeService)
+    monkeypatch.setattr(embedding_model, "TextEmbeddingModel", lambda: None)
+    FakeService.behavior = "succeed"
+    FakeService.calls = []
+    job_manager = IngestJobManager(store, job_dir=str(tmp_path / "uploads"), workers=1)
+    yield job_manager
+    job_manager.shutdown()
+
+
+def run_job(manager, content=b"hello"):
+    job = manager.submit(io.BytesIO(content), "合同.TXT", "合同", "采购合同", "org1")
+    manager._executor.shutdown(wait=True)
+    return manager.store.get(job["job_id"])
+
+
+def test_succeeded_job_removes_file(manager):
+    job = run_job(manager)
+    assert job["status"] == JOB_SUCCEEDED and job["finished_at"] is not None
+    assert (job["chunks_processed"], job["total_tokens"]) == (4, 5)
+    assert job["file_path"].endswith(".txt")
+    assert not os.path.exists(job["file_path"])
+
+
+def test_failed_job_keeps_file(manager):
+    FakeService.behavior = "fail"
+    job = run_job(manager, b"keep me")
+    assert job["status"] == JOB_FAILED and "嵌入服务不可用" in job["error"]
+    # 失败的任务保留上传文件，便于排查或重新提交
+    with open(job["file_path"], "rb") as f:
+        assert f.read() == b"keep me"
+
+
+def test_cancel_running_job_stops_at_next_batch(manager, monkeypatch):
+    store = manager.store
+    original_update = store.update
+
+    def update(job_id, **fields):
+        original_update(job_id, **fields)
+        # 第一批进度写回时，模拟用户从接口取消
+        if "chunks_processed" in fields:
+            manager.cancel(job_id)
+
+    monkeypatch.setattr(store, "update", update)
+    job = run_job(manager)
+    assert job["status"] == JOB_CANCELLED and job["cancel_requested"] == 1
+    assert not os.path.exists(job["file_path"])
+
+
+def test_recover_resumes_from_committed_batches(manager, store, tmp_path):
+    file_path = tmp_path / "uploads" / "crashed.txt"
+    file_path.write_bytes(b"hello")
+    create_job(store, "crashed", file_path=str(file_path), chunk_size=512, overlap=50)
+    store.claim("crashed")
+    # 持有进程已退出：进程号被当前进程复用且不在执行中
+    store.update("crashed", chunks_processed=3, chunks_embedded=3, chunks_stored=2, total_tokens=7)
+
+    assert manager.recover() == 1
+    manager._executor.shutdown(wait=True)
+    assert FakeService.calls == [{"file_path": str(file_path), "skip_chunks": 3,
+                                  "resume_counts": {"embedded": 3, "stored": 2}}]
+    job = store.get("crashed")
+    assert job["status"] == JOB_SUCCEEDED and job["total_tokens"] == 12
+
+
+def test_heartbeat_thread_refreshes_active_jobs(store, tmp_path):
+    manager = IngestJobManager(store, job_dir=str(tmp_path / "uploads"), stale_seconds=0.3, heartbeat_seconds=0.05)
+    try:
+        create_job(store, "a")
+        store.claim("a")
+        store.update("a", heartbeat_at=1.0)
+        manager._active.add("a")
+        manager._ensure_heartbeat()
+        for _ in range(100):
+            if store.get("a")["heartbeat_at"] > 1.0:
+                break
+            manager._stop.wait(0.02)
+        assert store.get("a")["heartbeat_at"] > 1.0
+    finally:
+        manager.shutdown()
@@ -0,0 +1,151 @@
+"""
+意图快速通道（active/intent_classifier.py）单元测试：规则置信度边界、多步骤标记、实体抽取、历史匹配的数字替换，
+以及从 t_call_log 实际写入的意图日志加载历史
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_intent_classifier.py
+"""
+import asyncio
+import json
+import pytest
+from active.intent_classifier import IntentClassifier, IntentHistory, load_intent_history
+
+
+def make_classifier(**overrides) -> IntentClassifier:
+    options = dict(
+        actions=["查询", "删除", "审批", "导出"],
+        keyword_mappings={"订单": ["订单记录"], "查询": ["查看"]},
+        parameter_patterns={"user_id": ["用户", "用户ID"], "order_no": ["订单号"]},
+        key_parameters=["报销单"],
+        object_terms=["详情", "信息"],
+        multi_step_markers=["然后", "并且"],
+        min_confidence=0.75,
+        max_query_length=20,
+        history=IntentHistory(limit=10, min_similarity=0.8)
+    )
+    options.update(overrides)
+    return IntentClassifier(**options)
+
+
+def test_confidence_exactly_at_threshold_is_accepted():
+    # 动作 0.5 + 对象 0.25，参数标记后没有值、查询超长：正好 0.75
+    classifier = make_classifier(max_query_length=5)
+    candidate = classifier.classify("查询用户的订单")
+    assert candidate["source"] == "rule"
+    assert candidate["confidence"] == 0.75
+    assert classifier.accept(candidate)
+    assert not make_classifier(max_query_length=5, min_confidence=0.76).accept(candidate)
+
+
+def test_action_without_object_is_rejected():
+    classifier = make_classifier()
+    candidate = classifier.classify("删除")
+    assert candidate["confidence"] == 0.65
+    assert not classifier.accept(candidate)
+
+
+def test_multiple_actions_lower_confidence():
+    classifier = make_classifier()
+    candidate = classifier.classify("查询删除订单")
+    assert candidate["confidence"] < classifier.min_confidence
+    assert not classifier.accept(candidate)
+
+
+def test_disabled_classifier_accepts_nothing():
+    classifier = make_classifier(enabled=False)
+    candidate = classifier.classify("查询用户123的订单")
+    assert candidate["confidence"] == 1.0
+    assert not classifier.accept(candidate)
+
+
+@pytest.mark.parametrize("query", ["查询订单然后删除", "删除订单并且导出"])
+def test_multi_step_marker_goes_to_llm(query):
+    assert make_classifier().classify(query) is None
+
+
+def test_entity_extraction():
+    classifier = make_classifier()
+    candidate = classifier.classify("查询用户123的订单")
+    assert candidate["intent"] == "查询订单"
+    assert candidate["entities"] == {"user_id": "123"}
+    assert candidate["required_operations"] == ["查询订单"]
+
+    candidate = classifier.classify("查询订单号为A-01的订单")
+    assert candidate["entities"] == {"order_no": "A-01"}
+
+    candidate = classifier.classify("审批报销单 10086")
+    assert candidate["intent"] == "审批报销单"
+    assert candidate["entities"] == {"报销单": "10086"}
+
+    candidate = classifier.classify("导出2024年1月5日的订单记录")
+    assert candidate["entities"]["date"] == "2024年1月5日"
+
+
+def test_object_terms_do_not_become_head():
+    candidate = make_classifier().classify("查看订单详情")
+    assert candidate["intent"] == "查询订单"
+    assert candidate["required_operations"] == ["查询订单", "查询详情"]
+
+
+def test_history_match_substitutes_numbers():
+    # 没有规则词表，只能依靠历史
+    classifier = make_classifier(actions=[], keyword_mappings={}, parameter_patterns={}, key_parameters=[])
+    classifier.learn("给客户123发第7期账单", {
+        "intent": "发送账单",
+        "entities": {"customer_id": "123", "period": "7", "channel": "邮件"},
+        "required_operations": ["发送账单"],
+        "missing_info": [],
+        "source": "llm"
+    })
+    candidate = classifier.classify("给客户456发第9期账单")
+    assert candidate["source"] == "history"
+    assert candidate["intent"] == "发送账单"
+    assert candidate["entities"] == {"customer_id": "456", "period": "9", "channel": "邮件"}
+    assert classifier.accept(candidate)
+
+    # 数字个数不同时不复用
+    assert classifier.classify("给客户456发账单") is None
+
+
+def test_learn_ignores_fast_path_results():
+    classifier = make_classifier()
+    classifier.learn("查询订单", {"intent": "查询订单", "source": "rule"})
+    classifier.learn("查询订单", {"intent": "未知", "source": "llm"})
+    assert len(classifier.history) == 0
+
+
+def test_load_history_from_logged_rows(sqlite_database, monkeypatch):
+    from repository import call_log_crud
+    from repository.entity.sql_entity import t_call_log
+    monkeypatch.setattr(call_log_crud, "execute_sql", sqlite_database.execute_sql)
+    sqlite_database.execute_sql(
+        "CREATE TABLE t_call_log (id INTEGER PRIMARY KEY AUTOINCREMENT, request_id VARCHAR(36) NOT NULL,"
+        " stage VARCHAR(50) NOT NULL, step_order INT NOT NULL, operation TEXT NOT NULL, input_data TEXT,"
+        " output_data TEXT, status VARCHAR(20) NOT NULL, error_message TEXT, execution_time INT,"
+        " timestamp DATETIME, endpoint_path VARCHAR(255), endpoint_method VARCHAR(10))"
+    )
+    intent = {"intent": "发送账单", "entities": {"customer_id": "123"}, "required_operations": ["发送账单"],
+              "missing_info": [], "source": "llm"}
+    # 与 ctl/chat_ctl.py 写意图分析日志的方式一致
+    call_log_crud.insert_call_log(t_call_log(
+        request_id="r1", stage="intent_analysis", step_order=1, operation="分析用户意图",
+        input_data="给客户123发账单", output_data=json.dumps(intent, ensure_ascii=False),
+        status="success", execution_time=10
+    ))
+    # 直接写入的原始字符串（未经 JSON 序列化）同样可用
+    sqlite_database.execute_sql(
+        "INSERT INTO t_call_log (request_id, stage, step_order, operation, input_data, output_data, status)"
+        " VALUES ('r2', 'intent_analysis', 1, '分析用户意图', :query, :intent, 'success')",
+        {"query": "删除客户88的地址", "intent": json.dumps({"intent": "删除地址", "entities": {"customer_id": "88"}})}
+    )
+
+    records = call_log_crud.get_recent_intent_logs(10)
+    assert [record["query"] for record in records] == ["删除客户88的地址", "给客户123发账单"]
+    assert records[1]["intent"]["entities"] == {"customer_id": "123"}
+
+    classifier = make_classifier(actions=[], keyword_mappings={}, parameter_patterns={}, key_parameters=[])
+    asyncio.run(load_intent_history(classifier))
+    assert len(classifier.history) == 2
+    candidate = classifier.classify("给客户777发账单")
+    assert candidate["source"] == "history"
+    assert candidate["entities"] == {"customer_id": "777"}
@@ -0,0 +1,145 @@
+"""
+关键词索引（Embedding/keyword_index.py）单元测试：分词、BM25 分数与逐项计算对比、删除与压缩、过滤 / 章节限流、RRF 融合
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_keyword_index.py
+"""
+import math
+from collections import Counter
+import numpy as np
+import pytest
+from Embedding.keyword_index import BM25Index, reciprocal_rank_fusion, text_terms
+from Embedding.vector_index import row_attributes
+
+TEXTS = [
+    "采购合同的付款方式为银行转账",
+    "销售合同约定交货日期与违约责任",
+    "采购订单编号 AB-1234 已审批",
+    "员工报销流程：提交发票后由财务审批",
+    "合同审批需要法务部门会签",
+    "ＡＢ－１２３４ 型号设备的采购合同",
+    "年度采购计划与预算",
+    "银行账户变更需要财务负责人审批",
+]
+IDS = list(range(100, 100 + len(TEXTS)))
+# 章节：两条一组；doc_type：采购相关为 purchase
+SECTIONS = [f"第{i // 2}节" for i in range(len(TEXTS))]
+DOC_TYPES = ["purchase" if "采购" in text else "other" for text in TEXTS]
+
+
+def make_index(ids=IDS, texts=TEXTS):
+    index = BM25Index()
+    positions = [IDS.index(row_id) for row_id in ids]
+    index.add(ids, texts, [row_attributes(SECTIONS[i], DOC_TYPES[i], None, None) for i in positions])
+    return index
+
+
+def reference_bm25(query, ids, texts, k1=1.2, b=0.75):
+    """逐项计算 BM25（词键与索引使用同一分词规则），返回按分数降序的 [(id, 分数), ...]"""
+    docs, keys = text_terms(texts)
+    doc_terms = [Counter() for _ in texts]
+    for doc, key in zip(docs.tolist(), keys.tolist()):
+        doc_terms[doc][key] += 1
+    lengths = [sum(terms.values()) for terms in doc_terms]
+    avg_length = sum(lengths) / len(texts)
+    query_keys = list(dict.fromkeys(text_terms([query])[1].tolist()))
+    scores = {}
+    for key in query_keys:
+        df = sum(1 for terms in doc_terms if key in terms)
+        if df == 0:
+            continue
+        idf = math.log(1 + (len(texts) - df + 0.5) / (df + 0.5))
+        for row_id, terms, length in zip(ids, doc_terms, lengths):
+            tf = terms.get(key, 0)
+            if tf:
+                norm = k1 * (1 - b + b * length / avg_length)
+                scores[row_id] = scores.get(row_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def assert_matches_reference(results, expected):
+    assert [row_id for row_id, _ in results] == [row_id for row_id, _ in expected[:len(results)]]
+    assert np.allclose([score for _, score in results], [score for _, score in expected[:len(results)]], atol=1e-4)
+
+
+def test_text_terms_bigrams_and_codes():
+    docs, keys = text_terms(["采购合同", "AB-1234", "ＡＢ－１２３４"])
+    per_doc = [sorted(keys[docs == i].tolist()) for i in range(3)]
+    # 采购 / 购合 / 合同 三个二元组
+    assert len(per_doc[0]) == 3
+    # 编号整体 + 各段，全角与半角一致
+    assert len(per_doc[1]) == 3
+    assert per_doc[1] == per_doc[2]
+
+
+@pytest.mark.parametrize("query", ["采购合同", "财务审批", "银行"])
+def test_bm25_scores_match_reference(query):
+    results = make_index().search(query, 5)
+    assert results
+    assert_matches_reference(results, reference_bm25(query, IDS, TEXTS))
+
+
+def test_bm25_code_query_matches_whole_word():
+    results = make_index().search("ab-1234", 5)
+    # 半角与全角写法的编号都命中，只用整词匹配
+    assert sorted(row_id for row_id, _ in results) == [102, 105]
+
+
+def test_bm25_no_match():
+    assert make_index().search("天气预报", 5) == []
+    assert make_index().search("", 5) == []
+
+
+def test_bm25_remove_and_compact():
+    index = make_index()
+    # 删除 1 条：只打标记，统计量按存活的行计算
+    assert index.remove([100, 999]) == 1
+    remaining = [(row_id, text) for row_id, text in zip(IDS, TEXTS) if row_id != 100]
+    assert_matches_reference(index.search("采购合同", 5), reference_bm25("采购合同", *zip(*remaining)))
+    # 删除超过 1/4 后压缩，剩余的行与重新建立的索引结果一致
+    assert index.remove([101, 104]) == 2
+    remaining = [(row_id, text) for row_id, text in remaining if row_id not in (101, 104)]
+    assert len(index) == len(remaining)
+    rebuilt = make_index(*map(list, zip(*remaining)))
+    for query in ("采购合同", "审批", "银行账户"):
+        assert index.search(query, 5) == rebuilt.search(query, 5)
+        assert_matches_reference(index.search(query, 5), reference_bm25(query, *zip(*remaining)))
+
+
+def test_bm25_add_existing_id_replaces_text():
+    index = make_index()
+    index.add([100], ["天气晴朗"], [row_attributes(SECTIONS[0], DOC_TYPES[0], None, None)])
+    assert len(index) == len(TEXTS)
+    assert [row_id for row_id, _ in index.search("天气", 5)] == [100]
+    assert 100 not in [row_id for row_id, _ in index.search("付款方式", 5)]
+
+
+def test_bm25_filters_and_section_cap():
+    index = make_index()
+    results = index.search("审批", 10, filters={"doc_type": "purchase"})
+    assert results and all(DOC_TYPES[IDS.index(row_id)] == "purchase" for row_id, _ in results)
+
+    expected = reference_bm25("合同", IDS, TEXTS)
+    capped = index.search("合同", 10, group_cap=1)
+    sections = [SECTIONS[IDS.index(row_id)] for row_id, _ in capped]
+    assert len(sections) == len(set(sections))
+    # 每章节保留分数最高的一条
+    best = {}
+    for row_id, score in expected:
+        best.setdefault(SECTIONS[IDS.index(row_id)], row_id)
+    assert sorted(row_id for row_id, _ in capped) == sorted(best.values())
+
+
+def test_reciprocal_rank_fusion():
+    vector = [(1, 0.9), (2, 0.8), (3, 0.7)]
+    keyword = [(3, 12.0), (4, 8.0), (1, 5.0)]
+    fused = reciprocal_rank_fusion([vector, keyword], k=60)
+    scores = dict(fused)
+    assert scores[1] == pytest.approx(1 / 61 + 1 / 63)
+    assert scores[3] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores[2] == pytest.approx(1 / 62)
+    assert scores[4] == pytest.approx(1 / 62)
+    # 两路都出现的排在只出现一路的前面，分数降序
+    assert {row_id for row_id, _ in fused[:2]} == {1, 3}
+    assert [score for _, score in fused] == sorted(scores.values(), reverse=True)
+    assert reciprocal_rank_fusion([]) == []
@@ -0,0 +1,116 @@
+"""
+检索结果缓存（Embedding/search_cache.py）单元测试：命中与 TTL 过期、LRU 淘汰、本进程写入后递增版本失效、
+写入期间的检索结果不再缓存，以及数据库快照按 snapshot_seconds 节流查询
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_search_cache.py
+"""
+import pytest
+from Embedding import search_cache
+from Embedding.search_cache import SearchResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可控的 time.monotonic()"""
+    now = {"value": 1000.0}
+    monkeypatch.setattr(search_cache.time, "monotonic", lambda: now["value"])
+    return now
+
+
+class Database:
+    """记录查询次数的 (行数, 最大ID)"""
+
+    def __init__(self):
+        self.state = (3, 30)
+        self.queries = 0
+
+    def load(self):
+        self.queries += 1
+        return self.state
+
+
+RESULTS = [(3, 0.9), (1, 0.8)]
+
+
+def test_hit_expire_and_lru(clock):
+    cache = SearchResultCache(ttl_seconds=60, max_items=2)
+    db = Database()
+    snapshot = cache.snapshot("org1", db.load)
+    assert snapshot == (0, 3, 30)
+    assert cache.get("org1", "采购合同", 5, snapshot) is None
+    cache.put("org1", "采购合同", 5, snapshot, RESULTS)
+    # 查询按空白归一化；top_k、检索选项与组织参与缓存键
+    assert cache.get("org1", " 采购合同 ", 5, snapshot) == RESULTS
+    assert cache.get("org1", "采购合同", 6, snapshot) is None
+    assert cache.get("org1", "采购合同", 5, snapshot, (2, 0.5)) is None
+    assert cache.get("org2", "采购合同", 5, snapshot) is None
+
+    clock["value"] += 61
+    assert cache.get("org1", "采购合同", 5, snapshot) is None
+    assert cache.stats()["expired"] == 1
+
+    for query in ("甲", "乙", "丙"):
+        cache.put("org1", query, 5, snapshot, RESULTS)
+    assert cache.get("org1", "甲", 5, snapshot) is None
+    assert cache.stats()["items"] == 2
+
+
+def test_invalidate_bumps_version_without_querying_database(clock):
+    cache = SearchResultCache(snapshot_seconds=60)
+    db = Database()
+    snapshot = cache.snapshot("org1", db.load)
+    cache.put("org1", "甲", 5, snapshot, RESULTS)
+    cache.put("org2", "甲", 5, cache.snapshot("org2", db.load), RESULTS)
+    queries = db.queries
+
+    # 命中时复用节流期内的数据库快照
+    for _ in range(3):
+        assert cache.get("org1", "甲", 5, cache.snapshot("org1", db.load)) == RESULTS
+    assert db.queries == queries
+
+    assert cache.invalidate("org1") == 1
+    db.state = (4, 31)
+    snapshot = cache.snapshot("org1", db.load)
+    assert snapshot == (1, 4, 31)
+    assert cache.get("org1", "甲", 5, snapshot) is None
+    # 其他组织不受影响
+    assert cache.get("org2", "甲", 5, cache.snapshot("org2", db.load)) == RESULTS
+
+
+def test_put_after_concurrent_write_is_dropped(clock):
+    cache = SearchResultCache()
+    db = Database()
+    snapshot = cache.snapshot("org1", db.load)
+    # 检索进行中本进程入库：旧快照的结果不写入缓存
+    cache.invalidate("org1")
+    cache.put("org1", "甲", 5, snapshot, RESULTS)
+    assert cache.stats()["items"] == 0
+
+
+def test_other_worker_writes_seen_after_snapshot_interval(clock):
+    cache = SearchResultCache(snapshot_seconds=5)
+    db = Database()
+    cache.put("org1", "甲", 5, cache.snapshot("org1", db.load), RESULTS)
+    # 其他 worker 入库：本进程版本不变，节流期内仍命中
+    db.state = (4, 31)
+    clock["value"] += 4
+    assert cache.get("org1", "甲", 5, cache.snapshot("org1", db.load)) == RESULTS
+    clock["value"] += 2
+    assert cache.get("org1", "甲", 5, cache.snapshot("org1", db.load)) is None
+    assert db.queries == 2
+
+    # snapshot_seconds=0 时每次都查询数据库
+    cache = SearchResultCache(snapshot_seconds=0)
+    for _ in range(3):
+        cache.snapshot("org1", db.load)
+    assert db.queries == 5
+    assert cache.stats()["snapshot_queries"] == 3
+
+
+def test_disabled_cache_does_not_store():
+    db = Database()
+    for cache in (SearchResultCache(ttl_seconds=0), SearchResultCache(max_items=0)):
+        snapshot = cache.snapshot("org1", db.load)
+        cache.put("org1", "甲", 5, snapshot, RESULTS)
+        assert cache.get("org1", "甲", 5, snapshot) is None
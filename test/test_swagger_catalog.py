@@ -0,0 +1,166 @@
+"""
+Swagger 文档目录（active/swagger_catalog.py）测试：TTL 内直接返回进程内列表、过期后按 ETag / Last-Modified
+条件请求（304 只刷新校验时间、列表对象不变）、文档变化时重新解析、拉取失败继续使用旧数据，
+以及重启（新实例）与其他 worker 从持久化目录加载
+
+用假的共享 HTTP 会话代替下游 Swagger 地址，不发起网络请求。
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_swagger_catalog.py
+"""
+import asyncio
+import pytest
+from multidict import CIMultiDict
+from active import swagger_catalog
+from active.swagger_catalog import SwaggerCatalog
+
+URL = "http://swagger.local/v3/api-docs"
+
+
+def swagger_doc(*paths):
+    return {"info": {"title": "order-service"},
+            "paths": {path: {"get": {"summary": f"查询{path}"}} for path in paths}}
+
+
+class FakeResponse:
+    def __init__(self, status, body=None, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = CIMultiDict(headers or {})
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+    async def json(self, content_type=None):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeServer:
+    """按 ETag 响应条件请求：If-None-Match 与当前版本一致时返回 304；记录每次请求头"""
+
+    def __init__(self):
+        self.doc = swagger_doc("/orders", "/orders/{id}")
+        self.etag = '"v1"'
+        self.status = 200
+        self.requests = []
+
+    @property
+    def session(self):
+        return self
+
+    def get(self, url, headers=None):
+        self.requests.append(dict(headers or {}))
+        if self.status != 200:
+            return FakeResponse(self.status)
+        if headers and headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        # 响应头大小写与 aiohttp 默认不同，验证按大小写不敏感读取
+        return FakeResponse(200, self.doc, {"etag": self.etag, "last-modified": "Mon, 12 Oct 2026 08:00:00 GMT"})
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeServer()
+    monkeypatch.setattr(swagger_catalog, "get_http_client", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"value": 1000.0}
+    monkeypatch.setattr(swagger_catalog.time, "time", lambda: now["value"])
+    return now
+
+
+def lookup(catalog, force=False):
+    return asyncio.run(catalog.lookup(URL, force))
+
+
+def test_memory_hit_within_ttl_then_304_revalidation(tmp_path, server, clock):
+    catalog = SwaggerCatalog(db_path=str(tmp_path / "catalog.db"), ttl=300)
+    endpoints, source = lookup(catalog)
+    assert source == "fetched"
+    assert [(ep["method"], ep["path"]) for ep in endpoints] == [("GET", "/orders"), ("GET", "/orders/{id}")]
+    assert server.requests == [{}]
+
+    clock["value"] += 299
+    again, source = lookup(catalog)
+    assert source == "memory" and again is endpoints
+    assert len(server.requests) == 1
+
+    # TTL 过期后发条件请求；304 时返回同一个列表对象，只刷新校验时间
+    clock["value"] += 2
+    again, source = lookup(catalog)
+    assert source == "not_modified" and again is endpoints
+    assert server.requests[-1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 12 Oct 2026 08:00:00 GMT"}
+    assert lookup(catalog)[1] == "memory"
+    stats = catalog.stats()
+    assert (stats["fetches"], stats["not_modified"], stats["memory_hits"]) == (1, 1, 2)
+    assert stats["entries"][URL]["checked_at"] == clock["value"]
+
+
+def test_changed_document_is_reparsed_after_ttl(tmp_path, server, clock):
+    catalog = SwaggerCatalog(db_path=str(tmp_path / "catalog.db"), ttl=60)
+    endpoints, _ = lookup(catalog)
+    server.doc = swagger_doc("/orders", "/orders/{id}", "/refunds")
+    server.etag = '"v2"'
+    # TTL 内不感知变化
+    assert lookup(catalog)[0] is endpoints
+    clock["value"] += 61
+    changed, source = lookup(catalog)
+    assert source == "fetched" and len(changed) == 3
+    assert catalog.stats()["entries"][URL]["etag"] == '"v2"'
+
+    # force 时忽略 TTL；ETag 一致返回 304
+    assert lookup(catalog, force=True) == (changed, "not_modified")
+
+
+def test_fetch_failure_serves_stale_and_retries_later(tmp_path, server, clock):
+    catalog = SwaggerCatalog(db_path=str(tmp_path / "catalog.db"), ttl=60, error_retry=30)
+    endpoints, _ = lookup(catalog)
+    server.status = 503
+    clock["value"] += 61
+    assert lookup(catalog) == (endpoints, "stale")
+    # error_retry 内不再请求
+    clock["value"] += 29
+    assert lookup(catalog) == (endpoints, "memory")
+    assert len(server.requests) == 2
+    clock["value"] += 2
+    server.status = 200
+    assert lookup(catalog) == (endpoints, "not_modified")
+
+    # 没有旧数据时返回空列表
+    assert SwaggerCatalog(db_path=None).stats()["persistent"] is False
+    server.status = 503
+    assert lookup(SwaggerCatalog(db_path=None)) == ([], "failed")
+
+
+def test_persisted_catalog_reload(tmp_path, server, clock):
+    db_path = str(tmp_path / "catalog.db")
+    endpoints, _ = lookup(SwaggerCatalog(db_path=db_path, ttl=300))
+
+    # 重启后（或其他 worker）校验时间未过期：直接采用持久化的接口列表，不发请求
+    clock["value"] += 100
+    restarted = SwaggerCatalog(db_path=db_path, ttl=300)
+    reloaded, source = lookup(restarted)
+    assert source == "shared" and reloaded == endpoints
+    assert len(server.requests) == 1
+    assert lookup(restarted) == (reloaded, "memory")
+
+    # 过期后用持久化的 ETag 发条件请求
+    clock["value"] += 300
+    later = SwaggerCatalog(db_path=db_path, ttl=300)
+    assert lookup(later) == (reloaded, "not_modified")
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+
+    # 304 刷新的校验时间写回数据库，其他 worker 据此跳过请求
+    other = SwaggerCatalog(db_path=db_path, ttl=300)
+    assert lookup(other)[1] == "shared"
+    assert len(server.requests) == 2
@@ -0,0 +1,59 @@
+"""
+文本切分黄金文件测试
+
+test/golden/splitter/*.txt 为输入文本，*.json 为重写前的 split_document_grouped 对同一输入的切分结果：
+默认参数（chunk_size=512, overlap=50）保存完整 chunk 列表，其他参数组合保存 chunk 数与 SHA256 摘要。
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_text_splitter.py
+"""
+import glob
+import hashlib
+import json
+import os
+import random
+import pytest
+from Embedding import text_splitter
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "splitter")
+GOLDEN_FILES = sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.json")))
+
+
+def load_golden(golden_path: str):
+    with open(golden_path, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    with open(os.path.join(GOLDEN_DIR, golden["source"]), "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    return text, golden["cases"]
+
+
+def digest(chunks) -> str:
+    return hashlib.sha256(json.dumps(chunks, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+@pytest.mark.parametrize("golden_path", GOLDEN_FILES, ids=os.path.basename)
+def test_split_grouped_matches_golden(golden_path):
+    text, cases = load_golden(golden_path)
+    for case in cases:
+        chunks = text_splitter.split_grouped(text, case["chunk_size"], case["overlap"])
+        if "chunks" in case:
+            assert chunks == case["chunks"]
+        assert len(chunks) == case["count"]
+        assert digest(chunks) == case["sha256"]
+
+
+@pytest.mark.parametrize("golden_path", GOLDEN_FILES, ids=os.path.basename)
+def test_streaming_split_matches_golden(golden_path):
+    """按任意位置切成多页流式输入，结果与整篇切分一致"""
+    text, cases = load_golden(golden_path)
+    rng = random.Random(golden_path)
+    for case in cases:
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, 30)))
+        pages = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        chunks = list(text_splitter.iter_split_grouped(pages, case["chunk_size"], case["overlap"]))
+        assert digest(chunks) == case["sha256"]
+
+
+def test_golden_corpus_present():
+    assert len(GOLDEN_FILES) >= 5
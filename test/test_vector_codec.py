@@ -0,0 +1,105 @@
+"""
+二进制向量存储测试：f32 / i8 编解码往返（Embedding/vector_codec.py）、启动时补齐二进制列
+（ensure_embedding_binary_columns）与存量 JSON 向量迁移（DocumentEmbeddingService.migrate_embeddings_to_binary）
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_vector_codec.py
+"""
+import json
+import numpy as np
+import pytest
+from sqlalchemy import inspect
+from Embedding.vector_codec import (
+    CODEC_F32, CODEC_I8, decode_json_vector, decode_vector, encode_vector, quantize_int8
+)
+from repository.entity.sql_entity import DocumentEmbedding
+
+VECTORS = np.random.default_rng(0).normal(size=(5, 32)).astype(np.float32)
+
+
+def test_f32_round_trip_is_exact():
+    for vector in VECTORS:
+        blob = encode_vector(vector.tolist(), CODEC_F32)
+        assert len(blob) == 4 * vector.size
+        assert np.array_equal(decode_vector(blob, CODEC_F32), vector)
+
+
+def test_i8_round_trip_within_half_step():
+    for vector in VECTORS:
+        blob = encode_vector(vector, CODEC_I8)
+        assert len(blob) == 4 + vector.size
+        decoded = decode_vector(blob, CODEC_I8)
+        scale = np.abs(vector).max() / 127
+        assert np.abs(decoded - vector).max() <= scale / 2 + 1e-7
+        # 与索引使用的按行量化方案一致
+        codes, scales = quantize_int8(vector)
+        assert np.array_equal(decoded, codes[0].astype(np.float32) * scales[0])
+
+
+def test_i8_zero_vector_and_unknown_codec():
+    assert np.array_equal(decode_vector(encode_vector([0.0, 0.0], CODEC_I8), CODEC_I8), [0.0, 0.0])
+    with pytest.raises(ValueError):
+        encode_vector([1.0], "json")
+    with pytest.raises(ValueError):
+        decode_vector(b"", "f16")
+
+
+def test_decode_json_vector():
+    assert decode_json_vector([1, 2]) == [1, 2]
+    assert decode_json_vector("[1.5, 2]") == [1.5, 2]
+    assert decode_json_vector("{\"a\": 1}") is None
+    assert decode_json_vector("not json") is None
+    assert decode_json_vector(None) is None
+
+
+def test_ensure_binary_columns_on_baseline_schema(sqlite_database):
+    from repository.document_embedding_crud import ensure_embedding_binary_columns
+    engine = sqlite_database.engine
+    assert ensure_embedding_binary_columns(engine) is False
+    # 基线建表语句：没有二进制列
+    sqlite_database.execute_sql(
+        "CREATE TABLE document_embedding (id INTEGER PRIMARY KEY AUTOINCREMENT, doc_type VARCHAR(100),"
+        " doc_subject VARCHAR(255), source_name VARCHAR(255), org_code VARCHAR(50), section VARCHAR(255),"
+        " chunk_index INT, embedding JSON, content TEXT, content_hash VARCHAR(64))"
+    )
+    assert ensure_embedding_binary_columns(engine) is True
+    columns = {column["name"] for column in inspect(engine).get_columns("document_embedding")}
+    assert {"embedding_bin", "embedding_codec"} <= columns
+    # 可重复执行
+    assert ensure_embedding_binary_columns(engine) is False
+
+
+@pytest.mark.parametrize("codec", [CODEC_F32, CODEC_I8])
+def test_migrate_embeddings_to_binary(sqlite_database, codec):
+    from Embedding.document_embedding_model import DocumentEmbeddingService
+    DocumentEmbedding.__table__.create(sqlite_database.engine)
+    db = sqlite_database.SessionLocal()
+    try:
+        rows = [DocumentEmbedding(org_code="org1", content=f"正文{i}", embedding=VECTORS[i].tolist()) for i in range(4)]
+        # JSON 字符串形式的旧数据、无法解析的向量、已迁移的行
+        rows.append(DocumentEmbedding(org_code="org1", content="字符串", embedding=json.dumps(VECTORS[4].tolist())))
+        rows.append(DocumentEmbedding(org_code="org1", content="损坏", embedding="oops"))
+        rows.append(DocumentEmbedding(org_code="org1", content="已迁移", embedding=[1.0],
+                                      embedding_bin=encode_vector([1.0], CODEC_F32), embedding_codec=CODEC_F32))
+        db.add_all(rows)
+        db.commit()
+
+        service = DocumentEmbeddingService(db, embedding_model=None, search_mode="flat")
+        with pytest.raises(ValueError):
+            service.migrate_embeddings_to_binary(codec="json")
+        assert service.migrate_embeddings_to_binary(codec=codec, batch_size=2, clear_json=True) == 5
+        # 重跑时只剩无法解析的行，不重复迁移
+        assert service.migrate_embeddings_to_binary(codec=codec, batch_size=2) == 0
+
+        db.expire_all()
+        stored = {row.content: row for row in db.query(DocumentEmbedding)}
+        for i, content in enumerate(["正文0", "正文1", "正文2", "正文3", "字符串"]):
+            row = stored[content]
+            assert row.embedding_codec == codec and row.embedding is None
+            decoded = service._row_vector(row.embedding, row.embedding_bin, row.embedding_codec)
+            expected = VECTORS[i] if codec == CODEC_F32 else decode_vector(encode_vector(VECTORS[i], CODEC_I8), CODEC_I8)
+            assert np.array_equal(decoded, expected)
+        assert stored["损坏"].embedding_bin is None and stored["损坏"].embedding == "oops"
+        assert stored["已迁移"].embedding_codec == CODEC_F32 and stored["已迁移"].embedding == [1.0]
+    finally:
+        db.close()
@@ -0,0 +1,244 @@
+"""
+向量索引（Embedding/vector_index.py）单元测试：精确 / IVF / int8 索引的 top-k 与暴力计算对比，
+检索前过滤、按章节限流、MMR 重排与删除
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_vector_index.py
+"""
+import numpy as np
+import pytest
+from Embedding.vector_index import (
+    ATTRIBUTE_FIELDS, FlatVectorIndex, IVFVectorIndex, QuantizedVectorIndex, normalize_filters, normalize_rows,
+    row_attributes
+)
+
+DIM = 16
+SIZE = 600
+SECTIONS = 12
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """固定随机种子的向量与属性：章节 12 个，doc_type 2 种，source_name 10 个"""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(SIZE, DIM)).astype(np.float32)
+    ids = np.arange(1000, 1000 + SIZE, dtype=np.int64)
+    meta = [(f"第{i % SECTIONS}节", f"type{i % 2}", "subject", f"file{i % 10}.txt") for i in range(SIZE)]
+    attrs = np.asarray([row_attributes(*row) for row in meta], dtype=np.int64)
+    queries = rng.normal(size=(5, DIM)).astype(np.float32)
+    return ids, vectors, attrs, meta, queries
+
+
+def brute_force(ids, vectors, query, top_k, keep=None):
+    scores = normalize_rows(vectors) @ normalize_rows(query)[0]
+    order = [i for i in np.argsort(-scores, kind="stable") if keep is None or keep[i]]
+    return [int(ids[i]) for i in order[:top_k]], scores
+
+
+def capped_reference(ids, scores, sections, top_k, cap):
+    """完整排序后逐个跳过超额章节"""
+    picked, used = [], {}
+    for i in np.argsort(-scores, kind="stable"):
+        if used.get(sections[i], 0) < cap:
+            used[sections[i]] = used.get(sections[i], 0) + 1
+            picked.append(int(ids[i]))
+            if len(picked) == top_k:
+                break
+    return picked
+
+
+def build(index, corpus):
+    ids, vectors, attrs, _, _ = corpus
+    index.add(ids, vectors, attrs)
+    return index
+
+
+def result_ids(results):
+    return [row_id for row_id, _ in results]
+
+
+def assert_same_results(batch, singles):
+    """批量与逐个查询的 id 一致，分数只差浮点误差（矩阵乘法与矩阵-向量乘法的累加顺序不同）"""
+    assert [result_ids(results) for results in batch] == [result_ids(results) for results in singles]
+    for results, expected in zip(batch, singles):
+        assert np.allclose([score for _, score in results], [score for _, score in expected], atol=1e-5)
+
+
+def test_flat_top_k_matches_brute_force(corpus):
+    ids, vectors, _, _, queries = corpus
+    index = build(FlatVectorIndex(), corpus)
+    for query in queries:
+        expected, scores = brute_force(ids, vectors, query, 10)
+        results = index.search(query, 10)
+        assert result_ids(results) == expected
+        assert np.allclose([score for _, score in results], np.sort(scores)[::-1][:10], atol=1e-5)
+
+
+def test_flat_search_batch_matches_search(corpus):
+    _, _, _, _, queries = corpus
+    index = build(FlatVectorIndex(), corpus)
+    assert_same_results(index.search_batch(queries, 7), [index.search(query, 7) for query in queries])
+
+
+def test_flat_remove_keeps_remaining_rows(corpus):
+    ids, vectors, _, _, queries = corpus
+    index = build(FlatVectorIndex(), corpus)
+    removed_ids = ids[::3]
+    assert index.remove(np.concatenate([removed_ids, [1]])) == removed_ids.size
+    assert len(index) == SIZE - removed_ids.size
+    keep = ~np.isin(ids, removed_ids)
+    for query in queries:
+        assert result_ids(index.search(query, 10)) == brute_force(ids, vectors, query, 10, keep)[0]
+
+
+def test_ivf_probing_all_lists_is_exact(corpus):
+    ids, vectors, _, _, queries = corpus
+    index = build(IVFVectorIndex(nprobe=8, nlist=8, min_train_size=256), corpus)
+    assert index.is_trained
+    for query in queries:
+        assert result_ids(index.search(query, 10)) == brute_force(ids, vectors, query, 10)[0]
+
+
+def test_ivf_partial_probe_recall(corpus):
+    ids, vectors, _, _, queries = corpus
+    index = build(IVFVectorIndex(nprobe=4, nlist=8, min_train_size=256), corpus)
+    recall = np.mean([
+        len(set(result_ids(index.search(query, 10))) & set(brute_force(ids, vectors, query, 10)[0])) / 10
+        for query in queries
+    ])
+    assert recall >= 0.7
+    # 批量查询与逐个查询一致
+    assert_same_results(index.search_batch(queries, 10), [index.search(query, 10) for query in queries])
+
+
+def test_ivf_untrained_falls_back_to_exact(corpus):
+    ids, vectors, _, _, queries = corpus
+    index = build(IVFVectorIndex(min_train_size=SIZE + 1), corpus)
+    assert not index.is_trained
+    assert result_ids(index.search(queries[0], 10)) == brute_force(ids, vectors, queries[0], 10)[0]
+
+
+def test_int8_with_rerank_matches_brute_force(corpus):
+    ids, vectors, _, _, queries = corpus
+    index = build(QuantizedVectorIndex(rerank_factor=4), corpus)
+    originals = dict(zip(ids.tolist(), vectors))
+    loaded = []
+
+    def loader(row_ids):
+        loaded.append(len(row_ids))
+        return {row_id: originals[row_id] for row_id in row_ids}
+
+    for query in queries:
+        expected, scores = brute_force(ids, vectors, query, 10)
+        results = index.search(query, 10, rerank_loader=loader)
+        assert result_ids(results) == expected
+        # 重排后为精确余弦相似度
+        assert np.allclose([score for _, score in results], np.sort(scores)[::-1][:10], atol=1e-5)
+    assert loaded and max(loaded) <= 40
+    # 批量查询的候选合并为一次读取
+    loaded.clear()
+    batch = index.search_batch(queries, 10, rerank_loader=loader)
+    assert len(loaded) == 1
+    assert_same_results(batch, [index.search(query, 10, rerank_loader=loader) for query in queries])
+
+
+def test_int8_without_rerank_is_close(corpus):
+    ids, vectors, _, _, queries = corpus
+    index = build(QuantizedVectorIndex(), corpus)
+    assert index.nbytes < normalize_rows(vectors).nbytes / 3
+    for query in queries:
+        expected = brute_force(ids, vectors, query, 10)[0]
+        assert len(set(result_ids(index.search(query, 10))) & set(expected)) >= 8
+
+
+@pytest.mark.parametrize("make_index", [FlatVectorIndex, QuantizedVectorIndex,
+                                        lambda: IVFVectorIndex(nprobe=8, nlist=8, min_train_size=256)])
+@pytest.mark.parametrize("filters, predicate", [
+    # 子集占比低于 DENSE_FILTER_RATIO：只对命中的行打分
+    ({"source_name": "file3.txt"}, lambda row: row[3] == "file3.txt"),
+    # 子集较大：整块打分后屏蔽未命中的行
+    ({"doc_type": ["type1"], "source_name": ["file1.txt", "file3.txt", "file5.txt"]},
+     lambda row: row[1] == "type1" and row[3] in ("file1.txt", "file3.txt", "file5.txt")),
+])
+def test_filters_restrict_results(corpus, make_index, filters, predicate):
+    ids, vectors, _, meta, queries = corpus
+    index = build(make_index(), corpus)
+    keep = np.asarray([predicate(row) for row in meta])
+    originals = dict(zip(ids.tolist(), vectors))
+    for query in queries:
+        expected = brute_force(ids, vectors, query, 10, keep)[0]
+        if isinstance(index, QuantizedVectorIndex):
+            results = index.search(query, 10, filters=filters,
+                                   rerank_loader=lambda row_ids: {i: originals[i] for i in row_ids})
+        else:
+            results = index.search(query, 10, filters=filters)
+        assert result_ids(results) == expected
+
+
+def test_filter_without_matches_returns_empty(corpus):
+    index = build(FlatVectorIndex(), corpus)
+    assert index.search(corpus[4][0], 10, filters={"doc_type": "missing"}) == []
+
+
+def test_unknown_filter_field_is_rejected():
+    with pytest.raises(ValueError):
+        normalize_filters({"section": "第1节"})
+    assert normalize_filters({"doc_type": ["b", "a", "a"], "doc_subject": None, "source_name": []}) == {"doc_type": ["a", "b"]}
+
+
+@pytest.mark.parametrize("make_index", [FlatVectorIndex, lambda: IVFVectorIndex(nprobe=8, nlist=8, min_train_size=256)])
+def test_per_section_cap(corpus, make_index):
+    ids, vectors, _, meta, queries = corpus
+    index = build(make_index(), corpus)
+    sections = [row[0] for row in meta]
+    for query in queries:
+        results = index.search(query, 15, group_cap=1)
+        _, scores = brute_force(ids, vectors, query, SIZE)
+        assert result_ids(results) == capped_reference(ids, scores, sections, 15, 1)
+        # 章节数少于 top_k 时每章节一条
+        assert len(results) == SECTIONS
+
+
+def test_rows_without_attributes_are_their_own_group(corpus):
+    ids, vectors, _, _, queries = corpus
+    index = FlatVectorIndex()
+    index.add(ids, vectors)
+    assert result_ids(index.search(queries[0], 10, group_cap=1)) == brute_force(ids, vectors, queries[0], 10)[0]
+
+
+def test_mmr_prefers_diverse_results():
+    base = np.eye(4, dtype=np.float32)
+    # 2 与 1 几乎相同，3 与 1 正交但与查询也较相关
+    vectors = np.stack([base[0], base[0] + 0.01 * base[1], base[2], base[3]])
+    index = FlatVectorIndex()
+    index.add([1, 2, 3, 4], vectors)
+    query = base[0] + 0.9 * base[2]
+    assert result_ids(index.search(query, 2)) == [1, 2]
+    # λ=1 只看相关度，与普通检索相同
+    assert result_ids(index.search(query, 2, mmr_lambda=1.0)) == [1, 2]
+    # λ 较小时跳过与已选结果几乎相同的 2
+    assert result_ids(index.search(query, 2, mmr_lambda=0.5)) == [1, 3]
+
+
+def test_mmr_respects_section_cap_and_pool(corpus):
+    ids, vectors, _, meta, queries = corpus
+    index = build(FlatVectorIndex(), corpus)
+    results = index.search(queries[0], 8, group_cap=1, mmr_lambda=0.7, mmr_pool=20)
+    assert len(results) == 8
+    sections = {ids[i]: meta[i][0] for i in range(SIZE)}
+    assert len({sections[row_id] for row_id in result_ids(results)}) == 8
+    # 结果都来自限流后的前 mmr_pool 个候选
+    _, scores = brute_force(ids, vectors, queries[0], SIZE)
+    pool = capped_reference(ids, scores, [row[0] for row in meta], 20, 1)
+    assert set(result_ids(results)) <= set(pool)
+
+
+def test_dimension_mismatch_is_rejected(corpus):
+    index = build(FlatVectorIndex(), corpus)
+    with pytest.raises(ValueError):
+        index.add([1], np.ones((1, DIM + 1)))
+    with pytest.raises(ValueError):
+        index.search(np.ones(DIM + 1), 3)
+    with pytest.raises(ValueError):
+        index.add([1, 2], np.ones((1, DIM)))
+    assert len(ATTRIBUTE_FIELDS) == corpus[2].shape[1]
@@ -0,0 +1,148 @@
+"""
+磁盘向量分片（Embedding/vector_shard.py）单元测试：导出 / 增量追加 / 删除标记 / 压缩后剩余的行，
+以及分片检索与精确索引的结果一致
+
+运行方式（在项目根目录）：
+    PYTHONPATH=. python -m pytest -q test/test_vector_shard.py
+"""
+import os
+import time
+import numpy as np
+import pytest
+from Embedding.vector_index import FlatVectorIndex, row_attributes
+from Embedding.vector_shard import VectorShardStore
+
+DIM = 8
+ORG = "org/测试"
+
+
+def make_rows(start, count, seed):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(start, start + count, dtype=np.int64)
+    vectors = rng.normal(size=(count, DIM)).astype(np.float32)
+    attrs = np.asarray([row_attributes(f"第{i % 4}节", f"type{i % 2}", None, "a.txt") for i in ids], dtype=np.int64)
+    return ids, vectors, attrs
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VectorShardStore(str(tmp_path), compact_threshold=100)
+
+
+def shard_ids(store):
+    index = store.open_index(ORG)
+    return sorted(row_id for row_id, _ in index.search(np.ones(DIM), len(index) + 10)) if len(index) else []
+
+
+def reference(*parts, removed=()):
+    index = FlatVectorIndex()
+    for ids, vectors, attrs in parts:
+        keep = ~np.isin(ids, list(removed))
+        index.add(ids[keep], vectors[keep], attrs[keep])
+    return index
+
+
+def assert_same_search(store, expected, query, **kwargs):
+    results = store.open_index(ORG).search(query, 10, **kwargs)
+    wanted = expected.search(query, 10, **kwargs)
+    assert [row_id for row_id, _ in results] == [row_id for row_id, _ in wanted]
+    assert np.allclose([score for _, score in results], [score for _, score in wanted], atol=1e-5)
+
+
+def test_append_and_delete_before_export_are_ignored(store):
+    ids, vectors, attrs = make_rows(1, 5, 0)
+    assert store.append(ORG, ids, vectors, attrs) is False
+    assert store.delete(ORG, ids[:1]) is False
+    assert store.open_index(ORG) is None
+
+
+def test_export_append_delete_compact(store):
+    base = make_rows(1, 40, 0)
+    delta = make_rows(41, 10, 1)
+    store.export(ORG, *base)
+    assert store.snapshot(ORG) == (40, 40)
+    assert store.append(ORG, *delta)
+    assert store.snapshot(ORG) == (50, 50)
+    assert shard_ids(store) == list(range(1, 51))
+
+    removed = [3, 7, 45, 999]
+    assert store.delete(ORG, removed)
+    # 删除标记只屏蔽，不改动分片文件；最大 ID 不变
+    assert store.snapshot(ORG) == (46, 50)
+    remaining = [i for i in range(1, 51) if i not in removed]
+    assert shard_ids(store) == remaining
+    expected = reference(base, delta, removed=removed)
+    query = np.random.default_rng(9).normal(size=DIM)
+    assert_same_search(store, expected, query)
+
+    before = store.read_manifest(ORG)
+    store.compact(ORG)
+    manifest = store.read_manifest(ORG)
+    assert manifest["deltas"] == [] and not manifest.get("tombstones")
+    assert manifest["version"] == before["version"] + 1
+    assert manifest["snapshot"] == before["snapshot"]
+    assert shard_ids(store) == remaining
+    assert_same_search(store, expected, query)
+    # 被合并的分片文件已删除，只剩新的 base 分片
+    names = {name.split(".")[0] for name in os.listdir(store._org_dir(ORG)) if name.endswith(".npy")}
+    assert names == {manifest["base"]}
+
+
+def test_compact_removes_everything_when_all_deleted(store):
+    ids, vectors, attrs = make_rows(1, 6, 0)
+    store.export(ORG, ids, vectors, attrs)
+    store.delete(ORG, ids)
+    assert len(store.open_index(ORG)) == 0
+    store.compact(ORG)
+    assert len(store.open_index(ORG)) == 0
+    assert store.open_index(ORG).search(np.ones(DIM), 5) == []
+
+
+def test_filters_and_section_cap_match_flat_index(store):
+    base = make_rows(1, 60, 0)
+    delta = make_rows(61, 20, 1)
+    store.export(ORG, *base)
+    store.append(ORG, *delta)
+    store.delete(ORG, [2, 62])
+    expected = reference(base, delta, removed=[2, 62])
+    for seed in range(3):
+        query = np.random.default_rng(seed + 10).normal(size=DIM)
+        assert_same_search(store, expected, query)
+        assert_same_search(store, expected, query, filters={"doc_type": "type1"})
+        assert_same_search(store, expected, query, group_cap=2)
+        assert_same_search(store, expected, query, group_cap=1, mmr_lambda=0.5)
+
+
+def test_append_with_expected_snapshot(store):
+    store.export(ORG, *make_rows(1, 10, 0))
+    delta = make_rows(11, 5, 1)
+    # 快照已变化（其他进程先追加过）时不重复追加
+    assert store.append(ORG, *delta, expected=(9, 10)) is False
+    assert store.append(ORG, *delta, expected=(10, 10)) is True
+    assert store.snapshot(ORG) == (15, 15)
+    assert shard_ids(store) == list(range(1, 16))
+
+
+def test_reader_is_reused_until_manifest_changes(store):
+    store.export(ORG, *make_rows(1, 10, 0))
+    reader = store.open_index(ORG)
+    assert store.open_index(ORG) is reader
+    store.append(ORG, *make_rows(11, 2, 1))
+    assert store.open_index(ORG) is not reader
+    assert store.open_index(ORG).snapshot == (12, 12)
+
+
+def test_compact_threshold_triggers_background_compaction(tmp_path):
+    store = VectorShardStore(str(tmp_path), compact_threshold=2)
+    store.export(ORG, *make_rows(1, 10, 0))
+    store.append(ORG, *make_rows(11, 3, 1))
+    store.compact(ORG)
+    store.append(ORG, *make_rows(14, 3, 2))
+    store.delete(ORG, [1])
+    # 达到阈值后后台线程压缩；等待其完成
+    for _ in range(200):
+        if not store._compacting and not store.read_manifest(ORG)["deltas"]:
+            break
+        time.sleep(0.01)
+    assert store.read_manifest(ORG)["deltas"] == []
+    assert shard_ids(store) == list(range(2, 17))
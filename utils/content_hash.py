@@ -0,0 +1,9 @@
+# utils/content_hash.py
+import hashlib
+import re
+
+
+def compute_content_hash(text: str) -> str:
+    """chunk 去重/缓存哈希：空白归一化后的文本 SHA256(HEX)"""
+    normalized = re.sub(r"\s+", " ", text or "").strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()